@@ -0,0 +1,21 @@
+"""
+Process-wide configuration bootstrap.
+"""
+
+import threading
+
+_loaded = False
+_lock = threading.Lock()
+
+
+def load_environment() -> None:
+    """Load ``.env`` into ``os.environ`` once per process; later calls are no-ops."""
+    global _loaded
+    if _loaded:
+        return
+    with _lock:
+        if not _loaded:
+            from dotenv import load_dotenv
+
+            load_dotenv()
+            _loaded = True
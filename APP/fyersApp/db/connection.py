@@ -1,11 +1,20 @@
 import os
+import threading
+import time
+from typing import Any, Optional
 from urllib.parse import quote_plus
 
-from dotenv import load_dotenv
-from sqlalchemy import create_engine
-from sqlalchemy.orm import sessionmaker
+from fastapi import HTTPException
 
-load_dotenv()
+from APP.config import load_environment
+from APP.services import readiness
+
+_engine: Optional[Any] = None
+_session_factory: Optional[Any] = None
+_lock = threading.Lock()
+_probe_lock = threading.Lock()
+_probed_at = float("-inf")
+_probe_ok = False
 
 
 def _build_connection_string() -> str:
@@ -50,16 +59,100 @@ def _build_connection_string() -> str:
     return ";".join(parts)
 
 
-connection_string = _build_connection_string()
-encoded_connection_string = quote_plus(connection_string)
-SQLALCHEMY_DATABASE_URL = f"mssql+pyodbc:///?odbc_connect={encoded_connection_string}"
+def database_url() -> str:
+    load_environment()
+    encoded_connection_string = quote_plus(_build_connection_string())
+    return f"mssql+pyodbc:///?odbc_connect={encoded_connection_string}"
+
+
+def get_engine() -> Any:
+    """
+    Build the SQLAlchemy engine on first use.
+
+    Deferring this keeps SQLAlchemy/pyodbc off the startup path and means a
+    missing DB configuration only fails DB-backed routes.
+    """
+    global _engine, _session_factory
+    if _engine is None:
+        with _lock:
+            if _engine is None:
+                from sqlalchemy import create_engine
+                from sqlalchemy.orm import sessionmaker
+
+                # pyodbc sends executemany batches as one parameter array
+                fast = os.getenv("DB_FAST_EXECUTEMANY", "true").lower() in ("1", "true", "yes")
+                # Login timeout (seconds): an unreachable server fails fast instead of hanging a worker
+                timeout = int(os.getenv("DB_CONNECT_TIMEOUT", "5"))
+                engine = create_engine(
+                    database_url(),
+                    fast_executemany=fast,
+                    connect_args={"timeout": timeout},
+                    pool_timeout=timeout,
+                )
+                _session_factory = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+                _engine = engine
+    return _engine
+
+
+def probe_database() -> bool:
+    """Check out a pooled connection and run ``SELECT 1``; blocks up to ``DB_CONNECT_TIMEOUT``."""
+    global _probed_at, _probe_ok
+    if _engine is None:
+        return False
+    try:
+        from sqlalchemy import text
 
-engine = create_engine(SQLALCHEMY_DATABASE_URL)
-SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+        with _engine.connect() as connection:
+            connection.execute(text("SELECT 1"))
+        _probe_ok = True
+    except Exception:
+        _probe_ok = False
+    finally:
+        _probed_at = time.monotonic()
+    return _probe_ok
+
+
+def _probe_in_background() -> None:
+    try:
+        probe_database()
+    finally:
+        _probe_lock.release()
+
+
+def engine_ready() -> bool:
+    """
+    Whether the database last answered ``SELECT 1``; never blocks.
+
+    A stale answer (older than ``DB_READY_PROBE_INTERVAL`` seconds, default 5)
+    starts a fresh probe on a daemon thread, so ``/ready`` on the event loop
+    never waits for a database that is down.
+    """
+    if _engine is None:
+        return False
+    stale = time.monotonic() - _probed_at >= float(os.getenv("DB_READY_PROBE_INTERVAL", "5"))
+    if stale and _probe_lock.acquire(blocking=False):
+        threading.Thread(target=_probe_in_background, name="db-ready-probe", daemon=True).start()
+    return _probe_ok
+
+
+def SessionLocal() -> Any:
+    get_engine()
+    return _session_factory()
+
+
+def _warm_database() -> None:
+    get_engine()
+    probe_database()
+
+
+readiness.register("database", engine_ready, _warm_database)
 
 
 def get_db():
-    db = SessionLocal()
+    try:
+        db = SessionLocal()
+    except ValueError as exc:
+        raise HTTPException(status_code=503, detail=str(exc))
     try:
         yield db
     finally:
@@ -8,11 +8,23 @@ from typing import Any, Dict
 class OptionChainRequest:
     """
     Lightweight value object describing an option-chain query.
+
+    ``expiry`` (a selector such as ``current`` or ``next-monthly``, see
+    ``APP.services.derivatives``) and ``strike_offset`` (centre the window
+    this many strikes from the money) are resolved against the derivatives
+    index before the request goes to Fyers.
     """
 
     symbol: str
     strikecount: int = 1
     timestamp: str | None = ""
+    expiry: str | None = None
+    strike_offset: int = 0
+
+    @property
+    def relative(self) -> bool:
+        """Whether the request needs resolving against the derivatives index."""
+        return bool(self.expiry) or self.strike_offset != 0
 
     def to_payload(self) -> Dict[str, Any]:
         """
@@ -22,6 +34,8 @@ class OptionChainRequest:
             raise ValueError("symbol is required for option chain request")
         if self.strikecount < 1:
             raise ValueError("strikecount must be >= 1")
+        if self.relative:
+            raise ValueError("expiry and strike_offset must be resolved before building the payload")
         payload: Dict[str, Any] = {
             "symbol": self.symbol,
             "strikecount": self.strikecount,
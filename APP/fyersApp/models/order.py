@@ -0,0 +1,31 @@
+from datetime import datetime, timezone
+
+from sqlalchemy import Column, DateTime, Integer, Numeric, String
+
+from APP.fyersApp.models.dropdown import Base
+
+
+def _utcnow() -> datetime:
+    return datetime.now(timezone.utc)
+
+
+class Order(Base):
+    __tablename__ = "orders"
+
+    id = Column(Integer, primary_key=True, index=True)
+    user_id = Column(Integer, nullable=False, index=True)
+    # Session user ID (X-User-ID) that placed the order; NULL for the legacy single-user session
+    session_user = Column(String(64), nullable=True, index=True)
+    order_id = Column(String(50), unique=True, nullable=True, index=True)
+    instrument_token = Column(String(50), nullable=False)
+    transaction_type = Column(String(10), nullable=False)
+    order_type = Column(String(10), nullable=False)
+    product_type = Column(String(10), default="MIS")
+    validity = Column(String(10), default="DAY")
+    quantity = Column(Integer, nullable=False)
+    price = Column(Numeric(10, 2), nullable=True)
+    status = Column(String(20), default="PENDING")
+    filled_quantity = Column(Integer, default=0)
+    average_price = Column(Numeric(10, 2), nullable=True)
+    placed_at = Column(DateTime(timezone=True), default=_utcnow)
+    updated_at = Column(DateTime(timezone=True), nullable=True, onupdate=_utcnow)
@@ -0,0 +1,17 @@
+from datetime import datetime, timezone
+
+from sqlalchemy import Column, DateTime, Integer, String
+
+from APP.fyersApp.models.dropdown import Base
+
+
+class StrategySignal(Base):
+    __tablename__ = "strategy_signals"
+
+    id = Column(Integer, primary_key=True, index=True)
+    strategy_id = Column(Integer, nullable=False, index=True)
+    instrument_token = Column(String(50), nullable=False)
+    signal_type = Column(String(10), nullable=False)
+    price = Column(String(20), nullable=False)
+    quantity = Column(Integer, nullable=False)
+    created_at = Column(DateTime(timezone=True), default=lambda: datetime.now(timezone.utc))
@@ -1,18 +1,30 @@
 import json
 import os
-from typing import Any, Dict, Optional
+from typing import Any, Callable, Dict, Optional
 from urllib.parse import quote_plus, urlparse
 
-from fastapi import APIRouter, HTTPException, Query
-from fastapi.responses import HTMLResponse
+from fastapi import APIRouter, HTTPException, Query, Request
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import HTMLResponse, JSONResponse, Response
 
 from APP.fyersApp.models import OptionChainRequest
 from APP.fyersApp.services import FyersService
+from APP.fyersApp.services.fyers_service import user_from_state
+from APP.services.cache import etag_for, etag_matches
+from APP.services.circuit import CircuitOpenError
+from APP.services.refresh import OPTION_CHAIN, QUOTES, refresh_scheduler
+from APP.services.sessions import current_user, use_user
 
 
 router = APIRouter()
 
 
+def _as_user(user: Optional[str], action: Callable[[], Any]) -> Any:
+    # Background refreshes run outside the request, so they re-bind its user
+    with use_user(user):
+        return action()
+
+
 def _frontend_urls() -> Dict[str, str]:
     """Return base URLs/origins used for popup messaging + fallback redirects."""
     base_url = os.getenv("FRONTEND_BASE_URL", "http://localhost:9000")
@@ -46,14 +58,18 @@ async def fyers_callback(
     urls = _frontend_urls()
     payload: Dict[str, Any] = {"provider": "fyers"}
 
-    expected_state = os.getenv("FYERS_STATE") or "algonova-fyers"
-
     try:
-        if state and state != expected_state:
+        # Per-user logins carry the user in a signed state; a per-user session is only
+        # written for the user that state names, whoever the caller claims to be
+        state_user = user_from_state(state) if state else None
+        user_id = current_user()
+        if user_id is not None and user_id != state_user:
             raise ValueError("State validation failed for Fyers callback")
+        user_id = state_user
 
-        service = FyersService()
-        result = service.exchange_auth_code(auth_code)
+        with use_user(user_id):
+            service = FyersService()
+            result = service.exchange_auth_code(auth_code)
         payload.update({"success": True, "data": result})
         fallback_suffix = "fyers_success=true"
     except Exception as exc:
@@ -121,17 +137,25 @@ async def fyers_callback(
 
 @router.get("/profile")
 async def get_fyers_profile(
+    request: Request,
     refresh: bool = Query(False, description="If true, pull the latest profile from Fyers"),
-) -> Dict[str, Any]:
+) -> Response:
+    """Stored (or freshly pulled) Fyers profile; honours If-None-Match with a 304."""
     try:
         service = FyersService()
         if refresh:
-            session = service.refresh_profile()
+            session = await run_in_threadpool(service.refresh_profile)
         else:
-            session = service.get_cached_profile()
-        return {"success": True, "data": session["profile"]}
+            session = await run_in_threadpool(service.get_cached_profile)
+    except CircuitOpenError:
+        raise
     except Exception as exc:
         raise HTTPException(status_code=400, detail=str(exc))
+    etag = etag_for(session["profile"], session.get("stored_at"))
+    headers = {"ETag": etag, "Cache-Control": "private, no-cache"}
+    if etag_matches(request.headers.get("if-none-match"), etag):
+        return Response(status_code=304, headers=headers)
+    return JSONResponse({"success": True, "data": session["profile"]}, headers=headers)
 
 
 @router.get("/option-chain")
@@ -143,22 +167,71 @@ async def get_option_chain(
     timestamp: Optional[str] = Query(
         None, description="Optional UNIX timestamp for historical chain"
     ),
+    expiry: Optional[str] = Query(
+        None,
+        description="Expiry: current, next, monthly, next-monthly, an offset (0, 1, ...) or YYYY-MM-DD",
+    ),
+    strike_offset: int = Query(
+        0, ge=-20, le=20, description="Centre the strikes this many steps above (+) or below (-) the money"
+    ),
 ) -> Dict[str, Any]:
     """
     Fetch the option-chain snapshot from Fyers for the requested symbol.
+
+    Live chains are served from cache and kept fresh in the background at a
+    rate that follows market hours. ``expiry`` and ``strike_offset`` are
+    resolved locally from the derivatives index (expiry calendar and strike
+    ladder); the response then carries a ``selection`` with the expiry, lot
+    size, tick size and strikes picked.
     """
     try:
         request = OptionChainRequest(
             symbol=symbol,
             strikecount=strikecount,
             timestamp=timestamp or "",
+            expiry=expiry,
+            strike_offset=strike_offset,
         )
         service = FyersService()
-        data = service.fetch_option_chain(request)
+        data = await run_in_threadpool(service.fetch_option_chain, request)
+        if not timestamp:
+            user = current_user()
+            refresh_scheduler.watch(
+                OPTION_CHAIN,
+                (user, symbol, strikecount, expiry, strike_offset),
+                lambda: _as_user(user, lambda: FyersService().fetch_option_chain(request, refresh=True)),
+            )
         return {"success": True, "data": data}
     except ValueError as exc:
         raise HTTPException(status_code=400, detail=str(exc))
+    except CircuitOpenError:
+        raise
     except Exception as exc:
         raise HTTPException(status_code=500, detail=str(exc))
 
 
+
+
+@router.get("/quotes")
+async def get_quotes(
+    symbols: str = Query(..., description="Comma-separated symbols e.g. NSE:SBIN-EQ,NSE:TCS-EQ"),
+) -> Dict[str, Any]:
+    """Latest quotes per symbol, from cache and kept fresh in the background during market hours."""
+    wanted = tuple(sorted({symbol.strip() for symbol in symbols.split(",") if symbol.strip()}))
+    try:
+        service = FyersService()
+        data = await run_in_threadpool(service.fetch_quotes, wanted)
+    except ValueError as exc:
+        raise HTTPException(status_code=400, detail=str(exc))
+    except CircuitOpenError:
+        raise
+    except Exception as exc:
+        raise HTTPException(status_code=500, detail=str(exc))
+    user = current_user()
+    refresh_scheduler.watch_many(
+        QUOTES,
+        ("fyers", user),
+        wanted,
+        lambda due: _as_user(user, lambda: FyersService().fetch_quotes(due, refresh=True)),
+    )
+    return {"success": True, "data": data}
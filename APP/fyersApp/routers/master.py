@@ -1,33 +1,56 @@
-from typing import Any, Dict, List, Optional
+from typing import TYPE_CHECKING, Any, Dict, List, Optional
 
 import logging
 from fastapi import APIRouter, Depends, HTTPException, Query
-from sqlalchemy.orm import Session
+from fastapi.concurrency import run_in_threadpool
 
 from APP.fyersApp.db.connection import get_db
-from APP.fyersApp.models.dropdown import DropdownMaster
+from APP.services.cache import TTLCache
+from APP.services.circuit import CircuitOpenError, guarded, serve_stale
+from APP.services.metrics import time_db_query
+
+if TYPE_CHECKING:
+    from sqlalchemy.orm import Session
 
 logger = logging.getLogger(__name__)
 router = APIRouter()
 
+# Last good result per filter; only read when the database is failing
+_dropdown_cache: TTLCache[List[Dict[str, Any]]] = TTLCache("dropdown_master", ttl=0.0, maxsize=64)
+
 
 @router.get("/dropdown")
 async def get_dropdown_values(
     type: Optional[str] = Query(None, description="Filter by DropdownType"),
-    db: Session = Depends(get_db),
+    db: "Session" = Depends(get_db),
 ) -> Dict[str, Any]:
     """
     Fetch active dropdown values from Dropdown_Master.
+
+    While the database is failing, the last good result for the same filter
+    is returned with ``"stale": true``.
     """
-    try:
+    # Imported here so SQLAlchemy's ORM only loads once a DB route is used
+    from APP.fyersApp.models.dropdown import DropdownMaster
+
+    def load() -> List[Dict[str, Any]]:
         query = db.query(DropdownMaster).filter(DropdownMaster.IsActive == True)
 
         if type:
             query = query.filter(DropdownMaster.DropdownType == type)
 
-        results = query.all()
+        def fetch() -> List[Any]:
+            try:
+                return query.all()
+            except Exception:
+                # A failed statement leaves the session unusable until rolled back
+                db.rollback()
+                raise
+
+        with time_db_query("dropdown_master"):
+            results = guarded("database", fetch)
 
-        data = [
+        return [
             {
                 "label": item.DropdownName,
                 "value": item.Value,
@@ -38,7 +61,16 @@ async def get_dropdown_values(
             if item.Value is not None
         ]
 
-        return {"success": True, "data": data}
+    try:
+        data = await run_in_threadpool(load)
     except Exception as exc:
-        logger.exception("Failed to load dropdown values from DB: %s", exc)
-        raise HTTPException(status_code=500, detail=str(exc))
+        try:
+            data = serve_stale(_dropdown_cache, type, exc)
+        except CircuitOpenError:
+            raise
+        except Exception:
+            logger.exception("Failed to load dropdown values from DB: %s", exc)
+            raise HTTPException(status_code=500, detail=str(exc))
+        return {"success": True, "data": data, "stale": True}
+    _dropdown_cache.set(type, data)
+    return {"success": True, "data": data}
@@ -1,15 +1,136 @@
+import base64
+import hashlib
+import hmac
 import json
 import os
+import secrets
+import sys
+import time
 from datetime import UTC, datetime
 from pathlib import Path
-from typing import Any, Dict, Iterable, Optional
-
-from dotenv import load_dotenv
-from fyers_apiv3.fyersModel import FyersModel, SessionModel
+from typing import Any, Callable, Dict, Iterable, List, Optional
 
+from APP.config import load_environment
 from APP.fyersApp.models import OptionChainRequest
+from APP.services import readiness
+from APP.services.cache import SingleFlight, TTLCache
+from APP.services.circuit import CircuitOpenError, guarded, is_transient, serve_stale
+from APP.services.market_calendar import parse_timestamp, token_cutoff_after
+from APP.services.metrics import time_upstream
+from APP.services.order_book import track_new_order
+from APP.services.refresh import OPTION_CHAIN, QUOTES, policies as refresh_policies
+from APP.services.risk_engine import RiskEngine, risk_for
+from APP.services.sessions import (
+    client_cache_size,
+    client_idle_ttl,
+    current_user,
+    fyers_sessions,
+    validate_user_id,
+)
+
+REFRESH_TOKEN_URL = "https://api-t1.fyers.in/api/v3/validate-refresh-token"
+
+# Fyers order API codes
+_ORDER_TYPES = {"LIMIT": 1, "MARKET": 2, "SL-M": 3, "SL": 4}
+_SIDES = {"BUY": 1, "SELL": -1}
+
+# Shared across FyersService instances (one is built per request).
+_client_cache: TTLCache[Any] = TTLCache(
+    "fyers_clients", ttl=client_idle_ttl(), maxsize=client_cache_size(), sliding=True, second_chance=True
+)
+_option_chain_cache: TTLCache[Dict[str, Any]] = TTLCache("fyers_option_chain", ttl=2.0, maxsize=256)
+_quote_cache: TTLCache[Dict[str, Any]] = TTLCache("fyers_quotes", ttl=1.0, maxsize=4096)
+_profile_flight: SingleFlight[Dict[str, Any]] = SingleFlight("fyers_profile")
+
+# Resolved from fyers_apiv3 on first use (see _sdk_class); importing the SDK
+# costs ~200ms, which should not sit on the startup path.
+SessionModel: Any = None
+FyersModel: Any = None
+
+
+def _sdk_class(name: str) -> type:
+    cls = globals().get(name)
+    if cls is None:
+        from fyers_apiv3 import fyersModel
+
+        cls = getattr(fyersModel, name)
+        globals()[name] = cls
+    return cls
+
+
+def _warm_sdk() -> None:
+    _sdk_class("SessionModel")
+    _sdk_class("FyersModel")
+
+
+readiness.register(
+    "fyers_sdk", lambda: "fyers_apiv3.fyersModel" in sys.modules, _warm_sdk
+)
+
+
+def _post_json(url: str, payload: Dict[str, Any]) -> Dict[str, Any]:
+    import requests
+
+    response = requests.post(url, json=payload, timeout=10)
+    return response.json()
+
+
+def _state_prefix() -> str:
+    return os.getenv("FYERS_STATE") or "algonova-fyers"
+
+
+def _state_signature(payload: str) -> str:
+    # The same app-secret names FyersService reads, behind a dedicated state secret
+    key = FyersService._first_env_value(
+        ["FYERS_STATE_SECRET", "FYERS_SECRET_KEY", "FYERS_SECRET_ID", "Secret_Key"]
+    )
+    if not key:
+        raise ValueError("FYERS_STATE_SECRET or the Fyers app secret is required to sign per-user logins")
+    return hmac.new(key.encode(), payload.encode(), hashlib.sha256).hexdigest()
+
+
+def sign_state(user_id: str) -> str:
+    """
+    OAuth ``state`` for a per-user login: ``<FYERS_STATE>:<user>:<issued>:<nonce>:<hmac>``.
+
+    The HMAC (keyed by ``FYERS_STATE_SECRET``, else the app secret) covers the
+    user, issue time and nonce, so a callback cannot be pointed at another
+    user's session file.
+    """
+    payload = f"{validate_user_id(user_id)}:{int(time.time())}:{secrets.token_hex(8)}"
+    return f"{_state_prefix()}:{payload}:{_state_signature(payload)}"
+
+
+def user_from_state(state: str) -> Optional[str]:
+    """
+    The user a Fyers callback ``state`` was issued for; None for the legacy session.
 
-load_dotenv()
+    Raises ValueError when the prefix, signature or age (``FYERS_STATE_TTL``
+    seconds, default 900) do not check out.
+    """
+    prefix = _state_prefix()
+    if state == prefix:
+        return None
+    head, _, payload = state.partition(":")
+    payload, _, signature = payload.rpartition(":")
+    user_id, _, issued = payload.partition(":")
+    issued, _, nonce = issued.partition(":")
+    if head != prefix or not nonce or not hmac.compare_digest(signature, _state_signature(payload)):
+        raise ValueError("State validation failed for Fyers callback")
+    if not issued.isdigit() or time.time() - int(issued) > float(os.getenv("FYERS_STATE_TTL", "900")):
+        raise ValueError("Fyers login expired; start it again")
+    return validate_user_id(user_id)
+
+
+def _jwt_expiry(access_token: str) -> Optional[datetime]:
+    """Read the ``exp`` claim of a Fyers (JWT) access token without verifying it."""
+    try:
+        payload_segment = access_token.split(".")[1]
+        padded = payload_segment + "=" * (-len(payload_segment) % 4)
+        claims = json.loads(base64.urlsafe_b64decode(padded))
+        return datetime.fromtimestamp(int(claims["exp"]), UTC)
+    except (IndexError, KeyError, ValueError, TypeError):
+        return None
 
 
 class FyersService:
@@ -19,9 +140,18 @@ class FyersService:
         self,
         session_factory: Optional[type] = None,
         fyers_factory: Optional[type] = None,
+        http_post: Optional[Callable[[str, Dict[str, Any]], Dict[str, Any]]] = None,
+        risk: Optional[RiskEngine] = None,
+        user_id: Optional[str] = None,
     ) -> None:
-        self.session_factory = session_factory or SessionModel
-        self.fyers_factory = fyers_factory or FyersModel
+        load_environment()
+        # None is the legacy single-user session in FYERS_TOKEN_PATH
+        self.user_id = user_id if user_id is not None else current_user()
+        # Positions, loss and order-rate limits are per session user
+        self.risk = risk or risk_for(self.user_id)
+        self.session_factory = session_factory or _sdk_class("SessionModel")
+        self.fyers_factory = fyers_factory or _sdk_class("FyersModel")
+        self.http_post = http_post or _post_json
 
         self.app_id = self._first_env_value(
             [
@@ -49,8 +179,12 @@ class FyersService:
         default_log_dir = os.getenv("FYERS_LOG_PATH", "./logs")
         os.makedirs(default_log_dir, exist_ok=True)
         self.log_path = default_log_dir
-        token_path = os.getenv("FYERS_TOKEN_PATH", "fyers_token.json")
-        self.token_file = Path(token_path)
+        if self.user_id is None:
+            self.token_file = Path(os.getenv("FYERS_TOKEN_PATH", "fyers_token.json"))
+        else:
+            self.token_file = fyers_sessions.path_for(self.user_id)
+        self.pin = os.getenv("FYERS_PIN", "")
+        self.option_chain_ttl = float(os.getenv("FYERS_OPTION_CHAIN_TTL", "2"))
 
         missing = []
         if not self.app_id:
@@ -72,15 +206,21 @@ class FyersService:
                 return value
         return None
 
-    def _create_session(self) -> SessionModel:
-        """Create a Fyers SessionModel configured for auth-code flow."""
+    def _create_session(self) -> Any:
+        """
+        Create a Fyers SessionModel configured for auth-code flow.
+
+        The user ID rides along in a signed ``state`` (:func:`sign_state`) so
+        the callback knows whose session it is completing.
+        """
+        state = self.state if self.user_id is None else sign_state(self.user_id)
         session = self.session_factory(
             client_id=self.app_id,
             secret_key=self.secret_key,
             redirect_uri=self.redirect_uri,
             response_type="code",
             grant_type="authorization_code",
-            state=self.state,
+            state=state,
             scope=self.scope,
             nonce=self.nonce,
         )
@@ -102,7 +242,8 @@ class FyersService:
         """Exchange auth_code for access_token and fetch basic profile."""
         session = self._create_session()
         session.set_token(auth_code)
-        token_response = session.generate_token()
+        with time_upstream("fyers", "generate_token"):
+            token_response = session.generate_token()
 
         access_token_value = token_response.get("access_token")
         if not access_token_value:
@@ -112,55 +253,167 @@ class FyersService:
 
         fyers = self._create_fyers_client(access_token_value)
 
-        profile = fyers.get_profile()
-        self._store_session(access_token_value, profile)
+        with time_upstream("fyers", "get_profile"):
+            profile = fyers.get_profile()
+        self._store_session(access_token_value, profile, token_response.get("refresh_token"))
         return {
             "access_token": access_token_value,
             "profile": profile,
         }
 
-    def _store_session(self, access_token: str, profile: Dict[str, Any]) -> None:
-        self.token_file.parent.mkdir(parents=True, exist_ok=True)
-        payload = {
+    def _store_session(
+        self,
+        access_token: str,
+        profile: Dict[str, Any],
+        refresh_token: Optional[str] = None,
+    ) -> Dict[str, Any]:
+        """Persist the session and return it; an identical stored session is left untouched."""
+        payload: Dict[str, Any] = {
             "access_token": access_token,
             "profile": profile,
             "stored_at": datetime.now(UTC).isoformat(),
         }
-        with self.token_file.open("w", encoding="utf-8") as fh:
-            json.dump(payload, fh, indent=2)
+        if refresh_token:
+            payload["refresh_token"] = refresh_token
+        try:
+            current = self._load_session()
+        except (ValueError, OSError):
+            current = None
+        if current is not None and current.get("stored_at") and {
+            key: value for key, value in current.items() if key != "stored_at"
+        } == {key: value for key, value in payload.items() if key != "stored_at"}:
+            # Keeping stored_at stable also keeps the profile ETag stable
+            return current
+        fyers_sessions.save(self.token_file, payload)
+        return payload
 
     def _load_session(self) -> Dict[str, Any]:
-        if not self.token_file.exists():
+        session = fyers_sessions.load(self.token_file)
+        if session is None:
             raise ValueError("No stored Fyers session found. Please login via Fyers first.")
-        with self.token_file.open("r", encoding="utf-8") as fh:
-            return json.load(fh)
+        return session
 
     def get_cached_profile(self) -> Dict[str, Any]:
         return self._load_session()
 
     def refresh_profile(self) -> Dict[str, Any]:
+        """
+        Pull the profile from Fyers and store it.
+
+        Concurrent refreshes for the same token share one upstream call.
+        """
         session = self._load_session()
-        fyers = self._create_fyers_client(session["access_token"])
-        profile = fyers.get_profile()
-        self._store_session(session["access_token"], profile)
-        return {"access_token": session["access_token"], "profile": profile}
+        access_token = session["access_token"]
 
-    def _create_fyers_client(self, access_token: str) -> FyersModel:
-        """Instantiate a Fyers client with shared configuration."""
-        return self.fyers_factory(
-            client_id=self.app_id,
-            token=access_token,
-            log_path=self.log_path,
+        def fetch() -> Dict[str, Any]:
+            fyers = self._create_fyers_client(access_token)
+            with time_upstream("fyers", "get_profile"):
+                profile = guarded("fyers", fyers.get_profile)
+            return self._store_session(access_token, profile, session.get("refresh_token"))
+
+        try:
+            stored = _profile_flight.do(access_token, fetch)
+        except Exception as exc:
+            # Fyers is down: the profile stored with the session stands in
+            if not (isinstance(exc, CircuitOpenError) or is_transient(exc)) or not session.get("profile"):
+                raise
+            return {
+                "access_token": access_token,
+                "profile": session["profile"],
+                "stored_at": session.get("stored_at"),
+                "stale": True,
+            }
+        return {"access_token": access_token, "profile": stored["profile"], "stored_at": stored.get("stored_at")}
+
+    def token_expiry(self) -> Optional[datetime]:
+        """Return when the stored access token stops working, if a session exists."""
+        if not self.token_file.exists():
+            return None
+        session = self._load_session()
+        expiry = _jwt_expiry(session.get("access_token", ""))
+        if expiry is None:
+            stored_at = parse_timestamp(session.get("stored_at"))
+            expiry = token_cutoff_after(stored_at) if stored_at else None
+        return expiry
+
+    def refresh_access_token(self) -> Dict[str, Any]:
+        """
+        Mint a new access token from the stored refresh token (valid ~15 days).
+
+        Requires FYERS_PIN; the profile stored alongside the token is kept.
+        """
+        session = self._load_session()
+        refresh_token = session.get("refresh_token")
+        if not refresh_token:
+            raise ValueError("No Fyers refresh token stored. Please login via Fyers again.")
+        if not self.pin:
+            raise ValueError("FYERS_PIN is required to refresh the Fyers access token.")
+
+        app_id_hash = hashlib.sha256(f"{self.app_id}:{self.secret_key}".encode()).hexdigest()
+        with time_upstream("fyers", "refresh_token"):
+            response = self.http_post(
+                REFRESH_TOKEN_URL,
+                {
+                    "grant_type": "refresh_token",
+                    "appIdHash": app_id_hash,
+                    "refresh_token": refresh_token,
+                    "pin": self.pin,
+                },
+            )
+        access_token = response.get("access_token") if isinstance(response, dict) else None
+        if not access_token:
+            message = response.get("message") if isinstance(response, dict) else response
+            raise ValueError(f"Fyers refresh token error: {message}")
+
+        _client_cache.invalidate(self._client_key(session["access_token"]))
+        self._store_session(access_token, session.get("profile", {}), refresh_token)
+        return {"access_token": access_token, "profile": session.get("profile", {})}
+
+    def _client_key(self, access_token: str) -> tuple:
+        return (self.fyers_factory, self.app_id, access_token)
+
+    def _create_fyers_client(self, access_token: str) -> Any:
+        """Return a Fyers client with shared configuration, reused per token."""
+        return _client_cache.get_or_set(
+            self._client_key(access_token),
+            lambda: self.fyers_factory(
+                client_id=self.app_id,
+                token=access_token,
+                log_path=self.log_path,
+            ),
         )
 
-    def fetch_option_chain(self, request: OptionChainRequest) -> Dict[str, Any]:
+    def fetch_option_chain(self, request: OptionChainRequest, refresh: bool = False) -> Dict[str, Any]:
         """
         Fetch option-chain data for the given request using the cached token.
+
+        Responses are reused for FYERS_OPTION_CHAIN_TTL seconds (0 disables),
+        longer outside market hours (see ``APP.services.refresh``); ``refresh``
+        skips the cache read. Expiry selectors and strike offsets are resolved
+        locally against the derivatives index and the answer trimmed to the
+        selected strikes.
         """
+        if request.relative:
+            from APP.services.derivatives import derivatives_index
+
+            plan = derivatives_index.plan_chain(request)
+            return plan.apply(self.fetch_option_chain(plan.request, refresh=refresh))
+
         session = self._load_session()
-        fyers = self._create_fyers_client(session["access_token"])
         payload = request.to_payload()
-        response = fyers.optionchain(data=payload)
+        cache_key = (session["access_token"], payload["symbol"], payload["strikecount"], payload["timestamp"])
+        if self.option_chain_ttl > 0 and not refresh:
+            cached = _option_chain_cache.get(cache_key)
+            if cached is not None:
+                return cached
+
+        fyers = self._create_fyers_client(session["access_token"])
+        try:
+            with time_upstream("fyers", "optionchain"):
+                response = guarded("fyers", fyers.optionchain, data=payload)
+        except Exception as exc:
+            # An expired chain beats an error while Fyers is unreachable
+            return serve_stale(_option_chain_cache, cache_key, exc)
         if not isinstance(response, dict):
             raise ValueError("Unexpected response from Fyers optionchain API")
 
@@ -169,6 +422,183 @@ class FyersService:
             message = response.get("message") or response.get("error") or "Unknown error"
             raise ValueError(f"Fyers optionchain error: {message}")
 
+        if self.option_chain_ttl > 0:
+            ttl = max(self.option_chain_ttl, refresh_policies[OPTION_CHAIN].ttl())
+            _option_chain_cache.set(cache_key, response, ttl=ttl)
+        # Chains double as marks for the portfolio analytics and feed OI alerts
+        from APP.services.alerts import alert_engine
+        from APP.services import portfolio
+
+        portfolio.ingest_option_chain(response)
+        alert_engine.ingest_option_chain(response)
         return response
 
+    def fetch_quotes(self, symbols: Iterable[str], refresh: bool = False) -> Dict[str, Dict[str, Any]]:
+        """
+        Quote fields (``lp``, ``ch``, ``volume``, ...) per symbol.
+
+        Quotes are cached per symbol for as long as the refresh policy allows,
+        and only the symbols missing from the cache are requested, in one call.
+        """
+        wanted = list(dict.fromkeys(symbol.strip() for symbol in symbols if symbol.strip()))
+        if not wanted:
+            raise ValueError("At least one symbol is required")
+        session = self._load_session()
+        token = session["access_token"]
+        quotes: Dict[str, Dict[str, Any]] = {}
+        if not refresh:
+            for symbol in wanted:
+                cached = _quote_cache.get((token, symbol))
+                if cached is not None:
+                    quotes[symbol] = cached
+        missing = [symbol for symbol in wanted if symbol not in quotes]
+        if missing:
+            fyers = self._create_fyers_client(token)
+            with time_upstream("fyers", "quotes"):
+                response = guarded("fyers", fyers.quotes, data={"symbols": ",".join(missing)})
+            if not isinstance(response, dict):
+                raise ValueError("Unexpected response from Fyers quotes API")
+            status = response.get("s")
+            if status and status.lower() != "ok":
+                message = response.get("message") or response.get("error") or "Unknown error"
+                raise ValueError(f"Fyers quotes error: {message}")
+            ttl = refresh_policies[QUOTES].ttl()
+            for entry in response.get("d") or []:
+                symbol, values = entry.get("n"), entry.get("v")
+                if symbol and isinstance(values, dict):
+                    _quote_cache.set((token, symbol), values, ttl=ttl)
+                    quotes[symbol] = values
+        return {symbol: quotes[symbol] for symbol in wanted if symbol in quotes}
+
+    def fetch_history(self, symbol: str, resolution: str, range_from: str, range_to: str) -> list:
+        """
+        Historical candles ``[[epoch, open, high, low, close, volume], ...]``.
 
+        ``range_from``/``range_to`` are ``YYYY-MM-DD``; Fyers serves at most
+        100 days per request for intraday resolutions.
+        """
+        session = self._load_session()
+        fyers = self._create_fyers_client(session["access_token"])
+        payload = {
+            "symbol": symbol,
+            "resolution": resolution,
+            "date_format": "1",
+            "range_from": range_from,
+            "range_to": range_to,
+            "cont_flag": "1",
+        }
+        with time_upstream("fyers", "history"):
+            response = guarded("fyers", fyers.history, data=payload)
+        if not isinstance(response, dict):
+            raise ValueError("Unexpected response from Fyers history API")
+        status = response.get("s")
+        if status and status.lower() != "ok":
+            message = response.get("message") or response.get("error") or "Unknown error"
+            raise ValueError(f"Fyers history error: {message}")
+        return response.get("candles") or []
+
+    def place_order(
+        self,
+        symbol: str,
+        transaction_type: str,
+        quantity: int,
+        order_type: str = "MARKET",
+        product: str = "INTRADAY",
+        price: Optional[float] = None,
+        trigger_price: Optional[float] = None,
+        validity: str = "DAY",
+        tag: Optional[str] = None,
+        user_id: Optional[int] = None,
+    ) -> Dict[str, Any]:
+        """
+        Place an order for ``symbol`` (e.g. "NSE:SBIN-EQ") after pre-trade risk checks.
+
+        Market orders without a price are valued at the last traded price.
+        """
+        transaction_type = transaction_type.upper()
+        order_type = order_type.upper()
+        if transaction_type not in _SIDES:
+            raise ValueError("transaction_type must be BUY or SELL")
+        if order_type not in _ORDER_TYPES:
+            raise ValueError(f"order_type must be one of {', '.join(_ORDER_TYPES)}")
+        session = self._load_session()
+        fyers = self._create_fyers_client(session["access_token"])
+
+        reference_price = price or trigger_price
+        if not reference_price:
+            with time_upstream("fyers", "quotes"):
+                quotes = guarded("fyers", fyers.quotes, data={"symbols": symbol})
+            try:
+                reference_price = quotes["d"][0]["v"]["lp"]
+            except (KeyError, IndexError, TypeError):
+                raise ValueError(f"Could not fetch last price for {symbol}: {quotes}")
+        if user_id is None:
+            user_id = int(os.getenv("DEFAULT_USER_ID", "1"))
+        self.risk.enforce(symbol, transaction_type, quantity, float(reference_price), user_id)
+
+        payload: Dict[str, Any] = {
+            "symbol": symbol,
+            "qty": quantity,
+            "type": _ORDER_TYPES[order_type],
+            "side": _SIDES[transaction_type],
+            "productType": product,
+            "limitPrice": price or 0,
+            "stopPrice": trigger_price or 0,
+            "validity": validity,
+            "disclosedQty": 0,
+            "offlineOrder": False,
+        }
+        if tag:
+            payload["orderTag"] = tag
+        with time_upstream("fyers", "place_order"):
+            response = guarded("fyers", fyers.place_order, data=payload, retries=0)
+        if not isinstance(response, dict) or str(response.get("s", "")).lower() != "ok":
+            message = response.get("message") if isinstance(response, dict) else response
+            raise ValueError(f"Fyers place_order error: {message}")
+
+        order_id = str(response["id"])
+        track_new_order(
+            "fyers",
+            order_id,
+            symbol=symbol,
+            side=transaction_type,
+            quantity=quantity,
+            order_type=order_type,
+            product=product,
+            validity=validity,
+            price=price,
+            tag=tag,
+            user_id=user_id,
+            session_user=self.user_id,
+        )
+        return {"order_id": order_id, "symbol": symbol, "reference_price": reference_price}
+
+    def cancel_order(self, order_id: str) -> Dict[str, Any]:
+        session = self._load_session()
+        fyers = self._create_fyers_client(session["access_token"])
+        with time_upstream("fyers", "cancel_order"):
+            response = guarded("fyers", fyers.cancel_order, data={"id": order_id}, retries=0)
+        if not isinstance(response, dict) or str(response.get("s", "")).lower() != "ok":
+            message = response.get("message") if isinstance(response, dict) else response
+            raise ValueError(f"Fyers cancel_order error: {message}")
+        return {"order_id": order_id}
+
+    def get_positions(self) -> List[Dict[str, Any]]:
+        """Net positions as ``symbol``, quantity, prices and realised P&L."""
+        session = self._load_session()
+        fyers = self._create_fyers_client(session["access_token"])
+        with time_upstream("fyers", "positions"):
+            response = guarded("fyers", fyers.positions)
+        if not isinstance(response, dict) or str(response.get("s", "")).lower() != "ok":
+            message = response.get("message") if isinstance(response, dict) else response
+            raise ValueError(f"Fyers positions error: {message}")
+        return [
+            {
+                "symbol": row["symbol"],
+                "quantity": row.get("netQty") or 0,
+                "average_price": row.get("netAvg") or 0.0,
+                "last_price": row.get("ltp") or 0.0,
+                "realized": row.get("realized_profit") or 0.0,
+            }
+            for row in response.get("netPositions") or []
+        ]
@@ -2,8 +2,8 @@
 API Routers
 """
 
-from APP.routers import broker
+from APP.routers import admin, alerts, broker, market, optimizer, orders
 from APP.fyersApp.routers import fyers
 
-__all__ = ["broker", "fyers"]
+__all__ = ["admin", "alerts", "broker", "fyers", "market", "optimizer", "orders"]
 
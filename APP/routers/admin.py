@@ -0,0 +1,61 @@
+from fastapi import APIRouter, Depends, Header, HTTPException, Query
+from fastapi.responses import PlainTextResponse
+from typing import Any, Dict, Optional
+import hmac
+import os
+
+from APP.services.profiling import profiler
+
+
+def require_admin(x_admin_token: Optional[str] = Header(None)) -> None:
+    """Admin endpoints need ``X-Admin-Token`` equal to ``ADMIN_TOKEN``; they are off while it is unset."""
+    expected = os.getenv("ADMIN_TOKEN", "")
+    if not expected:
+        raise HTTPException(status_code=403, detail="Admin endpoints are disabled; set ADMIN_TOKEN")
+    if not x_admin_token or not hmac.compare_digest(x_admin_token.encode(), expected.encode()):
+        raise HTTPException(status_code=401, detail="Invalid admin token")
+
+
+router = APIRouter(dependencies=[Depends(require_admin)])
+
+
+@router.get("/profiling")
+async def get_profiling_status() -> Dict[str, Any]:
+    """Whether profiling is armed, how many requests it still takes, and the profiles kept."""
+    return {"success": True, "data": profiler.status()}
+
+
+@router.post("/profiling")
+async def arm_profiling(
+    route: Optional[str] = Query(
+        None, description="Path to profile, e.g. /api/fyers/option-chain; all if unset"
+    ),
+    sample_rate: float = Query(1.0, description="Fraction of matching requests to profile"),
+    max_requests: int = Query(10, ge=1, le=1000, description="Disarm after this many profiled requests"),
+    interval_ms: float = Query(5.0, description="Stack sampling interval in milliseconds"),
+) -> Dict[str, Any]:
+    """Profile upcoming requests by stack sampling until ``max_requests`` have been captured."""
+    try:
+        status = profiler.arm(route, sample_rate, max_requests, interval_ms / 1000)
+    except ValueError as exc:
+        raise HTTPException(status_code=400, detail=str(exc))
+    return {"success": True, "data": status}
+
+
+@router.delete("/profiling")
+async def disarm_profiling(
+    clear: bool = Query(False, description="Also drop the kept profiles"),
+) -> Dict[str, Any]:
+    status = profiler.disarm()
+    if clear:
+        profiler.clear()
+        status = profiler.status()
+    return {"success": True, "data": status}
+
+
+@router.get("/profiling/collapsed", response_class=PlainTextResponse)
+async def get_collapsed_stacks(
+    request_id: Optional[str] = Query(None, description="Only this request (its X-Request-ID); all if unset"),
+) -> PlainTextResponse:
+    """Folded stacks (``frame;frame;frame samples`` lines) for ``flamegraph.pl`` or speedscope."""
+    return PlainTextResponse(profiler.collapsed(request_id))
@@ -0,0 +1,83 @@
+from fastapi import APIRouter, HTTPException, Query, WebSocket, WebSocketDisconnect
+from typing import Any, Dict, Optional
+from pydantic import BaseModel
+
+from APP.services.alerts import PRICE, alert_engine
+
+router = APIRouter()
+
+
+class AlertRequest(BaseModel):
+    symbol: str
+    # "price" or "oi"
+    field: str = PRICE
+    # Price alerts: "above", "below" or "cross"
+    condition: Optional[str] = None
+    threshold: Optional[float] = None
+    # OI alerts: signed percent change from baseline (defaults to the OI when set)
+    change_pct: Optional[float] = None
+    baseline: Optional[float] = None
+    # OI alerts: underlying whose option chain is polled for this alert
+    chain: Optional[str] = None
+    note: str = ""
+
+
+@router.post("")
+async def create_alert(request: AlertRequest) -> Dict[str, Any]:
+    """Register a one-shot price or OI alert"""
+    try:
+        alert = alert_engine.add(**request.model_dump())
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    return {"success": True, "data": alert.as_dict()}
+
+
+@router.get("")
+async def list_alerts(symbol: Optional[str] = None) -> Dict[str, Any]:
+    """Active alerts, oldest first"""
+    return {"success": True, "data": [alert.as_dict() for alert in alert_engine.alerts(symbol)]}
+
+
+@router.get("/fired")
+async def fired_alerts(limit: int = Query(100, ge=1, le=500)) -> Dict[str, Any]:
+    """Recently fired alerts, newest first"""
+    return {"success": True, "data": [alert.as_dict() for alert in alert_engine.fired(limit)]}
+
+
+@router.get("/status")
+async def alert_status() -> Dict[str, Any]:
+    return {"success": True, "data": alert_engine.status()}
+
+
+@router.get("/{alert_id}")
+async def get_alert(alert_id: str) -> Dict[str, Any]:
+    alert = alert_engine.get(alert_id)
+    if alert is None:
+        raise HTTPException(status_code=404, detail=f"Alert {alert_id} not found")
+    return {"success": True, "data": alert.as_dict()}
+
+
+@router.delete("/{alert_id}")
+async def cancel_alert(alert_id: str) -> Dict[str, Any]:
+    alert = alert_engine.cancel(alert_id)
+    if alert is None:
+        raise HTTPException(status_code=404, detail=f"Alert {alert_id} not found")
+    return {"success": True, "data": alert.as_dict()}
+
+
+@router.websocket("/ws")
+async def alert_updates(websocket: WebSocket, symbol: Optional[str] = None) -> None:
+    """Send the active alerts, then every alert as it fires"""
+    await websocket.accept()
+    queue = alert_engine.subscribe()
+    try:
+        active = [alert.as_dict() for alert in alert_engine.alerts(symbol)]
+        await websocket.send_json({"type": "snapshot", "data": active})
+        while True:
+            event = await queue.get()
+            if symbol is None or event["data"]["symbol"] == symbol:
+                await websocket.send_json(event)
+    except WebSocketDisconnect:
+        pass
+    finally:
+        alert_engine.unsubscribe(queue)
@@ -1,11 +1,18 @@
-from fastapi import APIRouter, HTTPException, Query
-from fastapi.responses import RedirectResponse, HTMLResponse
+from fastapi import APIRouter, HTTPException, Query, Request
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import RedirectResponse, HTMLResponse, JSONResponse, Response
 from typing import Dict, Any, Optional
 from pydantic import BaseModel
 import logging
-from APP.services.kite_service import KiteService
-from kiteconnect import KiteConnect
-from kiteconnect.exceptions import TokenException
+from APP.services.cache import etag_for, etag_matches
+from APP.services.circuit import CircuitOpenError
+from APP.services.kite_service import KiteService, kite_connect_class, kite_exceptions
+from APP.services.metrics import time_upstream
+from APP.services.portfolio import analytics_for
+from APP.services.refresh import PROFILE, refresh_scheduler
+from APP.services.risk_engine import RiskLimitExceeded, current_risk
+from APP.services.sessions import current_user, use_user
+from APP.services.token_scheduler import scheduler as token_scheduler
 
 router = APIRouter()
 logger = logging.getLogger(__name__)
@@ -13,13 +20,32 @@ logger = logging.getLogger(__name__)
 class SetAccessTokenRequest(BaseModel):
     access_token: str
 
+class PlaceOrderRequest(BaseModel):
+    symbol: str
+    transaction_type: str
+    quantity: int
+    order_type: str = "MARKET"
+    product: str = "MIS"
+    price: Optional[float] = None
+    trigger_price: Optional[float] = None
+    validity: str = "DAY"
+    variety: str = "regular"
+    tag: Optional[str] = None
+
 @router.get("/status")
 async def get_broker_status() -> Dict[str, Any]:
-    """Check Kite connection status"""
+    """Check Kite connection status (profile served from cache, refreshed in the background)"""
     try:
         kite_service = KiteService()
         try:
-            profile = kite_service.get_profile(use_stored_token=True)
+            profile = await run_in_threadpool(kite_service.get_profile, use_stored_token=True)
+            user = current_user()
+
+            def refresh() -> None:
+                with use_user(user):
+                    KiteService().refresh_profile()
+
+            refresh_scheduler.watch(PROFILE, ("kite", user), refresh)
             return {
                 "connected": True,
                 "message": "Connected to Kite",
@@ -145,34 +171,23 @@ async def process_token(
 async def set_access_token(request: SetAccessTokenRequest) -> Dict[str, Any]:
     """Manually set access token"""
     try:
-        import json
-        from datetime import datetime
-        from pathlib import Path
-        
-        TOKEN_STORAGE_FILE = Path("kite_token.json")
-        
         kite_service = KiteService()
         if not kite_service.api_key:
             raise ValueError("KITE_API_KEY not found")
         
-        kite = KiteConnect(api_key=kite_service.api_key)
+        kite = kite_connect_class()(api_key=kite_service.api_key)
         kite.set_access_token(request.access_token)
-        profile = kite.profile()
+        with time_upstream("kite", "profile"):
+            profile = kite.profile()
         
-        token_data = {
-            "access_token": request.access_token,
-            "profile": profile,
-            "stored_at": datetime.now().isoformat()
-        }
-        with open(TOKEN_STORAGE_FILE, 'w') as f:
-            json.dump(token_data, f, indent=2)
+        kite_service._store_token(request.access_token, profile)
         
         return {
             "success": True,
             "message": "Access token set successfully",
             "data": {"profile": profile}
         }
-    except TokenException as e:
+    except kite_exceptions().TokenException as e:
         raise HTTPException(status_code=400, detail=f"Invalid access token: {str(e)}")
     except Exception as e:
         raise HTTPException(status_code=400, detail=f"Failed: {str(e)}")
@@ -210,11 +225,58 @@ async def handle_callback(
         raise HTTPException(status_code=400, detail=str(e))
 
 @router.get("/profile")
-async def get_profile(request_token: Optional[str] = Query(None)) -> Dict[str, Any]:
-    """Fetch user profile"""
+async def get_profile(request: Request, request_token: Optional[str] = Query(None)) -> Response:
+    """Fetch user profile; honours If-None-Match with a 304"""
+    try:
+        kite_service = KiteService()
+        profile = await run_in_threadpool(kite_service.get_profile, request_token=request_token)
+    except CircuitOpenError:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    etag = etag_for(profile, kite_service.stored_at)
+    headers = {"ETag": etag, "Cache-Control": "private, no-cache"}
+    if etag_matches(request.headers.get("if-none-match"), etag):
+        return Response(status_code=304, headers=headers)
+    return JSONResponse({"success": True, "data": profile}, headers=headers)
+
+@router.get("/token-status")
+async def get_token_status() -> Dict[str, Any]:
+    """Token expiry / renewal and pre-warm state for both brokers"""
+    return {"success": True, "data": token_scheduler.status()}
+
+@router.post("/orders")
+async def place_order(request: PlaceOrderRequest) -> Dict[str, Any]:
+    """Place a Kite order after pre-trade risk checks"""
     try:
         kite_service = KiteService()
-        profile = kite_service.get_profile(request_token=request_token)
-        return {"success": True, "data": profile}
+        result = await run_in_threadpool(kite_service.place_order, **request.model_dump())
+        return {"success": True, "data": result}
+    except RiskLimitExceeded as e:
+        raise HTTPException(status_code=422, detail={"rule": e.breach.rule, "message": str(e)})
+    except CircuitOpenError:
+        raise
     except Exception as e:
         raise HTTPException(status_code=400, detail=str(e))
+
+@router.get("/risk")
+async def get_risk_state() -> Dict[str, Any]:
+    """Current risk limits, P&L and tracked positions"""
+    return {"success": True, "data": current_risk().snapshot()}
+
+
+@router.get("/portfolio")
+async def get_portfolio_analytics(
+    spot_range: float = Query(10.0, gt=0, le=50, description="Spot shocks span ±this many percent"),
+    spot_steps: int = Query(9, ge=1, le=51),
+    iv_range: float = Query(5.0, ge=0, le=50, description="IV shifts span ±this many vol points"),
+    iv_steps: int = Query(5, ge=1, le=21),
+) -> Dict[str, Any]:
+    """Greeks, scenario P&L grid, VaR and margin estimate over the tracked positions"""
+    try:
+        report = await run_in_threadpool(
+            analytics_for(current_user()).report, spot_range, spot_steps, iv_range, iv_steps
+        )
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    return {"success": True, "data": report}
@@ -0,0 +1,117 @@
+from fastapi import APIRouter, HTTPException, Query
+from fastapi.concurrency import run_in_threadpool
+from typing import Any, Dict, List, Optional
+import time
+
+from APP.services.candles import candle_aggregator
+from APP.services.circuit import breaker_status
+from APP.services.derivatives import derivatives_index
+from APP.services.indicators import batch_series, to_json_values
+from APP.services.market_data import tick_stream_status
+from APP.services import quotes, shared_ticks, tick_store
+from APP.services.refresh import QUOTES, refresh_scheduler
+from APP.services.sessions import current_user, use_user
+
+router = APIRouter()
+
+
+@router.get("/candles")
+async def get_candles(
+    symbol: str = Query(..., description="Symbol as streamed, e.g. NSE:SBIN-EQ"),
+    timeframe: str = Query("1m"),
+    limit: int = Query(500, ge=1, le=5000),
+    include_partial: bool = Query(False, description="Append the bar that is still forming"),
+) -> Dict[str, Any]:
+    """OHLCV bars built in memory from the live tick stream, oldest first"""
+    try:
+        candles = candle_aggregator.candles(symbol, timeframe, limit, include_partial)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    return {"success": True, "symbol": symbol, "timeframe": timeframe, "data": candles}
+
+
+@router.get("/indicators")
+async def get_indicators(
+    symbol: str = Query(...),
+    timeframe: str = Query("1m"),
+    indicator: List[str] = Query(..., description="Indicator spec, e.g. ema:20, rsi:14, supertrend:10:3"),
+    limit: int = Query(500, ge=1, le=5000),
+) -> Dict[str, Any]:
+    """Indicator series over the in-memory candles (closed bars only); warm-up values are null"""
+    try:
+        # Evaluate over every held bar so smoothing has its full history, then trim
+        timestamps, ohlcv = candle_aggregator.history(symbol, timeframe, limit=1 << 30)
+        series = batch_series(indicator, timestamps, ohlcv)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    timestamps = timestamps[-limit:]
+    series = {name: values[-limit:] for name, values in series.items()}
+    return {
+        "success": True,
+        "symbol": symbol,
+        "timeframe": timeframe,
+        "data": {
+            "timestamps": timestamps.tolist(),
+            "indicators": {name: to_json_values(values) for name, values in series.items()},
+        },
+    }
+
+
+@router.get("/quotes")
+async def get_quotes(
+    symbols: str = Query(..., description="Comma-separated, NSE:TCS-EQ or NSE:TCS style"),
+    refresh: bool = Query(False, description="Skip the cache"),
+) -> Dict[str, Any]:
+    """Quotes from whichever broker answers first, in one shape; each says which broker served it"""
+    wanted = tuple(sorted({symbol.strip() for symbol in symbols.split(",") if symbol.strip()}))
+    facade = quotes.get_quote_facade()
+    try:
+        data = await run_in_threadpool(facade.get_quotes, wanted, refresh)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except quotes.QuoteUnavailable as e:
+        raise HTTPException(status_code=503, detail=str(e))
+    user = current_user()
+
+    def refresh_quotes(due: List[str]) -> None:
+        with use_user(user):
+            facade.get_quotes(due, refresh=True)
+
+    refresh_scheduler.watch_many(QUOTES, ("facade", user), wanted, refresh_quotes)
+    return {"success": True, "data": data}
+
+
+@router.get("/ltp")
+async def get_last_ticks(
+    symbols: str = Query(..., description="Comma-separated, NSE:TCS-EQ or NSE:TCS style"),
+    max_age: Optional[float] = Query(None, gt=0, description="Leave out ticks older than this many seconds"),
+) -> Dict[str, Any]:
+    """Last streamed tick per symbol from the shared tick table: no broker call, no IPC round-trip"""
+    table = shared_ticks.get_table()
+    if table is None:
+        raise HTTPException(status_code=503, detail="Shared tick table is not available")
+    wanted = list(dict.fromkeys(symbol.strip() for symbol in symbols.split(",") if symbol.strip()))
+    now = time.time()
+    data = {symbol: tick.as_dict(now) for symbol, tick in table.read_many(wanted).items()}
+    if max_age is not None:
+        data = {symbol: tick for symbol, tick in data.items() if tick["age"] <= max_age}
+    return {"success": True, "data": data, "missing": [symbol for symbol in wanted if symbol not in data]}
+
+
+@router.get("/status")
+async def get_market_data_status() -> Dict[str, Any]:
+    """Tick stream, aggregator, tick store, background refresh, quote routing and circuit breaker state"""
+    recorder = tick_store.tick_recorder
+    return {
+        "success": True,
+        "data": {
+            "stream": tick_stream_status(),
+            "candles": candle_aggregator.status(),
+            "tick_store": recorder.status() if recorder is not None else None,
+            "refresh": refresh_scheduler.status(),
+            "quotes": quotes.quote_facade.status() if quotes.quote_facade is not None else None,
+            "circuits": breaker_status(),
+            "derivatives": derivatives_index.status(),
+            "shared_ticks": shared_ticks.status(),
+        },
+    }
@@ -0,0 +1,123 @@
+from fastapi import APIRouter, HTTPException, WebSocket, WebSocketDisconnect
+from fastapi.concurrency import run_in_threadpool
+from typing import Any, Dict, Optional, Tuple
+from pydantic import BaseModel
+import numpy as np
+
+from APP.services.backtest import STRATEGIES
+from APP.services.candles import candle_aggregator, parse_timeframe
+from APP.services.optimizer import RUNNING, optimizer
+
+router = APIRouter()
+
+
+class OptimizationRequest(BaseModel):
+    strategy: str
+    symbol: str
+    timeframe: str = "5m"
+    # "memory" uses the live candle store; "fyers" downloads history
+    source: str = "memory"
+    range_from: Optional[str] = None
+    range_to: Optional[str] = None
+    search: str = "grid"
+    space: Optional[Dict[str, Any]] = None
+    samples: int = 50
+    objective: str = "sharpe"
+    cost: float = 0.0002
+    eta: int = 3
+    min_bars: int = 500
+    seed: Optional[int] = None
+
+
+def _load_bars(request: OptimizationRequest) -> Tuple[np.ndarray, np.ndarray]:
+    if request.source == "memory":
+        return candle_aggregator.history(request.symbol, request.timeframe, limit=1 << 30)
+    if request.source != "fyers":
+        raise ValueError("source must be 'memory' or 'fyers'")
+    if not request.range_from or not request.range_to:
+        raise ValueError("range_from and range_to are required for Fyers history")
+    seconds = parse_timeframe(request.timeframe)
+    if seconds % 60:
+        raise ValueError("Fyers history needs a whole-minute timeframe")
+    from APP.fyersApp.services import FyersService
+
+    candles = FyersService().fetch_history(
+        request.symbol, str(seconds // 60), request.range_from, request.range_to
+    )
+    data = np.asarray(candles, dtype=np.float64).reshape(-1, 6)
+    return data[:, 0].astype(np.int64), data[:, 1:]
+
+
+@router.get("/strategies")
+async def list_strategies() -> Dict[str, Any]:
+    """Backtestable strategies and their default search spaces"""
+    return {"success": True, "data": {name: spec.space for name, spec in STRATEGIES.items()}}
+
+
+@router.post("/runs")
+async def start_run(request: OptimizationRequest) -> Dict[str, Any]:
+    """Start a parameter search in the background; follow it on the run's WebSocket"""
+    try:
+        timestamps, ohlcv = await run_in_threadpool(_load_bars, request)
+        run = optimizer.start(
+            request.strategy,
+            timestamps,
+            ohlcv,
+            search=request.search,
+            space=request.space,
+            samples=request.samples,
+            objective=request.objective,
+            cost=request.cost,
+            eta=request.eta,
+            min_bars=request.min_bars,
+            seed=request.seed,
+        )
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    return {"success": True, "data": run.as_dict()}
+
+
+@router.get("/runs")
+async def list_runs() -> Dict[str, Any]:
+    return {"success": True, "data": [run.as_dict(top=1) for run in optimizer.runs()]}
+
+
+@router.get("/runs/{run_id}")
+async def get_run(run_id: str) -> Dict[str, Any]:
+    run = optimizer.get(run_id)
+    if run is None:
+        raise HTTPException(status_code=404, detail=f"Optimisation run {run_id} not found")
+    return {"success": True, "data": run.as_dict()}
+
+
+@router.delete("/runs/{run_id}")
+async def cancel_run(run_id: str) -> Dict[str, Any]:
+    run = optimizer.cancel(run_id)
+    if run is None:
+        raise HTTPException(status_code=404, detail=f"Optimisation run {run_id} not found")
+    return {"success": True, "data": run.as_dict()}
+
+
+@router.websocket("/runs/{run_id}/ws")
+async def run_updates(websocket: WebSocket, run_id: str) -> None:
+    """Send the run's current state, then each evaluation as it finishes, until the run ends"""
+    await websocket.accept()
+    run = optimizer.get(run_id)
+    if run is None:
+        await websocket.close(code=4404)
+        return
+    queue = optimizer.subscribe(run_id)
+    try:
+        # Subscribed first, so a run still RUNNING here will publish its final status to us
+        snapshot = run.as_dict()
+        await websocket.send_json({"type": "status", "data": snapshot})
+        while snapshot["status"] == RUNNING:
+            event = await queue.get()
+            await websocket.send_json(event)
+            if event["type"] == "status":
+                break
+        await websocket.close()
+    except WebSocketDisconnect:
+        pass
+    finally:
+        optimizer.unsubscribe(run_id, queue)
@@ -0,0 +1,158 @@
+from fastapi import APIRouter, HTTPException, Query, Request, WebSocket, WebSocketDisconnect
+from fastapi.concurrency import run_in_threadpool
+from typing import Dict, Any, List, Optional
+from pydantic import BaseModel
+import hashlib
+import hmac
+import logging
+import os
+
+from APP.config import load_environment
+from APP.services.basket import FILLED, PLACED, ROLLED_BACK, BasketExecution, BasketLeg, basket_executor
+from APP.services.order_book import ALL_USERS, kite_update, order_book
+from APP.services.order_stream import stream_status
+from APP.services.paper import paper_book, paper_engine, paper_risk
+from APP.services.sessions import current_user
+
+router = APIRouter()
+logger = logging.getLogger(__name__)
+
+
+class BasketLegRequest(BaseModel):
+    broker: str
+    symbol: str
+    transaction_type: str
+    quantity: int
+    order_type: str = "MARKET"
+    product: Optional[str] = None
+    price: Optional[float] = None
+    trigger_price: Optional[float] = None
+    tag: Optional[str] = None
+
+
+class BasketOrderRequest(BaseModel):
+    legs: List[BasketLegRequest]
+    tag: Optional[str] = None
+    rollback: bool = True
+    hedge_first: bool = False
+    wait_for_fills: float = 0.0
+
+
+@router.get("")
+async def list_orders(
+    strategy: Optional[str] = Query(None),
+    paper: bool = Query(False, description="Paper orders instead of live ones"),
+) -> Dict[str, Any]:
+    """The session user's orders held in the in-memory book, optionally for one strategy (order tag)"""
+    if paper:
+        return {"success": True, "data": paper_book.snapshot(strategy)}
+    return {"success": True, "data": order_book.snapshot(strategy, user=current_user())}
+
+
+@router.get("/streams")
+async def get_stream_status() -> Dict[str, Any]:
+    """Connection state of the broker order-update streams"""
+    return {"success": True, "data": stream_status()}
+
+
+@router.get("/paper")
+async def get_paper_status(symbol: Optional[str] = Query(None)) -> Dict[str, Any]:
+    """Paper matching engine counters and risk state, and the book depth of ``symbol`` if given"""
+    data: Dict[str, Any] = paper_engine.status()
+    data["risk"] = paper_risk.snapshot()
+    if symbol:
+        data["depth"] = paper_engine.depth(symbol)
+        data["last_price"] = paper_engine.last_price(symbol)
+    return {"success": True, "data": data}
+
+
+@router.post("/baskets")
+async def place_basket(request: BasketOrderRequest) -> Dict[str, Any]:
+    """Validate every leg, then place them concurrently; failed baskets roll back if asked"""
+    legs = [BasketLeg(**leg.model_dump()) for leg in request.legs]
+    try:
+        execution = await run_in_threadpool(
+            basket_executor.execute,
+            legs,
+            tag=request.tag,
+            rollback=request.rollback,
+            hedge_first=request.hedge_first,
+            wait_for_fills=min(request.wait_for_fills, 30.0),
+        )
+    except ValueError as e:
+        raise HTTPException(status_code=422, detail=str(e))
+    return {"success": execution.status in (PLACED, FILLED), "data": execution.as_dict()}
+
+
+def _own_basket(basket_id: str) -> BasketExecution:
+    execution = basket_executor.get(basket_id)
+    if execution is None or execution.user != current_user():
+        raise HTTPException(status_code=404, detail=f"Basket {basket_id} not found")
+    return execution
+
+
+@router.get("/baskets/{basket_id}")
+async def get_basket(basket_id: str) -> Dict[str, Any]:
+    return {"success": True, "data": _own_basket(basket_id).as_dict()}
+
+
+@router.post("/baskets/{basket_id}/rollback")
+async def rollback_basket(basket_id: str) -> Dict[str, Any]:
+    """Cancel open legs and square off the filled quantity not squared off yet; a no-op once rolled back"""
+    execution = await run_in_threadpool(basket_executor.rollback, _own_basket(basket_id))
+    return {"success": execution.status == ROLLED_BACK, "data": execution.as_dict()}
+
+
+@router.get("/{order_id}")
+async def get_order(order_id: str) -> Dict[str, Any]:
+    state = order_book.get(order_id)
+    if state is not None and state.user != current_user():
+        # Another session user's order
+        state = None
+    state = state or paper_book.get(order_id)
+    if state is None:
+        raise HTTPException(status_code=404, detail=f"Order {order_id} not found")
+    return {"success": True, "data": state.as_dict()}
+
+
+@router.post("/kite-postback")
+async def kite_postback(request: Request) -> Dict[str, Any]:
+    """
+    Kite order postback (configure as the app's postback URL).
+    The checksum is SHA-256 of order_id + order_timestamp + api_secret.
+    """
+    payload = await request.json()
+    load_environment()
+    api_secret = os.getenv("KITE_API_SECRET", "")
+    expected = hashlib.sha256(
+        f"{payload.get('order_id', '')}{payload.get('order_timestamp', '')}{api_secret}".encode()
+    ).hexdigest()
+    if not api_secret or not hmac.compare_digest(expected, str(payload.get("checksum", ""))):
+        raise HTTPException(status_code=401, detail="Invalid postback checksum")
+    try:
+        state = order_book.apply(kite_update(payload))
+    except (KeyError, TypeError, ValueError) as e:
+        raise HTTPException(status_code=400, detail=f"Malformed postback: {str(e)}")
+    return {"success": True, "applied": state is not None}
+
+
+@router.websocket("/ws")
+async def order_updates(websocket: WebSocket, strategy: Optional[str] = None, paper: bool = False) -> None:
+    """Send the session user's orders (the paper book with ``paper=true``), then every change to them"""
+    await websocket.accept()
+    book = paper_book if paper else order_book
+    user = ALL_USERS if paper else current_user()
+    queue = book.subscribe()
+    try:
+        await websocket.send_json({"type": "snapshot", "data": book.snapshot(strategy, user=user)})
+        while True:
+            event = await queue.get()
+            if strategy is not None and event["data"].get("strategy") != strategy:
+                continue
+            if user != ALL_USERS and event["data"].get("user") != user:
+                continue
+            await websocket.send_json(event)
+    except WebSocketDisconnect:
+        pass
+    finally:
+        book.unsubscribe(queue)
@@ -0,0 +1,403 @@
+"""
+Price and open-interest alerts evaluated on the tick stream.
+
+An alert watches one symbol's price or OI:
+
+* ``above`` / ``below`` fire on the first value at or beyond ``threshold``
+* ``cross`` fires when the value moves through ``threshold`` from the side
+  it was on when the alert was set (or on the first value seen after)
+* OI alerts fire when OI has changed by ``change_pct`` percent (signed: ``20``
+  is a 20% rise, ``-20`` a 20% fall) from ``baseline``, which defaults to the
+  OI observed when the alert is set
+
+Every alert reduces to "fire once the value is >= L" or "<= L", so each
+(symbol, field) keeps two lists of levels sorted with :mod:`bisect`. A tick
+compares its value with the nearest level on each side and, when something
+crosses, pops exactly the crossed slice - the cost per tick does not grow
+with the number of alerts that did not fire. Symbols without alerts cost one
+dict lookup.
+
+Values come from :data:`APP.services.market_data.tick_bus` (LTP and OI) and
+from every option chain ``FyersService.fetch_option_chain`` returns. OI
+alerts may name a ``chain`` (the underlying, e.g. ``NSE:NIFTY50-INDEX``) which
+is then fetched (``ALERTS_CHAIN_STRIKES`` strikes each side, default 10)
+every ``ALERTS_CHAIN_POLL_SECONDS`` (default 60; 0 disables) while the alert
+is active, for feeds that do not stream OI.
+
+Alerts fire once. Fired alerts are kept in a short history and pushed to
+WebSocket subscribers (``/api/alerts/ws``).
+"""
+
+from __future__ import annotations
+
+import asyncio
+import itertools
+import logging
+import math
+import os
+import threading
+import time
+import uuid
+from bisect import bisect_left, bisect_right, insort
+from collections import deque
+from dataclasses import asdict, dataclass
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from APP.services.market_data import Tick, TickBus, tick_bus
+from APP.services.metrics import registry
+
+logger = logging.getLogger(__name__)
+
+PRICE, OI = "price", "oi"
+ABOVE, BELOW, CROSS, CHANGE = "above", "below", "cross", "change"
+ACTIVE, FIRED, CANCELLED = "active", "fired", "cancelled"
+
+ALERTS_FIRED = registry.counter(
+    "algonova_alerts_fired_total",
+    "Alerts fired, by watched field",
+    ("field",),
+)
+ALERTS_ACTIVE = registry.gauge(
+    "algonova_alerts_active",
+    "Alerts waiting to fire",
+)
+
+# (level, sequence, alert id); the sequence keeps equal levels in creation order
+_Level = Tuple[float, int, str]
+
+
+@dataclass
+class Alert:
+    id: str
+    symbol: str
+    field: str
+    condition: str
+    threshold: Optional[float] = None
+    change_pct: Optional[float] = None
+    baseline: Optional[float] = None
+    chain: Optional[str] = None
+    note: str = ""
+    created_at: float = 0.0
+    status: str = ACTIVE
+    fired_at: Optional[float] = None
+    fired_value: Optional[float] = None
+    # Resolved trigger: fire once the value is >= level (rising) or <= level
+    level: Optional[float] = None
+    rising: Optional[bool] = None
+    seq: int = 0
+
+    def as_dict(self) -> Dict[str, Any]:
+        data = asdict(self)
+        del data["seq"]
+        return data
+
+
+class _Book:
+    """Pending levels for one (symbol, field)."""
+
+    __slots__ = ("rising", "falling", "unresolved")
+
+    def __init__(self) -> None:
+        self.rising: List[_Level] = []
+        self.falling: List[_Level] = []
+        # Alerts that need a first value to pick a side or a baseline
+        self.unresolved: List[str] = []
+
+    def __bool__(self) -> bool:
+        return bool(self.rising or self.falling or self.unresolved)
+
+
+class AlertEngine:
+    """Sorted-threshold index of active alerts, evaluated per tick."""
+
+    def __init__(
+        self,
+        max_alerts: Optional[int] = None,
+        history: int = 500,
+        chain_poll: Optional[float] = None,
+        clock: Callable[[], float] = time.time,
+    ) -> None:
+        self.max_alerts = max_alerts or int(os.getenv("ALERTS_MAX", "10000"))
+        self.chain_poll = (
+            float(os.getenv("ALERTS_CHAIN_POLL_SECONDS", "60")) if chain_poll is None else chain_poll
+        )
+        # Strikes each side of the money fetched per polled chain
+        self.chain_strikes = int(os.getenv("ALERTS_CHAIN_STRIKES", "10"))
+        self.clock = clock
+        self._alerts: Dict[str, Alert] = {}
+        self._books: Dict[Tuple[str, str], _Book] = {}
+        self._last: Dict[Tuple[str, str], float] = {}
+        self._fired: "deque[Alert]" = deque(maxlen=history)
+        self._seq = itertools.count()
+        self._lock = threading.Lock()
+        self._subscribers: List[Tuple[asyncio.AbstractEventLoop, "asyncio.Queue[Dict[str, Any]]"]] = []
+        self._bus: Optional[TickBus] = None
+        self._stop = threading.Event()
+        self._poller: Optional[threading.Thread] = None
+        ALERTS_ACTIVE.set_function(lambda: {(): float(self.active_count())})
+
+    # -- rules ---------------------------------------------------------------
+
+    def add(
+        self,
+        symbol: str,
+        field: str = PRICE,
+        condition: Optional[str] = None,
+        threshold: Optional[float] = None,
+        change_pct: Optional[float] = None,
+        baseline: Optional[float] = None,
+        chain: Optional[str] = None,
+        note: str = "",
+    ) -> Alert:
+        """Register an alert; raises ValueError for an invalid rule or when full."""
+        symbol = symbol.strip()
+        if not symbol:
+            raise ValueError("symbol is required")
+        if field == PRICE:
+            condition = condition or CROSS
+            if condition not in (ABOVE, BELOW, CROSS):
+                raise ValueError("price alerts take condition 'above', 'below' or 'cross'")
+            if threshold is None or not math.isfinite(threshold) or threshold <= 0:
+                raise ValueError("price alerts need a positive threshold")
+        elif field == OI:
+            condition = CHANGE
+            if change_pct is None or not math.isfinite(change_pct) or change_pct == 0 or change_pct <= -100:
+                raise ValueError("OI alerts need a non-zero change_pct above -100")
+            if baseline is not None and baseline <= 0:
+                raise ValueError("baseline must be positive")
+        else:
+            raise ValueError(f"field must be '{PRICE}' or '{OI}'")
+
+        alert = Alert(
+            id=uuid.uuid4().hex[:12],
+            symbol=symbol,
+            field=field,
+            condition=condition,
+            threshold=threshold if field == PRICE else None,
+            change_pct=change_pct if field == OI else None,
+            baseline=baseline if field == OI else None,
+            chain=chain if field == OI else None,
+            note=note,
+            created_at=self.clock(),
+            seq=next(self._seq),
+        )
+        key = (symbol, field)
+        with self._lock:
+            if self.active_count() >= self.max_alerts:
+                raise ValueError(f"Alert limit reached ({self.max_alerts})")
+            self._alerts[alert.id] = alert
+            book = self._books.setdefault(key, _Book())
+            if not self._resolve(alert, book, self._last.get(key)):
+                book.unresolved.append(alert.id)
+        return alert
+
+    def cancel(self, alert_id: str) -> Optional[Alert]:
+        with self._lock:
+            alert = self._alerts.get(alert_id)
+            if alert is None or alert.status != ACTIVE:
+                return alert
+            key = (alert.symbol, alert.field)
+            book = self._books[key]
+            if alert.level is None:
+                book.unresolved.remove(alert.id)
+            else:
+                levels = book.rising if alert.rising else book.falling
+                del levels[bisect_left(levels, (alert.level, alert.seq, alert.id))]
+            if not book:
+                del self._books[key]
+            alert.status = CANCELLED
+            del self._alerts[alert_id]
+        return alert
+
+    def get(self, alert_id: str) -> Optional[Alert]:
+        alert = self._alerts.get(alert_id)
+        if alert is not None:
+            return alert
+        with self._lock:
+            return next((fired for fired in self._fired if fired.id == alert_id), None)
+
+    def alerts(self, symbol: Optional[str] = None) -> List[Alert]:
+        """Active alerts, oldest first."""
+        with self._lock:
+            alerts = list(self._alerts.values())
+        if symbol is not None:
+            alerts = [alert for alert in alerts if alert.symbol == symbol]
+        return alerts
+
+    def fired(self, limit: int = 100) -> List[Alert]:
+        """Most recently fired alerts, newest first."""
+        with self._lock:
+            recent = list(self._fired)
+        return recent[::-1][:limit]
+
+    def active_count(self) -> int:
+        return len(self._alerts)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._alerts.clear()
+            self._books.clear()
+            self._last.clear()
+            self._fired.clear()
+
+    def _resolve(self, alert: Alert, book: _Book, value: Optional[float]) -> bool:
+        """Turn ``alert`` into a level on one side of ``book``; False if it needs a value first."""
+        if alert.condition == ABOVE:
+            level, rising = alert.threshold, True
+        elif alert.condition == BELOW:
+            level, rising = alert.threshold, False
+        elif alert.condition == CROSS:
+            if value is None or value == alert.threshold:
+                return False
+            level, rising = alert.threshold, value < alert.threshold
+        else:
+            if alert.baseline is None:
+                if value is None or value <= 0:
+                    return False
+                alert.baseline = value
+            level = alert.baseline * (1 + alert.change_pct / 100)
+            rising = alert.change_pct > 0
+        alert.level, alert.rising = float(level), rising
+        insort(book.rising if rising else book.falling, (alert.level, alert.seq, alert.id))
+        return True
+
+    # -- evaluation ----------------------------------------------------------
+
+    def evaluate(
+        self, symbol: str, field: str, value: float, timestamp: Optional[float] = None
+    ) -> List[Alert]:
+        """Feed one observation; returns the alerts it fired."""
+        key = (symbol, field)
+        self._last[key] = value
+        if key not in self._books:
+            # Most ticks are for symbols nobody watches; skip the lock for them
+            return []
+        with self._lock:
+            book = self._books.get(key)
+            if book is None:
+                return []
+            fired: List[Alert] = []
+            rising, falling = book.rising, book.falling
+            if rising and rising[0][0] <= value:
+                cut = bisect_right(rising, (value, math.inf))
+                fired.extend(self._alerts[level[2]] for level in rising[:cut])
+                del rising[:cut]
+            if falling and falling[-1][0] >= value:
+                cut = bisect_left(falling, (value,))
+                fired.extend(self._alerts[level[2]] for level in falling[cut:])
+                del falling[cut:]
+            if book.unresolved:
+                # This value is the reference point, so it cannot also fire them
+                book.unresolved = [
+                    alert_id for alert_id in book.unresolved
+                    if not self._resolve(self._alerts[alert_id], book, value)
+                ]
+            if not book and self._books.get(key) is book:
+                del self._books[key]
+            when = self.clock() if timestamp is None else timestamp
+            for alert in fired:
+                alert.status, alert.fired_at, alert.fired_value = FIRED, when, value
+                del self._alerts[alert.id]
+                self._fired.append(alert)
+            subscribers = list(self._subscribers) if fired else []
+        for alert in fired:
+            ALERTS_FIRED.inc(field=field)
+            logger.info("Alert %s fired: %s %s at %s", alert.id, symbol, field, value)
+            event = {"type": "alert", "data": alert.as_dict()}
+            for loop, queue in subscribers:
+                loop.call_soon_threadsafe(_offer, queue, event)
+        return fired
+
+    def on_tick(self, tick: Tick) -> None:
+        self.evaluate(tick.symbol, PRICE, tick.price, tick.timestamp or None)
+        if tick.oi is not None:
+            self.evaluate(tick.symbol, OI, tick.oi, tick.timestamp or None)
+
+    def ingest_option_chain(self, response: Dict[str, Any]) -> None:
+        """Evaluate LTP and OI of every row of a Fyers ``optionchain`` response."""
+        chain = (response.get("data") or {}).get("optionsChain") or []
+        for entry in chain:
+            symbol = entry.get("symbol")
+            if not symbol:
+                continue
+            ltp, oi = entry.get("ltp"), entry.get("oi")
+            if ltp:
+                self.evaluate(symbol, PRICE, float(ltp))
+            if oi is not None:
+                self.evaluate(symbol, OI, float(oi))
+
+    # -- lifecycle -----------------------------------------------------------
+
+    def start(self, bus: TickBus = tick_bus) -> None:
+        if self._bus is None:
+            bus.subscribe(self.on_tick)
+            self._bus = bus
+        if self.chain_poll > 0 and self._poller is None:
+            self._stop.clear()
+            self._poller = threading.Thread(target=self._poll_chains, name="alert-chains", daemon=True)
+            self._poller.start()
+
+    def stop(self) -> None:
+        if self._bus is not None:
+            self._bus.unsubscribe(self.on_tick)
+            self._bus = None
+        self._stop.set()
+        if self._poller is not None:
+            self._poller.join(timeout=5)
+            self._poller = None
+
+    def _poll_chains(self) -> None:
+        while not self._stop.wait(self.chain_poll):
+            chains = {alert.chain for alert in self.alerts() if alert.chain}
+            if not chains:
+                continue
+            from APP.fyersApp.models import OptionChainRequest
+            from APP.fyersApp.services import FyersService
+
+            try:
+                service = FyersService()
+            except Exception as exc:
+                logger.warning("Alert chain poll skipped: %s", exc)
+                continue
+            for chain in sorted(chains):
+                try:
+                    # fetch_option_chain hands the response back to ingest_option_chain
+                    request = OptionChainRequest(symbol=chain, strikecount=self.chain_strikes)
+                    service.fetch_option_chain(request)
+                except Exception as exc:
+                    logger.warning("Alert chain poll failed for %s: %s", chain, exc)
+
+    def status(self) -> Dict[str, Any]:
+        with self._lock:
+            books = len(self._books)
+            fired = len(self._fired)
+        return {
+            "active": self.active_count(),
+            "indexed_series": books,
+            "recently_fired": fired,
+            "chain_poll_seconds": self.chain_poll,
+            "running": self._bus is not None,
+        }
+
+    # -- subscribers -----------------------------------------------------------
+
+    def subscribe(self) -> "asyncio.Queue[Dict[str, Any]]":
+        """Register a queue on the running loop; must be called from async code."""
+        queue: "asyncio.Queue[Dict[str, Any]]" = asyncio.Queue(1000)
+        with self._lock:
+            self._subscribers.append((asyncio.get_running_loop(), queue))
+        return queue
+
+    def unsubscribe(self, queue: "asyncio.Queue[Dict[str, Any]]") -> None:
+        with self._lock:
+            self._subscribers = [entry for entry in self._subscribers if entry[1] is not queue]
+
+
+def _offer(queue: "asyncio.Queue[Dict[str, Any]]", event: Dict[str, Any]) -> None:
+    """Queue ``event``; a slow client loses its oldest events, not the stream."""
+    if queue.full():
+        queue.get_nowait()
+    queue.put_nowait(event)
+
+
+alert_engine = AlertEngine()
@@ -0,0 +1,124 @@
+"""
+Vectorised bar backtests for the built-in strategies.
+
+A strategy maps candle arrays and parameters to a target position per bar
+(+1 long, -1 short, 0 flat). The position decided on bar ``i``'s close earns
+bar ``i + 1``'s return, and every change of position pays ``cost`` (a
+fraction of notional) per unit traded. Indicator series come from the batch
+mode of :mod:`APP.services.indicators`, so a backtest costs a few array
+passes however many bars it covers.
+
+Bars are passed as ``(timestamps, ohlcv)`` in the layout of
+:meth:`APP.services.candles.CandleAggregator.history`.
+"""
+
+from __future__ import annotations
+
+import math
+from dataclasses import dataclass
+from typing import Any, Callable, Dict, List
+
+import numpy as np
+
+from APP.services.indicators import EMA, RSI, Supertrend
+
+OBJECTIVES = ("sharpe", "total_return", "calmar")
+
+
+def _ema_crossover(timestamps: np.ndarray, ohlcv: np.ndarray, fast: int, slow: int) -> np.ndarray:
+    if fast >= slow:
+        raise ValueError("fast must be shorter than slow")
+    close = ohlcv[:, 3]
+    fast_line = EMA(int(fast)).batch(close)
+    slow_line = EMA(int(slow)).batch(close)
+    with np.errstate(invalid="ignore"):
+        position = np.sign(fast_line - slow_line)
+    return np.nan_to_num(position)
+
+
+def _supertrend(timestamps: np.ndarray, ohlcv: np.ndarray, period: int, multiplier: float) -> np.ndarray:
+    indicator = Supertrend(int(period), float(multiplier))
+    _, direction = indicator.trend_batch(ohlcv[:, 3], ohlcv[:, 1], ohlcv[:, 2])
+    return direction.astype(np.float64)
+
+
+def _rsi_reversion(
+    timestamps: np.ndarray, ohlcv: np.ndarray, period: int, lower: float, upper: float
+) -> np.ndarray:
+    """Long below ``lower``, short above ``upper``, flat once RSI crosses back through 50."""
+    if lower >= upper:
+        raise ValueError("lower must be below upper")
+    rsi = RSI(int(period)).batch(ohlcv[:, 3])
+    signal = np.full(len(rsi), np.nan)
+    previous = np.concatenate(([np.nan], rsi[:-1]))
+    with np.errstate(invalid="ignore"):
+        signal[(previous - 50) * (rsi - 50) <= 0] = 0.0
+        signal[rsi < lower] = 1.0
+        signal[rsi > upper] = -1.0
+    # Hold each entry/exit until the next one
+    index = np.where(np.isnan(signal), 0, np.arange(len(signal)))
+    np.maximum.accumulate(index, out=index)
+    held = signal[index]
+    return np.nan_to_num(held)
+
+
+@dataclass(frozen=True)
+class StrategySpec:
+    function: Callable[..., np.ndarray]
+    # Default search space: parameter -> candidate values
+    space: Dict[str, List[Any]]
+
+
+STRATEGIES: Dict[str, StrategySpec] = {
+    "ema_crossover": StrategySpec(
+        _ema_crossover, {"fast": [5, 9, 12, 20, 26], "slow": [30, 50, 100, 200]}
+    ),
+    "supertrend": StrategySpec(
+        _supertrend, {"period": [7, 10, 14, 20], "multiplier": [1.5, 2.0, 2.5, 3.0, 4.0]}
+    ),
+    "rsi_reversion": StrategySpec(
+        _rsi_reversion, {"period": [7, 14, 21], "lower": [20, 25, 30, 35], "upper": [65, 70, 75, 80]}
+    ),
+}
+
+
+def get_strategy(name: str) -> StrategySpec:
+    spec = STRATEGIES.get(name)
+    if spec is None:
+        raise ValueError(f"Unknown strategy {name!r}; available: {', '.join(sorted(STRATEGIES))}")
+    return spec
+
+
+def run_backtest(
+    strategy: str,
+    timestamps: np.ndarray,
+    ohlcv: np.ndarray,
+    params: Dict[str, Any],
+    cost: float = 0.0002,
+) -> Dict[str, float]:
+    """Backtest ``strategy`` with ``params``; returns per-run metrics (returns are fractions)."""
+    close = np.asarray(ohlcv[:, 3], dtype=np.float64)
+    if len(close) < 2:
+        raise ValueError("Need at least two bars to backtest")
+    position = get_strategy(strategy).function(timestamps, ohlcv, **params)
+
+    returns = np.diff(close) / close[:-1]
+    held = position[:-1]
+    turnover = np.abs(np.diff(np.concatenate(([0.0], held))))
+    pnl = held * returns - cost * turnover
+
+    equity = np.cumsum(pnl)
+    drawdown = float(np.max(np.maximum.accumulate(np.concatenate(([0.0], equity)))[1:] - equity))
+    total = float(equity[-1])
+    deviation = float(np.std(pnl))
+    # Per-bar Sharpe scaled to the run length, so runs over different bar sizes compare
+    sharpe = float(np.mean(pnl)) / deviation * math.sqrt(len(pnl)) if deviation > 0 else 0.0
+    return {
+        "total_return": total,
+        "sharpe": sharpe,
+        "max_drawdown": drawdown,
+        "calmar": total / drawdown if drawdown > 0 else 0.0,
+        "trades": int(np.count_nonzero(turnover)),
+        "exposure": float(np.mean(held != 0)),
+        "bars": len(close),
+    }
@@ -0,0 +1,430 @@
+"""
+Basket / multi-leg order execution.
+
+All legs are validated (shape + pre-trade risk) before anything is sent,
+then placed concurrently from a thread pool so a straddle or iron condor
+goes out within one broker round-trip instead of N. Each broker has a
+token-bucket limiter (``KITE_ORDERS_PER_SECOND`` / ``FYERS_ORDERS_PER_SECOND``,
+default 10) so bursts stay within the broker's order-rate limits. Legs with
+``broker="paper"`` go to the in-process matching engine (``APP.services.paper``),
+unthrottled unless ``PAPER_ORDERS_PER_SECOND`` is set.
+
+Leg fills are read from the in-memory order book (fed by the order-update
+streams). Live legs are checked against the session user's risk engine, and
+a basket is only visible to the user that placed it; paper legs are checked against, and tracked in, the paper
+broker's own risk engine and order book. With ``rollback`` enabled, a basket whose legs did not all go
+through is unwound: open legs are cancelled and filled quantity is squared
+off with opposite market orders. Each leg records how much it has already
+squared off, so rolling back again only trades what is left; square-offs
+reduce a position and so are not held back by the risk engine's order-rate
+limit. A basket whose unwind did not complete stays FAILED with ``error``
+set, and can be rolled back again.
+"""
+
+from __future__ import annotations
+
+import contextvars
+import logging
+import os
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field
+from datetime import datetime, timezone
+from typing import Any, Callable, Dict, List, Optional
+
+from APP.services.order_book import CANCELLED, COMPLETE, REJECTED, TERMINAL, OrderBook, order_book
+from APP.services.paper import paper_book as default_paper_book, paper_risk as default_paper_risk
+from APP.services.risk_engine import RiskEngine, current_risk
+from APP.services.sessions import current_user
+
+logger = logging.getLogger(__name__)
+
+BROKERS = ("kite", "fyers", "paper")
+# Orders per second when <BROKER>_ORDERS_PER_SECOND is unset; 0 means unthrottled
+_DEFAULT_ORDER_RATES = {"kite": "10", "fyers": "10", "paper": "0"}
+SIDES = ("BUY", "SELL")
+
+# Basket states
+PLACED = "PLACED"
+FILLED = "FILLED"
+FAILED = "FAILED"
+ROLLED_BACK = "ROLLED_BACK"
+
+
+class RateLimiter:
+    """Blocking token bucket shared by every thread placing orders for one broker."""
+
+    def __init__(self, rate: float, burst: Optional[int] = None) -> None:
+        self.rate = rate
+        self.capacity = float(burst or max(1, int(rate)))
+        self._tokens = self.capacity
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self) -> None:
+        if self.rate <= 0:
+            return
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+                self._updated = now
+                if self._tokens >= 1.0:
+                    self._tokens -= 1.0
+                    return
+                wait = (1.0 - self._tokens) / self.rate
+            time.sleep(wait)
+
+
+@dataclass
+class BasketLeg:
+    broker: str
+    symbol: str
+    transaction_type: str
+    quantity: int
+    order_type: str = "MARKET"
+    product: Optional[str] = None
+    price: Optional[float] = None
+    trigger_price: Optional[float] = None
+    tag: Optional[str] = None
+
+
+@dataclass
+class LegResult:
+    leg: BasketLeg
+    order_id: Optional[str] = None
+    status: str = "NOT_PLACED"
+    filled_quantity: int = 0
+    average_price: float = 0.0
+    error: Optional[str] = None
+    placed_ms: Optional[float] = None
+    rollback: Optional[str] = None
+    unwound_quantity: int = 0
+
+    def as_dict(self) -> Dict[str, Any]:
+        return {
+            "broker": self.leg.broker,
+            "symbol": self.leg.symbol,
+            "transaction_type": self.leg.transaction_type,
+            "quantity": self.leg.quantity,
+            "order_id": self.order_id,
+            "status": self.status,
+            "filled_quantity": self.filled_quantity,
+            "average_price": self.average_price,
+            "error": self.error,
+            "placed_ms": self.placed_ms,
+            "rollback": self.rollback,
+            "unwound_quantity": self.unwound_quantity,
+        }
+
+
+@dataclass
+class BasketExecution:
+    basket_id: str
+    tag: str
+    legs: List[LegResult]
+    status: str = PLACED
+    placed_ms: float = 0.0
+    error: Optional[str] = None
+    user: Optional[str] = None
+    created_at: datetime = field(default_factory=lambda: datetime.now(timezone.utc))
+    _rollback_lock: threading.Lock = field(default_factory=threading.Lock, repr=False, compare=False)
+
+    @property
+    def failed_legs(self) -> List[LegResult]:
+        return [leg for leg in self.legs if leg.order_id is None or leg.status in (REJECTED, CANCELLED)]
+
+    def as_dict(self) -> Dict[str, Any]:
+        return {
+            "basket_id": self.basket_id,
+            "tag": self.tag,
+            "status": self.status,
+            "placed_ms": self.placed_ms,
+            "error": self.error,
+            "created_at": self.created_at.isoformat(),
+            "legs": [leg.as_dict() for leg in self.legs],
+        }
+
+
+def _default_services() -> Dict[str, Callable[[], Any]]:
+    def kite() -> Any:
+        from APP.services.kite_service import KiteService
+
+        return KiteService()
+
+    def fyers() -> Any:
+        from APP.fyersApp.services import FyersService
+
+        return FyersService()
+
+    def paper() -> Any:
+        from APP.services.paper import PaperBroker
+
+        return PaperBroker()
+
+    return {"kite": kite, "fyers": fyers, "paper": paper}
+
+
+class BasketExecutor:
+    """Validates, places (in parallel), tracks and optionally unwinds multi-leg orders."""
+
+    def __init__(
+        self,
+        services: Optional[Dict[str, Callable[[], Any]]] = None,
+        book: OrderBook = order_book,
+        risk: Optional[RiskEngine] = None,
+        max_workers: int = 8,
+        limiters: Optional[Dict[str, RateLimiter]] = None,
+        history: int = 256,
+        paper_book: OrderBook = default_paper_book,
+        paper_risk: RiskEngine = default_paper_risk,
+    ) -> None:
+        self.services = services or _default_services()
+        self.book = book
+        self.risk = risk
+        self.paper_book = paper_book
+        self.paper_risk = paper_risk
+        self.limiters = limiters or {
+            broker: RateLimiter(
+                float(os.getenv(f"{broker.upper()}_ORDERS_PER_SECOND", _DEFAULT_ORDER_RATES[broker]))
+            )
+            for broker in BROKERS
+        }
+        self._pool = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="basket-leg")
+        self._baskets: "OrderedDict[str, BasketExecution]" = OrderedDict()
+        self._history = history
+        self._lock = threading.Lock()
+
+    def _book(self, broker: str) -> OrderBook:
+        return self.paper_book if broker == "paper" else self.book
+
+    def _risk(self, broker: str) -> RiskEngine:
+        if broker == "paper":
+            return self.paper_risk
+        # Live legs count against the calling session user's limits
+        return self.risk if self.risk is not None else current_risk()
+
+    def _submit(self, fn: Callable[..., Any], *args: Any) -> Any:
+        # Pool threads do not inherit the caller's context; the session user must follow the leg
+        return self._pool.submit(contextvars.copy_context().run, fn, *args)
+
+    # -- validation ----------------------------------------------------------
+
+    def validate(self, legs: List[BasketLeg]) -> None:
+        """Raise ValueError listing every problem; nothing is placed unless all legs pass."""
+        problems: List[str] = []
+        if not legs:
+            problems.append("basket has no legs")
+        for index, leg in enumerate(legs, start=1):
+            if leg.broker not in self.services:
+                problems.append(f"leg {index}: unknown broker {leg.broker!r}")
+            if leg.transaction_type.upper() not in SIDES:
+                problems.append(f"leg {index}: transaction_type must be BUY or SELL")
+            if leg.quantity <= 0:
+                problems.append(f"leg {index}: quantity must be positive")
+            if ":" not in leg.symbol:
+                problems.append(f"leg {index}: symbol must look like EXCHANGE:SYMBOL")
+            if leg.order_type.upper() in ("LIMIT", "SL") and not leg.price:
+                problems.append(f"leg {index}: {leg.order_type} orders need a price")
+            if leg.order_type.upper() in ("SL", "SL-M") and not leg.trigger_price:
+                problems.append(f"leg {index}: {leg.order_type} orders need a trigger_price")
+            reference = leg.price or leg.trigger_price
+            if reference and not problems:
+                breach = self._risk(leg.broker).check(
+                    leg.symbol, leg.transaction_type.upper(), leg.quantity, reference, consume_rate=False
+                )
+                if breach is not None:
+                    problems.append(f"leg {index}: {breach.message}")
+        if problems:
+            raise ValueError("; ".join(problems))
+
+    # -- placement -----------------------------------------------------------
+
+    def execute(
+        self,
+        legs: List[BasketLeg],
+        tag: Optional[str] = None,
+        rollback: bool = True,
+        hedge_first: bool = False,
+        wait_for_fills: float = 0.0,
+    ) -> BasketExecution:
+        """
+        Place every leg concurrently and return the per-leg outcome.
+
+        ``hedge_first`` places BUY legs before SELL legs (margin benefit on
+        option spreads) at the cost of a second round-trip. ``wait_for_fills``
+        waits up to that many seconds for legs to reach a final state before
+        deciding whether to roll back.
+        """
+        self.validate(legs)
+        basket_id = uuid.uuid4().hex[:12]
+        # Kite tags are limited to 20 alphanumeric characters
+        tag = tag or f"bkt{basket_id}"
+        execution = BasketExecution(basket_id, tag, [LegResult(leg) for leg in legs], user=current_user())
+        services = {broker: self.services[broker]() for broker in {leg.broker for leg in legs}}
+
+        started = time.perf_counter()
+        waves = (
+            [[r for r in execution.legs if r.leg.transaction_type.upper() == "BUY"],
+             [r for r in execution.legs if r.leg.transaction_type.upper() == "SELL"]]
+            if hedge_first
+            else [execution.legs]
+        )
+        for wave in waves:
+            futures = [self._submit(self._place, services[r.leg.broker], r, tag) for r in wave]
+            for future in futures:
+                future.result()
+            if hedge_first and any(r.order_id is None for r in wave):
+                break
+        execution.placed_ms = round((time.perf_counter() - started) * 1000, 3)
+
+        if wait_for_fills > 0:
+            self.wait(execution, wait_for_fills)
+        else:
+            self.refresh(execution)
+        self._remember(execution)
+
+        if execution.failed_legs:
+            execution.status = FAILED
+            if rollback:
+                self.rollback(execution)
+        return execution
+
+    def _place(self, service: Any, result: LegResult, tag: str) -> None:
+        leg = result.leg
+        params: Dict[str, Any] = {
+            "symbol": leg.symbol,
+            "transaction_type": leg.transaction_type.upper(),
+            "quantity": leg.quantity,
+            "order_type": leg.order_type.upper(),
+            "price": leg.price,
+            "trigger_price": leg.trigger_price,
+            "tag": leg.tag or tag,
+        }
+        if leg.product:
+            params["product"] = leg.product
+        self.limiters[leg.broker].acquire()
+        started = time.perf_counter()
+        try:
+            placed = service.place_order(**params)
+            result.order_id = str(placed["order_id"])
+            result.status = "PENDING"
+        except Exception as exc:
+            result.status = REJECTED
+            result.error = str(exc)
+            logger.warning("Basket leg %s %s rejected: %s", leg.transaction_type, leg.symbol, exc)
+        result.placed_ms = round((time.perf_counter() - started) * 1000, 3)
+
+    # -- tracking ------------------------------------------------------------
+
+    def refresh(self, execution: BasketExecution) -> BasketExecution:
+        """Pull leg status and fills from the order book."""
+        for result in execution.legs:
+            state = self._book(result.leg.broker).get(result.order_id) if result.order_id else None
+            if state is not None:
+                result.status = state.status
+                result.filled_quantity = state.filled_quantity
+                result.average_price = state.average_price
+        placed = [r for r in execution.legs if r.order_id]
+        if execution.status == PLACED and placed and len(placed) == len(execution.legs) and all(
+            r.status == COMPLETE for r in placed
+        ):
+            execution.status = FILLED
+        return execution
+
+    def wait(self, execution: BasketExecution, timeout: float) -> BasketExecution:
+        deadline = time.monotonic() + timeout
+        while True:
+            self.refresh(execution)
+            pending = [r for r in execution.legs if r.order_id and r.status not in TERMINAL]
+            if not pending or time.monotonic() >= deadline:
+                return execution
+            time.sleep(0.01)
+
+    def get(self, basket_id: str) -> Optional[BasketExecution]:
+        execution = self._baskets.get(basket_id)
+        return self.refresh(execution) if execution is not None else None
+
+    def _remember(self, execution: BasketExecution) -> None:
+        with self._lock:
+            self._baskets[execution.basket_id] = execution
+            while len(self._baskets) > self._history:
+                self._baskets.popitem(last=False)
+
+    # -- rollback ------------------------------------------------------------
+
+    def rollback(self, execution: BasketExecution) -> BasketExecution:
+        """
+        Cancel open legs, then square off whatever filled quantity is not squared off yet.
+
+        A basket that is already ROLLED_BACK is returned as is. If a cancel or
+        square-off fails the basket stays FAILED with ``error`` set.
+        """
+        with execution._rollback_lock:
+            if execution.status == ROLLED_BACK:
+                return execution
+            self.refresh(execution)
+            services = {broker: self.services[broker]() for broker in {r.leg.broker for r in execution.legs}}
+            futures = [
+                self._submit(self._unwind, services[r.leg.broker], r, execution.tag)
+                for r in execution.legs
+                if r.order_id
+                and (r.status not in (REJECTED, CANCELLED) or r.filled_quantity > r.unwound_quantity)
+            ]
+            problems = [problem for future in futures for problem in future.result()]
+            if problems:
+                execution.status = FAILED
+                execution.error = "Rollback incomplete: " + "; ".join(problems)
+                logger.error("Basket %s: %s", execution.basket_id, execution.error)
+            else:
+                execution.status = ROLLED_BACK
+                execution.error = None
+        return execution
+
+    def _unwind(self, service: Any, result: LegResult, tag: str) -> List[str]:
+        """Unwind one leg; returns what could not be done (empty once the leg is flat)."""
+        notes: List[str] = []
+        problems: List[str] = []
+        if result.status not in TERMINAL:
+            try:
+                self.limiters[result.leg.broker].acquire()
+                service.cancel_order(result.order_id)
+                notes.append("cancelled")
+            except Exception as exc:
+                notes.append(f"cancel failed: {exc}")
+                state = self._book(result.leg.broker).get(result.order_id)
+                if state is None or state.status not in TERMINAL:
+                    problems.append(f"{result.leg.symbol}: cancel of {result.order_id} failed: {exc}")
+        # The cancel may race a fill; the book holds the latest filled quantity
+        state = self._book(result.leg.broker).get(result.order_id)
+        filled = state.filled_quantity if state is not None else result.filled_quantity
+        remaining = filled - result.unwound_quantity
+        if remaining > 0:
+            opposite = "SELL" if result.leg.transaction_type.upper() == "BUY" else "BUY"
+            params: Dict[str, Any] = {
+                "symbol": result.leg.symbol,
+                "transaction_type": opposite,
+                "quantity": remaining,
+                "order_type": "MARKET",
+                "tag": tag,
+            }
+            if result.leg.product:
+                params["product"] = result.leg.product
+            try:
+                self.limiters[result.leg.broker].acquire()
+                placed = service.place_order(**params)
+                result.unwound_quantity += remaining
+                notes.append(f"squared off {remaining} via {placed['order_id']}")
+            except Exception as exc:
+                notes.append(f"square-off failed: {exc}")
+                problems.append(f"{result.leg.symbol}: square-off of {remaining} failed: {exc}")
+                logger.error("Could not square off basket leg %s: %s", result.order_id, exc)
+        if notes:
+            result.rollback = "; ".join(notes)
+        return problems
+
+
+basket_executor = BasketExecutor()
@@ -0,0 +1,204 @@
+"""
+Small thread-safe TTL + LRU cache shared by the broker services.
+
+Lookups are counted in ``algonova_cache_lookups_total`` so hit ratios show up
+on ``/metrics``. Expired entries are kept (until evicted) so callers can
+still serve a stale value when the upstream is unavailable.
+
+:class:`SingleFlight` collapses concurrent identical upstream calls into one,
+and :func:`etag_for` / :func:`etag_matches` back conditional (304) responses.
+"""
+
+from __future__ import annotations
+
+import hashlib
+import json
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Any, Callable, Dict, Generic, Hashable, Optional, TypeVar
+
+from APP.services.metrics import registry, record_cache_lookup
+
+V = TypeVar("V")
+
+COALESCED_CALLS = registry.counter(
+    "algonova_coalesced_calls_total",
+    "Calls that waited on an identical in-flight call instead of repeating it.",
+    ("flight",),
+)
+
+
+@dataclass
+class CacheEntry(Generic[V]):
+    value: V
+    stored_at: float
+    expires_at: float
+    # Hit since it was stored (or since its last second chance)
+    reused: bool = False
+
+    @property
+    def age(self) -> float:
+        return time.monotonic() - self.stored_at
+
+    @property
+    def fresh(self) -> bool:
+        return time.monotonic() < self.expires_at
+
+
+class TTLCache(Generic[V]):
+    """
+    Mapping with per-entry expiry and least-recently-used eviction.
+
+    With ``sliding=True`` every hit pushes the entry's expiry ``ttl`` seconds
+    out again, so ``ttl`` becomes an idle timeout. With ``second_chance=True``
+    an entry that was hit since it last reached the LRU end is moved back to
+    the front once instead of being evicted, so a burst of one-off keys
+    cannot flush the working set.
+    """
+
+    def __init__(
+        self,
+        name: str,
+        ttl: float,
+        maxsize: int = 1024,
+        sliding: bool = False,
+        second_chance: bool = False,
+    ) -> None:
+        if maxsize < 1:
+            raise ValueError("maxsize must be >= 1")
+        self.name = name
+        self.ttl = ttl
+        self.maxsize = maxsize
+        self.sliding = sliding
+        self.second_chance = second_chance
+        self._entries: "OrderedDict[Hashable, CacheEntry[V]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def get(self, key: Hashable) -> Optional[V]:
+        """Return the fresh value for ``key`` or ``None``; records a hit/miss."""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry.fresh:
+                self._entries.move_to_end(key)
+                entry.reused = True
+                if self.sliding:
+                    entry.expires_at = time.monotonic() + self.ttl
+                record_cache_lookup(self.name, hit=True)
+                return entry.value
+        record_cache_lookup(self.name, hit=False)
+        return None
+
+    def get_entry(self, key: Hashable) -> Optional[CacheEntry[V]]:
+        """Return the entry even if expired, without touching metrics."""
+        with self._lock:
+            return self._entries.get(key)
+
+    def set(self, key: Hashable, value: V, ttl: Optional[float] = None) -> None:
+        now = time.monotonic()
+        entry = CacheEntry(value=value, stored_at=now, expires_at=now + (self.ttl if ttl is None else ttl))
+        with self._lock:
+            self._entries[key] = entry
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.maxsize:
+                old_key, old = self._entries.popitem(last=False)
+                if self.second_chance and old.reused and old.fresh:
+                    old.reused = False
+                    self._entries[old_key] = old
+
+    def get_or_set(self, key: Hashable, factory: Callable[[], V], ttl: Optional[float] = None) -> V:
+        value = self.get(key)
+        if value is None:
+            value = factory()
+            self.set(key, value, ttl=ttl)
+        return value
+
+    def invalidate(self, key: Hashable) -> None:
+        with self._lock:
+            self._entries.pop(key, None)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+
+    def snapshot(self) -> Dict[Hashable, V]:
+        with self._lock:
+            return {key: entry.value for key, entry in self._entries.items()}
+
+
+class _Call:
+    __slots__ = ("done", "value", "error")
+
+    def __init__(self) -> None:
+        self.done = threading.Event()
+        self.value: Any = None
+        self.error: Optional[BaseException] = None
+
+
+class SingleFlight(Generic[V]):
+    """
+    Run at most one call per key at a time; concurrent callers share its outcome.
+
+    The first caller for a key runs the function. Callers arriving while it is
+    in flight block until it finishes and get the same value or exception.
+    Nothing is remembered afterwards, so pair this with a :class:`TTLCache`
+    when results should also be reused across time.
+    """
+
+    def __init__(self, name: str) -> None:
+        self.name = name
+        self._calls: Dict[Hashable, _Call] = {}
+        self._lock = threading.Lock()
+
+    def do(self, key: Hashable, fn: Callable[[], V]) -> V:
+        with self._lock:
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = self._calls[key] = _Call()
+        if not leader:
+            COALESCED_CALLS.inc(flight=self.name)
+            call.done.wait()
+            if call.error is not None:
+                raise call.error
+            return call.value
+        try:
+            call.value = fn()
+        except BaseException as exc:
+            call.error = exc
+            raise
+        finally:
+            with self._lock:
+                self._calls.pop(key, None)
+            call.done.set()
+        return call.value
+
+    def in_flight(self) -> int:
+        with self._lock:
+            return len(self._calls)
+
+
+def etag_for(*parts: Any) -> str:
+    """Strong ETag over the JSON encoding of ``parts`` (key order does not matter)."""
+    encoded = json.dumps(parts, sort_keys=True, separators=(",", ":"), default=str)
+    return '"' + hashlib.sha256(encoded.encode("utf-8")).hexdigest()[:32] + '"'
+
+
+def etag_matches(if_none_match: Optional[str], etag: str) -> bool:
+    """Whether an ``If-None-Match`` header matches ``etag`` (weak comparison, per RFC 9110)."""
+    if not if_none_match:
+        return False
+    if if_none_match.strip() == "*":
+        return True
+    opaque = etag[2:] if etag.startswith("W/") else etag
+    for candidate in if_none_match.split(","):
+        candidate = candidate.strip()
+        if candidate.startswith("W/"):
+            candidate = candidate[2:]
+        if candidate == opaque:
+            return True
+    return False
@@ -0,0 +1,370 @@
+"""
+Tick-to-bar aggregation.
+
+Every tick on :data:`APP.services.market_data.tick_bus` updates the open
+bar of each configured timeframe (``CANDLE_TIMEFRAMES``, default
+``1s,1m,5m``) for its symbol. Closed bars are written into a preallocated
+NumPy ring per (symbol, timeframe) - timestamps as int64, OHLCV as a
+``(capacity, 5)`` float64 block - so memory stays flat however long the
+process runs and a read of the last N bars is two array slices.
+
+Bars are aligned to epoch multiples of the timeframe (IST offsets are whole
+minutes, so 1m/5m bars line up with exchange bars). A bar closes when the
+first tick of a later bar arrives, or when the flush timer sees its period
+(plus ``CANDLE_CLOSE_GRACE`` seconds for feed lag) has passed, whichever is
+first. Listeners get a :class:`Bar` for each close. Ticks older than the open
+bar are counted and dropped, and periods with no ticks produce no bar.
+
+Ring sizes default to roughly one trading session per timeframe and can be
+set per timeframe with ``CANDLE_CAPACITY_<TF>``, e.g. ``CANDLE_CAPACITY_1M``.
+"""
+
+from __future__ import annotations
+
+import logging
+import os
+import threading
+import time
+from dataclasses import asdict, dataclass
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+import numpy as np
+
+from APP.services.market_data import Tick, TickBus, tick_bus
+from APP.services.metrics import registry
+
+logger = logging.getLogger(__name__)
+
+BARS_CLOSED = registry.counter(
+    "algonova_candles_closed_total",
+    "Bars closed by the candle aggregator",
+    ("timeframe",),
+)
+LATE_TICKS = registry.counter(
+    "algonova_candle_late_ticks_total",
+    "Ticks dropped because their bar had already closed",
+)
+
+_UNITS = {"s": 1, "m": 60, "h": 3600}
+# One NSE session is 375 minutes
+_DEFAULT_CAPACITY_SECONDS = 375 * 60
+
+OPEN, HIGH, LOW, CLOSE, VOLUME = range(5)
+
+
+def parse_timeframe(label: str) -> int:
+    """``"5m"`` -> 300. Raises ValueError for anything else."""
+    label = label.strip().lower()
+    try:
+        seconds = int(label[:-1]) * _UNITS[label[-1]]
+    except (KeyError, ValueError, IndexError):
+        raise ValueError(f"Unsupported timeframe {label!r}; use e.g. 1s, 1m, 5m, 1h")
+    if seconds <= 0:
+        raise ValueError(f"Unsupported timeframe {label!r}")
+    return seconds
+
+
+def timeframe_label(seconds: int) -> str:
+    for unit, size in (("h", 3600), ("m", 60)):
+        if seconds % size == 0:
+            return f"{seconds // size}{unit}"
+    return f"{seconds}s"
+
+
+@dataclass
+class Bar:
+    symbol: str
+    timeframe: str
+    timestamp: int
+    open: float
+    high: float
+    low: float
+    close: float
+    volume: float
+
+    def as_dict(self) -> Dict[str, Any]:
+        return asdict(self)
+
+
+class CandleSeries:
+    """Closed bars for one symbol/timeframe in a fixed-size ring, plus the open bar."""
+
+    __slots__ = (
+        "symbol", "seconds", "label", "capacity", "_ts", "_ohlcv", "_head", "_count",
+        "start", "last_closed", "open", "high", "low", "close", "volume",
+    )
+
+    def __init__(self, symbol: str, seconds: int, capacity: int) -> None:
+        self.symbol = symbol
+        self.seconds = seconds
+        self.label = timeframe_label(seconds)
+        self.capacity = capacity
+        self._ts = np.zeros(capacity, dtype=np.int64)
+        self._ohlcv = np.zeros((capacity, 5), dtype=np.float64)
+        self._head = 0
+        self._count = 0
+        # Open bar; start is -1 while there is none
+        self.start = -1
+        self.last_closed = -1
+        self.open = self.high = self.low = self.close = self.volume = 0.0
+
+    def __len__(self) -> int:
+        return self._count
+
+    def update(self, timestamp: float, price: float, volume: float) -> Tuple[bool, Optional[Bar]]:
+        """Apply a trade. Returns ``(accepted, closed_bar)``."""
+        start = int(timestamp) // self.seconds * self.seconds
+        if start == self.start:
+            if price > self.high:
+                self.high = price
+            elif price < self.low:
+                self.low = price
+            self.close = price
+            self.volume += volume
+            return True, None
+        if start < self.start or start <= self.last_closed:
+            return False, None
+        closed = self.close_bar()
+        self.start = start
+        self.open = self.high = self.low = self.close = price
+        self.volume = volume
+        return True, closed
+
+    def close_bar(self) -> Optional[Bar]:
+        """Commit the open bar to the ring."""
+        if self.start < 0:
+            return None
+        head = self._head
+        self._ts[head] = self.start
+        self._ohlcv[head] = (self.open, self.high, self.low, self.close, self.volume)
+        self._head = (head + 1) % self.capacity
+        if self._count < self.capacity:
+            self._count += 1
+        bar = Bar(
+            self.symbol, self.label, self.start, self.open, self.high, self.low, self.close, self.volume
+        )
+        self.last_closed = self.start
+        self.start = -1
+        return bar
+
+    @property
+    def has_open_bar(self) -> bool:
+        return self.start >= 0
+
+    def due(self, now: float) -> bool:
+        return self.start >= 0 and now >= self.start + self.seconds
+
+    def last(self, limit: int) -> Tuple[np.ndarray, np.ndarray]:
+        """Most recent ``limit`` closed bars, oldest first, as (timestamps, ohlcv) copies."""
+        count = min(limit, self._count)
+        if count <= 0:
+            return self._ts[:0].copy(), self._ohlcv[:0].copy()
+        begin = (self._head - count) % self.capacity
+        if begin + count <= self.capacity:
+            return self._ts[begin:begin + count].copy(), self._ohlcv[begin:begin + count].copy()
+        index = np.arange(begin, begin + count) % self.capacity
+        return self._ts[index], self._ohlcv[index]
+
+
+BarListener = Callable[[Bar], None]
+
+
+def _capacity(seconds: int) -> int:
+    value = os.getenv(f"CANDLE_CAPACITY_{timeframe_label(seconds).upper()}")
+    if value:
+        return max(1, int(value))
+    # Cap 1s rings at an hour of bars; 1m and up hold a full session
+    return max(1, min(3600, _DEFAULT_CAPACITY_SECONDS // seconds + 1))
+
+
+class CandleAggregator:
+    """Builds bars for every symbol on the tick bus across the configured timeframes."""
+
+    def __init__(
+        self,
+        timeframes: Optional[List[str]] = None,
+        capacities: Optional[Dict[str, int]] = None,
+        close_grace: Optional[float] = None,
+        clock: Callable[[], float] = time.time,
+    ) -> None:
+        labels = timeframes or os.getenv("CANDLE_TIMEFRAMES", "1s,1m,5m").split(",")
+        self.timeframes = sorted({parse_timeframe(label) for label in labels if label.strip()})
+        capacities = {parse_timeframe(k): v for k, v in (capacities or {}).items()}
+        self.capacities = {tf: capacities.get(tf) or _capacity(tf) for tf in self.timeframes}
+        self.close_grace = (
+            float(os.getenv("CANDLE_CLOSE_GRACE", "1.0")) if close_grace is None else close_grace
+        )
+        self.clock = clock
+        self._series: Dict[Tuple[str, int], CandleSeries] = {}
+        self._by_symbol: Dict[str, List[CandleSeries]] = {}
+        self._last_volume: Dict[str, float] = {}
+        self._listeners: List[BarListener] = []
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self._bus: Optional[TickBus] = None
+        self.ticks = 0
+        self.late_ticks = 0
+
+    # -- input ---------------------------------------------------------------
+
+    def on_tick(self, tick: Tick) -> None:
+        closed: List[Bar] = []
+        with self._lock:
+            self.ticks += 1
+            series_list = self._by_symbol.get(tick.symbol)
+            if series_list is None:
+                series_list = self._by_symbol[tick.symbol] = [
+                    self._new_series(tick.symbol, tf) for tf in self.timeframes
+                ]
+            # Brokers send cumulative day volume; a drop means a new session
+            previous = self._last_volume.get(tick.symbol)
+            self._last_volume[tick.symbol] = tick.volume
+            if previous is None:
+                traded = 0.0
+            elif tick.volume >= previous:
+                traded = tick.volume - previous
+            else:
+                traded = tick.volume
+            late = False
+            for series in series_list:
+                accepted, bar = series.update(tick.timestamp, tick.price, traded)
+                if bar is not None:
+                    closed.append(bar)
+                late = late or not accepted
+            if late:
+                self.late_ticks += 1
+        if late:
+            LATE_TICKS.inc()
+        self._emit(closed)
+
+    def _new_series(self, symbol: str, seconds: int) -> CandleSeries:
+        series = CandleSeries(symbol, seconds, self.capacities[seconds])
+        self._series[(symbol, seconds)] = series
+        return series
+
+    def flush(self, now: Optional[float] = None) -> List[Bar]:
+        """Close every open bar whose period (plus the grace) has ended."""
+        cutoff = (self.clock() if now is None else now) - self.close_grace
+        closed: List[Bar] = []
+        with self._lock:
+            for series in self._series.values():
+                if series.due(cutoff):
+                    bar = series.close_bar()
+                    if bar is not None:
+                        closed.append(bar)
+        self._emit(closed)
+        return closed
+
+    # -- output --------------------------------------------------------------
+
+    def add_listener(self, listener: BarListener) -> None:
+        with self._lock:
+            self._listeners = self._listeners + [listener]
+
+    def remove_listener(self, listener: BarListener) -> None:
+        with self._lock:
+            self._listeners = [entry for entry in self._listeners if entry != listener]
+
+    def _emit(self, bars: List[Bar]) -> None:
+        if not bars:
+            return
+        for bar in bars:
+            BARS_CLOSED.inc(timeframe=bar.timeframe)
+        for listener in self._listeners:
+            for bar in bars:
+                try:
+                    listener(bar)
+                except Exception:
+                    logger.exception("Bar listener %r failed for %s %s", listener, bar.symbol, bar.timeframe)
+
+    def _seconds(self, timeframe: str) -> int:
+        seconds = parse_timeframe(timeframe)
+        if seconds not in self.capacities:
+            configured = ", ".join(timeframe_label(tf) for tf in self.timeframes)
+            raise ValueError(f"Timeframe {timeframe!r} is not aggregated; configured: {configured}")
+        return seconds
+
+    def history(self, symbol: str, timeframe: str, limit: int = 500) -> Tuple[np.ndarray, np.ndarray]:
+        """Latest closed bars as ``(timestamps, ohlcv)`` array copies, oldest first."""
+        seconds = self._seconds(timeframe)
+        with self._lock:
+            series = self._series.get((symbol, seconds))
+            if series is None:
+                return np.zeros(0, dtype=np.int64), np.zeros((0, 5), dtype=np.float64)
+            return series.last(limit)
+
+    def candles(
+        self, symbol: str, timeframe: str, limit: int = 500, include_partial: bool = False
+    ) -> List[Dict[str, Any]]:
+        """Latest bars for ``symbol``, oldest first. Raises ValueError for unconfigured timeframes."""
+        seconds = self._seconds(timeframe)
+        with self._lock:
+            series = self._series.get((symbol, seconds))
+            if series is None:
+                return []
+            partial = include_partial and series.has_open_bar
+            timestamps, ohlcv = series.last(limit - 1 if partial else limit)
+            if partial:
+                open_bar = (series.start, series.open, series.high, series.low, series.close, series.volume)
+        rows = [
+            {"timestamp": ts, "open": o, "high": h, "low": lo, "close": c, "volume": v}
+            for ts, (o, h, lo, c, v) in zip(timestamps.tolist(), ohlcv.tolist())
+        ]
+        if partial:
+            ts, o, h, lo, c, v = open_bar
+            rows.append(
+                {"timestamp": ts, "open": o, "high": h, "low": lo, "close": c, "volume": v, "partial": True}
+            )
+        return rows
+
+    def symbols(self) -> List[str]:
+        return sorted(self._by_symbol)
+
+    def status(self) -> Dict[str, Any]:
+        return {
+            "running": self._thread is not None,
+            "timeframes": [timeframe_label(tf) for tf in self.timeframes],
+            "symbols": len(self._by_symbol),
+            "ticks": self.ticks,
+            "late_ticks": self.late_ticks,
+        }
+
+    def clear(self) -> None:
+        with self._lock:
+            self._series.clear()
+            self._by_symbol.clear()
+            self._last_volume.clear()
+
+    # -- lifecycle -----------------------------------------------------------
+
+    def start(self, bus: TickBus = tick_bus, interval: Optional[float] = None) -> None:
+        """Subscribe to ``bus`` and close idle bars from a background timer."""
+        if self._thread is not None:
+            return
+        interval = interval or min(0.25, self.timeframes[0] / 4)
+        self._bus = bus
+        bus.subscribe(self.on_tick)
+        self._stop.clear()
+
+        def run() -> None:
+            while not self._stop.wait(interval):
+                try:
+                    self.flush()
+                except Exception:
+                    logger.exception("Candle flush failed")
+
+        self._thread = threading.Thread(target=run, name="candle-flush", daemon=True)
+        self._thread.start()
+
+    def stop(self) -> None:
+        if self._bus is not None:
+            self._bus.unsubscribe(self.on_tick)
+            self._bus = None
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout=2)
+            self._thread = None
+
+
+candle_aggregator = CandleAggregator()
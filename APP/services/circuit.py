@@ -0,0 +1,307 @@
+"""
+Circuit breakers, bounded retries and stale fallbacks for upstream calls.
+
+Every broker API and the database sit behind a :class:`CircuitBreaker`
+(``breaker("fyers")``, ``breaker("kite")``, ``breaker("database")``). Each
+keeps the outcome of its last ``window`` calls and opens when, over at
+least ``min_calls`` of them, the failure rate or the share of calls slower
+than ``slow_call_seconds`` crosses its threshold. While open, calls fail at
+once with :class:`CircuitOpenError` instead of waiting out a timeout, so a
+broker or database outage cannot tie up the worker threads. After
+``open_seconds`` (jittered) a limited number of probe calls are let through
+(half-open); if they succeed the circuit closes, otherwise it opens again.
+
+Only transient failures count (:func:`is_transient`): network errors,
+timeouts and server faults. A ``ValueError`` from an API that answered
+("token expired", bad symbol) means the dependency is healthy.
+
+:func:`guarded` adds bounded retries with full jitter for idempotent reads.
+Callers that hold a cached value serve it stale when the call fails or the
+circuit is open (see :func:`serve_stale`), so an outage degrades to slightly
+old data rather than errors.
+
+Settings come from ``CIRCUIT_<NAME>_<SETTING>`` falling back to
+``CIRCUIT_<SETTING>``, e.g. ``CIRCUIT_FYERS_SLOW_CALL_SECONDS=3`` or
+``CIRCUIT_OPEN_SECONDS=30``.
+"""
+
+from __future__ import annotations
+
+import logging
+import os
+import random
+import sys
+import threading
+import time
+from collections import deque
+from typing import Any, Callable, Deque, Dict, Optional, Tuple, TypeVar
+
+from APP.services.metrics import registry
+
+logger = logging.getLogger(__name__)
+
+T = TypeVar("T")
+
+CLOSED = "closed"
+OPEN = "open"
+HALF_OPEN = "half_open"
+_STATE_VALUES = {CLOSED: 0.0, HALF_OPEN: 1.0, OPEN: 2.0}
+
+CIRCUIT_STATE = registry.gauge(
+    "algonova_circuit_state",
+    "Circuit breaker state per dependency (0 closed, 1 half-open, 2 open)",
+    ("circuit",),
+)
+CIRCUIT_REJECTIONS = registry.counter(
+    "algonova_circuit_rejections_total",
+    "Calls failed fast because their circuit was open",
+    ("circuit",),
+)
+CIRCUIT_TRANSITIONS = registry.counter(
+    "algonova_circuit_transitions_total",
+    "Circuit breaker state changes",
+    ("circuit", "state"),
+)
+RETRIES = registry.counter(
+    "algonova_upstream_retries_total",
+    "Upstream calls retried after a transient failure",
+    ("circuit",),
+)
+STALE_SERVED = registry.counter(
+    "algonova_stale_served_total",
+    "Responses served from an expired cache entry because the upstream failed",
+    ("cache",),
+)
+
+# Client-side problems: the dependency answered, so they say nothing about its health
+_PERMANENT_ERRORS: Tuple[type, ...] = (ValueError, LookupError, TypeError, PermissionError)
+_KITE_PERMANENT = ("TokenException", "PermissionException", "InputException", "OrderException")
+
+
+class CircuitOpenError(RuntimeError):
+    """Raised instead of calling a dependency whose circuit is open."""
+
+    def __init__(self, name: str, retry_after: float) -> None:
+        super().__init__(f"{name} is unavailable (circuit open); retry in {retry_after:.0f}s")
+        self.name = name
+        self.retry_after = retry_after
+
+
+def is_transient(exc: BaseException) -> bool:
+    """Whether ``exc`` suggests the dependency itself is failing (and a retry may help)."""
+    if isinstance(exc, CircuitOpenError):
+        return False
+    kite_errors = sys.modules.get("kiteconnect.exceptions")
+    if kite_errors is not None:
+        permanent = [getattr(kite_errors, name, None) for name in _KITE_PERMANENT]
+        if isinstance(exc, tuple(error for error in permanent if error is not None)):
+            return False
+    return not isinstance(exc, _PERMANENT_ERRORS)
+
+
+def _setting(name: str, key: str, default: str) -> float:
+    return float(os.getenv(f"CIRCUIT_{name.upper()}_{key}", os.getenv(f"CIRCUIT_{key}", default)))
+
+
+class CircuitBreaker:
+    """Error-rate and slow-call-rate breaker over a sliding window of calls."""
+
+    def __init__(
+        self,
+        name: str,
+        window: Optional[int] = None,
+        min_calls: Optional[int] = None,
+        failure_rate: Optional[float] = None,
+        slow_call_seconds: Optional[float] = None,
+        slow_call_rate: Optional[float] = None,
+        open_seconds: Optional[float] = None,
+        half_open_probes: Optional[int] = None,
+        clock: Callable[[], float] = time.monotonic,
+    ) -> None:
+        self.name = name
+        def pick(value: Optional[float], key: str, default: str) -> float:
+            return _setting(name, key, default) if value is None else value
+
+        self.window = int(pick(window, "WINDOW", "20"))
+        self.min_calls = int(pick(min_calls, "MIN_CALLS", "10"))
+        self.failure_rate = pick(failure_rate, "FAILURE_RATE", "0.5")
+        self.slow_call_seconds = pick(slow_call_seconds, "SLOW_CALL_SECONDS", "5")
+        self.slow_call_rate = pick(slow_call_rate, "SLOW_CALL_RATE", "0.8")
+        self.open_seconds = pick(open_seconds, "OPEN_SECONDS", "30")
+        self.half_open_probes = int(pick(half_open_probes, "HALF_OPEN_PROBES", "2"))
+        self.clock = clock
+        self.state = CLOSED
+        # (failed, slow) per recent call
+        self._outcomes: Deque[Tuple[bool, bool]] = deque(maxlen=self.window)
+        self._opened_until = 0.0
+        self._probes_in_flight = 0
+        self._probe_successes = 0
+        self._lock = threading.Lock()
+        self.last_error: Optional[str] = None
+
+    # -- state machine -------------------------------------------------------
+
+    def _transition(self, state: str) -> None:
+        if state == self.state:
+            return
+        self.state = state
+        CIRCUIT_TRANSITIONS.inc(circuit=self.name, state=state)
+        if state == OPEN:
+            # Jitter keeps workers (and other instances) from probing in lockstep
+            self._opened_until = self.clock() + self.open_seconds * random.uniform(0.8, 1.2)
+            logger.warning("Circuit %s opened: %s", self.name, self.last_error)
+        elif state == HALF_OPEN:
+            self._probes_in_flight = 0
+            self._probe_successes = 0
+        else:
+            self._outcomes.clear()
+            logger.info("Circuit %s closed", self.name)
+
+    def acquire(self) -> bool:
+        """Admit a call or raise :class:`CircuitOpenError`; True when the call is a half-open probe."""
+        with self._lock:
+            if self.state == OPEN:
+                remaining = self._opened_until - self.clock()
+                if remaining > 0:
+                    CIRCUIT_REJECTIONS.inc(circuit=self.name)
+                    raise CircuitOpenError(self.name, remaining)
+                self._transition(HALF_OPEN)
+            if self.state == HALF_OPEN:
+                if self._probes_in_flight >= self.half_open_probes:
+                    CIRCUIT_REJECTIONS.inc(circuit=self.name)
+                    raise CircuitOpenError(self.name, 1.0)
+                self._probes_in_flight += 1
+                return True
+            return False
+
+    def record(self, elapsed: float, error: Optional[BaseException], probe: bool = False) -> None:
+        failed = error is not None and is_transient(error)
+        slow = elapsed >= self.slow_call_seconds
+        with self._lock:
+            if failed:
+                self.last_error = f"{type(error).__name__}: {error}"
+            if probe:
+                self._probes_in_flight = max(0, self._probes_in_flight - 1)
+                if self.state != HALF_OPEN:
+                    return
+                if failed or slow:
+                    self._transition(OPEN)
+                    return
+                self._probe_successes += 1
+                if self._probe_successes >= self.half_open_probes:
+                    self._transition(CLOSED)
+                return
+            if self.state != CLOSED:
+                return
+            self._outcomes.append((failed, slow))
+            if len(self._outcomes) < self.min_calls:
+                return
+            calls = len(self._outcomes)
+            failures = sum(1 for was_failed, _ in self._outcomes if was_failed)
+            slow_calls = sum(1 for _, was_slow in self._outcomes if was_slow)
+            if failures / calls >= self.failure_rate or slow_calls / calls >= self.slow_call_rate:
+                if not failed:
+                    self.last_error = f"{slow_calls}/{calls} calls slower than {self.slow_call_seconds:g}s"
+                self._transition(OPEN)
+
+    def call(self, fn: Callable[..., T], *args: Any, **kwargs: Any) -> T:
+        probe = self.acquire()
+        start = time.perf_counter()
+        try:
+            result = fn(*args, **kwargs)
+        except BaseException as exc:
+            self.record(time.perf_counter() - start, exc, probe)
+            raise
+        self.record(time.perf_counter() - start, None, probe)
+        return result
+
+    def status(self) -> Dict[str, Any]:
+        with self._lock:
+            calls = max(1, len(self._outcomes))
+            retry_after = None
+            if self.state == OPEN:
+                retry_after = max(0.0, round(self._opened_until - self.clock(), 1))
+            return {
+                "state": self.state,
+                "calls": len(self._outcomes),
+                "failure_rate": round(sum(failed for failed, _ in self._outcomes) / calls, 3),
+                "slow_rate": round(sum(slow for _, slow in self._outcomes) / calls, 3),
+                "retry_after": retry_after,
+                "last_error": self.last_error,
+            }
+
+
+_breakers: Dict[str, CircuitBreaker] = {}
+_breakers_lock = threading.Lock()
+
+CIRCUIT_STATE.set_function(
+    lambda: {(name,): _STATE_VALUES[circuit.state] for name, circuit in list(_breakers.items())}
+)
+
+
+def breaker(name: str) -> CircuitBreaker:
+    """The shared breaker for dependency ``name``, created on first use."""
+    circuit = _breakers.get(name)
+    if circuit is None:
+        with _breakers_lock:
+            circuit = _breakers.get(name)
+            if circuit is None:
+                circuit = _breakers[name] = CircuitBreaker(name)
+    return circuit
+
+
+def reset_breakers() -> None:
+    with _breakers_lock:
+        _breakers.clear()
+
+
+def breaker_status() -> Dict[str, Dict[str, Any]]:
+    return {name: circuit.status() for name, circuit in sorted(_breakers.items())}
+
+
+def guarded(
+    name: str,
+    fn: Callable[..., T],
+    *args: Any,
+    retries: Optional[int] = None,
+    base_delay: Optional[float] = None,
+    max_delay: Optional[float] = None,
+    **kwargs: Any,
+) -> T:
+    """
+    Call ``fn`` through breaker ``name``, retrying transient failures.
+
+    Retries (``CIRCUIT_RETRIES``, default 2) sleep a uniformly random time up
+    to ``base_delay * 2**attempt`` capped at ``max_delay`` ("full jitter"),
+    and stop as soon as the circuit opens. Use ``retries=0`` for calls that
+    must not be repeated, such as order placement.
+    """
+    circuit = breaker(name)
+    attempts = 1 + (int(_setting(name, "RETRIES", "2")) if retries is None else retries)
+    base = _setting(name, "RETRY_BASE_SECONDS", "0.1") if base_delay is None else base_delay
+    cap = _setting(name, "RETRY_MAX_SECONDS", "1.0") if max_delay is None else max_delay
+    for attempt in range(attempts):
+        try:
+            return circuit.call(fn, *args, **kwargs)
+        except Exception as exc:
+            if attempt + 1 >= attempts or not is_transient(exc):
+                raise
+            RETRIES.inc(circuit=name)
+            time.sleep(random.uniform(0, min(cap, base * (2 ** attempt))))
+    raise AssertionError("unreachable")
+
+
+def serve_stale(cache: Any, key: Any, exc: BaseException) -> Any:
+    """
+    The expired value cached under ``key`` when ``exc`` is an outage; re-raises otherwise.
+
+    Stale values are only used in place of transient failures and open
+    circuits, never to hide an error the upstream actually returned.
+    """
+    if isinstance(exc, CircuitOpenError) or is_transient(exc):
+        entry = cache.get_entry(key)
+        if entry is not None:
+            STALE_SERVED.inc(cache=cache.name)
+            logger.info("Serving stale %s entry (%.0fs old): %s", cache.name, entry.age, exc)
+            return entry.value
+    raise exc
@@ -0,0 +1,333 @@
+"""
+Derivatives metadata: expiry calendars, lot sizes, tick sizes and strike ladders.
+
+Built from the Kite instrument dumps (``KiteService.get_instruments``, cached
+for the day and fetched at pre-warm) of the exchanges in
+``DERIVATIVES_EXCHANGES`` (default ``NFO,BFO``). Underlyings are keyed as
+:func:`APP.services.portfolio.underlying_of` names them, so
+``NSE:NIFTY50-INDEX``, ``NIFTY`` and ``NSE:NIFTY24JUN22000CE`` share a key.
+Per underlying the index keeps every listed expiry, the last one of each
+month marked monthly, and per expiry the lot size, tick size, future, the
+sorted strike ladder (a NumPy array, so the strike nearest a price is a
+binary search) and the Fyers symbol of every option.
+
+A load builds a new snapshot and swaps it in whole, so lookups take no
+lock. The index reloads itself when first used on a new day.
+
+Option-chain requests use it to turn an ``expiry`` selector and a
+``strike_offset`` from the money into a plain Fyers request and to trim
+the answer to the wanted strikes, without fetching a chain first (see
+:meth:`DerivativesIndex.plan_chain`). Expiry selectors are ``current``,
+``next``, ``monthly``, ``next-monthly``, an offset (``0`` is the nearest
+live expiry) or a date (``2024-06-27``).
+"""
+
+from __future__ import annotations
+
+import logging
+import os
+import time
+from dataclasses import dataclass, field, replace
+from datetime import date, datetime
+from typing import TYPE_CHECKING, Any, Callable, Dict, Iterable, List, Optional, Tuple
+
+import numpy as np
+
+from APP.services.market_calendar import IST, MARKET_CLOSE
+from APP.services.metrics import registry
+from APP.services.portfolio import underlying_of
+
+if TYPE_CHECKING:
+    from APP.fyersApp.models import OptionChainRequest
+
+logger = logging.getLogger(__name__)
+
+DERIVATIVE_CONTRACTS = registry.gauge(
+    "algonova_derivatives_contracts",
+    "Contracts in the derivatives index, by kind",
+    ("kind",),
+)
+# Fyers serves at most this many strikes each side of the money
+MAX_STRIKECOUNT = 50
+# Seconds before a failed reload is retried
+_RETRY_SECONDS = 60.0
+_SELECTORS = {"current": 0, "next": 1}
+_MONTHLY_SELECTORS = {"monthly": 0, "next-monthly": 1}
+
+
+@dataclass(frozen=True)
+class ExpirySeries:
+    """Everything listed for one underlying and expiry."""
+
+    underlying: str
+    expiry: date
+    lot_size: int
+    tick_size: float
+    strikes: np.ndarray
+    # (strike, "CE" | "PE") -> Fyers symbol
+    options: Dict[Tuple[float, str], str] = field(repr=False)
+    future: Optional[str] = None
+    monthly: bool = False
+
+    def nearest(self, price: float) -> int:
+        """Position in the ladder of the strike nearest ``price`` (the lower one on a tie)."""
+        strikes = self.strikes
+        index = int(np.searchsorted(strikes, price))
+        if index == len(strikes):
+            return index - 1
+        if index > 0 and price - strikes[index - 1] <= strikes[index] - price:
+            return index - 1
+        return index
+
+    def atm(self, price: float) -> float:
+        return float(self.strikes[self.nearest(price)])
+
+    def window(self, price: float, each_side: int, offset: int = 0) -> np.ndarray:
+        """``each_side`` strikes either side of the strike ``offset`` steps from the money."""
+        centre = min(max(self.nearest(price) + offset, 0), len(self.strikes) - 1)
+        return self.strikes[max(centre - each_side, 0):centre + each_side + 1]
+
+    def option(self, strike: float, kind: str) -> str:
+        try:
+            return self.options[(float(strike), kind.upper())]
+        except KeyError:
+            raise ValueError(f"No {kind} at {strike} for {self.underlying} {self.expiry}") from None
+
+    def fyers_timestamp(self) -> str:
+        """The expiry as Fyers' ``optionchain`` ``timestamp``: close of the expiry day, epoch seconds."""
+        return str(int(datetime.combine(self.expiry, MARKET_CLOSE, tzinfo=IST).timestamp()))
+
+    def as_dict(self) -> Dict[str, Any]:
+        return {
+            "underlying": self.underlying,
+            "expiry": self.expiry.isoformat(),
+            "monthly": self.monthly,
+            "lot_size": self.lot_size,
+            "tick_size": self.tick_size,
+            "future": self.future,
+            "strikes": len(self.strikes),
+        }
+
+
+@dataclass(frozen=True)
+class ChainPlan:
+    """A relative option-chain request resolved against the index."""
+
+    request: "OptionChainRequest"
+    series: ExpirySeries
+    each_side: int
+    offset: int
+
+    def apply(self, response: Dict[str, Any]) -> Dict[str, Any]:
+        """Keep the underlying row and the wanted strikes; add what was selected."""
+        data = response.get("data")
+        rows = (data or {}).get("optionsChain") if isinstance(data, dict) else None
+        selection: Dict[str, Any] = {**self.series.as_dict(), "strike_offset": self.offset}
+        if not rows:
+            return {**response, "selection": selection}
+        spot = next(
+            (row.get("ltp") for row in rows if (row.get("strike_price") or -1) < 0 and row.get("ltp")), None
+        )
+        if spot is None:
+            return {**response, "selection": selection}
+        strikes = self.series.window(float(spot), self.each_side, self.offset)
+        wanted = set(strikes.tolist())
+        kept = [
+            row for row in rows if (row.get("strike_price") or -1) < 0 or row.get("strike_price") in wanted
+        ]
+        selection.update(atm=self.series.atm(float(spot)), strikes=strikes.tolist())
+        return {**response, "data": {**data, "optionsChain": kept}, "selection": selection}
+
+
+# Series per underlying in expiry order, their expiry ordinals, and the day it was loaded
+_Snapshot = Tuple[Dict[str, List[ExpirySeries]], Dict[str, np.ndarray], Optional[date]]
+
+
+def _expiry(value: Any) -> Optional[date]:
+    if isinstance(value, datetime):
+        return value.date()
+    if isinstance(value, date):
+        return value
+    if isinstance(value, str) and value:
+        return date.fromisoformat(value[:10])
+    return None
+
+
+def _kite_rows(kite: Any = None) -> Iterable[Dict[str, Any]]:
+    if kite is None:
+        from APP.services.kite_service import KiteService
+
+        kite = KiteService()
+    exchanges = os.getenv("DERIVATIVES_EXCHANGES", "NFO,BFO")
+    for exchange in (item.strip() for item in exchanges.split(",")):
+        if exchange:
+            yield from kite.get_instruments(exchange)
+
+
+class DerivativesIndex:
+    """Expiries, lot sizes and strike ladders per underlying, from the instrument dumps."""
+
+    def __init__(
+        self,
+        loader: Callable[[], Iterable[Dict[str, Any]]] = _kite_rows,
+        clock: Callable[[], float] = time.time,
+    ) -> None:
+        self.loader = loader
+        self.clock = clock
+        self._state: _Snapshot = ({}, {}, None)
+        self._retry_at = 0.0
+        self._error: Optional[str] = None
+        self._counts: Dict[str, int] = {}
+        DERIVATIVE_CONTRACTS.set_function(lambda: {(kind,): float(n) for kind, n in self._counts.items()})
+
+    def _today(self) -> date:
+        return datetime.fromtimestamp(self.clock(), IST).date()
+
+    # -- loading -------------------------------------------------------------
+
+    def load(self, rows: Iterable[Dict[str, Any]]) -> int:
+        """Rebuild from instrument dump rows; returns the number of contracts indexed."""
+        from APP.services.quotes import normalize_symbol
+
+        grouped: Dict[Tuple[str, date], Dict[str, Any]] = {}
+        counts = {"options": 0, "futures": 0}
+        for row in rows:
+            kind = row.get("instrument_type")
+            if kind not in ("CE", "PE", "FUT"):
+                continue
+            expiry = _expiry(row.get("expiry"))
+            name = row.get("name") or ""
+            if expiry is None or not name:
+                continue
+            key = (underlying_of(name), expiry)
+            entry = grouped.setdefault(key, {"options": {}, "future": None, "lot": 0, "tick": 0.0})
+            symbol = normalize_symbol(f"{row['exchange']}:{row['tradingsymbol']}")
+            entry["lot"] = int(row.get("lot_size") or entry["lot"])
+            entry["tick"] = float(row.get("tick_size") or entry["tick"])
+            if kind == "FUT":
+                entry["future"] = symbol
+                counts["futures"] += 1
+            else:
+                entry["options"][(float(row["strike"]), kind)] = symbol
+                counts["options"] += 1
+
+        by_underlying: Dict[str, List[ExpirySeries]] = {}
+        for (underlying, expiry), entry in sorted(grouped.items()):
+            strikes = np.unique(np.fromiter((strike for strike, _ in entry["options"]), dtype=np.float64))
+            by_underlying.setdefault(underlying, []).append(
+                ExpirySeries(
+                    underlying,
+                    expiry,
+                    entry["lot"],
+                    entry["tick"],
+                    strikes,
+                    entry["options"],
+                    entry["future"],
+                )
+            )
+        for underlying, listed in by_underlying.items():
+            # The last listed expiry of a month is its monthly contract
+            months = [(series.expiry.year, series.expiry.month) for series in listed]
+            by_underlying[underlying] = [
+                replace(series, monthly=index + 1 == len(listed) or months[index + 1] != months[index])
+                for index, series in enumerate(listed)
+            ]
+        ordinals = {
+            underlying: np.array([series.expiry.toordinal() for series in listed], dtype=np.int64)
+            for underlying, listed in by_underlying.items()
+        }
+        self._state = (by_underlying, ordinals, self._today())
+        self._counts = counts
+        self._error = None
+        logger.info(
+            "Derivatives index: %d underlyings, %d options, %d futures",
+            len(by_underlying), counts["options"], counts["futures"],
+        )
+        return counts["options"] + counts["futures"]
+
+    def refresh(self, kite: Any = None) -> int:
+        """Reload from the Kite instrument dumps (``kite`` defaults to a new ``KiteService``)."""
+        if kite is None:
+            return self.load(self.loader())
+        return self.load(_kite_rows(kite))
+
+    def _ensure_fresh(self) -> None:
+        if self._state[2] == self._today() or self.clock() < self._retry_at:
+            return
+        try:
+            self.refresh()
+        except Exception as exc:
+            self._retry_at = self.clock() + _RETRY_SECONDS
+            self._error = str(exc)
+            logger.warning("Derivatives index reload failed: %s", exc)
+            if not self._state[0]:
+                raise ValueError(f"Derivatives index is not loaded: {exc}") from exc
+
+    # -- lookups -------------------------------------------------------------
+
+    def expiries(self, underlying: str) -> List[ExpirySeries]:
+        """Live expiries of ``underlying`` (today's included), nearest first."""
+        self._ensure_fresh()
+        by_underlying, ordinals, _ = self._state
+        key = underlying_of(underlying)
+        if key not in by_underlying:
+            raise ValueError(f"No derivatives listed for {underlying}")
+        first = int(np.searchsorted(ordinals[key], self._today().toordinal()))
+        return by_underlying[key][first:]
+
+    def series(self, underlying: str, expiry: Optional[str] = None) -> ExpirySeries:
+        """The expiry of ``underlying`` picked by the ``expiry`` selector (default ``current``)."""
+        listed = self.expiries(underlying)
+        selector = (expiry or "current").strip().lower()
+        if selector in _MONTHLY_SELECTORS:
+            listed = [series for series in listed if series.monthly]
+            position = _MONTHLY_SELECTORS[selector]
+        elif selector in _SELECTORS or selector.isdigit():
+            position = _SELECTORS[selector] if selector in _SELECTORS else int(selector)
+        else:
+            try:
+                wanted = date.fromisoformat(selector)
+            except ValueError:
+                raise ValueError(f"Unknown expiry selector {expiry!r}") from None
+            for series in listed:
+                if series.expiry == wanted:
+                    return series
+            raise ValueError(f"{underlying} has no live expiry on {wanted.isoformat()}")
+        if position >= len(listed):
+            raise ValueError(f"{underlying} has no {selector} expiry listed")
+        return listed[position]
+
+    def lot_size(self, underlying: str, expiry: Optional[str] = None) -> int:
+        return self.series(underlying, expiry).lot_size
+
+    def plan_chain(self, request: "OptionChainRequest") -> ChainPlan:
+        """Resolve ``request.expiry`` / ``request.strike_offset`` into a plain Fyers request."""
+        if request.expiry and request.timestamp:
+            raise ValueError("Give either an expiry selector or a timestamp, not both")
+        series = self.series(request.symbol, request.expiry)
+        if not len(series.strikes):
+            raise ValueError(f"No options listed for {request.symbol} {series.expiry}")
+        # Fyers centres its strikes on the money; widen so the shifted window is inside them
+        strikecount = request.strikecount + abs(request.strike_offset)
+        if strikecount > MAX_STRIKECOUNT:
+            raise ValueError(f"strikecount plus |strike_offset| must be <= {MAX_STRIKECOUNT}")
+        plain = replace(
+            request,
+            strikecount=strikecount,
+            timestamp=series.fyers_timestamp() if request.expiry else request.timestamp,
+            expiry=None,
+            strike_offset=0,
+        )
+        return ChainPlan(plain, series, request.strikecount, request.strike_offset)
+
+    def status(self) -> Dict[str, Any]:
+        by_underlying, _, loaded_on = self._state
+        return {
+            "loaded_on": loaded_on.isoformat() if loaded_on else None,
+            "underlyings": len(by_underlying),
+            **self._counts,
+            "error": self._error,
+        }
+
+
+derivatives_index = DerivativesIndex()
@@ -0,0 +1,519 @@
+"""
+Technical indicators with O(1) incremental updates and a vectorised batch mode.
+
+Each indicator keeps only the state its recurrence needs (a running sum, the
+previous smoothed value, ...), so ``update`` costs the same on bar 10 as on
+bar 100,000. ``update(..., final=False)`` evaluates a still-forming bar (e.g.
+on every tick) without advancing the state.
+
+``batch`` computes the full series over NumPy arrays for backtests and
+matches what feeding the same bars through ``update`` produces (up to float
+rounding). Wilder/EMA smoothing is vectorised blockwise; Supertrend's band
+ratchet is path dependent, so its batch mode vectorises ATR and loops only
+over the band step shared with ``update``.
+
+Indicators are named by spec strings - ``sma:20``, ``ema:50``, ``rsi:14``,
+``atr:14``, ``vwap``, ``supertrend:10:3`` - see :func:`create`.
+:class:`IndicatorSet` keeps a group of them current from the candle
+aggregator's bar-close events.
+"""
+
+from __future__ import annotations
+
+import math
+import threading
+from collections import deque
+from typing import Any, Callable, Deque, Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from APP.services.market_calendar import IST
+
+NAN = float("nan")
+_IST_OFFSET = int(IST.utcoffset(None).total_seconds())
+# Blocks are sized so (1 - alpha) ** -block stays below this; keeps the
+# closed-form recurrence within ~1e-10 relative error
+_BLOCK_GROWTH = 1e6
+
+
+def _smooth(values: np.ndarray, alpha: float, seed: float) -> np.ndarray:
+    """``y[i] = y[i-1] + alpha * (values[i] - y[i-1])`` from ``y[-1] = seed``, vectorised."""
+    decay = 1.0 - alpha
+    out = np.empty(len(values), dtype=np.float64)
+    if decay <= 0.0:
+        out[:] = values
+        return out
+    block = int(math.log(_BLOCK_GROWTH) / -math.log(decay))
+    last = seed
+    if block < 16:
+        # Short periods decay too fast for the closed form to pay off
+        for index, value in enumerate(values.tolist()):
+            last = last + alpha * (value - last)
+            out[index] = last
+        return out
+    powers = decay ** np.arange(1, block + 1, dtype=np.float64)
+    for start in range(0, len(values), block):
+        chunk = values[start:start + block]
+        scale = powers[: len(chunk)]
+        smoothed = scale * (last + alpha * np.cumsum(chunk / scale))
+        out[start:start + len(chunk)] = smoothed
+        last = smoothed[-1]
+    return out
+
+
+def _as_array(values: Optional[Sequence[float]], default: np.ndarray) -> np.ndarray:
+    return default if values is None else np.asarray(values, dtype=np.float64)
+
+
+class Indicator:
+    """Base class; ``value`` is NaN until enough bars have been seen."""
+
+    name = ""
+
+    def __init__(self) -> None:
+        self.value = NAN
+
+    @property
+    def ready(self) -> bool:
+        return not math.isnan(self.value)
+
+    def update(
+        self,
+        close: float,
+        high: Optional[float] = None,
+        low: Optional[float] = None,
+        volume: float = 0.0,
+        timestamp: float = 0.0,
+        final: bool = True,
+    ) -> float:
+        raise NotImplementedError
+
+    def batch(
+        self,
+        close: Sequence[float],
+        high: Optional[Sequence[float]] = None,
+        low: Optional[Sequence[float]] = None,
+        volume: Optional[Sequence[float]] = None,
+        timestamp: Optional[Sequence[float]] = None,
+    ) -> np.ndarray:
+        raise NotImplementedError
+
+
+class SMA(Indicator):
+    def __init__(self, period: int) -> None:
+        if period < 1:
+            raise ValueError("SMA period must be at least 1")
+        super().__init__()
+        self.period = period
+        self.name = f"sma:{period}"
+        self._window: Deque[float] = deque(maxlen=period)
+        self._total = 0.0
+        self._updates = 0
+
+    def update(self, close, high=None, low=None, volume=0.0, timestamp=0.0, final=True) -> float:
+        window = self._window
+        full = len(window) == self.period
+        total = self._total + close - (window[0] if full else 0.0)
+        value = total / self.period if full or len(window) + 1 == self.period else NAN
+        if final:
+            window.append(close)
+            self._updates += 1
+            # Re-sum once per window so rounding in the running total cannot drift
+            self._total = math.fsum(window) if self._updates % self.period == 0 else total
+            self.value = value
+        return value
+
+    def batch(self, close, high=None, low=None, volume=None, timestamp=None) -> np.ndarray:
+        close = np.asarray(close, dtype=np.float64)
+        out = np.full(len(close), NAN)
+        n = self.period
+        if len(close) >= n:
+            totals = np.cumsum(close)
+            out[n - 1] = totals[n - 1]
+            out[n:] = totals[n:] - totals[:-n]
+            out[n - 1:] /= n
+        return out
+
+
+class EMA(Indicator):
+    """Exponential average seeded with the SMA of the first ``period`` values."""
+
+    def __init__(self, period: int) -> None:
+        if period < 1:
+            raise ValueError("EMA period must be at least 1")
+        super().__init__()
+        self.period = period
+        self.alpha = 2.0 / (period + 1)
+        self.name = f"ema:{period}"
+        self._seed = 0.0
+        self._count = 0
+
+    def update(self, close, high=None, low=None, volume=0.0, timestamp=0.0, final=True) -> float:
+        if self._count >= self.period:
+            value = self.value + self.alpha * (close - self.value)
+        else:
+            seed = self._seed + close
+            value = seed / self.period if self._count + 1 == self.period else NAN
+            if final:
+                self._seed = seed
+        if final:
+            self._count += 1
+            self.value = value
+        return value
+
+    def batch(self, close, high=None, low=None, volume=None, timestamp=None) -> np.ndarray:
+        close = np.asarray(close, dtype=np.float64)
+        out = np.full(len(close), NAN)
+        n = self.period
+        if len(close) >= n:
+            seed = float(np.cumsum(close[:n])[-1]) / n
+            out[n - 1] = seed
+            out[n:] = _smooth(close[n:], self.alpha, seed)
+        return out
+
+
+def _rsi(gain: float, loss: float) -> float:
+    total = gain + loss
+    return 50.0 if total == 0 else 100.0 * gain / total
+
+
+class RSI(Indicator):
+    """Wilder's RSI; the first value needs ``period + 1`` closes."""
+
+    def __init__(self, period: int = 14) -> None:
+        if period < 1:
+            raise ValueError("RSI period must be at least 1")
+        super().__init__()
+        self.period = period
+        self.name = f"rsi:{period}"
+        self._previous: Optional[float] = None
+        self._count = 0
+        self._gain = 0.0
+        self._loss = 0.0
+
+    def update(self, close, high=None, low=None, volume=0.0, timestamp=0.0, final=True) -> float:
+        if self._previous is None:
+            if final:
+                self._previous = close
+            return NAN
+        change = close - self._previous
+        up = change if change > 0 else 0.0
+        down = -change if change < 0 else 0.0
+        n = self.period
+        if self._count >= n:
+            gain = self._gain + (up - self._gain) / n
+            loss = self._loss + (down - self._loss) / n
+        else:
+            gain, loss = self._gain + up, self._loss + down
+            if self._count + 1 == n:
+                gain, loss = gain / n, loss / n
+        value = _rsi(gain, loss) if self._count + 1 >= n else NAN
+        if final:
+            self._previous = close
+            self._count += 1
+            self._gain, self._loss = gain, loss
+            self.value = value
+        return value
+
+    def batch(self, close, high=None, low=None, volume=None, timestamp=None) -> np.ndarray:
+        close = np.asarray(close, dtype=np.float64)
+        out = np.full(len(close), NAN)
+        n = self.period
+        if len(close) > n:
+            change = np.diff(close)
+            up = np.where(change > 0, change, 0.0)
+            down = np.where(change < 0, -change, 0.0)
+            first_gain = float(np.cumsum(up[:n])[-1]) / n
+            first_loss = float(np.cumsum(down[:n])[-1]) / n
+            gain = np.concatenate(([first_gain], _smooth(up[n:], 1.0 / n, first_gain)))
+            loss = np.concatenate(([first_loss], _smooth(down[n:], 1.0 / n, first_loss)))
+            total = gain + loss
+            with np.errstate(invalid="ignore", divide="ignore"):
+                out[n:] = np.where(total == 0, 50.0, 100.0 * gain / total)
+        return out
+
+
+class ATR(Indicator):
+    """Wilder's average true range."""
+
+    def __init__(self, period: int = 14) -> None:
+        if period < 1:
+            raise ValueError("ATR period must be at least 1")
+        super().__init__()
+        self.period = period
+        self.name = f"atr:{period}"
+        self._previous: Optional[float] = None
+        self._count = 0
+        self._seed = 0.0
+
+    def update(self, close, high=None, low=None, volume=0.0, timestamp=0.0, final=True) -> float:
+        high = close if high is None else high
+        low = close if low is None else low
+        true_range = high - low
+        if self._previous is not None:
+            true_range = max(true_range, abs(high - self._previous), abs(low - self._previous))
+        n = self.period
+        if self._count >= n:
+            value = self.value + (true_range - self.value) / n
+        else:
+            seed = self._seed + true_range
+            value = seed / n if self._count + 1 == n else NAN
+            if final:
+                self._seed = seed
+        if final:
+            self._previous = close
+            self._count += 1
+            self.value = value
+        return value
+
+    def batch(self, close, high=None, low=None, volume=None, timestamp=None) -> np.ndarray:
+        close = np.asarray(close, dtype=np.float64)
+        high = _as_array(high, close)
+        low = _as_array(low, close)
+        out = np.full(len(close), NAN)
+        n = self.period
+        if len(close) >= n:
+            true_range = high - low
+            true_range[1:] = np.maximum.reduce(
+                [true_range[1:], np.abs(high[1:] - close[:-1]), np.abs(low[1:] - close[:-1])]
+            )
+            seed = float(np.cumsum(true_range[:n])[-1]) / n
+            out[n - 1] = seed
+            out[n:] = _smooth(true_range[n:], 1.0 / n, seed)
+        return out
+
+
+class VWAP(Indicator):
+    """Session VWAP on the typical price; resets at each IST calendar day."""
+
+    name = "vwap"
+
+    def __init__(self) -> None:
+        super().__init__()
+        self._session = -1
+        self._value_traded = 0.0
+        self._volume = 0.0
+
+    def update(self, close, high=None, low=None, volume=0.0, timestamp=0.0, final=True) -> float:
+        high = close if high is None else high
+        low = close if low is None else low
+        session = (int(timestamp) + _IST_OFFSET) // 86400
+        if session != self._session:
+            traded, total = 0.0, 0.0
+        else:
+            traded, total = self._value_traded, self._volume
+        traded += (high + low + close) / 3.0 * volume
+        total += volume
+        value = traded / total if total > 0 else NAN
+        if final:
+            self._session = session
+            self._value_traded, self._volume = traded, total
+            self.value = value
+        return value
+
+    def batch(self, close, high=None, low=None, volume=None, timestamp=None) -> np.ndarray:
+        close = np.asarray(close, dtype=np.float64)
+        high = _as_array(high, close)
+        low = _as_array(low, close)
+        volume = _as_array(volume, np.zeros(len(close)))
+        stamps = np.zeros(len(close), dtype=np.int64)
+        if timestamp is not None:
+            stamps = np.asarray(timestamp, dtype=np.int64)
+        if not len(close):
+            return np.zeros(0)
+        session = (stamps + _IST_OFFSET) // 86400
+        # Index of the first bar of each bar's session
+        first = np.zeros(len(close), dtype=np.int64)
+        starts = np.flatnonzero(np.diff(session) != 0) + 1
+        first[starts] = starts
+        first = np.maximum.accumulate(first)
+
+        traded = np.cumsum((high + low + close) / 3.0 * volume)
+        totals = np.cumsum(volume)
+        before = first - 1
+        traded = traded - np.where(first > 0, traded[before], 0.0)
+        totals = totals - np.where(first > 0, totals[before], 0.0)
+        with np.errstate(invalid="ignore", divide="ignore"):
+            return np.where(totals > 0, traded / totals, NAN)
+
+
+def _supertrend_step(
+    hl2: float,
+    atr: float,
+    close: float,
+    previous_close: float,
+    upper: float,
+    lower: float,
+    direction: int,
+    multiplier: float,
+) -> Tuple[float, float, int]:
+    """One bar of the Supertrend band ratchet; returns ``(upper, lower, direction)``."""
+    basic_upper = hl2 + multiplier * atr
+    basic_lower = hl2 - multiplier * atr
+    if direction == 0:
+        return basic_upper, basic_lower, 1 if close > hl2 else -1
+    if basic_upper < upper or previous_close > upper:
+        upper = basic_upper
+    if basic_lower > lower or previous_close < lower:
+        lower = basic_lower
+    if direction == 1:
+        direction = -1 if close < lower else 1
+    else:
+        direction = 1 if close > upper else -1
+    return upper, lower, direction
+
+
+class Supertrend(Indicator):
+    """ATR-band trend follower; ``direction`` is 1 (up, value = lower band) or -1."""
+
+    def __init__(self, period: int = 10, multiplier: float = 3.0) -> None:
+        super().__init__()
+        self.period = period
+        self.multiplier = multiplier
+        self.name = f"supertrend:{period}:{multiplier:g}"
+        self._atr = ATR(period)
+        self._previous = NAN
+        self._upper = NAN
+        self._lower = NAN
+        self.direction = 0
+
+    def update(self, close, high=None, low=None, volume=0.0, timestamp=0.0, final=True) -> float:
+        high = close if high is None else high
+        low = close if low is None else low
+        atr = self._atr.update(close, high, low, final=final)
+        if math.isnan(atr):
+            if final:
+                self._previous = close
+            return NAN
+        upper, lower, direction = _supertrend_step(
+            (high + low) / 2.0, atr, close, self._previous, self._upper, self._lower,
+            self.direction, self.multiplier,
+        )
+        value = lower if direction == 1 else upper
+        if final:
+            self._previous = close
+            self._upper, self._lower, self.direction = upper, lower, direction
+            self.value = value
+        return value
+
+    def trend_batch(
+        self,
+        close: Sequence[float],
+        high: Optional[Sequence[float]] = None,
+        low: Optional[Sequence[float]] = None,
+    ) -> Tuple[np.ndarray, np.ndarray]:
+        """Supertrend line and direction (0 while warming up) for a whole series."""
+        close = np.asarray(close, dtype=np.float64)
+        high = _as_array(high, close)
+        low = _as_array(low, close)
+        atr = ATR(self.period).batch(close, high, low)
+        hl2 = (high + low) / 2.0
+        line = np.full(len(close), NAN)
+        directions = np.zeros(len(close), dtype=np.int8)
+        upper = lower = NAN
+        direction = 0
+        start = self.period - 1
+        closes = close.tolist()
+        for index, (mid, band) in enumerate(zip(hl2[start:].tolist(), atr[start:].tolist()), start):
+            previous = closes[index - 1] if index else NAN
+            upper, lower, direction = _supertrend_step(
+                mid, band, closes[index], previous, upper, lower, direction, self.multiplier
+            )
+            line[index] = lower if direction == 1 else upper
+            directions[index] = direction
+        return line, directions
+
+    def batch(self, close, high=None, low=None, volume=None, timestamp=None) -> np.ndarray:
+        return self.trend_batch(close, high, low)[0]
+
+
+INDICATORS: Dict[str, Callable[..., Indicator]] = {
+    "sma": SMA,
+    "ema": EMA,
+    "rsi": RSI,
+    "atr": ATR,
+    "vwap": VWAP,
+    "supertrend": Supertrend,
+}
+
+
+def create(spec: str) -> Indicator:
+    """Build an indicator from ``name[:arg[:arg]]``, e.g. ``ema:20`` or ``supertrend:10:3``."""
+    name, *raw_args = spec.strip().lower().split(":")
+    factory = INDICATORS.get(name)
+    if factory is None:
+        raise ValueError(f"Unknown indicator {name!r}; available: {', '.join(sorted(INDICATORS))}")
+    try:
+        args = [float(arg) if "." in arg else int(arg) for arg in raw_args if arg]
+        return factory(*args)
+    except (TypeError, ValueError) as exc:
+        raise ValueError(f"Invalid indicator spec {spec!r}: {exc}")
+
+
+def batch_series(specs: Sequence[str], timestamps: np.ndarray, ohlcv: np.ndarray) -> Dict[str, np.ndarray]:
+    """Evaluate ``specs`` over candle arrays (``ohlcv`` columns as in :mod:`APP.services.candles`)."""
+    indicators = [create(spec) for spec in specs]
+    high, low, close, volume = ohlcv[:, 1], ohlcv[:, 2], ohlcv[:, 3], ohlcv[:, 4]
+    return {
+        indicator.name: indicator.batch(close, high, low, volume, timestamps) for indicator in indicators
+    }
+
+
+class IndicatorSet:
+    """
+    A group of indicators for one symbol/timeframe kept current from bar closes.
+
+    ``attach`` replays the bars the aggregator already holds, then follows its
+    bar-close events, so strategies read ``values()`` instead of recomputing.
+    """
+
+    def __init__(self, specs: Sequence[str]) -> None:
+        self.indicators: Dict[str, Indicator] = {}
+        for spec in specs:
+            indicator = create(spec)
+            self.indicators[indicator.name] = indicator
+        self.last_timestamp = -1
+        self._lock = threading.Lock()
+        self._detach: Optional[Callable[[], None]] = None
+
+    def update(
+        self, close: float, high: float, low: float, volume: float, timestamp: int, final: bool = True
+    ) -> Dict[str, float]:
+        with self._lock:
+            if final and timestamp <= self.last_timestamp:
+                return self.values()
+            if final:
+                self.last_timestamp = timestamp
+            return {
+                name: indicator.update(close, high, low, volume, timestamp, final)
+                for name, indicator in self.indicators.items()
+            }
+
+    def values(self) -> Dict[str, float]:
+        return {name: indicator.value for name, indicator in self.indicators.items()}
+
+    def attach(self, aggregator: Any, symbol: str, timeframe: str) -> None:
+        from APP.services.candles import parse_timeframe, timeframe_label
+
+        seconds = parse_timeframe(timeframe)
+        label = timeframe_label(seconds)
+        timestamps, ohlcv = aggregator.history(symbol, label, limit=aggregator.capacities.get(seconds, 0))
+        for stamp, (_, high, low, close, volume) in zip(timestamps.tolist(), ohlcv.tolist()):
+            self.update(close, high, low, volume, stamp)
+
+        def on_bar(bar: Any) -> None:
+            if bar.symbol == symbol and bar.timeframe == label:
+                self.update(bar.close, bar.high, bar.low, bar.volume, bar.timestamp)
+
+        aggregator.add_listener(on_bar)
+        self._detach = lambda: aggregator.remove_listener(on_bar)
+
+    def detach(self) -> None:
+        if self._detach is not None:
+            self._detach()
+            self._detach = None
+
+
+def to_json_values(values: np.ndarray) -> List[Optional[float]]:
+    """NaN is not valid JSON; warm-up positions become null."""
+    return [None if math.isnan(value) else value for value in values.tolist()]
@@ -1,51 +1,111 @@
 import logging
 import os
-import json
+import sys
 from pathlib import Path
-from dotenv import load_dotenv
-from kiteconnect import KiteConnect
-from kiteconnect.exceptions import TokenException, NetworkException, KiteException
-from typing import Dict, Any, Optional
+from types import SimpleNamespace
+from typing import Dict, Any, List, Optional
+from urllib.parse import quote
 from datetime import datetime, timedelta
 
-# Load environment variables
-load_dotenv()
+from APP.config import load_environment
+from APP.services import readiness
+from APP.services.cache import SingleFlight, TTLCache
+from APP.services.circuit import guarded, serve_stale
+from APP.services.market_calendar import now_ist, token_cutoff_after
+from APP.services.metrics import time_upstream
+from APP.services.order_book import track_new_order
+from APP.services.refresh import PROFILE, policies as refresh_policies
+from APP.services.risk_engine import RiskEngine, risk_for
+from APP.services.sessions import client_cache_size, client_idle_ttl, current_user, kite_sessions
 
-logging.basicConfig(level=logging.DEBUG)
+logger = logging.getLogger(__name__)
 
-# Token storage file path
+# Token storage file of the legacy single-user session (requests without a user ID)
 TOKEN_STORAGE_FILE = Path("kite_token.json")
 
+# kiteconnect pulls in twisted/autobahn for its ticker (~250ms), so it is
+# imported on first use rather than at startup.
+KiteConnect: Any = None
+
+
+class _SdkNotLoaded(Exception):
+    """Stand-in for kiteconnect exceptions; nothing can raise them before the SDK loads."""
+
+
+_UNLOADED_EXCEPTIONS = SimpleNamespace(
+    TokenException=_SdkNotLoaded,
+    NetworkException=_SdkNotLoaded,
+    KiteException=_SdkNotLoaded,
+)
+
+
+def kite_connect_class() -> type:
+    """Return ``kiteconnect.KiteConnect``, importing the SDK on first use."""
+    global KiteConnect
+    if KiteConnect is None:
+        from kiteconnect import KiteConnect as sdk_class
+
+        KiteConnect = sdk_class
+    return KiteConnect
+
+
+def kite_exceptions() -> Any:
+    """Return ``kiteconnect.exceptions`` for ``except`` clauses without forcing the import."""
+    return sys.modules.get("kiteconnect.exceptions") or _UNLOADED_EXCEPTIONS
+
+
+readiness.register("kite_sdk", lambda: "kiteconnect" in sys.modules, kite_connect_class)
+
+# Shared across KiteService instances; KiteConnect keeps a pooled requests.Session.
+_client_cache: TTLCache[Any] = TTLCache(
+    "kite_clients", ttl=client_idle_ttl(), maxsize=client_cache_size(), sliding=True, second_chance=True
+)
+_profile_cache: TTLCache[Dict[str, Any]] = TTLCache("kite_profile", ttl=60.0, maxsize=client_cache_size())
+_profile_flight: SingleFlight[Dict[str, Any]] = SingleFlight("kite_profile")
+_instruments_cache: TTLCache[list] = TTLCache("kite_instruments", ttl=12 * 3600, maxsize=16)
+
 class KiteService:
     """Service to handle Kite Connect API operations"""
     
-    def __init__(self, api_key: Optional[str] = None, api_secret: Optional[str] = None):
+    def __init__(
+        self,
+        api_key: Optional[str] = None,
+        api_secret: Optional[str] = None,
+        risk: Optional[RiskEngine] = None,
+        user_id: Optional[str] = None,
+    ):
+        load_environment()
+        self.user_id = user_id if user_id is not None else current_user()
+        # Positions, loss and order-rate limits are per session user
+        self.risk = risk or risk_for(self.user_id)
+        self.token_file = TOKEN_STORAGE_FILE if self.user_id is None else kite_sessions.path_for(self.user_id)
         self.api_key = api_key or os.getenv("KITE_API_KEY")
         self.api_secret = api_secret or os.getenv("KITE_API_SECRET")
         self.kite = None
         self.access_token = None
+        self.profile: Optional[Dict[str, Any]] = None
+        # stored_at of the token file behind the current session (feeds the profile ETag)
+        self.stored_at: Optional[str] = None
+        self.profile_ttl = float(os.getenv("KITE_PROFILE_TTL", "60"))
     
     def _load_stored_token(self) -> Optional[Dict[str, Any]]:
         """Load stored access token from file"""
         try:
-            if TOKEN_STORAGE_FILE.exists():
-                with open(TOKEN_STORAGE_FILE, 'r') as f:
-                    token_data = json.load(f)
-                    # Check if token is still valid (access tokens are valid for the day)
-                    stored_time = datetime.fromisoformat(token_data.get('stored_at', ''))
-                    # Access tokens are valid until end of trading day (typically 3:30 PM IST)
-                    # For safety, we'll consider it valid if stored today
-                    if stored_time.date() == datetime.now().date():
-                        return token_data
-                    else:
-                        # Token expired, remove file
-                        TOKEN_STORAGE_FILE.unlink()
-                        logging.info("Stored access token expired, removed")
+            token_data = kite_sessions.load(self.token_file)
+            if token_data is not None:
+                # Access tokens are invalidated daily at 06:00 IST
+                stored_time = datetime.fromisoformat(token_data.get('stored_at', ''))
+                if now_ist() < token_cutoff_after(stored_time):
+                    return token_data
+                else:
+                    # Token expired, remove file
+                    kite_sessions.delete(self.token_file)
+                    logger.info("Stored access token expired, removed")
         except Exception as e:
-            logging.warning(f"Error loading stored token: {str(e)}")
+            logger.warning("Error loading stored token: %s", e)
         return None
     
-    def _store_token(self, access_token: str, profile: Dict[str, Any]):
+    def _store_token(self, access_token: str, profile: Dict[str, Any], refresh_token: Optional[str] = None):
         """Store access token to file for reuse"""
         try:
             token_data = {
@@ -53,11 +113,13 @@ class KiteService:
                 "profile": profile,
                 "stored_at": datetime.now().isoformat()
             }
-            with open(TOKEN_STORAGE_FILE, 'w') as f:
-                json.dump(token_data, f, indent=2)
-            logging.info("Access token stored successfully")
+            if refresh_token:
+                token_data["refresh_token"] = refresh_token
+            kite_sessions.save(self.token_file, token_data)
+            self.stored_at = token_data["stored_at"]
+            logger.info("Access token stored successfully")
         except Exception as e:
-            logging.warning(f"Error storing token: {str(e)}")
+            logger.warning("Error storing token: %s", e)
     
     def _initialize_with_stored_token(self) -> bool:
         """Initialize KiteConnect with stored access token if available"""
@@ -65,30 +127,212 @@ class KiteService:
         if token_data and token_data.get('access_token'):
             try:
                 self.access_token = token_data['access_token']
-                self.kite = KiteConnect(api_key=self.api_key)
-                self.kite.set_access_token(self.access_token)
+                self.kite = self._client_for(self.access_token)
+                self.stored_at = token_data.get('stored_at')
+                # A recently validated token is trusted until its cached profile expires
+                self.profile = _profile_cache.get(self.access_token)
+                if self.profile is not None:
+                    return True
                 # Test if token is still valid by trying to get profile
-                self.kite.profile()
-                logging.info("Using stored access token")
+                self.profile = self._fetch_profile()
+                logger.info("Using stored access token")
                 return True
-            except (TokenException, KiteException) as e:
+            except (kite_exceptions().TokenException, kite_exceptions().KiteException) as e:
                 # Token is invalid, remove it
-                logging.warning(f"Stored token is invalid: {str(e)}")
-                if TOKEN_STORAGE_FILE.exists():
-                    TOKEN_STORAGE_FILE.unlink()
+                logger.warning("Stored token is invalid: %s", e)
+                _client_cache.invalidate((self.api_key, self.access_token))
+                kite_sessions.delete(self.token_file)
                 return False
         return False
+
+    def _fetch_profile(self) -> Dict[str, Any]:
+        """Call ``kite.profile()`` once per token however many requests ask concurrently."""
+        kite, access_token = self.kite, self.access_token
+
+        def fetch() -> Dict[str, Any]:
+            with time_upstream("kite", "profile"):
+                profile = guarded("kite", kite.profile)
+            # Held longer outside market hours, when nothing refreshes it
+            ttl = max(self.profile_ttl, refresh_policies[PROFILE].ttl())
+            _profile_cache.set(access_token, profile, ttl=ttl)
+            return profile
+
+        try:
+            return _profile_flight.do(access_token, fetch)
+        except Exception as exc:
+            # While Kite is unreachable the last profile seen for this token stands in
+            return serve_stale(_profile_cache, access_token, exc)
+
+    def refresh_profile(self) -> Dict[str, Any]:
+        """Re-fetch the profile of the stored session, replacing the cached one."""
+        if not self.kite and not self._initialize_with_stored_token():
+            raise ValueError("No valid Kite access token found. Please login via Kite first.")
+        self.profile = self._fetch_profile()
+        return self.profile
+
+    def _client_for(self, access_token: str) -> Any:
+        """Return an authenticated KiteConnect client, reused per token."""
+        def build() -> Any:
+            kite = kite_connect_class()(api_key=self.api_key)
+            kite.set_access_token(access_token)
+            return kite
+
+        return _client_cache.get_or_set((self.api_key, access_token), build)
+
+    def token_expiry(self) -> Optional[datetime]:
+        """Return when the stored access token stops working, if one is stored."""
+        token_data = self._load_stored_token()
+        if not token_data:
+            return None
+        return token_cutoff_after(datetime.fromisoformat(token_data["stored_at"]))
+
+    def renew_access_token(self) -> Dict[str, Any]:
+        """Renew the stored token via its refresh token (only issued to some Kite apps)."""
+        token_data = self._load_stored_token()
+        refresh_token = token_data.get("refresh_token") if token_data else None
+        if not refresh_token:
+            raise ValueError("No Kite refresh token stored; a fresh login is required.")
+        kite = kite_connect_class()(api_key=self.api_key)
+        with time_upstream("kite", "renew_access_token"):
+            data = kite.renew_access_token(refresh_token, self.api_secret)
+        access_token = data["access_token"]
+        _client_cache.invalidate((self.api_key, token_data["access_token"]))
+        self._store_token(access_token, token_data.get("profile", {}), data.get("refresh_token") or refresh_token)
+        return {"access_token": access_token, "profile": token_data.get("profile", {})}
+
+    def get_instruments(self, exchange: Optional[str] = None) -> list:
+        """Return the instrument dump for ``exchange`` (all if None), cached for the day."""
+        if not self.kite and not self._initialize_with_stored_token():
+            raise ValueError("No valid Kite access token found. Please login via Kite first.")
+        key = exchange or "ALL"
+        instruments = _instruments_cache.get(key)
+        if instruments is None:
+            with time_upstream("kite", "instruments"):
+                instruments = guarded("kite", self.kite.instruments, *([exchange] if exchange else []))
+            _instruments_cache.set(key, instruments)
+        return instruments
+
+    def get_quotes(self, instruments: List[str]) -> Dict[str, Dict[str, Any]]:
+        """Full quotes keyed by ``EXCHANGE:TRADINGSYMBOL`` (e.g. ``NSE:TCS``), in one call."""
+        if not self.kite and not self._initialize_with_stored_token():
+            raise ValueError("No valid Kite access token found. Please login via Kite first.")
+        with time_upstream("kite", "quote"):
+            return guarded("kite", self.kite.quote, list(instruments))
         
+    def place_order(
+        self,
+        symbol: str,
+        transaction_type: str,
+        quantity: int,
+        order_type: str = "MARKET",
+        product: str = "MIS",
+        price: Optional[float] = None,
+        trigger_price: Optional[float] = None,
+        validity: str = "DAY",
+        variety: str = "regular",
+        tag: Optional[str] = None,
+        user_id: Optional[int] = None,
+    ) -> Dict[str, Any]:
+        """
+        Place an order for ``symbol`` ("EXCHANGE:TRADINGSYMBOL") after pre-trade risk checks.
+
+        Market orders without a price are valued at the last traded price.
+        Raises RiskLimitExceeded (a ValueError) when a limit would be breached.
+        The ``orders`` row is written behind; the broker call never waits on the DB.
+        """
+        if not self.kite and not self._initialize_with_stored_token():
+            raise ValueError("No valid Kite access token found. Please login via Kite first.")
+        exchange, _, tradingsymbol = symbol.partition(":")
+        if not tradingsymbol:
+            raise ValueError("symbol must look like EXCHANGE:TRADINGSYMBOL")
+        transaction_type = transaction_type.upper()
+
+        reference_price = price or trigger_price
+        if not reference_price:
+            with time_upstream("kite", "ltp"):
+                reference_price = guarded("kite", self.kite.ltp, [symbol])[symbol]["last_price"]
+        if user_id is None:
+            user_id = int(os.getenv("DEFAULT_USER_ID", "1"))
+        self.risk.enforce(symbol, transaction_type, quantity, float(reference_price), user_id)
+
+        params: Dict[str, Any] = {
+            "variety": variety,
+            "exchange": exchange,
+            "tradingsymbol": tradingsymbol,
+            "transaction_type": transaction_type,
+            "quantity": quantity,
+            "product": product,
+            "order_type": order_type,
+            "validity": validity,
+        }
+        if price is not None:
+            params["price"] = price
+        if trigger_price is not None:
+            params["trigger_price"] = trigger_price
+        if tag:
+            params["tag"] = tag
+        try:
+            with time_upstream("kite", "place_order"):
+                order_id = guarded("kite", self.kite.place_order, retries=0, **params)
+        except kite_exceptions().KiteException as e:
+            raise ValueError(f"Kite API error while placing order: {str(e)}")
+
+        track_new_order(
+            "kite",
+            str(order_id),
+            symbol=symbol,
+            side=transaction_type,
+            quantity=quantity,
+            order_type=order_type,
+            product=product,
+            validity=validity,
+            price=price,
+            tag=tag,
+            user_id=user_id,
+            session_user=self.user_id,
+        )
+        return {"order_id": order_id, "symbol": symbol, "reference_price": reference_price}
+
+    def cancel_order(self, order_id: str, variety: str = "regular") -> Dict[str, Any]:
+        if not self.kite and not self._initialize_with_stored_token():
+            raise ValueError("No valid Kite access token found. Please login via Kite first.")
+        try:
+            with time_upstream("kite", "cancel_order"):
+                guarded("kite", self.kite.cancel_order, variety=variety, order_id=order_id, retries=0)
+        except kite_exceptions().KiteException as e:
+            raise ValueError(f"Kite API error while cancelling order: {str(e)}")
+        return {"order_id": order_id}
+
+    def get_positions(self) -> List[Dict[str, Any]]:
+        """Net positions as ``symbol`` ("EXCHANGE:TRADINGSYMBOL"), quantity, prices and realised P&L."""
+        if not self.kite and not self._initialize_with_stored_token():
+            raise ValueError("No valid Kite access token found. Please login via Kite first.")
+        with time_upstream("kite", "positions"):
+            positions = guarded("kite", self.kite.positions)
+        return [
+            {
+                "symbol": f"{row['exchange']}:{row['tradingsymbol']}",
+                "quantity": row.get("quantity") or 0,
+                "average_price": row.get("average_price") or 0.0,
+                "last_price": row.get("last_price") or 0.0,
+                "realized": row.get("realised") or 0.0,
+            }
+            for row in (positions or {}).get("net") or []
+        ]
+
     def get_login_url(self) -> str:
         """Generate Kite Connect login URL"""
         if not self.api_key:
             raise ValueError("KITE_API_KEY not found in environment variables")
         
-        kite = KiteConnect(api_key=self.api_key)
+        kite = kite_connect_class()(api_key=self.api_key)
         # Note: login_url() doesn't accept redirect_url parameter
         # The redirect URL must be configured in Kite app settings at https://kite.trade/apps/
         # Configure it to: http://localhost:3000/login (or your frontend login page)
         login_url = kite.login_url()
+        if self.user_id is not None:
+            # Kite appends redirect_params to the redirect, where the session middleware reads ?user=
+            login_url += "&redirect_params=" + quote(f"user={self.user_id}", safe="")
         
         return login_url
     
@@ -98,43 +342,46 @@ class KiteService:
             raise ValueError("Kite API credentials not found. Please check KITE_API_KEY and KITE_API_SECRET in .env file")
         
         try:
-            self.kite = KiteConnect(api_key=self.api_key)
+            self.kite = kite_connect_class()(api_key=self.api_key)
             
             # Generate session using request token
-            data = self.kite.generate_session(
-                request_token=request_token,
-                api_secret=self.api_secret
-            )
+            with time_upstream("kite", "generate_session"):
+                data = self.kite.generate_session(
+                    request_token=request_token,
+                    api_secret=self.api_secret
+                )
             
             self.access_token = data["access_token"]
             self.kite.set_access_token(self.access_token)
             
             # Fetch profile immediately after session generation
-            profile = self.kite.profile()
+            with time_upstream("kite", "profile"):
+                profile = self.kite.profile()
             
             # Store the access token for future use
-            self._store_token(self.access_token, profile)
+            self._store_token(self.access_token, profile, data.get("refresh_token"))
+            _profile_cache.set(self.access_token, profile, ttl=self.profile_ttl)
             
             return {
                 "access_token": self.access_token,
                 "profile": profile,
                 "session_data": data
             }
-        except TokenException as e:
+        except kite_exceptions().TokenException as e:
             error_msg = f"Token error: {str(e)}. The request token may be invalid or expired."
-            logging.error(error_msg)
+            logger.error(error_msg)
             raise ValueError(error_msg)
-        except NetworkException as e:
+        except kite_exceptions().NetworkException as e:
             error_msg = f"Network error: {str(e)}. Please check your internet connection."
-            logging.error(error_msg)
+            logger.error(error_msg)
             raise ConnectionError(error_msg)
-        except KiteException as e:
+        except kite_exceptions().KiteException as e:
             error_msg = f"Kite API error: {str(e)}"
-            logging.error(error_msg)
+            logger.error(error_msg)
             raise ValueError(error_msg)
         except Exception as e:
             error_msg = f"Unexpected error: {str(e)}"
-            logging.error(error_msg)
+            logger.error(error_msg)
             raise
     
     def get_profile(self, request_token: Optional[str] = None, use_stored_token: bool = True) -> Dict[str, Any]:
@@ -155,20 +402,17 @@ class KiteService:
             # Try to use stored access token first (if enabled)
             if use_stored_token and not self.kite:
                 if self._initialize_with_stored_token():
-                    profile = self.kite.profile()
-                    return profile
+                    return self.profile
             
             # If we have an initialized kite instance, use it
             if self.kite:
-                profile = self.kite.profile()
-                return profile
+                return self._fetch_profile()
             
             # Last resort: try env token (but warn user)
-            from dotenv import load_dotenv
-            load_dotenv()
+            load_environment()
             request_token_env = os.getenv("KITE_REQUEST_TOKEN")
             if request_token_env:
-                logging.warning("Using KITE_REQUEST_TOKEN from .env. This token may expire. Consider using the login flow instead.")
+                logger.warning("Using KITE_REQUEST_TOKEN from .env. This token may expire. Consider using the login flow instead.")
                 session_data = self.generate_session_from_token(request_token_env)
                 return session_data["profile"]
             else:
@@ -178,20 +422,20 @@ class KiteService:
                     "2. The access token will be stored and reused automatically\n"
                     "3. Or provide a request_token parameter"
                 )
-        except TokenException as e:
+        except kite_exceptions().TokenException as e:
             error_msg = f"Token error while fetching profile: {str(e)}. The access token may have expired."
-            logging.error(error_msg)
+            logger.error(error_msg)
             raise ValueError(error_msg)
-        except NetworkException as e:
+        except kite_exceptions().NetworkException as e:
             error_msg = f"Network error while fetching profile: {str(e)}"
-            logging.error(error_msg)
+            logger.error(error_msg)
             raise ConnectionError(error_msg)
-        except KiteException as e:
+        except kite_exceptions().KiteException as e:
             error_msg = f"Kite API error while fetching profile: {str(e)}"
-            logging.error(error_msg)
+            logger.error(error_msg)
             raise ValueError(error_msg)
         except Exception as e:
             error_msg = f"Error fetching profile: {str(e)}"
-            logging.error(error_msg)
+            logger.error(error_msg)
             raise
 
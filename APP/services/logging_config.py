@@ -0,0 +1,230 @@
+"""
+Centralised, non-blocking logging setup.
+
+Request-path code only enqueues records; a background ``QueueListener`` thread
+formats them as JSON lines and writes them out. Levels are configurable per
+subsystem and high-volume tick/quote loggers are sampled.
+"""
+
+from __future__ import annotations
+
+import atexit
+import json
+import logging
+import os
+import queue
+import sys
+import time
+import uuid
+from contextvars import ContextVar
+from datetime import UTC, datetime
+from logging.handlers import QueueHandler, QueueListener
+from typing import Any, Dict, List, Optional
+
+from starlette.datastructures import MutableHeaders
+
+from APP.services.metrics import route_template
+
+TICK_LOGGER = "APP.ticks"
+QUOTE_LOGGER = "APP.quotes"
+ACCESS_LOGGER = "APP.access"
+
+# Loggers owned by third-party SDKs; FyersAPIRequest logs every HTTP call at DEBUG.
+DEFAULT_LEVELS: Dict[str, str] = {
+    "FyersAPI": "ERROR",
+    "FyersAPIRequest": "WARNING",
+    "urllib3": "WARNING",
+    "httpx": "WARNING",
+    "asyncio": "WARNING",
+}
+DEFAULT_SAMPLE_RATES: Dict[str, float] = {
+    TICK_LOGGER: 0.01,
+    QUOTE_LOGGER: 0.1,
+}
+
+# Attributes present on every LogRecord; anything else came in via ``extra``.
+_RESERVED_ATTRS = frozenset(
+    vars(logging.LogRecord("", 0, "", 0, "", None, None)).keys()
+) | {"message", "asctime", "request_id"}
+
+_request_id: ContextVar[str] = ContextVar("request_id", default="-")
+_listener: Optional[QueueListener] = None
+
+logger = logging.getLogger(ACCESS_LOGGER)
+
+
+def get_request_id() -> str:
+    return _request_id.get()
+
+
+class RequestContextFilter(logging.Filter):
+    """Stamp the current request ID onto records before they leave the caller thread."""
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        record.request_id = _request_id.get()
+        return True
+
+
+class SamplingFilter(logging.Filter):
+    """Pass one in every ``1/rate`` records below WARNING; warnings always pass."""
+
+    def __init__(self, rate: float) -> None:
+        super().__init__()
+        if not 0 < rate <= 1:
+            raise ValueError("sample rate must be in (0, 1]")
+        self.every = max(1, round(1 / rate))
+        self._seen = 0
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        if record.levelno >= logging.WARNING:
+            return True
+        self._seen += 1
+        return (self._seen - 1) % self.every == 0
+
+
+class JsonFormatter(logging.Formatter):
+    """Render a record as a single JSON object, including ``extra`` fields."""
+
+    def format(self, record: logging.LogRecord) -> str:
+        payload: Dict[str, Any] = {
+            "ts": datetime.fromtimestamp(record.created, UTC).isoformat(),
+            "level": record.levelname,
+            "logger": record.name,
+            "message": record.getMessage(),
+            "request_id": getattr(record, "request_id", "-"),
+        }
+        for key, value in record.__dict__.items():
+            if key not in _RESERVED_ATTRS and not key.startswith("_"):
+                payload[key] = value
+        if record.exc_info:
+            payload["exc_info"] = self.formatException(record.exc_info)
+        return json.dumps(payload, default=str)
+
+
+def _parse_mapping(raw: Optional[str]) -> Dict[str, str]:
+    """Parse ``"a.b=INFO,c=DEBUG"`` style env values."""
+    mapping: Dict[str, str] = {}
+    if not raw:
+        return mapping
+    for item in raw.split(","):
+        name, sep, value = item.partition("=")
+        if sep and name.strip() and value.strip():
+            mapping[name.strip()] = value.strip()
+    return mapping
+
+
+def configure_logging(force: bool = False) -> None:
+    """
+    Install the queue-based JSON pipeline on the root logger.
+
+    Environment:
+        LOG_LEVEL          root level (default INFO)
+        LOG_LEVELS         per-logger overrides, e.g. ``APP.services=DEBUG,FyersAPI=INFO``
+        LOG_SAMPLE_RATES   per-logger sampling, e.g. ``APP.ticks=0.001``
+        LOG_FILE           optional file to write alongside stderr
+    """
+    global _listener
+    if _listener is not None:
+        if not force:
+            return
+        shutdown_logging()
+
+    handlers: List[logging.Handler] = [logging.StreamHandler(sys.stderr)]
+    log_file = os.getenv("LOG_FILE")
+    if log_file:
+        handlers.append(logging.FileHandler(log_file, encoding="utf-8"))
+    formatter = JsonFormatter()
+    for handler in handlers:
+        handler.setFormatter(formatter)
+
+    record_queue: "queue.SimpleQueue[logging.LogRecord]" = queue.SimpleQueue()
+    queue_handler = QueueHandler(record_queue)
+    queue_handler.addFilter(RequestContextFilter())
+
+    root = logging.getLogger()
+    for existing in list(root.handlers):
+        root.removeHandler(existing)
+    root.addHandler(queue_handler)
+    root.setLevel(os.getenv("LOG_LEVEL", "INFO").upper())
+
+    levels = dict(DEFAULT_LEVELS)
+    levels.update(_parse_mapping(os.getenv("LOG_LEVELS")))
+    for name, level in levels.items():
+        logging.getLogger(name).setLevel(level.upper())
+
+    # FyersModel attaches its own FileHandlers unless the logger looks preconfigured;
+    # marking it keeps SDK records flowing through this pipeline instead.
+    for name in ("FyersAPI", "FyersAPIRequest"):
+        setattr(logging.getLogger(name), "init", True)
+
+    rates: Dict[str, float] = dict(DEFAULT_SAMPLE_RATES)
+    rates.update({name: float(rate) for name, rate in _parse_mapping(os.getenv("LOG_SAMPLE_RATES")).items()})
+    for name, rate in rates.items():
+        sampled = logging.getLogger(name)
+        for existing in [f for f in sampled.filters if isinstance(f, SamplingFilter)]:
+            sampled.removeFilter(existing)
+        sampled.addFilter(SamplingFilter(rate))
+
+    _listener = QueueListener(record_queue, *handlers, respect_handler_level=True)
+    _listener.start()
+
+
+def shutdown_logging() -> None:
+    """Flush queued records and stop the writer thread."""
+    global _listener
+    if _listener is not None:
+        _listener.stop()
+        for handler in _listener.handlers:
+            handler.close()
+        _listener = None
+
+
+atexit.register(shutdown_logging)
+
+
+class RequestContextMiddleware:
+    """ASGI middleware assigning a request ID and emitting one access record per request."""
+
+    header_name = "X-Request-ID"
+
+    def __init__(self, app: Any) -> None:
+        self.app = app
+
+    async def __call__(self, scope: Dict[str, Any], receive: Any, send: Any) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        incoming = None
+        for key, value in scope.get("headers", []):
+            if key == b"x-request-id":
+                incoming = value.decode("latin-1")[:64]
+                break
+        request_id = incoming or uuid.uuid4().hex[:16]
+        token = _request_id.set(request_id)
+        start = time.perf_counter()
+        status_code = 500
+
+        async def send_with_request_id(message: Dict[str, Any]) -> None:
+            nonlocal status_code
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+                MutableHeaders(scope=message).append(self.header_name, request_id)
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_request_id)
+        finally:
+            logger.info(
+                "%s %s %s",
+                scope.get("method", ""),
+                scope.get("path", ""),
+                status_code,
+                extra={
+                    "method": scope.get("method", ""),
+                    "route": route_template(scope),
+                    "status": status_code,
+                    "latency_ms": round((time.perf_counter() - start) * 1000, 3),
+                },
+            )
+            _request_id.reset(token)
@@ -0,0 +1,133 @@
+"""
+Indian market time helpers.
+
+Broker access tokens (Kite and Fyers) are invalidated daily around 06:00 IST,
+so token expiry is expressed relative to that cutoff.
+
+The NSE/BSE equity and F&O session runs 09:15-15:30 IST on trading days,
+preceded by the 09:00-09:15 pre-open auction and followed by the closing
+session until 16:00. Weekends are closed; exchange holidays come from
+``MARKET_HOLIDAYS`` (comma-separated ``YYYY-MM-DD``) and/or the file named by
+``MARKET_HOLIDAYS_FILE`` (one date per line, anything after the date is a
+comment), and special sessions held on a weekend (budget day, Muhurat) from
+``MARKET_SPECIAL_SESSIONS``. Both exchanges publish the same equity holiday
+list, so one calendar serves both.
+"""
+
+from __future__ import annotations
+
+import os
+from datetime import date, datetime, time, timedelta, timezone
+from typing import Dict, FrozenSet, Optional, Tuple
+
+IST = timezone(timedelta(hours=5, minutes=30), name="IST")
+
+TOKEN_CUTOFF = time(6, 0)
+PRE_OPEN = time(9, 0)
+MARKET_OPEN = time(9, 15)
+MARKET_CLOSE = time(15, 30)
+POST_CLOSE_END = time(16, 0)
+
+# Session phases, in the order a trading day goes through them
+PHASE_PRE_OPEN = "pre_open"
+PHASE_OPEN = "open"
+PHASE_POST_CLOSE = "post_close"
+PHASE_CLOSED = "closed"
+PHASES = (PHASE_PRE_OPEN, PHASE_OPEN, PHASE_POST_CLOSE, PHASE_CLOSED)
+
+_BOUNDARIES = (
+    (PRE_OPEN, PHASE_PRE_OPEN),
+    (MARKET_OPEN, PHASE_OPEN),
+    (MARKET_CLOSE, PHASE_POST_CLOSE),
+    (POST_CLOSE_END, PHASE_CLOSED),
+)
+
+_calendars: Dict[Tuple[str, str, str], Tuple[FrozenSet[date], FrozenSet[date]]] = {}
+
+
+def now_ist() -> datetime:
+    return datetime.now(IST)
+
+
+def to_ist(value: datetime) -> datetime:
+    """Convert to IST; naive datetimes are treated as server-local time."""
+    return value.astimezone(IST)
+
+
+def token_cutoff_after(issued_at: datetime) -> datetime:
+    """Return the first 06:00 IST strictly after ``issued_at``."""
+    issued = to_ist(issued_at)
+    cutoff = datetime.combine(issued.date(), TOKEN_CUTOFF, tzinfo=IST)
+    if cutoff <= issued:
+        cutoff += timedelta(days=1)
+    return cutoff
+
+
+def parse_timestamp(raw: Optional[str]) -> Optional[datetime]:
+    if not raw:
+        return None
+    try:
+        return datetime.fromisoformat(raw)
+    except ValueError:
+        return None
+
+
+def _parse_dates(raw: str) -> FrozenSet[date]:
+    days = set()
+    for line in raw.replace(",", "\n").splitlines():
+        token = line.split("#", 1)[0].strip().split(" ", 1)[0]
+        if token:
+            days.add(date.fromisoformat(token))
+    return frozenset(days)
+
+
+def _calendar() -> Tuple[FrozenSet[date], FrozenSet[date]]:
+    """(holidays, special sessions), parsed once per configuration."""
+    key = (
+        os.getenv("MARKET_HOLIDAYS", ""),
+        os.getenv("MARKET_HOLIDAYS_FILE", ""),
+        os.getenv("MARKET_SPECIAL_SESSIONS", ""),
+    )
+    calendar = _calendars.get(key)
+    if calendar is None:
+        holidays = _parse_dates(key[0])
+        if key[1]:
+            with open(key[1], "r", encoding="utf-8") as fh:
+                holidays |= _parse_dates(fh.read())
+        calendar = _calendars[key] = (holidays, _parse_dates(key[2]))
+    return calendar
+
+
+def is_trading_day(day: date) -> bool:
+    holidays, special = _calendar()
+    if day in special:
+        return True
+    return day.weekday() < 5 and day not in holidays
+
+
+def market_phase(at: Optional[datetime] = None) -> str:
+    """Session phase at ``at`` (default now): pre_open, open, post_close or closed."""
+    current = to_ist(at) if at is not None else now_ist()
+    if not is_trading_day(current.date()):
+        return PHASE_CLOSED
+    phase = PHASE_CLOSED
+    for start, name in _BOUNDARIES:
+        if current.time() >= start:
+            phase = name
+    return phase
+
+
+def next_phase_change(at: Optional[datetime] = None) -> datetime:
+    """First instant after ``at`` at which :func:`market_phase` changes."""
+    current = to_ist(at) if at is not None else now_ist()
+    phase = market_phase(current)
+    day = current.date()
+    # Holidays can run for days (plus weekends); a year bounds the search
+    for _ in range(366):
+        if is_trading_day(day):
+            for start, name in _BOUNDARIES:
+                boundary = datetime.combine(day, start, tzinfo=IST)
+                if boundary > current and name != phase:
+                    return boundary
+        day += timedelta(days=1)
+    raise ValueError("No trading session within a year; check MARKET_HOLIDAYS")
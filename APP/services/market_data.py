@@ -0,0 +1,251 @@
+"""
+Live tick feed.
+
+Broker tick sockets (KiteTicker, FyersDataSocket) are normalised into
+:class:`Tick` and published on :data:`tick_bus`; consumers such as the
+candle aggregator subscribe with a plain callable. Handlers run on the
+socket's thread, so they must be quick and must not block.
+
+Symbols to stream come from ``MARKET_DATA_SYMBOLS`` (comma separated,
+"EXCHANGE:SYMBOL" in each broker's own notation) and the broker from
+``MARKET_DATA_BROKER`` (``fyers`` or ``kite``).
+"""
+
+from __future__ import annotations
+
+import logging
+import os
+import threading
+import time
+from dataclasses import dataclass
+from typing import Any, Callable, Dict, List, Optional
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass(slots=True)
+class Tick:
+    symbol: str
+    price: float
+    # Cumulative volume traded today, as both brokers report it
+    volume: float = 0.0
+    timestamp: float = 0.0
+    oi: Optional[float] = None
+
+
+TickHandler = Callable[[Tick], None]
+
+
+class TickBus:
+    """Fan-out of ticks to in-process consumers."""
+
+    def __init__(self) -> None:
+        self._handlers: List[TickHandler] = []
+        self._lock = threading.Lock()
+        self.published = 0
+
+    def subscribe(self, handler: TickHandler) -> None:
+        with self._lock:
+            if handler not in self._handlers:
+                # Copy-on-write: publish iterates without taking the lock
+                self._handlers = self._handlers + [handler]
+
+    def unsubscribe(self, handler: TickHandler) -> None:
+        with self._lock:
+            self._handlers = [h for h in self._handlers if h != handler]
+
+    def publish(self, tick: Tick) -> None:
+        self.published += 1
+        for handler in self._handlers:
+            try:
+                handler(tick)
+            except Exception:
+                logger.exception("Tick handler %r failed for %s", handler, tick.symbol)
+
+
+tick_bus = TickBus()
+
+
+class TickStream:
+    broker = ""
+
+    def __init__(self, symbols: List[str], bus: TickBus = tick_bus) -> None:
+        self.symbols = symbols
+        self.bus = bus
+        self.connected = False
+        self.last_error: Optional[str] = None
+
+    def start(self) -> None:
+        raise NotImplementedError
+
+    def stop(self) -> None:
+        self.connected = False
+
+    def status(self) -> Dict[str, Any]:
+        return {
+            "broker": self.broker,
+            "symbols": len(self.symbols),
+            "connected": self.connected,
+            "last_error": self.last_error,
+        }
+
+
+class FyersTickStream(TickStream):
+    broker = "fyers"
+
+    def __init__(
+        self, app_id: str, access_token: str, symbols: List[str], log_path: str = "", bus: TickBus = tick_bus
+    ) -> None:
+        super().__init__(symbols, bus)
+        self.access_token = f"{app_id}:{access_token}"
+        self.log_path = log_path
+        self._socket: Any = None
+
+    def handle(self, message: Dict[str, Any]) -> None:
+        if "ltp" not in message or "symbol" not in message:
+            return
+        self.bus.publish(
+            Tick(
+                symbol=message["symbol"],
+                price=float(message["ltp"]),
+                volume=float(message.get("vol_traded_today") or 0.0),
+                timestamp=float(message.get("last_traded_time") or time.time()),
+                oi=message.get("OI"),
+            )
+        )
+
+    def start(self) -> None:
+        from fyers_apiv3.FyersWebsocket.data_ws import FyersDataSocket
+
+        def on_connect() -> None:
+            self.connected = True
+            self._socket.subscribe(symbols=self.symbols, data_type="SymbolUpdate")
+
+        def on_error(message: Any) -> None:
+            self.last_error = str(message)
+
+        def on_close(message: Any) -> None:
+            self.connected = False
+
+        self._socket = FyersDataSocket(
+            access_token=self.access_token,
+            log_path=self.log_path or None,
+            litemode=False,
+            write_to_file=False,
+            on_message=self.handle,
+            on_error=on_error,
+            on_connect=on_connect,
+            on_close=on_close,
+        )
+        self._socket.connect()
+
+    def stop(self) -> None:
+        if self._socket is not None:
+            self._socket.close_connection()
+            self._socket = None
+        super().stop()
+
+
+class KiteTickStream(TickStream):
+    broker = "kite"
+
+    def __init__(
+        self, api_key: str, access_token: str, tokens: Dict[int, str], bus: TickBus = tick_bus
+    ) -> None:
+        super().__init__(list(tokens.values()), bus)
+        self.api_key = api_key
+        self.access_token = access_token
+        self.tokens = tokens
+        self._ticker: Any = None
+
+    def handle(self, ticks: List[Dict[str, Any]]) -> None:
+        for raw in ticks:
+            symbol = self.tokens.get(raw.get("instrument_token"))
+            if symbol is None:
+                continue
+            stamp = raw.get("exchange_timestamp") or raw.get("last_trade_time")
+            self.bus.publish(
+                Tick(
+                    symbol=symbol,
+                    price=float(raw["last_price"]),
+                    volume=float(raw.get("volume_traded") or 0.0),
+                    timestamp=stamp.timestamp() if stamp is not None else time.time(),
+                    oi=raw.get("oi"),
+                )
+            )
+
+    def start(self) -> None:
+        from kiteconnect import KiteTicker
+
+        ticker = KiteTicker(self.api_key, self.access_token)
+        tokens = list(self.tokens)
+
+        def on_connect(ws: Any, response: Any) -> None:
+            self.connected = True
+            ws.subscribe(tokens)
+            ws.set_mode(ws.MODE_FULL, tokens)
+
+        def on_close(ws: Any, code: Any, reason: Any) -> None:
+            self.connected = False
+            self.last_error = str(reason)
+
+        ticker.on_ticks = lambda ws, ticks: self.handle(ticks)
+        ticker.on_connect = on_connect
+        ticker.on_close = on_close
+        self._ticker = ticker
+        ticker.connect(threaded=True)
+
+    def stop(self) -> None:
+        if self._ticker is not None:
+            self._ticker.close()
+            self._ticker = None
+        super().stop()
+
+
+_stream: Optional[TickStream] = None
+
+
+def start_tick_stream() -> Optional[TickStream]:
+    """Connect the configured broker's tick socket for ``MARKET_DATA_SYMBOLS``."""
+    global _stream
+    symbols = [s.strip() for s in os.getenv("MARKET_DATA_SYMBOLS", "").split(",") if s.strip()]
+    if not symbols or _stream is not None:
+        return _stream
+    broker = os.getenv("MARKET_DATA_BROKER", "fyers").lower()
+    try:
+        if broker == "kite":
+            from APP.services.kite_service import KiteService
+
+            kite = KiteService()
+            if not kite._initialize_with_stored_token():
+                raise ValueError("No valid Kite access token found.")
+            quotes = kite.kite.ltp(symbols)
+            tokens = {quote["instrument_token"]: symbol for symbol, quote in quotes.items()}
+            stream: TickStream = KiteTickStream(kite.api_key, kite.access_token, tokens)
+        else:
+            from APP.fyersApp.services import FyersService
+
+            fyers = FyersService()
+            session = fyers.get_cached_profile()
+            stream = FyersTickStream(fyers.app_id, session["access_token"], symbols, str(fyers.log_path))
+        _stream = stream
+        stream.start()
+    except Exception as exc:
+        logger.warning("Tick stream (%s) not started: %s", broker, exc)
+        if _stream is not None:
+            _stream.last_error = str(exc)
+    return _stream
+
+
+def stop_tick_stream() -> None:
+    global _stream
+    if _stream is not None:
+        try:
+            _stream.stop()
+        except Exception:
+            logger.exception("Error stopping tick stream")
+        _stream = None
+
+
+def tick_stream_status() -> Optional[Dict[str, Any]]:
+    return _stream.status() if _stream is not None else None
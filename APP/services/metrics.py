@@ -0,0 +1,407 @@
+"""
+In-process latency instrumentation rendered in the Prometheus text format.
+
+Every timer records into a shared registry (scraped via ``/metrics``) and, when
+called inside an HTTP request, into that request's ``Server-Timing`` header.
+"""
+
+from __future__ import annotations
+
+import bisect
+import logging
+import threading
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Any, Callable, Dict, Iterator, List, Optional, Sequence, Tuple
+
+from starlette.datastructures import MutableHeaders
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+DEFAULT_BUCKETS: Tuple[float, ...] = (
+    0.001,
+    0.0025,
+    0.005,
+    0.01,
+    0.025,
+    0.05,
+    0.1,
+    0.25,
+    0.5,
+    1.0,
+    2.5,
+    5.0,
+    10.0,
+)
+
+LabelKey = Tuple[str, ...]
+
+logger = logging.getLogger(__name__)
+
+# (name, duration in seconds) pairs collected for the current request.
+_server_timings: ContextVar[Optional[List[Tuple[str, float]]]] = ContextVar(
+    "server_timings", default=None
+)
+
+
+def _format_labels(labelnames: Sequence[str], values: LabelKey, extra: str = "") -> str:
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(labelnames, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_value(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value))
+
+
+class _Metric:
+    kind = "untyped"
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()) -> None:
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._lock = threading.Lock()
+
+    def _key(self, labels: Dict[str, Any]) -> LabelKey:
+        if set(labels) != set(self.labelnames):
+            raise ValueError(
+                f"{self.name} expects labels {self.labelnames}, got {tuple(labels)}"
+            )
+        return tuple(str(labels[name]) for name in self.labelnames)
+
+    def render(self) -> List[str]:
+        lines = [
+            f"# HELP {self.name} {self.documentation}",
+            f"# TYPE {self.name} {self.kind}",
+        ]
+        lines.extend(self._samples())
+        return lines
+
+    def _samples(self) -> List[str]:
+        raise NotImplementedError
+
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()) -> None:
+        super().__init__(name, documentation, labelnames)
+        self._values: Dict[LabelKey, float] = {}
+
+    def inc(self, amount: float = 1.0, **labels: Any) -> None:
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0.0) + amount
+
+    def bind(self, **labels: Any) -> Callable[[float], None]:
+        """``inc`` for one label set, resolved once; for per-event hot paths."""
+        key = self._key(labels)
+
+        def inc(amount: float = 1.0) -> None:
+            with self._lock:
+                self._values[key] = self._values.get(key, 0.0) + amount
+
+        return inc
+
+    def value(self, **labels: Any) -> float:
+        return self._values.get(self._key(labels), 0.0)
+
+    def _samples(self) -> List[str]:
+        with self._lock:
+            items = list(self._values.items())
+        return [
+            f"{self.name}{_format_labels(self.labelnames, key)} {_format_value(value)}"
+            for key, value in items
+        ]
+
+
+class Gauge(_Metric):
+    kind = "gauge"
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()) -> None:
+        super().__init__(name, documentation, labelnames)
+        self._values: Dict[LabelKey, float] = {}
+        self._callback: Optional[Callable[[], Dict[LabelKey, float]]] = None
+
+    def set(self, value: float, **labels: Any) -> None:
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = value
+
+    def set_function(self, callback: Callable[[], Dict[LabelKey, float]]) -> None:
+        """Compute the gauge at scrape time; callback returns {label values: value}."""
+        self._callback = callback
+
+    def _samples(self) -> List[str]:
+        if self._callback is not None:
+            try:
+                items = list(self._callback().items())
+            except Exception:
+                items = []
+        else:
+            with self._lock:
+                items = list(self._values.items())
+        return [
+            f"{self.name}{_format_labels(self.labelnames, key)} {_format_value(value)}"
+            for key, value in items
+        ]
+
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(
+        self,
+        name: str,
+        documentation: str,
+        labelnames: Sequence[str] = (),
+        buckets: Sequence[float] = DEFAULT_BUCKETS,
+    ) -> None:
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets))
+        # Per label set: [bucket counts..., +Inf count], sum
+        self._counts: Dict[LabelKey, List[int]] = {}
+        self._sums: Dict[LabelKey, float] = {}
+
+    def observe(self, value: float, **labels: Any) -> None:
+        key = self._key(labels)
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            counts = self._counts.get(key)
+            if counts is None:
+                counts = self._counts[key] = [0] * (len(self.buckets) + 1)
+                self._sums[key] = 0.0
+            counts[index] += 1
+            self._sums[key] += value
+
+    def count(self, **labels: Any) -> int:
+        return sum(self._counts.get(self._key(labels), ()))
+
+    def _samples(self) -> List[str]:
+        with self._lock:
+            snapshot = [(key, list(counts), self._sums[key]) for key, counts in self._counts.items()]
+        lines: List[str] = []
+        for key, counts, total in snapshot:
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float("inf"),), counts):
+                cumulative += count
+                le = f'le="{_format_value(bound)}"'
+                lines.append(
+                    f"{self.name}_bucket{_format_labels(self.labelnames, key, le)} {cumulative}"
+                )
+            lines.append(f"{self.name}_sum{_format_labels(self.labelnames, key)} {_format_value(total)}")
+            lines.append(f"{self.name}_count{_format_labels(self.labelnames, key)} {cumulative}")
+        return lines
+
+
+class MetricsRegistry:
+    """Get-or-create store for metrics, rendered together on scrape."""
+
+    def __init__(self) -> None:
+        self._metrics: Dict[str, _Metric] = {}
+        self._lock = threading.Lock()
+
+    def _get_or_create(self, cls: type, name: str, *args: Any, **kwargs: Any) -> Any:
+        with self._lock:
+            metric = self._metrics.get(name)
+            if metric is None:
+                metric = self._metrics[name] = cls(name, *args, **kwargs)
+            elif not isinstance(metric, cls):
+                raise ValueError(f"Metric {name} already registered as {metric.kind}")
+            return metric
+
+    def counter(self, name: str, documentation: str, labelnames: Sequence[str] = ()) -> Counter:
+        return self._get_or_create(Counter, name, documentation, labelnames)
+
+    def gauge(self, name: str, documentation: str, labelnames: Sequence[str] = ()) -> Gauge:
+        return self._get_or_create(Gauge, name, documentation, labelnames)
+
+    def histogram(
+        self,
+        name: str,
+        documentation: str,
+        labelnames: Sequence[str] = (),
+        buckets: Sequence[float] = DEFAULT_BUCKETS,
+    ) -> Histogram:
+        return self._get_or_create(Histogram, name, documentation, labelnames, buckets=buckets)
+
+    def render(self) -> str:
+        with self._lock:
+            metrics = list(self._metrics.values())
+        lines: List[str] = []
+        for metric in metrics:
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+
+registry = MetricsRegistry()
+
+HTTP_REQUEST_SECONDS = registry.histogram(
+    "algonova_http_request_duration_seconds",
+    "Time spent serving HTTP requests, by route template.",
+    ("method", "route", "status"),
+)
+UPSTREAM_CALL_SECONDS = registry.histogram(
+    "algonova_upstream_call_duration_seconds",
+    "Latency of calls to broker APIs.",
+    ("service", "operation", "outcome"),
+)
+DB_QUERY_SECONDS = registry.histogram(
+    "algonova_db_query_duration_seconds",
+    "Latency of database queries.",
+    ("query", "outcome"),
+)
+CACHE_LOOKUPS = registry.counter(
+    "algonova_cache_lookups_total",
+    "Cache lookups by cache name and result (hit/miss).",
+    ("cache", "result"),
+)
+CACHE_HIT_RATIO = registry.gauge(
+    "algonova_cache_hit_ratio",
+    "Fraction of lookups served from cache since process start.",
+    ("cache",),
+)
+EXECUTOR_QUEUE_DEPTH = registry.gauge(
+    "algonova_executor_queue_depth",
+    "Tasks waiting for a worker thread in the default threadpool.",
+)
+EXECUTOR_ACTIVE_THREADS = registry.gauge(
+    "algonova_executor_active_threads",
+    "Worker threads currently borrowed from the default threadpool.",
+)
+
+
+def _cache_hit_ratios() -> Dict[LabelKey, float]:
+    totals: Dict[str, List[float]] = {}
+    with CACHE_LOOKUPS._lock:
+        items = list(CACHE_LOOKUPS._values.items())
+    for (cache, result), value in items:
+        hits_and_total = totals.setdefault(cache, [0.0, 0.0])
+        if result == "hit":
+            hits_and_total[0] += value
+        hits_and_total[1] += value
+    return {(cache,): hits / total for cache, (hits, total) in totals.items() if total}
+
+
+def _threadpool_statistics() -> Any:
+    # Only meaningful inside the event loop, which is where /metrics renders.
+    from anyio import to_thread
+
+    return to_thread.current_default_thread_limiter().statistics()
+
+
+CACHE_HIT_RATIO.set_function(_cache_hit_ratios)
+EXECUTOR_QUEUE_DEPTH.set_function(lambda: {(): float(_threadpool_statistics().tasks_waiting)})
+EXECUTOR_ACTIVE_THREADS.set_function(
+    lambda: {(): float(_threadpool_statistics().borrowed_tokens)}
+)
+
+
+def _add_server_timing(name: str, seconds: float) -> None:
+    timings = _server_timings.get()
+    if timings is not None:
+        timings.append((name, seconds))
+
+
+@contextmanager
+def time_upstream(service: str, operation: str) -> Iterator[None]:
+    """Time a broker API call, e.g. ``time_upstream("fyers", "optionchain")``."""
+    outcome = "error"
+    start = time.perf_counter()
+    try:
+        yield
+        outcome = "ok"
+    finally:
+        elapsed = time.perf_counter() - start
+        UPSTREAM_CALL_SECONDS.observe(
+            elapsed, service=service, operation=operation, outcome=outcome
+        )
+        logger.debug(
+            "%s.%s %s",
+            service,
+            operation,
+            outcome,
+            extra={"upstream": f"{service}.{operation}", "latency_ms": round(elapsed * 1000, 3)},
+        )
+        _add_server_timing(f"{service}-{operation}", elapsed)
+
+
+@contextmanager
+def time_db_query(query: str) -> Iterator[None]:
+    """Time a database round-trip under a short, static query name."""
+    outcome = "error"
+    start = time.perf_counter()
+    try:
+        yield
+        outcome = "ok"
+    finally:
+        elapsed = time.perf_counter() - start
+        DB_QUERY_SECONDS.observe(elapsed, query=query, outcome=outcome)
+        _add_server_timing(f"db-{query}", elapsed)
+
+
+def record_cache_lookup(cache: str, hit: bool) -> None:
+    CACHE_LOOKUPS.inc(cache=cache, result="hit" if hit else "miss")
+
+
+def route_template(scope: Dict[str, Any]) -> str:
+    """Return the matched route template (e.g. ``/api/orders/{order_id}``) for labels."""
+    # FastAPI releases that keep included routers nested put the router-relative route in
+    # ``scope["route"]`` and the prefixed one in their effective route context
+    route = (scope.get("fastapi") or {}).get("effective_route_context") or scope.get("route")
+    template = getattr(route, "path_format", None) or getattr(route, "path", None)
+    return template if template is not None else "unmatched"
+
+
+def _render_server_timing(timings: List[Tuple[str, float]], total: float) -> str:
+    entries = [f"{name};dur={seconds * 1000:.2f}" for name, seconds in timings]
+    entries.append(f"app;dur={total * 1000:.2f}")
+    return ", ".join(entries)
+
+
+class MetricsMiddleware:
+    """ASGI middleware timing each request and emitting a ``Server-Timing`` header."""
+
+    def __init__(self, app: Any) -> None:
+        self.app = app
+
+    async def __call__(self, scope: Dict[str, Any], receive: Any, send: Any) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        timings: List[Tuple[str, float]] = []
+        token = _server_timings.set(timings)
+        start = time.perf_counter()
+        status_code = 500
+
+        async def send_with_timing(message: Dict[str, Any]) -> None:
+            nonlocal status_code
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+                headers = MutableHeaders(scope=message)
+                headers.append(
+                    "Server-Timing",
+                    _render_server_timing(timings, time.perf_counter() - start),
+                )
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_timing)
+        finally:
+            _server_timings.reset(token)
+            HTTP_REQUEST_SECONDS.observe(
+                time.perf_counter() - start,
+                method=scope.get("method", ""),
+                route=route_template(scope),
+                status=str(status_code),
+            )
@@ -0,0 +1,382 @@
+"""
+Parallel parameter optimisation for the backtestable strategies.
+
+A run evaluates many parameter sets of one strategy (:mod:`APP.services.backtest`)
+across a process pool (``OPTIMIZER_WORKERS``, default: CPU count). The bars
+are written once to a ``.npy`` file under ``OPTIMIZER_DATA_DIR`` and each
+worker maps it read-only (``np.load(mmap_mode="r")``), so only the file path
+and a small parameter dict cross the process boundary per task, and the OS
+page cache shares one copy of the data across all workers.
+
+Searches:
+
+* ``grid``    - every combination of the candidate values
+* ``random``  - ``samples`` draws; a list is sampled from, a ``{"min", "max"}``
+  range is sampled uniformly (integers if both bounds are)
+* ``halving`` - successive halving: random candidates are scored on the
+  first ``1/eta**k`` of the bars, the best ``1/eta`` go on to more data, and
+  only the finalists see the full history
+
+Workers are started with the ``spawn`` method: forking the API process would
+copy its threads' locks mid-flight. Every finished evaluation is published to
+the run's subscribers (the ``/api/optimizer/runs/{id}/ws`` WebSocket).
+"""
+
+from __future__ import annotations
+
+import asyncio
+import itertools
+import logging
+import math
+import multiprocessing
+import os
+import random
+import tempfile
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from concurrent.futures import FIRST_COMPLETED, Future, ProcessPoolExecutor, wait
+from dataclasses import dataclass, field
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+import numpy as np
+
+from APP.services.backtest import OBJECTIVES, get_strategy, run_backtest
+
+logger = logging.getLogger(__name__)
+
+SEARCHES = ("grid", "random", "halving")
+
+# Run states
+RUNNING = "RUNNING"
+COMPLETED = "COMPLETED"
+FAILED = "FAILED"
+CANCELLED = "CANCELLED"
+
+# Set in each worker by _init_worker
+_worker_bars: Optional[np.ndarray] = None
+
+
+def _init_worker(path: str) -> None:
+    global _worker_bars
+    _worker_bars = np.load(path, mmap_mode="r")
+
+
+def _evaluate(strategy: str, params: Dict[str, Any], bars: int, cost: float) -> Dict[str, Any]:
+    """Worker task: backtest ``params`` on the first ``bars`` rows of the mapped data."""
+    data = _worker_bars[:bars]
+    try:
+        metrics = run_backtest(strategy, data[:, 0], data[:, 1:], params, cost)
+    except ValueError as exc:
+        return {"params": params, "bars": bars, "error": str(exc)}
+    return {"params": params, "bars": bars, "metrics": metrics}
+
+
+def write_bars(timestamps: np.ndarray, ohlcv: np.ndarray, directory: Path) -> Path:
+    """Store bars as one ``(n, 6)`` float64 array for workers to memory-map."""
+    directory.mkdir(parents=True, exist_ok=True)
+    path = directory / f"bars-{uuid.uuid4().hex}.npy"
+    data = np.empty((len(timestamps), 6), dtype=np.float64)
+    data[:, 0] = timestamps
+    data[:, 1:] = ohlcv
+    np.save(path, data)
+    return path
+
+
+def grid_candidates(space: Dict[str, List[Any]]) -> List[Dict[str, Any]]:
+    names = list(space)
+    for name in names:
+        if not isinstance(space[name], list) or not space[name]:
+            raise ValueError(f"Grid search needs a non-empty list of values for {name!r}")
+    return [dict(zip(names, values)) for values in itertools.product(*(space[name] for name in names))]
+
+
+def random_candidates(
+    space: Dict[str, Any], samples: int, seed: Optional[int] = None
+) -> List[Dict[str, Any]]:
+    rng = random.Random(seed)
+    candidates: List[Dict[str, Any]] = []
+    seen = set()
+    # Discrete spaces can be smaller than the sample count
+    for _ in range(samples * 10):
+        if len(candidates) >= samples:
+            break
+        params = {name: _draw(rng, name, domain) for name, domain in space.items()}
+        key = tuple(sorted(params.items()))
+        if key not in seen:
+            seen.add(key)
+            candidates.append(params)
+    return candidates
+
+
+def _draw(rng: random.Random, name: str, domain: Any) -> Any:
+    if isinstance(domain, list) and domain:
+        return rng.choice(domain)
+    if isinstance(domain, dict) and "min" in domain and "max" in domain:
+        low, high = domain["min"], domain["max"]
+        if isinstance(low, int) and isinstance(high, int):
+            return rng.randint(low, high)
+        return round(rng.uniform(float(low), float(high)), 6)
+    raise ValueError(f"Parameter {name!r} must be a list of values or a {{'min', 'max'}} range")
+
+
+@dataclass
+class OptimizationRun:
+    run_id: str
+    strategy: str
+    search: str
+    objective: str
+    total: int
+    status: str = RUNNING
+    completed: int = 0
+    results: List[Dict[str, Any]] = field(default_factory=list)
+    best: Optional[Dict[str, Any]] = None
+    error: Optional[str] = None
+    started_at: datetime = field(default_factory=lambda: datetime.now(timezone.utc))
+    elapsed: float = 0.0
+    cancelled: threading.Event = field(default_factory=threading.Event, repr=False)
+
+    def score(self, result: Dict[str, Any]) -> float:
+        metrics = result.get("metrics")
+        return metrics[self.objective] if metrics else -math.inf
+
+    def leaders(self, top: int = 10) -> List[Dict[str, Any]]:
+        # Halving re-scores survivors on more data; rank each set by its latest result
+        latest: Dict[Tuple[Any, ...], Dict[str, Any]] = {}
+        for result in self.results:
+            latest[tuple(sorted(result["params"].items()))] = result
+        return sorted(latest.values(), key=self.score, reverse=True)[:top]
+
+    def as_dict(self, top: int = 10) -> Dict[str, Any]:
+        return {
+            "run_id": self.run_id,
+            "strategy": self.strategy,
+            "search": self.search,
+            "objective": self.objective,
+            "status": self.status,
+            "total": self.total,
+            "completed": self.completed,
+            "best": self.best,
+            "top": self.leaders(top),
+            "error": self.error,
+            "started_at": self.started_at.isoformat(),
+            "elapsed": round(self.elapsed, 3),
+        }
+
+
+Subscriber = Tuple[asyncio.AbstractEventLoop, "asyncio.Queue[Dict[str, Any]]"]
+
+
+class Optimizer:
+    """Starts runs on a background thread each; results stream to subscribers as they finish."""
+
+    def __init__(
+        self,
+        max_workers: Optional[int] = None,
+        data_dir: Optional[Path] = None,
+        start_method: Optional[str] = None,
+        history: int = 32,
+    ) -> None:
+        configured = int(os.getenv("OPTIMIZER_WORKERS", "0") or 0)
+        self.max_workers = max_workers or configured or os.cpu_count() or 1
+        self.data_dir = data_dir or Path(
+            os.getenv("OPTIMIZER_DATA_DIR") or Path(tempfile.gettempdir()) / "algonova-optimizer"
+        )
+        self.start_method = start_method or os.getenv("OPTIMIZER_START_METHOD", "spawn")
+        self._runs: "OrderedDict[str, OptimizationRun]" = OrderedDict()
+        self._subscribers: Dict[str, List[Subscriber]] = {}
+        self._history = history
+        self._lock = threading.Lock()
+
+    # -- runs ----------------------------------------------------------------
+
+    def start(
+        self,
+        strategy: str,
+        timestamps: np.ndarray,
+        ohlcv: np.ndarray,
+        search: str = "grid",
+        space: Optional[Dict[str, Any]] = None,
+        samples: int = 50,
+        objective: str = "sharpe",
+        cost: float = 0.0002,
+        eta: int = 3,
+        min_bars: int = 500,
+        seed: Optional[int] = None,
+        workers: Optional[int] = None,
+    ) -> OptimizationRun:
+        """Validate the request and start it in the background; raises ValueError on bad input."""
+        spec = get_strategy(strategy)
+        if search not in SEARCHES:
+            raise ValueError(f"search must be one of {', '.join(SEARCHES)}")
+        if objective not in OBJECTIVES:
+            raise ValueError(f"objective must be one of {', '.join(OBJECTIVES)}")
+        if len(timestamps) < 2:
+            raise ValueError("Not enough bars to optimise over")
+        space = space or spec.space
+        unknown = set(space) - set(spec.space)
+        if unknown:
+            raise ValueError(f"Unknown parameters for {strategy}: {', '.join(sorted(unknown))}")
+        if search == "grid":
+            candidates = grid_candidates(space)
+        else:
+            candidates = random_candidates(space, max(1, samples), seed)
+        if not candidates:
+            raise ValueError("Search space produced no parameter sets")
+
+        schedule = self._schedule(search, len(candidates), len(timestamps), eta, min_bars)
+        run = OptimizationRun(
+            run_id=uuid.uuid4().hex[:12],
+            strategy=strategy,
+            search=search,
+            objective=objective,
+            total=sum(count for count, _ in schedule),
+        )
+        path = write_bars(timestamps, ohlcv, self.data_dir)
+        self._remember(run)
+        thread = threading.Thread(
+            target=self._drive,
+            args=(run, candidates, schedule, path, cost, workers or self.max_workers),
+            name=f"optimizer-{run.run_id}",
+            daemon=True,
+        )
+        thread.start()
+        return run
+
+    @staticmethod
+    def _schedule(search: str, candidates: int, bars: int, eta: int, min_bars: int) -> List[Tuple[int, int]]:
+        """``[(parameter sets, bars)]`` per round; one round unless halving."""
+        if search != "halving" or candidates <= 1:
+            return [(candidates, bars)]
+        eta = max(2, eta)
+        rounds = 1
+        # Another round needs enough candidates to cut and enough bars for the shortest prefix
+        while eta ** rounds <= candidates and bars // eta ** rounds >= min_bars:
+            rounds += 1
+        return [
+            (math.ceil(candidates / eta ** index), max(2, bars // eta ** (rounds - 1 - index)))
+            for index in range(rounds)
+        ]
+
+    def _drive(
+        self,
+        run: OptimizationRun,
+        candidates: List[Dict[str, Any]],
+        schedule: List[Tuple[int, int]],
+        path: Path,
+        cost: float,
+        workers: int,
+    ) -> None:
+        started = time.perf_counter()
+        context = multiprocessing.get_context(self.start_method)
+        try:
+            with ProcessPoolExecutor(
+                max_workers=workers, mp_context=context, initializer=_init_worker, initargs=(str(path),)
+            ) as pool:
+                for index, (count, bars) in enumerate(schedule):
+                    finished = self._round(run, pool, candidates[:count], bars, cost)
+                    if run.cancelled.is_set():
+                        break
+                    if index + 1 < len(schedule):
+                        # Survivors for the next round, best first
+                        finished.sort(key=run.score, reverse=True)
+                        candidates = [result["params"] for result in finished]
+            run.status = CANCELLED if run.cancelled.is_set() else COMPLETED
+        except Exception as exc:
+            logger.exception("Optimisation run %s failed", run.run_id)
+            run.status = FAILED
+            run.error = str(exc)
+        finally:
+            run.elapsed = time.perf_counter() - started
+            path.unlink(missing_ok=True)
+            self._publish(run.run_id, {"type": "status", "data": run.as_dict()})
+
+    def _round(
+        self,
+        run: OptimizationRun,
+        pool: ProcessPoolExecutor,
+        candidates: Iterable[Dict[str, Any]],
+        bars: int,
+        cost: float,
+    ) -> List[Dict[str, Any]]:
+        pending = {pool.submit(_evaluate, run.strategy, params, bars, cost) for params in candidates}
+        finished: List[Dict[str, Any]] = []
+        while pending:
+            done, pending = wait(pending, timeout=0.5, return_when=FIRST_COMPLETED)
+            if run.cancelled.is_set():
+                for future in pending:
+                    future.cancel()
+                break
+            for future in done:
+                self._record(run, future, finished)
+        return finished
+
+    def _record(self, run: OptimizationRun, future: Future, finished: List[Dict[str, Any]]) -> None:
+        result = future.result()
+        run.results.append(result)
+        run.completed += 1
+        if "metrics" in result:
+            finished.append(result)
+            # Halving scores early rounds on a prefix of the bars; results on more data win
+            best = run.best
+            if best is None or result["bars"] > best["bars"] or (
+                result["bars"] == best["bars"] and run.score(result) > run.score(best)
+            ):
+                run.best = result
+        self._publish(
+            run.run_id, {"type": "result", "data": result, "completed": run.completed, "total": run.total}
+        )
+
+    def cancel(self, run_id: str) -> Optional[OptimizationRun]:
+        run = self._runs.get(run_id)
+        if run is not None and run.status == RUNNING:
+            run.cancelled.set()
+        return run
+
+    def get(self, run_id: str) -> Optional[OptimizationRun]:
+        return self._runs.get(run_id)
+
+    def runs(self) -> List[OptimizationRun]:
+        return list(self._runs.values())
+
+    def _remember(self, run: OptimizationRun) -> None:
+        with self._lock:
+            self._runs[run.run_id] = run
+            while len(self._runs) > self._history:
+                old_id, old = next(iter(self._runs.items()))
+                if old.status == RUNNING:
+                    break
+                self._runs.pop(old_id)
+                self._subscribers.pop(old_id, None)
+
+    # -- subscribers ---------------------------------------------------------
+
+    def subscribe(self, run_id: str) -> "asyncio.Queue[Dict[str, Any]]":
+        """Register a queue on the running loop; must be called from async code."""
+        queue: "asyncio.Queue[Dict[str, Any]]" = asyncio.Queue(1000)
+        with self._lock:
+            self._subscribers.setdefault(run_id, []).append((asyncio.get_running_loop(), queue))
+        return queue
+
+    def unsubscribe(self, run_id: str, queue: "asyncio.Queue[Dict[str, Any]]") -> None:
+        with self._lock:
+            entries = self._subscribers.get(run_id, [])
+            self._subscribers[run_id] = [entry for entry in entries if entry[1] is not queue]
+
+    def _publish(self, run_id: str, event: Dict[str, Any]) -> None:
+        with self._lock:
+            subscribers = list(self._subscribers.get(run_id, ()))
+        for loop, queue in subscribers:
+            loop.call_soon_threadsafe(_offer, queue, event)
+
+
+def _offer(queue: "asyncio.Queue[Dict[str, Any]]", event: Dict[str, Any]) -> None:
+    if queue.full():
+        queue.get_nowait()
+    queue.put_nowait(event)
+
+
+optimizer = Optimizer()
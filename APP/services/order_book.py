@@ -0,0 +1,457 @@
+"""
+In-memory order book fed by broker order-update streams.
+
+Kite (postbacks / ``KiteTicker.on_order_update``) and Fyers (order socket)
+updates are normalised into :class:`OrderUpdate` and applied here, so order
+state is read from memory instead of polling the broker per order. Orders are
+indexed by order ID and by strategy (the order tag).
+
+Each order remembers the session user that placed it (``user``; None for the
+legacy single-user session). Listings filter on it, and new fills are applied
+to that user's risk engine positions. Every change is fanned out to
+subscribers (the ``/api/orders/ws`` WebSocket), which filter by user too.
+Status and fill changes of live orders are written behind to their
+``orders`` row (see :func:`track_new_order`).
+"""
+
+from __future__ import annotations
+
+import asyncio
+import copy
+import logging
+import threading
+from dataclasses import dataclass, field, fields
+from datetime import datetime, timezone
+from typing import Any, Callable, Dict, Iterable, List, Optional, Set, Tuple
+
+from APP.services.metrics import registry
+from APP.services.sessions import current_user, use_user
+
+logger = logging.getLogger(__name__)
+
+ORDER_UPDATES = registry.counter(
+    "algonova_order_updates_total",
+    "Order updates received from broker streams",
+    ("broker", "outcome"),
+)
+# ORDER_UPDATES.inc per (broker, outcome), label lookup done once
+_update_counters: Dict[Tuple[str, str], Callable[[float], None]] = {}
+
+
+def _count_updates(key: Tuple[str, str], count: int) -> None:
+    inc = _update_counters.get(key)
+    if inc is None:
+        inc = _update_counters.setdefault(key, ORDER_UPDATES.bind(broker=key[0], outcome=key[1]))
+    inc(count)
+
+
+# Statuses from the orders table schema
+PENDING = "PENDING"
+OPEN = "OPEN"
+COMPLETE = "COMPLETE"
+CANCELLED = "CANCELLED"
+REJECTED = "REJECTED"
+TERMINAL = frozenset({COMPLETE, CANCELLED, REJECTED})
+
+# ``user`` filter matching every owner; never a valid user ID
+ALL_USERS = "*"
+
+_KITE_STATUS = {
+    "COMPLETE": COMPLETE,
+    "CANCELLED": CANCELLED,
+    "REJECTED": REJECTED,
+    "OPEN": OPEN,
+    "UPDATE": OPEN,
+    "TRIGGER PENDING": OPEN,
+    "MODIFIED": OPEN,
+}
+# https://myapi.fyers.in/docsv3 - order status codes
+_FYERS_STATUS = {1: CANCELLED, 2: COMPLETE, 4: PENDING, 5: REJECTED, 6: OPEN, 7: CANCELLED}
+
+
+@dataclass
+class OrderUpdate:
+    broker: str
+    order_id: str
+    status: str
+    symbol: str = ""
+    side: str = ""
+    quantity: int = 0
+    filled_quantity: int = 0
+    average_price: float = 0.0
+    price: Optional[float] = None
+    strategy: Optional[str] = None
+    message: Optional[str] = None
+    timestamp: Optional[str] = None
+    user: Optional[str] = None
+
+
+@dataclass(slots=True)
+class OrderState:
+    broker: str
+    order_id: str
+    status: str
+    symbol: str
+    side: str
+    quantity: int
+    filled_quantity: int = 0
+    average_price: float = 0.0
+    price: Optional[float] = None
+    strategy: Optional[str] = None
+    message: Optional[str] = None
+    user: Optional[str] = None
+    version: int = 0
+    updated_at: datetime = field(default_factory=lambda: datetime.now(timezone.utc))
+
+    def as_dict(self) -> Dict[str, Any]:
+        # Shallow on purpose: every field is a scalar, and asdict's deep copy dominated apply()
+        data = {name: getattr(self, name) for name in _STATE_FIELDS}
+        data["updated_at"] = self.updated_at.isoformat()
+        return data
+
+
+_STATE_FIELDS = tuple(item.name for item in fields(OrderState))
+
+
+def kite_update(payload: Dict[str, Any]) -> OrderUpdate:
+    """Normalise a Kite postback / ticker order update."""
+    raw_status = str(payload.get("status") or "").upper()
+    status = _KITE_STATUS.get(raw_status, PENDING)
+    exchange = payload.get("exchange")
+    symbol = payload.get("tradingsymbol") or ""
+    return OrderUpdate(
+        broker="kite",
+        order_id=str(payload["order_id"]),
+        status=status,
+        symbol=f"{exchange}:{symbol}" if exchange and symbol else symbol,
+        side=str(payload.get("transaction_type") or "").upper(),
+        quantity=int(payload.get("quantity") or 0),
+        filled_quantity=int(payload.get("filled_quantity") or 0),
+        average_price=float(payload.get("average_price") or 0.0),
+        price=payload.get("price"),
+        strategy=payload.get("tag"),
+        message=payload.get("status_message"),
+        timestamp=payload.get("exchange_update_timestamp") or payload.get("order_timestamp"),
+    )
+
+
+def fyers_update(message: Dict[str, Any]) -> OrderUpdate:
+    """Normalise a parsed ``FyersOrderSocket`` ``on_orders`` message."""
+    order = message.get("orders", message)
+    side = order.get("side")
+    return OrderUpdate(
+        broker="fyers",
+        order_id=str(order["id"]),
+        status=_FYERS_STATUS.get(int(order.get("status") or 4), PENDING),
+        symbol=order.get("symbol") or "",
+        side="BUY" if side == 1 else "SELL" if side == -1 else "",
+        quantity=int(order.get("qty") or 0),
+        filled_quantity=int(order.get("filledQty") or 0),
+        average_price=float(order.get("tradedPrice") or 0.0),
+        price=order.get("limitPrice"),
+        strategy=order.get("orderTag"),
+        message=order.get("message"),
+        timestamp=order.get("orderDateTime"),
+    )
+
+
+Subscriber = Tuple[asyncio.AbstractEventLoop, "asyncio.Queue[Dict[str, Any]]"]
+
+
+class OrderBook:
+    """Thread-safe order state keyed by order ID, with a per-strategy index."""
+
+    def __init__(
+        self,
+        on_fill: Optional[Callable[[str, str, int, float], None]] = None,
+        subscriber_queue_size: int = 1000,
+        on_change: Optional[Callable[[OrderState], None]] = None,
+    ) -> None:
+        self.on_fill = on_fill
+        # Called with a copy of an order already in the book whose status or fill changed
+        self.on_change = on_change
+        self.subscriber_queue_size = subscriber_queue_size
+        self._orders: Dict[str, OrderState] = {}
+        self._by_strategy: Dict[str, Set[str]] = {}
+        self._subscribers: List[Subscriber] = []
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self._orders)
+
+    def apply(self, update: OrderUpdate) -> Optional[OrderState]:
+        """Apply ``update``; returns the new state, or None if it was stale or a duplicate."""
+        applied = self.apply_many((update,))
+        return applied[0] if applied else None
+
+    def apply_many(self, updates: Iterable[OrderUpdate]) -> List[OrderState]:
+        """
+        Apply ``updates`` in order under one lock; returns the states that changed.
+
+        For high-rate sources (the paper matching engine reports every order a
+        submit or tick touched at once): the lock, clock read and metric
+        updates are paid per batch instead of per update.
+        """
+        applied: List[OrderState] = []
+        fills: List[Tuple[OrderState, Tuple[str, str, int, float]]] = []
+        changes: List[OrderState] = []
+        events: List[Dict[str, Any]] = []
+        outcomes: Dict[Tuple[str, str], int] = {}
+        with self._lock:
+            now = datetime.now(timezone.utc)
+            subscribers = list(self._subscribers)
+            for update in updates:
+                state = self._apply_locked(update, now, outcomes, fills, changes)
+                if state is None:
+                    continue
+                key = (update.broker, "applied")
+                outcomes[key] = outcomes.get(key, 0) + 1
+                applied.append(state)
+                if subscribers:
+                    # Only serialised when someone is listening
+                    events.append({"type": "order", "data": state.as_dict()})
+
+        for key, count in outcomes.items():
+            _count_updates(key, count)
+        if fills and self.on_fill is not None:
+            caller = current_user()
+            for state, fill in fills:
+                try:
+                    if state.user == caller:
+                        self.on_fill(*fill)
+                    else:
+                        with use_user(state.user):
+                            self.on_fill(*fill)
+                except Exception:
+                    logger.exception("Could not apply fill for order %s", state.order_id)
+        for changed_state in changes:
+            try:
+                self.on_change(changed_state)
+            except Exception:
+                logger.exception("Could not record the change to order %s", changed_state.order_id)
+        for event in events:
+            for loop, queue in subscribers:
+                loop.call_soon_threadsafe(_offer, queue, event)
+        return applied
+
+    def _apply_locked(
+        self,
+        update: OrderUpdate,
+        now: datetime,
+        outcomes: Dict[Tuple[str, str], int],
+        fills: List[Tuple[OrderState, Tuple[str, str, int, float]]],
+        changes: List[OrderState],
+    ) -> Optional[OrderState]:
+        """Apply one update with the lock held; stale and duplicate ones are only counted in ``outcomes``."""
+        state = self._orders.get(update.order_id)
+        status_changed = False
+        if state is None:
+            state = OrderState(
+                update.broker,
+                update.order_id,
+                update.status,
+                update.symbol,
+                update.side,
+                update.quantity,
+                0,
+                0.0,
+                update.price,
+                update.strategy,
+                update.message,
+                update.user,
+                0,
+                now,
+            )
+            self._orders[update.order_id] = state
+            if state.strategy:
+                self._by_strategy.setdefault(state.strategy, set()).add(state.order_id)
+            known = False
+        else:
+            if update.user is not None and state.user is None:
+                # A stream update beat the placing request's registration to the book
+                state.user = update.user
+            # Streams can replay or reorder; fills only move forward and terminal states stick
+            if (
+                update.filled_quantity < state.filled_quantity
+                or (state.status in TERMINAL and update.filled_quantity == state.filled_quantity)
+                or (update.status == PENDING and state.status != PENDING)
+            ):
+                key = (update.broker, "stale")
+                outcomes[key] = outcomes.get(key, 0) + 1
+                return None
+            if (
+                update.status == state.status
+                and update.filled_quantity == state.filled_quantity
+                and update.message == state.message
+            ):
+                key = (update.broker, "duplicate")
+                outcomes[key] = outcomes.get(key, 0) + 1
+                return None
+            status_changed = update.status != state.status
+            state.status = update.status
+            # Only what the update carries; the order's fixed fields are already set
+            if update.symbol:
+                state.symbol = update.symbol
+            if update.side:
+                state.side = update.side
+            if update.quantity:
+                state.quantity = update.quantity
+            if update.price is not None:
+                state.price = update.price
+            state.message = update.message
+            if update.strategy and not state.strategy:
+                state.strategy = update.strategy
+                self._by_strategy.setdefault(update.strategy, set()).add(state.order_id)
+            known = True
+
+        filled = update.filled_quantity - state.filled_quantity
+        if filled > 0:
+            # Price of just this fill, from the change in filled value
+            value = update.average_price * update.filled_quantity
+            previous = state.average_price * state.filled_quantity
+            fills.append((state, (state.symbol, state.side, filled, (value - previous) / filled)))
+            state.filled_quantity = update.filled_quantity
+            state.average_price = update.average_price
+        state.version += 1
+        state.updated_at = now
+        if known and self.on_change is not None and (status_changed or filled > 0):
+            changes.append(copy.copy(state))
+        return state
+
+    def get(self, order_id: str) -> Optional[OrderState]:
+        return self._orders.get(order_id)
+
+    def orders(self, strategy: Optional[str] = None, user: Optional[str] = ALL_USERS) -> List[OrderState]:
+        """Orders, optionally of one strategy and of one session user (None: the legacy session)."""
+        with self._lock:
+            if strategy is None:
+                states = list(self._orders.values())
+            else:
+                states = [self._orders[order_id] for order_id in self._by_strategy.get(strategy, ())]
+        if user == ALL_USERS:
+            return states
+        return [state for state in states if state.user == user]
+
+    def snapshot(
+        self, strategy: Optional[str] = None, user: Optional[str] = ALL_USERS
+    ) -> List[Dict[str, Any]]:
+        return [state.as_dict() for state in self.orders(strategy, user)]
+
+    def clear(self) -> None:
+        with self._lock:
+            self._orders.clear()
+            self._by_strategy.clear()
+
+    # -- subscribers ---------------------------------------------------------
+
+    def subscribe(self) -> "asyncio.Queue[Dict[str, Any]]":
+        """Register a queue on the running loop; must be called from async code."""
+        queue: "asyncio.Queue[Dict[str, Any]]" = asyncio.Queue(self.subscriber_queue_size)
+        with self._lock:
+            self._subscribers.append((asyncio.get_running_loop(), queue))
+        return queue
+
+    def unsubscribe(self, queue: "asyncio.Queue[Dict[str, Any]]") -> None:
+        with self._lock:
+            self._subscribers = [entry for entry in self._subscribers if entry[1] is not queue]
+
+
+def _offer(queue: "asyncio.Queue[Dict[str, Any]]", event: Dict[str, Any]) -> None:
+    """Queue ``event``; a slow client loses its oldest events, not the stream."""
+    if queue.full():
+        queue.get_nowait()
+    queue.put_nowait(event)
+
+
+def track_new_order(
+    broker: str,
+    order_id: str,
+    *,
+    symbol: str,
+    side: str,
+    quantity: int,
+    order_type: str,
+    product: str,
+    validity: str,
+    price: Optional[float],
+    tag: Optional[str],
+    user_id: int,
+    session_user: Optional[str] = None,
+) -> None:
+    """
+    Register an order the broker just accepted: PENDING in the book (later
+    state arrives from the update streams) and an ``orders`` row written behind,
+    both owned by ``session_user``. Later changes reach the row through
+    :func:`_record_change`.
+    """
+    from APP.services import write_behind
+
+    order_book.apply(
+        OrderUpdate(
+            broker=broker,
+            order_id=order_id,
+            status=PENDING,
+            symbol=symbol,
+            side=side,
+            quantity=quantity,
+            price=price,
+            strategy=tag,
+            user=session_user,
+        )
+    )
+    # A stream update may have reached the book first; the row starts from the latest state
+    state = order_book.get(order_id)
+    try:
+        write_behind.submit(
+            "orders",
+            {
+                "user_id": user_id,
+                "session_user": session_user,
+                "order_id": order_id,
+                "instrument_token": symbol,
+                "transaction_type": side,
+                "order_type": order_type,
+                "product_type": product,
+                "validity": validity,
+                "quantity": quantity,
+                "price": price,
+                "status": state.status if state is not None else PENDING,
+                "filled_quantity": state.filled_quantity if state is not None else 0,
+                "average_price": state.average_price if state is not None else None,
+                "placed_at": datetime.now(timezone.utc),
+            },
+        )
+    except write_behind.BufferFull as exc:
+        # The order is already live at the broker; losing the row beats failing the request
+        logger.error("Order %s placed but not recorded: %s", order_id, exc)
+
+
+def _record_change(state: OrderState) -> None:
+    """Queue the new status and fill of a live order for its ``orders`` row."""
+    from APP.services import write_behind
+
+    try:
+        write_behind.submit(
+            "orders",
+            write_behind.as_update(
+                {
+                    "order_id": state.order_id,
+                    "status": state.status,
+                    "filled_quantity": state.filled_quantity,
+                    "average_price": state.average_price,
+                    "updated_at": state.updated_at,
+                }
+            ),
+        )
+    except write_behind.BufferFull as exc:
+        logger.error("Order %s changed to %s but not recorded: %s", state.order_id, state.status, exc)
+
+
+def _risk_fill(symbol: str, side: str, quantity: int, price: float) -> None:
+    # Runs as the order's owner (see OrderBook.apply)
+    from APP.services.risk_engine import current_risk
+
+    current_risk().on_fill(symbol, side, quantity, price)
+
+
+order_book = OrderBook(on_fill=_risk_fill, on_change=_record_change)
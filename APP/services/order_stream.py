@@ -0,0 +1,214 @@
+"""
+Order-update stream consumers feeding :mod:`APP.services.order_book`.
+
+* :class:`KiteOrderStream` - ``KiteTicker.on_order_update`` (Kite postbacks
+  arrive over HTTP at ``/api/orders/kite-postback`` instead)
+* :class:`FyersOrderStream` - ``FyersOrderSocket`` ``OnOrders``
+* :class:`FakeOrderStream` - emits broker-shaped payloads locally; drives
+  tests and offline runs
+
+SDK sockets run on their own threads; the book is thread-safe.
+"""
+
+from __future__ import annotations
+
+import logging
+import threading
+import time
+from typing import Any, Dict, Iterable, Optional
+
+from APP.services.order_book import OrderBook, fyers_update, kite_update, order_book
+
+logger = logging.getLogger(__name__)
+
+
+class OrderStream:
+    """Base class: normalises broker payloads and applies them to the book."""
+
+    broker = ""
+
+    def __init__(self, book: OrderBook = order_book) -> None:
+        self.book = book
+        self.connected = False
+        self.last_error: Optional[str] = None
+        self.received = 0
+
+    def start(self) -> None:
+        raise NotImplementedError
+
+    def stop(self) -> None:
+        self.connected = False
+
+    def handle(self, payload: Dict[str, Any]) -> None:
+        self.received += 1
+        try:
+            update = kite_update(payload) if self.broker == "kite" else fyers_update(payload)
+        except (KeyError, TypeError, ValueError) as exc:
+            logger.warning("Ignoring malformed %s order update: %s", self.broker, exc)
+            return
+        self.book.apply(update)
+
+    def status(self) -> Dict[str, Any]:
+        return {
+            "broker": self.broker,
+            "connected": self.connected,
+            "received": self.received,
+            "last_error": self.last_error,
+        }
+
+
+class KiteOrderStream(OrderStream):
+    broker = "kite"
+
+    def __init__(self, api_key: str, access_token: str, book: OrderBook = order_book) -> None:
+        super().__init__(book)
+        self.api_key = api_key
+        self.access_token = access_token
+        self._ticker: Any = None
+
+    def start(self) -> None:
+        from kiteconnect import KiteTicker
+
+        ticker = KiteTicker(self.api_key, self.access_token)
+        ticker.on_order_update = lambda ws, data: self.handle(data)
+        ticker.on_connect = lambda ws, response: self._set_connected(True)
+        ticker.on_close = lambda ws, code, reason: self._set_connected(False, reason)
+        ticker.on_error = lambda ws, code, reason: self._set_connected(False, reason)
+        self._ticker = ticker
+        ticker.connect(threaded=True)
+
+    def _set_connected(self, connected: bool, error: Optional[str] = None) -> None:
+        self.connected = connected
+        if error:
+            self.last_error = str(error)
+
+    def stop(self) -> None:
+        if self._ticker is not None:
+            self._ticker.close()
+            self._ticker = None
+        super().stop()
+
+
+class FyersOrderStream(OrderStream):
+    broker = "fyers"
+
+    def __init__(
+        self, app_id: str, access_token: str, log_path: str = "", book: OrderBook = order_book
+    ) -> None:
+        super().__init__(book)
+        self.app_id = app_id
+        self.access_token = access_token
+        self.log_path = log_path
+        self._socket: Any = None
+
+    def start(self) -> None:
+        from fyers_apiv3.FyersWebsocket.order_ws import FyersOrderSocket
+
+        def on_connect() -> None:
+            self.connected = True
+            self._socket.subscribe(data_type="OnOrders")
+
+        def on_error(message: Any) -> None:
+            self.last_error = str(message)
+
+        def on_close(message: Any) -> None:
+            self.connected = False
+
+        self._socket = FyersOrderSocket(
+            access_token=f"{self.app_id}:{self.access_token}",
+            write_to_file=False,
+            log_path=self.log_path or None,
+            on_orders=self.handle,
+            on_error=on_error,
+            on_connect=on_connect,
+            on_close=on_close,
+        )
+        self._socket.connect()
+
+    def stop(self) -> None:
+        if self._socket is not None:
+            self._socket.close_connection()
+            self._socket = None
+        super().stop()
+
+
+class FakeOrderStream(OrderStream):
+    """Local stand-in for a broker socket; ``emit`` behaves like a pushed update."""
+
+    def __init__(self, broker: str = "kite", book: OrderBook = order_book) -> None:
+        super().__init__(book)
+        self.broker = broker
+        self._thread: Optional[threading.Thread] = None
+
+    def start(self) -> None:
+        self.connected = True
+
+    def emit(self, payload: Dict[str, Any]) -> None:
+        self.handle(payload)
+
+    def play(self, payloads: Iterable[Dict[str, Any]], interval: float = 0.0) -> threading.Thread:
+        """Emit ``payloads`` from a background thread, like an SDK socket would."""
+
+        def run() -> None:
+            for payload in payloads:
+                if not self.connected:
+                    break
+                self.emit(payload)
+                if interval:
+                    time.sleep(interval)
+
+        self.start()
+        self._thread = threading.Thread(target=run, name=f"fake-{self.broker}-orders", daemon=True)
+        self._thread.start()
+        return self._thread
+
+
+_streams: Dict[str, OrderStream] = {}
+
+
+def start_streams() -> Dict[str, OrderStream]:
+    """Connect the order streams for every broker with a stored session; failures are recorded."""
+    from APP.fyersApp.services import FyersService
+    from APP.services.kite_service import KiteService
+
+    candidates = {}
+    try:
+        kite = KiteService()
+        token = (kite._load_stored_token() or {}).get("access_token")
+        if kite.api_key and token:
+            candidates["kite"] = lambda: KiteOrderStream(kite.api_key, token)
+    except Exception as exc:
+        logger.info("Kite order stream not started: %s", exc)
+    try:
+        fyers = FyersService()
+        session = fyers.get_cached_profile()
+        candidates["fyers"] = lambda: FyersOrderStream(
+            fyers.app_id, session["access_token"], str(fyers.log_path)
+        )
+    except Exception as exc:
+        logger.info("Fyers order stream not started: %s", exc)
+
+    for name, factory in candidates.items():
+        if name in _streams:
+            continue
+        stream = factory()
+        try:
+            stream.start()
+        except Exception as exc:
+            stream.last_error = str(exc)
+            logger.warning("Could not start %s order stream: %s", name, exc)
+        _streams[name] = stream
+    return _streams
+
+
+def stop_streams() -> None:
+    for stream in list(_streams.values()):
+        try:
+            stream.stop()
+        except Exception:
+            logger.exception("Error stopping %s order stream", stream.broker)
+    _streams.clear()
+
+
+def stream_status() -> Dict[str, Any]:
+    return {name: stream.status() for name, stream in _streams.items()}
@@ -0,0 +1,540 @@
+"""
+Paper trading: an in-process matching engine behind the broker interface.
+
+:class:`PaperBroker` takes the same ``place_order`` / ``cancel_order`` calls
+as KiteService and FyersService, so strategies and baskets run end to end
+(risk checks, order book, order WebSocket, positions) without a live broker;
+basket legs use ``broker="paper"``. Paper trading keeps its own order book
+(:data:`paper_book`) and risk engine (:data:`paper_risk`), so simulated
+fills never count toward live positions, P&L or limits.
+
+Orders go to a :class:`MatchingEngine`, one price-time priority book per
+symbol. An incoming order first matches resting orders on the other side,
+best price first and oldest first within a price, at the resting price.
+Whatever is left trades at the last tick, which stands in for the rest of
+the market and fills in full. Limit remainders rest and fill at their limit
+once a tick trades through it; market remainders with nothing to trade
+against are cancelled. SL / SL-M orders wait until the last price crosses
+their trigger, then enter as limit / market orders.
+
+Ticks come from the live bus (``PAPER_TRADING_ENABLED``), from recorded
+tick blocks (:func:`recorded_ticks`) or from :func:`synthetic_ticks`, all
+through :meth:`MatchingEngine.on_tick`.
+
+Throughput (``python -m benchmarks.paper_trading``): the 100k+ orders/s
+figure is the matching engine alone, which is what a strategy runtime
+driving :class:`MatchingEngine` directly sees. Reporting to an order book
+(one :meth:`~APP.services.order_book.OrderBook.apply_many` batch per submit
+or tick) costs more than matching does, so the ``with_order_book`` figure is
+roughly a third of the engine's; :class:`PaperBroker` adds a pre-trade risk
+check per order on top of that.
+"""
+
+from __future__ import annotations
+
+import heapq
+import itertools
+import logging
+import os
+import threading
+from collections import deque
+from dataclasses import dataclass
+from typing import Any, Callable, Deque, Dict, Iterable, Iterator, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from APP.services.market_data import Tick, TickBus, tick_bus
+from APP.services.order_book import (
+    CANCELLED,
+    COMPLETE,
+    OPEN,
+    REJECTED,
+    OrderBook,
+    OrderUpdate,
+)
+from APP.services.risk_engine import BreachRecorder, RiskBreach, RiskEngine
+
+logger = logging.getLogger(__name__)
+
+BUY = 1
+SELL = -1
+_SIDES = {"BUY": BUY, "SELL": SELL}
+ORDER_TYPES = ("MARKET", "LIMIT", "SL", "SL-M")
+# Stop orders waiting for their trigger; reported to the order book as OPEN
+TRIGGER_PENDING = "TRIGGER_PENDING"
+
+
+@dataclass(slots=True, eq=False)
+class PaperOrder:
+    order_id: str
+    symbol: str
+    side: int
+    quantity: int
+    order_type: str
+    price: float
+    trigger_price: float
+    tag: Optional[str] = None
+    status: str = OPEN
+    filled: int = 0
+    # Sum of price * quantity over fills
+    value: float = 0.0
+    message: Optional[str] = None
+
+    @property
+    def average_price(self) -> float:
+        return self.value / self.filled if self.filled else 0.0
+
+    @property
+    def transaction_type(self) -> str:
+        return "BUY" if self.side == BUY else "SELL"
+
+
+class _Book:
+    """Price levels of one symbol: FIFO queues keyed by price, with heaps of the prices."""
+
+    __slots__ = ("bids", "asks", "bid_prices", "ask_prices", "buy_stops", "sell_stops", "tick", "last")
+
+    def __init__(self) -> None:
+        self.bids: Dict[float, Deque[PaperOrder]] = {}
+        self.asks: Dict[float, Deque[PaperOrder]] = {}
+        # Bid prices are negated so both heaps pop the best price first
+        self.bid_prices: List[float] = []
+        self.ask_prices: List[float] = []
+        # (trigger, arrival) ordered; sell triggers negated
+        self.buy_stops: List[Tuple[float, int, PaperOrder]] = []
+        self.sell_stops: List[Tuple[float, int, PaperOrder]] = []
+        # Last tick (the outside market) and last trade, tick or matched
+        self.tick: Optional[float] = None
+        self.last: Optional[float] = None
+
+
+class MatchingEngine:
+    """
+    Price-time priority matching for paper orders, filled against each other and against ticks.
+
+    ``on_update`` is called (outside the engine lock) with every order whose
+    state changed: the new order itself, resting orders it traded with, and
+    orders filled or triggered by a tick. ``on_updates`` gets the same orders
+    as one list per submit, cancel or tick, so an attached order book
+    (:func:`apply_all_to_book`) is updated once per batch.
+    """
+
+    def __init__(
+        self,
+        on_update: Optional[Callable[[PaperOrder], None]] = None,
+        prefix: str = "PAPER",
+        on_updates: Optional[Callable[[List[PaperOrder]], None]] = None,
+    ) -> None:
+        self.on_update = on_update
+        self.on_updates = on_updates
+        self.prefix = prefix
+        self._books: Dict[str, _Book] = {}
+        # Orders that can still fill; finished ones live on in the order book only
+        self._live: Dict[str, PaperOrder] = {}
+        self._ids = itertools.count(1)
+        self._lock = threading.Lock()
+        self.orders = 0
+        self.fills = 0
+        self.ticks = 0
+
+    def _book(self, symbol: str) -> _Book:
+        book = self._books.get(symbol)
+        if book is None:
+            book = self._books[symbol] = _Book()
+        return book
+
+    def submit(
+        self,
+        symbol: str,
+        transaction_type: str,
+        quantity: int,
+        order_type: str = "MARKET",
+        price: Optional[float] = None,
+        trigger_price: Optional[float] = None,
+        tag: Optional[str] = None,
+    ) -> PaperOrder:
+        """Accept an order, match what can be matched now and return it in its resulting state."""
+        side = _SIDES.get(transaction_type.upper())
+        order_type = order_type.upper()
+        if side is None:
+            raise ValueError("transaction_type must be BUY or SELL")
+        if order_type not in ORDER_TYPES:
+            raise ValueError(f"order_type must be one of {', '.join(ORDER_TYPES)}")
+        if quantity <= 0:
+            raise ValueError("quantity must be positive")
+        if order_type in ("LIMIT", "SL") and not price:
+            raise ValueError(f"{order_type} orders need a price")
+        if order_type in ("SL", "SL-M") and not trigger_price:
+            raise ValueError(f"{order_type} orders need a trigger_price")
+
+        touched: List[PaperOrder] = []
+        with self._lock:
+            self.orders += 1
+            order = PaperOrder(
+                f"{self.prefix}{next(self._ids)}",
+                symbol,
+                side,
+                quantity,
+                order_type,
+                float(price or 0.0),
+                float(trigger_price or 0.0),
+                tag,
+            )
+            book = self._book(symbol)
+            if order_type in ("SL", "SL-M"):
+                self._arm(book, order, touched)
+            else:
+                self._execute(book, order, touched)
+            self._trigger_stops(book, touched)
+        self._notify(touched)
+        return order
+
+    def cancel(self, order_id: str) -> PaperOrder:
+        with self._lock:
+            order = self._live.pop(order_id, None)
+            if order is None:
+                raise ValueError(f"Order {order_id} is not open")
+            # Left in its price queue / trigger heap and skipped when reached
+            order.status = CANCELLED
+        self._notify([order])
+        return order
+
+    def on_tick(self, tick: Tick) -> None:
+        """Move the market to ``tick.price``: resting orders it trades through fill, stops it crosses fire."""
+        touched: List[PaperOrder] = []
+        price = tick.price
+        with self._lock:
+            self.ticks += 1
+            book = self._book(tick.symbol)
+            book.tick = book.last = price
+            if book.bid_prices and -book.bid_prices[0] >= price:
+                self._sweep(book.bids, book.bid_prices, -1, price, touched)
+            if book.ask_prices and book.ask_prices[0] <= price:
+                self._sweep(book.asks, book.ask_prices, 1, price, touched)
+            self._trigger_stops(book, touched)
+        self._notify(touched)
+
+    def feed(self, ticks: Iterable[Tick]) -> int:
+        count = 0
+        for tick in ticks:
+            self.on_tick(tick)
+            count += 1
+        return count
+
+    def get(self, order_id: str) -> Optional[PaperOrder]:
+        return self._live.get(order_id)
+
+    def last_price(self, symbol: str) -> Optional[float]:
+        book = self._books.get(symbol)
+        return book.last if book is not None else None
+
+    def depth(self, symbol: str, levels: int = 5) -> Dict[str, List[Tuple[float, int]]]:
+        """Open quantity at the best ``levels`` bid and ask prices."""
+        with self._lock:
+            book = self._books.get(symbol)
+            if book is None:
+                return {"bids": [], "asks": []}
+            return {
+                "bids": _levels(book.bids, sorted(book.bids, reverse=True), levels),
+                "asks": _levels(book.asks, sorted(book.asks), levels),
+            }
+
+    def status(self) -> Dict[str, Any]:
+        return {
+            "symbols": len(self._books),
+            "live_orders": len(self._live),
+            "orders": self.orders,
+            "fills": self.fills,
+            "ticks": self.ticks,
+        }
+
+    def reset(self) -> None:
+        with self._lock:
+            self._books.clear()
+            self._live.clear()
+            self.orders = self.fills = self.ticks = 0
+
+    # -- matching ------------------------------------------------------------
+
+    def _execute(self, book: _Book, order: PaperOrder, touched: List[PaperOrder]) -> None:
+        buy = order.side == BUY
+        limit = order.price if order.order_type in ("LIMIT", "SL") else None
+        levels, prices, sign = (book.asks, book.ask_prices, 1) if buy else (book.bids, book.bid_prices, -1)
+        remaining = order.quantity - order.filled
+        while remaining and prices:
+            level_price = prices[0] * sign
+            if limit is not None and (level_price > limit if buy else level_price < limit):
+                break
+            queue = levels[level_price]
+            while queue and remaining:
+                resting = queue[0]
+                if resting.status != OPEN:
+                    queue.popleft()
+                    continue
+                take = min(remaining, resting.quantity - resting.filled)
+                resting.filled += take
+                resting.value += take * level_price
+                order.filled += take
+                order.value += take * level_price
+                remaining -= take
+                self.fills += 1
+                book.last = level_price
+                if resting.filled == resting.quantity:
+                    resting.status = COMPLETE
+                    queue.popleft()
+                    del self._live[resting.order_id]
+                touched.append(resting)
+            if not queue:
+                heapq.heappop(prices)
+                del levels[level_price]
+
+        tick = book.tick
+        if remaining and tick is not None and (limit is None or (tick <= limit if buy else tick >= limit)):
+            order.filled += remaining
+            order.value += remaining * tick
+            remaining = 0
+            self.fills += 1
+            book.last = tick
+
+        if not remaining:
+            order.status = COMPLETE
+            self._live.pop(order.order_id, None)
+        elif limit is not None:
+            order.status = OPEN
+            self._live[order.order_id] = order
+            own_levels, own_prices = (book.bids, book.bid_prices) if buy else (book.asks, book.ask_prices)
+            queue = own_levels.get(limit)
+            if queue is None:
+                queue = own_levels[limit] = deque()
+                heapq.heappush(own_prices, -limit if buy else limit)
+            queue.append(order)
+        else:
+            self._live.pop(order.order_id, None)
+            if order.filled:
+                order.status = CANCELLED
+                order.message = "Unfilled market quantity cancelled"
+            else:
+                order.status = REJECTED
+                order.message = f"No market price for {order.symbol} yet"
+        touched.append(order)
+
+    def _sweep(
+        self,
+        levels: Dict[float, Deque[PaperOrder]],
+        prices: List[float],
+        sign: int,
+        tick: float,
+        touched: List[PaperOrder],
+    ) -> None:
+        """Fill every level the tick traded through, at each order's own limit."""
+        while prices and (prices[0] * sign <= tick if sign > 0 else prices[0] * sign >= tick):
+            level_price = heapq.heappop(prices) * sign
+            for resting in levels.pop(level_price):
+                if resting.status != OPEN:
+                    continue
+                remaining = resting.quantity - resting.filled
+                resting.filled = resting.quantity
+                resting.value += remaining * level_price
+                resting.status = COMPLETE
+                self.fills += 1
+                del self._live[resting.order_id]
+                touched.append(resting)
+
+    def _arm(self, book: _Book, order: PaperOrder, touched: List[PaperOrder]) -> None:
+        trigger = order.trigger_price
+        last = book.last
+        buy = order.side == BUY
+        # As at the brokers, a trigger the market is already past is refused
+        if last is not None and (trigger <= last if buy else trigger >= last):
+            order.status = REJECTED
+            order.message = f"Trigger price must be {'above' if buy else 'below'} the last price {last:g}"
+        else:
+            order.status = TRIGGER_PENDING
+            self._live[order.order_id] = order
+            stops = book.buy_stops if buy else book.sell_stops
+            heapq.heappush(stops, (trigger if buy else -trigger, self.orders, order))
+        touched.append(order)
+
+    def _trigger_stops(self, book: _Book, touched: List[PaperOrder]) -> None:
+        # A triggered stop trades, which moves the last price and can fire more
+        while book.last is not None:
+            last = book.last
+            if book.buy_stops and book.buy_stops[0][0] <= last:
+                order = heapq.heappop(book.buy_stops)[2]
+            elif book.sell_stops and -book.sell_stops[0][0] >= last:
+                order = heapq.heappop(book.sell_stops)[2]
+            else:
+                return
+            if order.status == TRIGGER_PENDING:
+                order.status = OPEN
+                self._execute(book, order, touched)
+
+    def _notify(self, touched: List[PaperOrder]) -> None:
+        if self.on_updates is not None and touched:
+            try:
+                self.on_updates(touched)
+            except Exception:
+                logger.exception("Paper order update handler failed for %d orders", len(touched))
+        if self.on_update is None:
+            return
+        for order in touched:
+            try:
+                self.on_update(order)
+            except Exception:
+                logger.exception("Paper order update handler failed for %s", order.order_id)
+
+
+def _levels(
+    book_side: Dict[float, Deque[PaperOrder]], prices: List[float], count: int
+) -> List[Tuple[float, int]]:
+    depth = []
+    for price in prices:
+        quantity = sum(order.quantity - order.filled for order in book_side[price] if order.status == OPEN)
+        if quantity:
+            depth.append((price, quantity))
+            if len(depth) == count:
+                break
+    return depth
+
+
+# -- tick sources ---------------------------------------------------------------
+
+
+def synthetic_ticks(
+    symbols: Sequence[str],
+    count: int,
+    start_price: float = 100.0,
+    volatility: float = 0.0005,
+    tick_size: float = 0.05,
+    start_time: float = 0.0,
+    interval: float = 0.01,
+    seed: int = 0,
+) -> Iterator[Tick]:
+    """``count`` ticks per symbol, interleaved: a seeded log-normal random walk rounded to ``tick_size``."""
+    rng = np.random.default_rng(seed)
+    steps = rng.normal(0.0, volatility, size=(count, len(symbols)))
+    prices = np.round(start_price * np.exp(np.cumsum(steps, axis=0)) / tick_size) * tick_size
+    volumes = np.cumsum(rng.integers(1, 500, size=(count, len(symbols))), axis=0)
+    for row in range(count):
+        stamp = start_time + row * interval
+        for column, symbol in enumerate(symbols):
+            yield Tick(symbol, round(float(prices[row, column]), 2), float(volumes[row, column]), stamp)
+
+
+def recorded_ticks(symbol: str, columns: Dict[str, np.ndarray]) -> Iterator[Tick]:
+    """Ticks from :func:`APP.services.tick_store.read_ticks` columns, in stored order."""
+    oi = columns.get("oi")
+    for index, (stamp, price, volume) in enumerate(
+        zip(columns["timestamp"].tolist(), columns["price"].tolist(), columns["volume"].tolist())
+    ):
+        value = None if oi is None or np.isnan(oi[index]) else float(oi[index])
+        yield Tick(symbol, price, volume, stamp, value)
+
+
+# -- broker interface -----------------------------------------------------------
+
+
+def _book_update(order: PaperOrder) -> OrderUpdate:
+    # Positional and without the properties: this runs for every order a submit or tick touches
+    filled = order.filled
+    return OrderUpdate(
+        "paper",
+        order.order_id,
+        OPEN if order.status == TRIGGER_PENDING else order.status,
+        order.symbol,
+        "BUY" if order.side == BUY else "SELL",
+        order.quantity,
+        filled,
+        order.value / filled if filled else 0.0,
+        order.price or None,
+        order.tag,
+        order.message,
+    )
+
+
+def apply_to_book(order: PaperOrder, book: OrderBook) -> None:
+    """Report ``order``'s state to ``book`` as a broker order update would."""
+    book.apply(_book_update(order))
+
+
+def apply_all_to_book(orders: List[PaperOrder], book: OrderBook) -> None:
+    """Report the orders one submit or tick touched to ``book`` in one batch."""
+    book.apply_many([_book_update(order) for order in orders])
+
+
+def _log_breaches(breaches: List[RiskBreach]) -> None:
+    # Paper breaches stay out of system_logs, which holds the live ones
+    for breach in breaches:
+        logger.info("Paper risk breach [%s] %s %d %s: %s", breach.rule, breach.side, breach.quantity,
+                    breach.symbol, breach.message)
+
+
+paper_risk = RiskEngine(recorder=BreachRecorder(sink=_log_breaches))
+paper_book = OrderBook(on_fill=paper_risk.on_fill)
+paper_engine = MatchingEngine(on_updates=lambda orders: apply_all_to_book(orders, paper_book))
+
+
+class PaperBroker:
+    """
+    Broker service backed by :data:`paper_engine`; orders never leave the process.
+
+    Like the live services it runs pre-trade risk checks and reports order
+    state and fills through an order book (and so to positions), by default
+    :data:`paper_risk` and :data:`paper_book`. Nothing is written to the
+    ``orders`` table.
+    """
+
+    def __init__(self, engine: Optional[MatchingEngine] = None, risk: Optional[RiskEngine] = None) -> None:
+        self.engine = engine or paper_engine
+        self.risk = risk or paper_risk
+
+    def place_order(
+        self,
+        symbol: str,
+        transaction_type: str,
+        quantity: int,
+        order_type: str = "MARKET",
+        product: str = "MIS",
+        price: Optional[float] = None,
+        trigger_price: Optional[float] = None,
+        validity: str = "DAY",
+        tag: Optional[str] = None,
+        user_id: Optional[int] = None,
+        **_: Any,
+    ) -> Dict[str, Any]:
+        """Place an order for ``symbol`` after pre-trade risk checks; market orders need a tick first."""
+        transaction_type = transaction_type.upper()
+        reference_price = price or trigger_price or self.engine.last_price(symbol)
+        if not reference_price:
+            raise ValueError(f"No price for {symbol}: feed a tick before placing market orders")
+        if user_id is None:
+            user_id = int(os.getenv("DEFAULT_USER_ID", "1"))
+        self.risk.enforce(symbol, transaction_type, quantity, float(reference_price), user_id)
+        order = self.engine.submit(symbol, transaction_type, quantity, order_type, price, trigger_price, tag)
+        if order.status == REJECTED:
+            raise ValueError(f"Paper order rejected: {order.message}")
+        return {"order_id": order.order_id, "symbol": symbol, "reference_price": reference_price}
+
+    def cancel_order(self, order_id: str, variety: str = "regular") -> Dict[str, Any]:
+        self.engine.cancel(order_id)
+        return {"order_id": order_id}
+
+
+_bus: Optional[TickBus] = None
+
+
+def start(bus: TickBus = tick_bus) -> None:
+    """Fill paper orders from the live tick feed, and mark paper positions with it."""
+    global _bus
+    if _bus is None:
+        bus.subscribe(paper_engine.on_tick)
+        paper_risk.start(bus)
+        _bus = bus
+
+
+def stop() -> None:
+    global _bus
+    if _bus is not None:
+        _bus.unsubscribe(paper_engine.on_tick)
+        paper_risk.stop()
+        _bus = None
@@ -0,0 +1,576 @@
+"""
+Portfolio risk analytics over the position book.
+
+Positions come from the pre-trade risk engine (fills from the order streams)
+and marks from the tick bus and the option chains fetched through
+``FyersService.fetch_option_chain``. Every metric is computed with NumPy
+over all positions at once:
+
+* Greeks (Black-Scholes, no dividends; IV solved from the option's mark)
+  per position, per underlying and in total
+* a scenario P&L grid: spot shocked by ``±spot_range``% and IV by
+  ``±iv_range`` volatility points, full revaluation
+* 1-day VaR and expected shortfall by Monte Carlo full revaluation, with a
+  one-factor model (``PORTFOLIO_VAR_CORRELATION`` between underlyings)
+* a SPAN-style margin estimate: worst loss over a price/vol scan per
+  underlying plus an exposure margin on futures and short options. This is
+  an estimate, not the exchange's figure
+
+Per-position results (Greeks, scenario and simulation P&L columns) are kept
+between calls and recomputed only for underlyings whose positions or prices
+changed; the assembled report is cached per market snapshot (data version
+plus the current minute, since time to expiry moves). Marks are recorded
+from the tick bus under a short lock; a report copies the marks it needs
+under that lock and computes outside it, so tick delivery never waits on
+IV solving or the Monte Carlo revaluation.
+
+Each session user gets analytics over their own risk engine from
+:func:`analytics_for`; ``portfolio_analytics`` covers the legacy session.
+"""
+
+from __future__ import annotations
+
+import calendar
+import math
+import os
+import re
+import threading
+import time
+from dataclasses import dataclass
+from datetime import date, datetime, timedelta
+from typing import Any, Dict, List, Optional, Tuple
+
+import numpy as np
+
+from APP.services.market_calendar import IST, MARKET_CLOSE
+from APP.services.market_data import Tick, TickBus, tick_bus
+from APP.services.risk_engine import RiskEngine, risk_engine, risk_for
+
+YEAR_SECONDS = 365.0 * 86400
+_MONTHS = {name.upper(): index for index, name in enumerate(calendar.month_abbr) if name}
+# Weekly contracts encode the month as 1-9, O, N, D
+_WEEKLY_MONTHS = {**{str(i): i for i in range(1, 10)}, "O": 10, "N": 11, "D": 12}
+_OPTION = re.compile(
+    r"^(?:[A-Z]+:)?(?P<underlying>[A-Z&-]+?)(?P<year>\d{2})"
+    r"(?:(?P<month>[A-Z]{3})|(?P<wmonth>[1-9OND])(?P<day>\d{2}))"
+    r"(?P<strike>\d+(?:\.\d+)?)(?P<kind>CE|PE)$"
+)
+_FUTURE = re.compile(r"^(?:[A-Z]+:)?(?P<underlying>[A-Z&-]+?)\d{2}[A-Z]{3}FUT$")
+# Index spot symbols as the brokers name them
+_INDEX_ALIASES = {
+    "NIFTY50": "NIFTY",
+    "NIFTY 50": "NIFTY",
+    "NIFTYBANK": "BANKNIFTY",
+    "NIFTY BANK": "BANKNIFTY",
+    "FINNIFTY": "FINNIFTY",
+    "NIFTY FIN SERVICE": "FINNIFTY",
+    "MIDCPNIFTY": "MIDCPNIFTY",
+    "SENSEX": "SENSEX",
+}
+
+
+@dataclass(frozen=True)
+class OptionContract:
+    underlying: str
+    expiry: date
+    strike: float
+    call: bool
+
+
+def _monthly_expiry(year: int, month: int) -> date:
+    """Last ``FNO_EXPIRY_WEEKDAY`` (0=Monday, default Tuesday) of the month."""
+    weekday = int(os.getenv("FNO_EXPIRY_WEEKDAY", "1"))
+    last = date(year, month, calendar.monthrange(year, month)[1])
+    return last - timedelta(days=(last.weekday() - weekday) % 7)
+
+
+def parse_option(symbol: str) -> Optional[OptionContract]:
+    """Parse NSE option symbols (``NSE:NIFTY24JUN22000CE``, weekly ``NSE:NIFTY2461322000CE``)."""
+    match = _OPTION.match(symbol.upper())
+    if match is None:
+        return None
+    year = 2000 + int(match["year"])
+    if match["month"]:
+        month = _MONTHS.get(match["month"])
+        if month is None:
+            return None
+        expiry = _monthly_expiry(year, month)
+    else:
+        try:
+            expiry = date(year, _WEEKLY_MONTHS[match["wmonth"]], int(match["day"]))
+        except ValueError:
+            return None
+    return OptionContract(match["underlying"], expiry, float(match["strike"]), match["kind"] == "CE")
+
+
+def underlying_of(symbol: str) -> str:
+    """Underlying key shared by a stock/index, its futures and its options."""
+    option = parse_option(symbol)
+    if option is not None:
+        return option.underlying
+    upper = symbol.upper()
+    future = _FUTURE.match(upper)
+    if future is not None:
+        return future["underlying"]
+    name = upper.split(":", 1)[-1]
+    for suffix in ("-INDEX", "-EQ", "-BE"):
+        if name.endswith(suffix):
+            name = name[: -len(suffix)]
+    return _INDEX_ALIASES.get(name, name)
+
+
+# -- Black-Scholes ------------------------------------------------------------
+
+
+def _norm_cdf(x: np.ndarray) -> np.ndarray:
+    # Abramowitz & Stegun 26.2.17; |error| < 7.5e-8
+    k = 1.0 / (1.0 + 0.2316419 * np.abs(x))
+    poly = k * (
+        0.319381530 + k * (-0.356563782 + k * (1.781477937 + k * (-1.821255978 + k * 1.330274429)))
+    )
+    tail = _norm_pdf(x) * poly
+    return np.where(x >= 0, 1.0 - tail, tail)
+
+
+def _norm_pdf(x: np.ndarray) -> np.ndarray:
+    return np.exp(-0.5 * x * x) / math.sqrt(2 * math.pi)
+
+
+def black_scholes(
+    spot: np.ndarray, strike: np.ndarray, years: np.ndarray, vol: np.ndarray, rate: float, call: np.ndarray
+) -> Tuple[np.ndarray, np.ndarray, np.ndarray, np.ndarray, np.ndarray]:
+    """
+    Price and Greeks for European options; inputs broadcast together.
+
+    Returns ``(price, delta, gamma, vega, theta)`` with vega per volatility
+    point and theta per calendar day.
+    """
+    years = np.maximum(years, 1e-6)
+    vol = np.maximum(vol, 1e-4)
+    root = np.sqrt(years)
+    d1 = (np.log(spot / strike) + (rate + 0.5 * vol * vol) * years) / (vol * root)
+    d2 = d1 - vol * root
+    discount = strike * np.exp(-rate * years)
+    n1, n2, pdf = _norm_cdf(d1), _norm_cdf(d2), _norm_pdf(d1)
+    price = np.where(call, spot * n1 - discount * n2, discount * (1 - n2) - spot * (1 - n1))
+    delta = np.where(call, n1, n1 - 1.0)
+    gamma = pdf / (spot * vol * root)
+    vega = spot * pdf * root / 100.0
+    decay = -spot * pdf * vol / (2 * root)
+    theta = np.where(call, decay - rate * discount * n2, decay + rate * discount * (1 - n2)) / 365.0
+    return price, delta, gamma, vega, theta
+
+
+def implied_volatility(
+    price: np.ndarray, spot: np.ndarray, strike: np.ndarray, years: np.ndarray, rate: float, call: np.ndarray
+) -> np.ndarray:
+    """Vectorised bisection; NaN where the price is outside no-arbitrage bounds."""
+    low = np.full(np.shape(price), 1e-4)
+    high = np.full(np.shape(price), 5.0)
+    for _ in range(60):
+        mid = 0.5 * (low + high)
+        above = black_scholes(spot, strike, years, mid, rate, call)[0] > price
+        high = np.where(above, mid, high)
+        low = np.where(above, low, mid)
+    vol = 0.5 * (low + high)
+    floor = black_scholes(spot, strike, years, 1e-4, rate, call)[0]
+    valid = (price > floor + 1e-9) & (vol < 4.99)
+    return np.where(valid, vol, np.nan)
+
+
+# -- portfolio ----------------------------------------------------------------
+
+
+# Price scan points as fractions of the scan range, each at IV -4 and +4 points
+_SPAN_SCAN = np.array([-1, -2 / 3, -1 / 3, 0, 1 / 3, 2 / 3, 1])
+
+
+class PortfolioAnalytics:
+    """Vectorised Greeks, scenarios, VaR and margin over the risk engine's positions."""
+
+    def __init__(
+        self,
+        risk: RiskEngine = risk_engine,
+        rate: Optional[float] = None,
+        simulations: Optional[int] = None,
+        clock: Any = time.time,
+        seed: int = 7,
+    ) -> None:
+        self.risk = risk
+        self.rate = float(os.getenv("RISK_FREE_RATE", "0.065")) if rate is None else rate
+        self.default_vol = float(os.getenv("PORTFOLIO_DEFAULT_IV", "0.20"))
+        self.correlation = float(os.getenv("PORTFOLIO_VAR_CORRELATION", "0.8"))
+        self.simulations = simulations or int(os.getenv("PORTFOLIO_VAR_SIMULATIONS", "5000"))
+        self.span_scan = float(os.getenv("PORTFOLIO_SPAN_SCAN", "0.06"))
+        self.exposure_rate = float(os.getenv("PORTFOLIO_EXPOSURE_MARGIN", "0.02"))
+        self.clock = clock
+        self._rng = np.random.default_rng(seed)
+        self._prices: Dict[str, float] = {}
+        # Latest stock/index price per underlying
+        self._spots: Dict[str, float] = {}
+        self._kinds: Dict[str, Tuple[str, bool]] = {}
+        # Guards the marks and dirty set (held briefly, also by ticks)
+        self._lock = threading.Lock()
+        # Serialises reports, which own the per-row arrays
+        self._compute_lock = threading.Lock()
+        self._version = 0
+        self._bus: Optional[TickBus] = None
+        self._reset_rows()
+        self._cache: Optional[Tuple[Any, Dict[str, Any]]] = None
+
+    # -- inputs --------------------------------------------------------------
+
+    def set_price(self, symbol: str, price: float) -> None:
+        """Record a mark for an option, future, stock or index."""
+        if price is None or price <= 0:
+            return
+        with self._lock:
+            if self._prices.get(symbol) == price:
+                return
+            self._prices[symbol] = float(price)
+            underlying, is_spot = self._classify(symbol)
+            if is_spot:
+                self._spots[underlying] = float(price)
+            if underlying in self._und_index:
+                self._dirty.add(self._und_index[underlying])
+                self._version += 1
+
+    def _classify(self, symbol: str) -> Tuple[str, bool]:
+        """``(underlying, is_spot)``; memoised since every tick goes through here."""
+        kind = self._kinds.get(symbol)
+        if kind is None:
+            is_spot = parse_option(symbol) is None and _FUTURE.match(symbol.upper()) is None
+            kind = self._kinds[symbol] = (underlying_of(symbol), is_spot)
+        return kind
+
+    def on_tick(self, tick: Tick) -> None:
+        self.set_price(tick.symbol, tick.price)
+
+    def ingest_option_chain(self, response: Dict[str, Any]) -> None:
+        """Take marks from a Fyers ``optionchain`` response (underlying and every strike)."""
+        chain = (response.get("data") or {}).get("optionsChain") or []
+        for entry in chain:
+            symbol, ltp = entry.get("symbol"), entry.get("ltp")
+            if symbol and ltp:
+                self.set_price(symbol, float(ltp))
+
+    def start(self, bus: TickBus = tick_bus) -> None:
+        if self._bus is None:
+            bus.subscribe(self.on_tick)
+            self._bus = bus
+
+    def stop(self) -> None:
+        if self._bus is not None:
+            self._bus.unsubscribe(self.on_tick)
+            self._bus = None
+
+    # -- position rows -------------------------------------------------------
+
+    def _reset_rows(self) -> None:
+        self._symbols: List[str] = []
+        self._positions: Dict[str, Tuple[int, float]] = {}
+        self._underlyings: List[str] = []
+        self._und_index: Dict[str, int] = {}
+        self._dirty: set = set()
+        self._minute = -1
+        self._grid_config: Optional[Tuple[float, int, float, int]] = None
+
+    def _sync(self, held: Dict[str, Dict[str, Any]]) -> None:
+        """Pick up position changes from a risk engine snapshot; called under both locks."""
+        positions = {
+            symbol: (int(data["quantity"]), float(data["last_price"]))
+            for symbol, data in held.items()
+            if data["quantity"]
+        }
+        if set(positions) != set(self._symbols):
+            self._build(positions)
+            return
+        for symbol, (quantity, mark) in positions.items():
+            previous = self._positions[symbol]
+            if previous[0] != quantity:
+                self._dirty.add(self._und_index[underlying_of(symbol)])
+                self._version += 1
+            elif previous[1] != mark and symbol not in self._prices:
+                self._dirty.add(self._und_index[underlying_of(symbol)])
+                self._version += 1
+        self._positions = positions
+
+    def _build(self, positions: Dict[str, Tuple[int, float]]) -> None:
+        self._reset_rows()
+        self._version += 1
+        self._symbols = sorted(positions)
+        self._positions = positions
+        count = len(self._symbols)
+        contracts = [parse_option(symbol) for symbol in self._symbols]
+        for symbol in self._symbols:
+            name = underlying_of(symbol)
+            if name not in self._und_index:
+                self._und_index[name] = len(self._underlyings)
+                self._underlyings.append(name)
+        self._und = np.array([self._und_index[underlying_of(s)] for s in self._symbols], dtype=np.int64)
+        self._is_option = np.array([c is not None for c in contracts], dtype=bool)
+        self._call = np.array([bool(c and c.call) for c in contracts], dtype=bool)
+        self._strike = np.array([c.strike if c else np.nan for c in contracts], dtype=np.float64)
+        expiry_close = [
+            datetime.combine(c.expiry, MARKET_CLOSE, tzinfo=IST).timestamp() if c else np.nan
+            for c in contracts
+        ]
+        self._expiry = np.array(expiry_close, dtype=np.float64)
+        self._quantity = np.zeros(count)
+        self._mark = np.full(count, np.nan)
+        self._spot_row = np.full(count, np.nan)
+        self._iv = np.full(count, np.nan)
+        self._value = np.zeros(count)
+        self._greeks = np.zeros((count, 4))
+        self._grid_rows = np.zeros((count, 0, 0))
+        self._span_rows = np.zeros((count, 2 * len(_SPAN_SCAN)))
+        self._sim_rows = np.zeros((count, self.simulations))
+        self._vol = np.full(len(self._underlyings), self.default_vol)
+        # One-factor model: each underlying loads on a common market shock
+        market = self._rng.standard_normal((self.simulations, 1))
+        own = self._rng.standard_normal((self.simulations, len(self._underlyings)))
+        rho = min(max(self.correlation, 0.0), 1.0)
+        self._normals = math.sqrt(rho) * market + math.sqrt(1 - rho) * own
+        self._dirty = set(range(len(self._underlyings)))
+
+    def _spot(self, underlying: str, spots: Dict[str, float]) -> float:
+        if underlying in spots:
+            return spots[underlying]
+        # Fall back to a held stock/index position's own mark
+        for symbol in self._symbols:
+            if self._classify(symbol) == (underlying, True):
+                return self._positions[symbol][1]
+        return np.nan
+
+    # -- computation ---------------------------------------------------------
+
+    def _recompute(
+        self,
+        rows: np.ndarray,
+        now: float,
+        config: Tuple[float, int, float, int],
+        prices: Dict[str, float],
+        spots: Dict[str, float],
+    ) -> None:
+        """Refresh every per-row result for ``rows`` (indices into the position arrays) from ``prices``."""
+        if not len(rows):
+            return
+        symbols = [self._symbols[row] for row in rows]
+        self._quantity[rows] = [self._positions[s][0] for s in symbols]
+        self._mark[rows] = [prices.get(s, self._positions[s][1]) or np.nan for s in symbols]
+        underlying_spots = {
+            name: self._spot(name, spots) for name in {self._underlyings[i] for i in self._und[rows]}
+        }
+        self._spot_row[rows] = [underlying_spots[self._underlyings[self._und[row]]] for row in rows]
+
+        option = self._is_option[rows]
+        spot, mark, qty = self._spot_row[rows], self._mark[rows], self._quantity[rows]
+        years = np.maximum((self._expiry[rows] - now) / YEAR_SECONDS, 0.0)
+        strike, call = self._strike[rows], self._call[rows]
+
+        with np.errstate(invalid="ignore", divide="ignore"):
+            iv = implied_volatility(mark, spot, strike, years, self.rate, call)
+        iv = np.where(option & np.isnan(iv), self.default_vol, iv)
+        self._iv[rows] = np.where(option, iv, np.nan)
+        for index in set(self._und[rows].tolist()):
+            members = (self._und == index) & self._is_option & ~np.isnan(self._iv)
+            self._vol[index] = float(np.mean(self._iv[members])) if members.any() else self.default_vol
+
+        with np.errstate(invalid="ignore", divide="ignore"):
+            price, delta, gamma, vega, theta = black_scholes(spot, strike, years, iv, self.rate, call)
+        linear_mark = np.where(np.isnan(mark), spot, mark)
+        self._value[rows] = qty * np.where(option, mark, linear_mark)
+        self._greeks[rows] = np.nan_to_num(np.column_stack(
+            [
+                qty * np.where(option, delta, 1.0),
+                qty * np.where(option, gamma, 0.0),
+                qty * np.where(option, vega, 0.0),
+                qty * np.where(option, theta, 0.0),
+            ]
+        ))
+
+        def revalue(spot_shock: np.ndarray, vol_shift: np.ndarray, horizon: float) -> np.ndarray:
+            """P&L per row for shocks shaped ``(rows, ...)``."""
+            shape = (-1,) + (1,) * (spot_shock.ndim - 1)
+            base_spot, base_mark = spot.reshape(shape), linear_mark.reshape(shape)
+            with np.errstate(invalid="ignore", divide="ignore"):
+                shocked = black_scholes(
+                    base_spot * (1 + spot_shock),
+                    strike.reshape(shape),
+                    np.maximum(years - horizon, 0.0).reshape(shape),
+                    np.maximum(iv.reshape(shape) + vol_shift, 1e-4),
+                    self.rate,
+                    call.reshape(shape),
+                )[0]
+            option_pnl = shocked - price.reshape(shape)
+            linear_pnl = base_mark * spot_shock
+            pnl = np.where(option.reshape(shape), option_pnl, linear_pnl) * qty.reshape(shape)
+            return np.nan_to_num(pnl)
+
+        spot_range, spot_steps, iv_range, iv_steps = config
+        spot_axis = np.linspace(-spot_range, spot_range, spot_steps) / 100.0
+        iv_axis = np.linspace(-iv_range, iv_range, iv_steps) / 100.0
+        self._grid_rows[rows] = revalue(spot_axis[None, :, None], iv_axis[None, None, :], 0.0)
+
+        scan = np.tile(_SPAN_SCAN * self.span_scan, 2)[None, :]
+        vol_scan = np.repeat([-0.04, 0.04], len(_SPAN_SCAN))[None, :]
+        self._span_rows[rows] = revalue(scan, vol_scan, 0.0)
+
+        daily = self._vol[self._und[rows]] / math.sqrt(252)
+        returns = (self._normals[:, self._und[rows]] * daily).T
+        self._sim_rows[rows] = revalue(np.expm1(returns), np.zeros((1, 1)), 1.0 / 365)
+
+    def report(
+        self, spot_range: float = 10.0, spot_steps: int = 9, iv_range: float = 5.0, iv_steps: int = 5
+    ) -> Dict[str, Any]:
+        """Full analytics for the current book; cached until prices, positions or the minute change."""
+        if spot_steps < 1 or iv_steps < 1 or spot_steps * iv_steps > 2500:
+            raise ValueError("Scenario grid must have between 1 and 2500 points")
+        now = self.clock()
+        config = (float(spot_range), int(spot_steps), float(iv_range), int(iv_steps))
+        held = self.risk.snapshot()["positions"]
+        with self._compute_lock:
+            with self._lock:
+                self._sync(held)
+                key = (self._version, int(now // 60), config)
+                if self._cache is not None and self._cache[0] == key:
+                    return self._cache[1]
+                count = len(self._symbols)
+                if self._grid_config != config:
+                    self._grid_rows = np.zeros((count, spot_steps, iv_steps))
+                    self._dirty = set(range(len(self._underlyings)))
+                    self._grid_config = config
+                if int(now // 60) != self._minute:
+                    # Time to expiry moved on; everything reprices
+                    self._minute = int(now // 60)
+                    self._dirty = set(range(len(self._underlyings)))
+                # Marks arriving from here on dirty their underlyings for the next report
+                dirty, self._dirty = self._dirty, set()
+                prices, spots = dict(self._prices), dict(self._spots)
+            if dirty:
+                rows = np.flatnonzero(np.isin(self._und, list(dirty)))
+                self._recompute(rows, now, config, prices, spots)
+            report = self._assemble(now, config)
+            self._cache = (key, report)
+            return report
+
+    def _assemble(self, now: float, config: Tuple[float, int, float, int]) -> Dict[str, Any]:
+        count = len(self._symbols)
+        spot_range, spot_steps, iv_range, iv_steps = config
+        delta_value = self._greeks[:, 0] * np.nan_to_num(self._spot_row)
+        by_underlying: Dict[str, Any] = {}
+        margin: Dict[str, Any] = {}
+        for index, name in enumerate(self._underlyings):
+            members = self._und == index
+            greeks = self._greeks[members].sum(axis=0)
+            by_underlying[name] = {
+                "delta": float(greeks[0]),
+                "delta_value": float(delta_value[members].sum()),
+                "gamma": float(greeks[1]),
+                "vega": float(greeks[2]),
+                "theta": float(greeks[3]),
+            }
+            span = max(0.0, -float(self._span_rows[members].sum(axis=0).min())) if count else 0.0
+            short_option = members & self._is_option & (self._quantity < 0)
+            futures = members & ~self._is_option
+            notional = np.abs(self._quantity) * np.nan_to_num(self._spot_row)
+            exposure = self.exposure_rate * float(notional[short_option | futures].sum())
+            margin[name] = {"span": span, "exposure": exposure, "total": span + exposure}
+
+        totals = self._greeks.sum(axis=0) if count else np.zeros(4)
+        simulated = self._sim_rows.sum(axis=0) if count else np.zeros(self.simulations)
+        losses = np.sort(-simulated)
+        var = {}
+        for level in (0.95, 0.99):
+            cutoff = int(math.floor(level * len(losses)))
+            var[f"var_{int(level * 100)}"] = float(max(losses[min(cutoff, len(losses) - 1)], 0.0))
+            var[f"expected_shortfall_{int(level * 100)}"] = float(max(losses[cutoff:].mean(), 0.0))
+
+        missing = [
+            symbol for row, symbol in enumerate(self._symbols)
+            if np.isnan(self._spot_row[row]) or (self._is_option[row] and np.isnan(self._mark[row]))
+        ]
+        positions = [
+            {
+                "symbol": symbol,
+                "underlying": self._underlyings[self._und[row]],
+                "quantity": int(self._quantity[row]),
+                "mark": _number(self._mark[row]),
+                "spot": _number(self._spot_row[row]),
+                "iv": _number(self._iv[row]),
+                "value": _number(self._value[row]),
+                "delta": float(self._greeks[row, 0]),
+                "gamma": float(self._greeks[row, 1]),
+                "vega": float(self._greeks[row, 2]),
+                "theta": float(self._greeks[row, 3]),
+            }
+            for row, symbol in enumerate(self._symbols)
+        ]
+        grid = self._grid_rows.sum(axis=0) if count else np.zeros((spot_steps, iv_steps))
+        return {
+            "as_of": datetime.fromtimestamp(now, IST).isoformat(),
+            "version": self._version,
+            "positions": positions,
+            "greeks": {
+                "total": {
+                    "delta_value": float(delta_value.sum()),
+                    "gamma": float(totals[1]),
+                    "vega": float(totals[2]),
+                    "theta": float(totals[3]),
+                },
+                "by_underlying": by_underlying,
+            },
+            "scenarios": {
+                "spot_shocks_pct": np.linspace(-spot_range, spot_range, spot_steps).tolist(),
+                "iv_shifts_pts": np.linspace(-iv_range, iv_range, iv_steps).tolist(),
+                "pnl": grid.tolist(),
+            },
+            "var": {"horizon_days": 1, "simulations": self.simulations, **var},
+            "margin": {
+                "total": float(sum(entry["total"] for entry in margin.values())),
+                "by_underlying": margin,
+                "estimate": True,
+            },
+            "missing_marks": missing,
+        }
+
+
+def _number(value: float) -> Optional[float]:
+    return None if math.isnan(value) else float(value)
+
+
+portfolio_analytics = PortfolioAnalytics()
+_user_analytics: Dict[str, PortfolioAnalytics] = {}
+_user_lock = threading.Lock()
+
+
+def analytics_for(user: Optional[str]) -> PortfolioAnalytics:
+    """Analytics over ``user``'s positions; ``portfolio_analytics`` for None, the legacy session."""
+    if user is None:
+        return portfolio_analytics
+    analytics = _user_analytics.get(user)
+    if analytics is None:
+        with _user_lock:
+            analytics = _user_analytics.get(user)
+            if analytics is None:
+                analytics = PortfolioAnalytics(risk=risk_for(user))
+                with portfolio_analytics._lock:
+                    for symbol, price in portfolio_analytics._prices.items():
+                        analytics.set_price(symbol, price)
+                if portfolio_analytics._bus is not None:
+                    analytics.start(portfolio_analytics._bus)
+                _user_analytics[user] = analytics
+    return analytics
+
+
+def ingest_option_chain(response: Dict[str, Any]) -> None:
+    """Record option-chain marks in every user's analytics."""
+    portfolio_analytics.ingest_option_chain(response)
+    for analytics in list(_user_analytics.values()):
+        analytics.ingest_option_chain(response)
+
+
+def stop_all() -> None:
+    portfolio_analytics.stop()
+    for analytics in list(_user_analytics.values()):
+        analytics.stop()
@@ -0,0 +1,330 @@
+"""
+On-demand request profiling by stack sampling.
+
+Switched on at runtime through the admin API (``/api/admin/profiling``):
+once armed, requests whose path matches ``route`` (a path such as
+``/api/fyers/option-chain``, ``{param}`` segments allowed; any path if
+unset) are profiled with probability ``sample_rate``, and the profiler
+disarms itself after ``max_requests`` of them, so it never stays on.
+
+While a profiled request is in flight a daemon thread samples every
+thread's stack each ``interval`` seconds with ``sys._current_frames`` and
+keeps the stacks that work for that request: its coroutine on the event
+loop and the thread-pool calls it started (``run_in_threadpool`` carries
+the request's context into the worker). That covers what cProfile misses
+here, since cProfile only sees the thread it was enabled on and route work
+mostly runs in the pool. Event-loop stacks start at the profiling
+middleware and pool stacks at the function handed to the pool, so a
+profile shows session loading, client construction, the broker call and
+response encoding, and nothing of the server's own loop.
+
+Profiles are kept per request (the last ``PROFILING_HISTORY``, default 50)
+and rendered as collapsed stacks, one ``frame;frame;frame count`` line per
+distinct stack: the input of ``flamegraph.pl``, speedscope and similar
+tools. Each uvicorn worker profiles its own requests.
+"""
+
+from __future__ import annotations
+
+import asyncio.events
+import logging
+import os
+import random
+import re
+import sys
+import threading
+import time
+from collections import Counter, deque
+from contextvars import Context, ContextVar
+from dataclasses import dataclass, field
+from types import CodeType, FrameType
+from typing import Any, Callable, Deque, Dict, List, Optional, Pattern, Tuple
+
+from APP.services.logging_config import get_request_id
+from APP.services.metrics import registry
+
+logger = logging.getLogger(__name__)
+
+PROFILED_REQUESTS = registry.counter(
+    "algonova_profiled_requests_total",
+    "Requests captured by the on-demand profiler",
+)
+
+_profile: ContextVar[Optional["RequestProfile"]] = ContextVar("request_profile", default=None)
+_HANDLE_RUN: CodeType = asyncio.events.Handle._run.__code__
+# Frames deeper than this are dropped from a sample
+_MAX_DEPTH = 128
+
+
+@dataclass
+class RequestProfile:
+    request_id: str
+    method: str
+    path: str
+    started: float
+    loop_thread: int
+    seconds: Optional[float] = None
+    status: Optional[int] = None
+    samples: Counter = field(default_factory=Counter)
+
+    def as_dict(self) -> Dict[str, Any]:
+        return {
+            "request_id": self.request_id,
+            "method": self.method,
+            "path": self.path,
+            "started": self.started,
+            "seconds": self.seconds,
+            "status": self.status,
+            "samples": sum(self.samples.values()),
+        }
+
+
+def _route_pattern(route: str) -> Pattern[str]:
+    parts = re.split(r"\{[^}/]+\}", route.rstrip("/") or "/")
+    return re.compile("[^/]+".join(re.escape(part) for part in parts) + "/?")
+
+
+def _worker_run_code() -> Optional[CodeType]:
+    """Code of the loop that runs ``run_in_threadpool`` calls in anyio's worker threads."""
+    try:
+        from anyio._backends._asyncio import WorkerThread
+    except Exception:  # pragma: no cover - anyio always ships with starlette
+        return None
+    return WorkerThread.run.__code__
+
+
+def _frame_label(code: CodeType) -> str:
+    filename = code.co_filename
+    for root in sys.path:
+        if root and filename.startswith(root):
+            filename = filename[len(root):].lstrip("/\\")
+            break
+    return f"{code.co_qualname} ({filename}:{code.co_firstlineno})".replace(";", ":")
+
+
+def _from_middleware(codes: List[CodeType]) -> List[CodeType]:
+    """``codes`` (innermost first) from the profiling middleware inwards, reversed; [] without it."""
+    for index, code in enumerate(codes):
+        if code is _MIDDLEWARE_CALL:
+            return codes[index::-1]
+    return []
+
+
+class Profiler:
+    """Arms request sampling and collects per-request stack samples."""
+
+    def __init__(self, history: Optional[int] = None, clock: Callable[[], float] = time.time) -> None:
+        self.clock = clock
+        self._lock = threading.Lock()
+        self._profiles: Deque[RequestProfile] = deque(
+            maxlen=history or int(os.getenv("PROFILING_HISTORY", "50"))
+        )
+        self._active: List[RequestProfile] = []
+        self._armed = False
+        self._route: Optional[str] = None
+        self._pattern: Optional[Pattern[str]] = None
+        self._sample_rate = 1.0
+        self._remaining = 0
+        self.interval = 0.005
+        self._random = random.Random()
+        self._sampler: Optional[threading.Thread] = None
+        self._wake = threading.Event()
+        self._worker_code = _worker_run_code()
+        self._labels: Dict[CodeType, str] = {}
+
+    # -- control -------------------------------------------------------------
+
+    def arm(
+        self,
+        route: Optional[str] = None,
+        sample_rate: float = 1.0,
+        max_requests: int = 10,
+        interval: float = 0.005,
+    ) -> Dict[str, Any]:
+        """Profile the next ``max_requests`` matching requests, each with probability ``sample_rate``."""
+        if not 0 < sample_rate <= 1:
+            raise ValueError("sample_rate must be in (0, 1]")
+        if max_requests < 1:
+            raise ValueError("max_requests must be >= 1")
+        if not 0.0005 <= interval <= 1:
+            raise ValueError("interval must be between 0.5 ms and 1 s")
+        if route is not None and not route.startswith("/"):
+            raise ValueError("route must be a path starting with '/'")
+        with self._lock:
+            self._route = route
+            self._pattern = _route_pattern(route) if route else None
+            self._sample_rate = sample_rate
+            self._remaining = max_requests
+            self.interval = interval
+            self._armed = True
+        logger.info("Profiling armed: route=%s rate=%s max=%d", route or "*", sample_rate, max_requests)
+        return self.status()
+
+    def disarm(self) -> Dict[str, Any]:
+        with self._lock:
+            self._armed = False
+            self._remaining = 0
+        return self.status()
+
+    def clear(self) -> None:
+        with self._lock:
+            self._profiles.clear()
+
+    # -- per request ---------------------------------------------------------
+
+    def claim(self, method: str, path: str) -> Optional[RequestProfile]:
+        """A profile for this request if it is picked; None otherwise (the common, lock-free case)."""
+        if not self._armed:
+            return None
+        if self._pattern is not None and self._pattern.fullmatch(path) is None:
+            return None
+        if self._sample_rate < 1 and self._random.random() >= self._sample_rate:
+            return None
+        with self._lock:
+            if not self._armed:
+                return None
+            self._remaining -= 1
+            if self._remaining <= 0:
+                self._armed = False
+                logger.info("Profiling disarmed after its last request")
+            profile = RequestProfile(get_request_id(), method, path, self.clock(), threading.get_ident())
+            self._active.append(profile)
+            self._profiles.append(profile)
+            if self._sampler is None or not self._sampler.is_alive():
+                self._sampler = threading.Thread(target=self._run, name="request-profiler", daemon=True)
+                self._sampler.start()
+        self._wake.set()
+        PROFILED_REQUESTS.inc()
+        return profile
+
+    def finish(self, profile: RequestProfile, status: Optional[int]) -> None:
+        with self._lock:
+            profile.seconds = self.clock() - profile.started
+            profile.status = status
+            if profile in self._active:
+                self._active.remove(profile)
+
+    # -- sampling ------------------------------------------------------------
+
+    def _run(self) -> None:
+        while True:
+            with self._lock:
+                active = list(self._active)
+                if not active and not self._armed:
+                    self._sampler = None
+                    return
+            if not active:
+                self._wake.wait(0.5)
+                self._wake.clear()
+                continue
+            self.sample(active)
+            time.sleep(self.interval)
+
+    def sample(self, active: Optional[List[RequestProfile]] = None) -> None:
+        """Take one sample of every thread working for an ``active`` profile."""
+        if active is None:
+            with self._lock:
+                active = list(self._active)
+        if not active:
+            return
+        me = threading.get_ident()
+        for thread_id, frame in sys._current_frames().items():
+            if thread_id == me:
+                continue
+            owner, codes = self._attribute(frame)
+            if owner is None and codes and len(active) == 1 and thread_id == active[0].loop_thread:
+                # Event loops without Python-level handles (uvloop) cannot be attributed by context
+                owner = active[0]
+            if owner is not None and codes and owner in active:
+                owner.samples[tuple(self._label(code) for code in codes)] += 1
+
+    def _attribute(self, frame: Optional[FrameType]) -> Tuple[Optional[RequestProfile], List[CodeType]]:
+        """
+        The profile whose context ``frame``'s thread runs in, and the frames doing its work, outermost
+        first: from the profiling middleware on the event loop, from the called function in the pool.
+        """
+        codes: List[CodeType] = []
+        while frame is not None and len(codes) < _MAX_DEPTH:
+            code = frame.f_code
+            context: Optional[Context] = None
+            if code is _HANDLE_RUN:
+                context = getattr(frame.f_locals.get("self"), "_context", None)
+            elif code is self._worker_code:
+                context = frame.f_locals.get("context")
+            if isinstance(context, Context):
+                owner = context.get(_profile)
+                return (owner, _from_middleware(codes) or codes[::-1]) if owner is not None else (None, [])
+            codes.append(code)
+            frame = frame.f_back
+        return None, _from_middleware(codes)
+
+    def _label(self, code: CodeType) -> str:
+        label = self._labels.get(code)
+        if label is None:
+            label = self._labels[code] = _frame_label(code)
+        return label
+
+    # -- output --------------------------------------------------------------
+
+    def _selected(self, request_id: Optional[str]) -> List[RequestProfile]:
+        with self._lock:
+            profiles = list(self._profiles)
+        if request_id is None:
+            return profiles
+        return [profile for profile in profiles if profile.request_id == request_id]
+
+    def collapsed(self, request_id: Optional[str] = None) -> str:
+        """Folded stacks (``a;b;c count``) over the kept profiles, or one request's."""
+        totals: Counter = Counter()
+        for profile in self._selected(request_id):
+            totals.update(profile.samples)
+        return "".join(f"{';'.join(stack)} {count}\n" for stack, count in sorted(totals.items()))
+
+    def status(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "armed": self._armed,
+                "route": self._route,
+                "sample_rate": self._sample_rate,
+                "remaining": self._remaining,
+                "interval": self.interval,
+                "active": len(self._active),
+                "profiles": [profile.as_dict() for profile in self._profiles],
+            }
+
+
+profiler = Profiler()
+
+
+class ProfilingMiddleware:
+    """ASGI middleware marking the requests the profiler picks; a no-op while it is disarmed."""
+
+    def __init__(self, app: Any, profiler: Profiler = profiler) -> None:
+        self.app = app
+        self.profiler = profiler
+
+    async def __call__(self, scope: Dict[str, Any], receive: Any, send: Any) -> None:
+        profile = None
+        if scope["type"] == "http":
+            profile = self.profiler.claim(scope.get("method", ""), scope.get("path", ""))
+        if profile is None:
+            await self.app(scope, receive, send)
+            return
+
+        status_code: Optional[int] = None
+
+        async def send_with_status(message: Dict[str, Any]) -> None:
+            nonlocal status_code
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+            await send(message)
+
+        token = _profile.set(profile)
+        try:
+            await self.app(scope, receive, send_with_status)
+        finally:
+            _profile.reset(token)
+            self.profiler.finish(profile, status_code)
+
+
+_MIDDLEWARE_CALL: CodeType = ProfilingMiddleware.__call__.__code__
@@ -0,0 +1,382 @@
+"""
+Quotes from whichever broker answers first.
+
+We hold sessions with both Fyers and Kite, so a quote lookup need not wait
+on one slow API. :class:`QuoteFacade` sends the request to the broker that
+has recently been fastest, and if no answer has come after the hedge delay
+it sends the same request to the other one and takes the first good answer
+(a primary that fails outright is failed over at once). The delay is
+``QUOTE_HEDGE_DELAY_MS``, or ``auto`` (default): the primary's recent p95
+latency, so roughly one request in twenty is duplicated.
+
+Each broker's latency is tracked as an EWMA plus a window of recent samples,
+and an EWMA of its error rate; the primary is the broker with the lowest
+error-penalised latency (``QUOTE_BROKERS`` sets the order used before any
+samples exist). Losing requests are still timed when they complete, so a
+broker that recovers wins the primary role back.
+
+Symbols use the Fyers convention (``NSE:TCS-EQ``, ``NSE:NIFTY50-INDEX``,
+``NSE:NIFTY24JUN24000CE``) and are mapped to Kite's (``NSE:TCS``,
+``NSE:NIFTY 50``, ``NFO:NIFTY24JUN24000CE``); Kite-style input is accepted
+and normalised. Quotes come back in one shape whichever broker served them.
+"""
+
+from __future__ import annotations
+
+import contextvars
+import functools
+import logging
+import math
+import os
+import threading
+import time
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor, wait
+from dataclasses import dataclass, field
+from typing import Any, Callable, Deque, Dict, Iterable, List, Optional, Tuple
+
+from APP.services.cache import TTLCache
+from APP.services.metrics import registry
+from APP.services.refresh import QUOTES, policies as refresh_policies
+from APP.services.sessions import current_user
+
+logger = logging.getLogger(__name__)
+
+FYERS = "fyers"
+KITE = "kite"
+
+QUOTE_REQUESTS = registry.counter(
+    "algonova_quote_requests_total",
+    "Quote requests sent per broker, by outcome (won, lost, error)",
+    ("broker", "outcome"),
+)
+QUOTE_HEDGES = registry.counter(
+    "algonova_quote_hedges_total",
+    "Quote lookups that went to a second broker, by reason",
+    ("reason",),
+)
+
+# Fyers index symbols and their Kite trading symbols
+INDEX_NAMES: Dict[str, str] = {
+    "NSE:NIFTY50-INDEX": "NSE:NIFTY 50",
+    "NSE:NIFTYBANK-INDEX": "NSE:NIFTY BANK",
+    "NSE:FINNIFTY-INDEX": "NSE:NIFTY FIN SERVICE",
+    "NSE:MIDCPNIFTY-INDEX": "NSE:NIFTY MID SELECT",
+    "NSE:NIFTYNXT50-INDEX": "NSE:NIFTY NEXT 50",
+    "NSE:INDIAVIX-INDEX": "NSE:INDIA VIX",
+    "BSE:SENSEX-INDEX": "BSE:SENSEX",
+    "BSE:BANKEX-INDEX": "BSE:BANKEX",
+}
+_KITE_INDEX_NAMES = {kite: fyers for fyers, kite in INDEX_NAMES.items()}
+
+# Derivatives trade on separate Kite segments
+_KITE_DERIVATIVE_EXCHANGE = {"NSE": "NFO", "BSE": "BFO"}
+_FYERS_CASH_EXCHANGE = {"NFO": "NSE", "BFO": "BSE"}
+_EQUITY_SERIES = ("EQ", "BE", "BZ", "SM", "ST", "A", "B", "T", "X", "XT", "Z")
+
+
+def _split(symbol: str) -> Tuple[str, str]:
+    exchange, separator, name = symbol.strip().partition(":")
+    if not separator or not exchange or not name:
+        raise ValueError(f"Symbol must look like EXCHANGE:NAME, got {symbol!r}")
+    return exchange.upper(), name
+
+
+def normalize_symbol(symbol: str) -> str:
+    """Fyers-style form of ``symbol``, which may be written either way."""
+    exchange, name = _split(symbol)
+    full = f"{exchange}:{name}"
+    if full in INDEX_NAMES:
+        return full
+    if full in _KITE_INDEX_NAMES:
+        return _KITE_INDEX_NAMES[full]
+    if exchange in _FYERS_CASH_EXCHANGE:
+        return f"{_FYERS_CASH_EXCHANGE[exchange]}:{name}"
+    series = name.rpartition("-")[2] if "-" in name else ""
+    if exchange not in ("NSE", "BSE") or series in _EQUITY_SERIES + ("INDEX",) or _is_derivative(name):
+        return full
+    # Plain Kite cash symbol; BSE scrips are quoted on Fyers under their group, A for most liquid names
+    return f"{full}-EQ" if exchange == "NSE" else f"{full}-A"
+
+
+def _is_derivative(name: str) -> bool:
+    return name.endswith(("FUT", "CE", "PE")) and any(character.isdigit() for character in name)
+
+
+def to_kite(symbol: str) -> str:
+    """Kite ``EXCHANGE:TRADINGSYMBOL`` for a Fyers-style symbol."""
+    symbol = normalize_symbol(symbol)
+    if symbol in INDEX_NAMES:
+        return INDEX_NAMES[symbol]
+    exchange, name = _split(symbol)
+    base, _, series = name.rpartition("-")
+    if base and series in _EQUITY_SERIES:
+        return f"{exchange}:{base}"
+    if _is_derivative(name) and exchange in _KITE_DERIVATIVE_EXCHANGE:
+        return f"{_KITE_DERIVATIVE_EXCHANGE[exchange]}:{name}"
+    return symbol
+
+
+def _number(value: Any) -> Optional[float]:
+    try:
+        return float(value) if value is not None else None
+    except (TypeError, ValueError):
+        return None
+
+
+def _fyers_quote(symbol: str, values: Dict[str, Any]) -> Dict[str, Any]:
+    return {
+        "symbol": symbol,
+        "ltp": _number(values.get("lp")),
+        "open": _number(values.get("open_price")),
+        "high": _number(values.get("high_price")),
+        "low": _number(values.get("low_price")),
+        "prev_close": _number(values.get("prev_close_price")),
+        "volume": _number(values.get("volume")),
+        "bid": _number(values.get("bid")),
+        "ask": _number(values.get("ask")),
+        "oi": _number(values.get("oi")),
+        "timestamp": _number(values.get("tt")),
+        "broker": FYERS,
+    }
+
+
+def _kite_quote(symbol: str, values: Dict[str, Any]) -> Dict[str, Any]:
+    ohlc = values.get("ohlc") or {}
+    depth = values.get("depth") or {}
+    best_bid = (depth.get("buy") or [{}])[0].get("price")
+    best_ask = (depth.get("sell") or [{}])[0].get("price")
+    stamp = values.get("last_trade_time") or values.get("timestamp")
+    return {
+        "symbol": symbol,
+        "ltp": _number(values.get("last_price")),
+        "open": _number(ohlc.get("open")),
+        "high": _number(ohlc.get("high")),
+        "low": _number(ohlc.get("low")),
+        "prev_close": _number(ohlc.get("close")),
+        "volume": _number(values.get("volume")),
+        "bid": _number(best_bid),
+        "ask": _number(best_ask),
+        "oi": _number(values.get("oi")),
+        "timestamp": stamp.timestamp() if hasattr(stamp, "timestamp") else _number(stamp),
+        "broker": KITE,
+    }
+
+
+def fetch_fyers(symbols: List[str]) -> Dict[str, Dict[str, Any]]:
+    from APP.fyersApp.services import FyersService
+
+    # The facade caches; always ask Fyers
+    raw = FyersService().fetch_quotes(symbols, refresh=True)
+    return {symbol: _fyers_quote(symbol, values) for symbol, values in raw.items()}
+
+
+def fetch_kite(symbols: List[str]) -> Dict[str, Dict[str, Any]]:
+    from APP.services.kite_service import KiteService
+
+    names = {to_kite(symbol): symbol for symbol in symbols}
+    raw = KiteService().get_quotes(list(names))
+    return {names[name]: _kite_quote(names[name], values) for name, values in raw.items() if name in names}
+
+
+@dataclass
+class BrokerStats:
+    """Latency/error tracking of one broker's quote API."""
+
+    name: str
+    alpha: float = 0.2
+    latency_ewma: Optional[float] = None
+    error_rate: float = 0.0
+    samples: Deque[float] = field(default_factory=lambda: deque(maxlen=200))
+    won: int = 0
+    lost: int = 0
+    errors: int = 0
+
+    def record(self, seconds: Optional[float], ok: bool) -> None:
+        self.error_rate += self.alpha * ((0.0 if ok else 1.0) - self.error_rate)
+        if ok and seconds is not None:
+            self.samples.append(seconds)
+            if self.latency_ewma is None:
+                self.latency_ewma = seconds
+            else:
+                self.latency_ewma += self.alpha * (seconds - self.latency_ewma)
+
+    def score(self) -> float:
+        """Expected cost of asking this broker; lower is better, unknown sorts last among equals."""
+        latency = self.latency_ewma if self.latency_ewma is not None else 1.0
+        return latency * (1.0 + 10.0 * self.error_rate)
+
+    def percentile(self, q: float) -> Optional[float]:
+        if not self.samples:
+            return None
+        ordered = sorted(self.samples)
+        return ordered[min(len(ordered) - 1, int(math.ceil(q * len(ordered))) - 1)]
+
+    def as_dict(self) -> Dict[str, Any]:
+        p95 = self.percentile(0.95)
+        return {
+            "latency_ewma_ms": round(self.latency_ewma * 1000, 2) if self.latency_ewma is not None else None,
+            "p95_ms": round(p95 * 1000, 2) if p95 is not None else None,
+            "error_rate": round(self.error_rate, 3),
+            "won": self.won,
+            "lost": self.lost,
+            "errors": self.errors,
+        }
+
+
+class QuoteUnavailable(RuntimeError):
+    """No broker produced quotes in time."""
+
+
+class QuoteFacade:
+    """Hedged, failover quote lookups across brokers with adaptive primary selection."""
+
+    def __init__(
+        self,
+        fetchers: Optional[Dict[str, Callable[[List[str]], Dict[str, Dict[str, Any]]]]] = None,
+        hedge_delay: Optional[str] = None,
+        timeout: Optional[float] = None,
+        workers: Optional[int] = None,
+        cache_ttl: Optional[float] = None,
+    ) -> None:
+        if fetchers is None:
+            order = [name.strip() for name in os.getenv("QUOTE_BROKERS", "fyers,kite").split(",")]
+            available = {FYERS: fetch_fyers, KITE: fetch_kite}
+            fetchers = {name: available[name] for name in order if name in available}
+        if not fetchers:
+            raise ValueError("At least one quote broker is required")
+        self.fetchers = fetchers
+        raw_delay = (hedge_delay or os.getenv("QUOTE_HEDGE_DELAY_MS", "auto")).strip().lower()
+        self.hedge_delay_ms: Optional[float] = None if raw_delay == "auto" else float(raw_delay)
+        self.min_hedge_delay = float(os.getenv("QUOTE_HEDGE_MIN_MS", "20")) / 1000
+        self.max_hedge_delay = float(os.getenv("QUOTE_HEDGE_MAX_MS", "1000")) / 1000
+        self.timeout = timeout or float(os.getenv("QUOTE_TIMEOUT", "5"))
+        self.cache_ttl = cache_ttl
+        self.stats: Dict[str, BrokerStats] = {name: BrokerStats(name) for name in fetchers}
+        self._lock = threading.Lock()
+        self._pool = ThreadPoolExecutor(
+            max_workers=workers or int(os.getenv("QUOTE_WORKERS", "8")), thread_name_prefix="quotes"
+        )
+        self._cache: TTLCache[Dict[str, Any]] = TTLCache("quotes", ttl=1.0, maxsize=4096)
+
+    # -- broker choice -------------------------------------------------------
+
+    def ranking(self) -> List[str]:
+        """Brokers best first; ties keep the configured order."""
+        with self._lock:
+            order = list(self.fetchers)
+            return sorted(order, key=lambda name: (self.stats[name].score(), order.index(name)))
+
+    def hedge_delay(self, broker: str) -> float:
+        if self.hedge_delay_ms is not None:
+            return self.hedge_delay_ms / 1000
+        with self._lock:
+            p95 = self.stats[broker].percentile(0.95)
+        if p95 is None:
+            return self.max_hedge_delay
+        return min(self.max_hedge_delay, max(self.min_hedge_delay, p95))
+
+    # -- lookups -------------------------------------------------------------
+
+    def get_quotes(self, symbols: Iterable[str], refresh: bool = False) -> Dict[str, Dict[str, Any]]:
+        """Normalised quotes per requested symbol (as given), cached for the refresh policy's TTL."""
+        requested = list(dict.fromkeys(symbol.strip() for symbol in symbols if symbol.strip()))
+        if not requested:
+            raise ValueError("At least one symbol is required")
+        canonical = {symbol: normalize_symbol(symbol) for symbol in requested}
+        user = current_user()
+        found: Dict[str, Dict[str, Any]] = {}
+        if not refresh:
+            for name in set(canonical.values()):
+                cached = self._cache.get((user, name))
+                if cached is not None:
+                    found[name] = cached
+        missing = sorted(set(canonical.values()) - set(found))
+        if missing:
+            fetched = self._fetch_hedged(missing)
+            ttl = self.cache_ttl if self.cache_ttl is not None else refresh_policies[QUOTES].ttl()
+            for name, quote in fetched.items():
+                self._cache.set((user, name), quote, ttl=ttl)
+            found.update(fetched)
+        return {symbol: found[canonical[symbol]] for symbol in requested if canonical[symbol] in found}
+
+    def _submit(self, broker: str, symbols: List[str], sent: Dict[Future, str]) -> Future:
+        started = time.perf_counter()
+        # Carries the request's user (session) into the worker thread
+        context = contextvars.copy_context()
+        future = self._pool.submit(context.run, self.fetchers[broker], symbols)
+        future.add_done_callback(functools.partial(self._record, broker, started))
+        sent[future] = broker
+        return future
+
+    def _record(self, broker: str, started: float, future: Future) -> None:
+        if future.cancelled():
+            return
+        error = future.exception()
+        with self._lock:
+            stats = self.stats[broker]
+            stats.record(time.perf_counter() - started, error is None)
+            stats.errors += error is not None
+        if error is not None:
+            QUOTE_REQUESTS.inc(broker=broker, outcome="error")
+            logger.debug("Quote request to %s failed: %s", broker, error)
+
+    def _fetch_hedged(self, symbols: List[str]) -> Dict[str, Dict[str, Any]]:
+        ranking = self.ranking()
+        backups = ranking[1:]
+        deadline = time.perf_counter() + self.timeout
+        hedge_at = time.perf_counter() + self.hedge_delay(ranking[0])
+        sent: Dict[Future, str] = {}
+        pending = {self._submit(ranking[0], symbols, sent)}
+        errors: List[str] = []
+        while pending:
+            now = time.perf_counter()
+            if now >= deadline:
+                break
+            until = min(deadline, hedge_at) if backups else deadline
+            done, pending = wait(pending, timeout=until - now, return_when=FIRST_COMPLETED)
+            for future in done:
+                if future.exception() is None:
+                    self._won(sent[future], [sent[loser] for loser in pending])
+                    return future.result()
+                errors.append(f"{sent[future]}: {future.exception()}")
+            if backups and (not pending or time.perf_counter() >= hedge_at):
+                # Everything sent so far failed (fail over) or is slower than the hedge delay (hedge)
+                QUOTE_HEDGES.inc(reason="slow" if pending else "error")
+                pending.add(self._submit(backups.pop(0), symbols, sent))
+                hedge_at = time.perf_counter() + self.hedge_delay(ranking[0])
+        for future in pending:
+            future.cancel()
+        detail = "; ".join(errors) or f"no answer within {self.timeout:g}s"
+        raise QuoteUnavailable(f"No broker returned quotes ({detail})")
+
+    def _won(self, winner: str, losers: List[str]) -> None:
+        QUOTE_REQUESTS.inc(broker=winner, outcome="won")
+        with self._lock:
+            self.stats[winner].won += 1
+            for broker in losers:
+                self.stats[broker].lost += 1
+        for broker in losers:
+            QUOTE_REQUESTS.inc(broker=broker, outcome="lost")
+
+    def status(self) -> Dict[str, Any]:
+        ranking = self.ranking()
+        return {
+            "primary": ranking[0],
+            "ranking": ranking,
+            "hedge_delay_ms": round(self.hedge_delay(ranking[0]) * 1000, 2),
+            "brokers": {name: stats.as_dict() for name, stats in self.stats.items()},
+        }
+
+    def shutdown(self) -> None:
+        self._pool.shutdown(wait=False, cancel_futures=True)
+
+
+quote_facade: Optional[QuoteFacade] = None
+
+
+def get_quote_facade() -> QuoteFacade:
+    global quote_facade
+    if quote_facade is None:
+        quote_facade = QuoteFacade()
+    return quote_facade
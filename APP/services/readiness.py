@@ -0,0 +1,93 @@
+"""
+Registry of lazily initialised subsystems and their warm-up state.
+
+Modules that defer expensive setup (broker SDK imports, the DB engine) register
+here so the lifespan hook can warm them in the background and ``/ready`` can
+report which ones are usable.
+"""
+
+from __future__ import annotations
+
+import logging
+import os
+import threading
+import time
+from dataclasses import dataclass
+from typing import Any, Callable, Dict, Optional
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass
+class Subsystem:
+    name: str
+    is_warm: Callable[[], bool]
+    warm: Callable[[], Any]
+    required: bool = False
+    error: Optional[str] = None
+    warm_ms: Optional[float] = None
+
+
+_subsystems: Dict[str, Subsystem] = {}
+_lock = threading.Lock()
+_started = False
+
+
+def register(
+    name: str,
+    is_warm: Callable[[], bool],
+    warm: Callable[[], Any],
+    required: bool = False,
+) -> None:
+    """Register (or replace) a subsystem; ``READINESS_REQUIRED`` can mark it required."""
+    required_env = {
+        item.strip() for item in os.getenv("READINESS_REQUIRED", "").split(",") if item.strip()
+    }
+    with _lock:
+        _subsystems[name] = Subsystem(
+            name=name,
+            is_warm=is_warm,
+            warm=warm,
+            required=required or name in required_env,
+        )
+
+
+def mark_started(started: bool = True) -> None:
+    global _started
+    _started = started
+
+
+def warm_all() -> None:
+    """Initialise every cold subsystem, recording failures instead of raising."""
+    with _lock:
+        subsystems = list(_subsystems.values())
+    for subsystem in subsystems:
+        if subsystem.is_warm():
+            continue
+        start = time.perf_counter()
+        try:
+            subsystem.warm()
+            subsystem.error = None
+        except Exception as exc:
+            subsystem.error = str(exc)
+            logger.warning("Warm-up of %s failed: %s", subsystem.name, exc)
+        finally:
+            subsystem.warm_ms = round((time.perf_counter() - start) * 1000, 3)
+
+
+def report() -> Dict[str, Any]:
+    with _lock:
+        subsystems = list(_subsystems.values())
+    details = {
+        subsystem.name: {
+            "warm": subsystem.is_warm(),
+            "required": subsystem.required,
+            "warm_ms": subsystem.warm_ms,
+            "error": subsystem.error,
+        }
+        for subsystem in subsystems
+    }
+    ready = _started and all(
+        detail["warm"] for detail in details.values() if detail["required"]
+    )
+    return {"ready": ready, "started": _started, "subsystems": details}
@@ -0,0 +1,395 @@
+"""
+Market-hours-aware refresh of cached broker data.
+
+Routes serving broker data (option chains, quotes, the Kite profile behind
+``/api/broker/status``) register what they were asked for with
+:meth:`RefreshScheduler.watch`. A daemon thread re-fetches each watched key
+on a schedule set by the session phase of the NSE calendar
+(:func:`APP.services.market_calendar.market_phase`): every few seconds
+while the market is open, slower in the pre-open and closing sessions, and
+not at all when it is closed. Clients read from the caches, so however
+often a screen polls, the broker sees at most one call per key per interval.
+
+Quotes are watched per symbol with :meth:`RefreshScheduler.watch_many`, so
+overlapping watchlists share their symbols; symbols of one group (broker and
+user) that fall due together are fetched in one call of at most
+``REFRESH_BATCH_SIZE`` symbols (default 50). At most ``REFRESH_MAX_WATCHES``
+keys (default 500) are watched; a new key beyond that evicts the one read
+least recently, which bounds broker calls however many clients poll.
+
+Cache lifetimes follow the same policy (:meth:`RefreshPolicy.ttl`): a value
+fetched while the market is closed stays fresh until the next session
+starts, so overnight and weekend polling never reaches the broker. Keys
+nobody has read for ``REFRESH_WATCH_IDLE`` seconds (default 900) are
+dropped. Intervals per kind come from ``REFRESH_<KIND>_INTERVALS``, e.g.
+``REFRESH_OPTION_CHAIN_INTERVALS="open=3,pre_open=30,post_close=60,closed=off"``.
+"""
+
+from __future__ import annotations
+
+import logging
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field
+from datetime import datetime
+from typing import Any, Callable, Dict, Hashable, List, Optional, Sequence, Tuple
+
+from APP.services.market_calendar import PHASES, market_phase, next_phase_change, now_ist
+from APP.services.metrics import registry
+
+logger = logging.getLogger(__name__)
+
+OPTION_CHAIN = "option_chain"
+QUOTES = "quotes"
+PROFILE = "profile"
+
+SCHEDULED_REFRESHES = registry.counter(
+    "algonova_scheduled_refreshes_total",
+    "Background refreshes of cached broker data",
+    ("kind", "outcome"),
+)
+WATCHED_KEYS = registry.gauge(
+    "algonova_refresh_watched_keys",
+    "Cache keys kept fresh by the refresh scheduler",
+    ("kind",),
+)
+
+
+@dataclass(frozen=True)
+class RefreshPolicy:
+    """Seconds between refreshes per session phase; None means do not refresh."""
+
+    kind: str
+    intervals: Dict[str, Optional[float]]
+
+    @classmethod
+    def from_env(cls, kind: str, default: str) -> "RefreshPolicy":
+        raw = os.getenv(f"REFRESH_{kind.upper()}_INTERVALS", default)
+        intervals: Dict[str, Optional[float]] = {phase: None for phase in PHASES}
+        for item in raw.split(","):
+            if not item.strip():
+                continue
+            phase, _, value = item.partition("=")
+            phase, value = phase.strip(), value.strip().lower()
+            if phase not in intervals:
+                raise ValueError(f"Unknown market phase {phase!r} in REFRESH_{kind.upper()}_INTERVALS")
+            intervals[phase] = None if value in ("", "off", "none") else float(value)
+        return cls(kind, intervals)
+
+    def interval(self, phase: str) -> Optional[float]:
+        return self.intervals.get(phase)
+
+    def ttl(self, at: Optional[datetime] = None) -> float:
+        """
+        How long a value fetched at ``at`` stays fresh.
+
+        Half an interval of slack lets the scheduled refresh replace it before
+        it expires; in phases without refreshes it lasts until the phase ends.
+        """
+        at = at or now_ist()
+        interval = self.interval(market_phase(at))
+        until_change = (next_phase_change(at) - at).total_seconds()
+        if interval is None:
+            return max(1.0, until_change)
+        return interval * 1.5
+
+
+policies: Dict[str, RefreshPolicy] = {
+    OPTION_CHAIN: RefreshPolicy.from_env(OPTION_CHAIN, "pre_open=30,open=3,post_close=60,closed=off"),
+    QUOTES: RefreshPolicy.from_env(QUOTES, "pre_open=5,open=1,post_close=30,closed=off"),
+    PROFILE: RefreshPolicy.from_env(PROFILE, "pre_open=300,open=300,post_close=900,closed=off"),
+}
+
+
+@dataclass
+class _Watch:
+    kind: str
+    key: Hashable
+    fetch: Callable[[], Any]
+    last_read: float
+    group: Optional[Hashable] = None
+    member: Optional[Hashable] = None
+    due: float = 0.0
+    refreshed_at: Optional[float] = None
+    refreshes: int = 0
+    last_error: Optional[str] = None
+    running: bool = False
+
+    def as_dict(self) -> Dict[str, Any]:
+        return {
+            "kind": self.kind,
+            "key": repr(self.key),
+            "refreshes": self.refreshes,
+            "refreshed_at": self.refreshed_at,
+            "last_error": self.last_error,
+        }
+
+
+@dataclass
+class _Stats:
+    refreshes: Dict[str, int] = field(default_factory=dict)
+    errors: Dict[str, int] = field(default_factory=dict)
+    evicted: int = 0
+
+
+class RefreshScheduler:
+    """Keeps watched broker data fresh at a rate set by the market session phase."""
+
+    def __init__(
+        self,
+        policy_map: Optional[Dict[str, RefreshPolicy]] = None,
+        workers: Optional[int] = None,
+        idle: Optional[float] = None,
+        max_watches: Optional[int] = None,
+        batch_size: Optional[int] = None,
+        clock: Callable[[], datetime] = now_ist,
+        monotonic: Callable[[], float] = time.monotonic,
+    ) -> None:
+        self.policies = policy_map if policy_map is not None else policies
+        self.workers = workers or int(os.getenv("REFRESH_WORKERS", "4"))
+        self.idle = float(os.getenv("REFRESH_WATCH_IDLE", "900")) if idle is None else idle
+        self.max_watches = max_watches or int(os.getenv("REFRESH_MAX_WATCHES", "500"))
+        self.batch_size = batch_size or int(os.getenv("REFRESH_BATCH_SIZE", "50"))
+        self.clock = clock
+        self.monotonic = monotonic
+        self._watches: Dict[Tuple[str, Hashable], _Watch] = {}
+        self._batches: Dict[Tuple[str, Hashable], Callable[[List[Any]], Any]] = {}
+        self._lock = threading.Lock()
+        self._wake = threading.Event()
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self._pool: Optional[ThreadPoolExecutor] = None
+        self.stats = _Stats()
+        WATCHED_KEYS.set_function(self._watched_by_kind)
+
+    def _watched_by_kind(self) -> Dict[Tuple[str, ...], float]:
+        counts: Dict[Tuple[str, ...], float] = {(kind,): 0.0 for kind in self.policies}
+        for kind, _ in list(self._watches):
+            counts[(kind,)] = counts.get((kind,), 0.0) + 1
+        return counts
+
+    # -- registration --------------------------------------------------------
+
+    def watch(self, kind: str, key: Hashable, fetch: Callable[[], Any]) -> None:
+        """
+        Note that ``key`` of ``kind`` was read; ``fetch`` re-populates its cache.
+
+        The first read of a key schedules it one interval out (the read that
+        registered it has just fetched it); later reads only keep it alive.
+        """
+        if kind not in self.policies:
+            raise ValueError(f"Unknown refresh kind {kind!r}")
+        now = self.monotonic()
+        with self._lock:
+            added = self._touch(kind, key, fetch, now)
+        if added:
+            self._wake.set()
+
+    def watch_many(
+        self, kind: str, group: Hashable, members: Sequence[Hashable], fetch: Callable[[List[Any]], Any]
+    ) -> None:
+        """
+        Note that ``members`` of ``group`` were read; each is its own key ``(group, member)``.
+
+        Members of a group that fall due together are refreshed with one
+        ``fetch`` call per ``batch_size`` of them, given the members to fetch.
+        """
+        if kind not in self.policies:
+            raise ValueError(f"Unknown refresh kind {kind!r}")
+        now = self.monotonic()
+        added = False
+        with self._lock:
+            self._batches[(kind, group)] = fetch
+            for member in members:
+                added = self._touch(kind, (group, member), fetch, now, group, member) or added
+        if added:
+            self._wake.set()
+
+    def _touch(
+        self,
+        kind: str,
+        key: Hashable,
+        fetch: Callable[..., Any],
+        now: float,
+        group: Optional[Hashable] = None,
+        member: Optional[Hashable] = None,
+    ) -> bool:
+        watch = self._watches.get((kind, key))
+        if watch is not None:
+            watch.last_read = now
+            watch.fetch = fetch
+            return False
+        if len(self._watches) >= self.max_watches:
+            slot = min(self._watches, key=lambda slot: self._watches[slot].last_read)
+            self._forget(slot)
+            self.stats.evicted += 1
+            logger.debug("Refresh watch limit of %d reached; dropped %r", self.max_watches, slot)
+        interval = self.policies[kind].interval(market_phase(self.clock()))
+        self._watches[(kind, key)] = _Watch(
+            kind,
+            key,
+            fetch,
+            last_read=now,
+            group=group,
+            member=member,
+            due=now + (interval if interval is not None else 0.0),
+        )
+        return True
+
+    def _forget(self, slot: Tuple[str, Hashable]) -> None:
+        watch = self._watches.pop(slot, None)
+        if watch is None or watch.group is None:
+            return
+        batch = (watch.kind, watch.group)
+        if not any((other.kind, other.group) == batch for other in self._watches.values()):
+            self._batches.pop(batch, None)
+
+    def unwatch(self, kind: str, key: Hashable) -> None:
+        with self._lock:
+            self._forget((kind, key))
+
+    def watched(self, kind: Optional[str] = None) -> List[Dict[str, Any]]:
+        with self._lock:
+            return [watch.as_dict() for watch in self._watches.values() if kind is None or watch.kind == kind]
+
+    # -- scheduling ----------------------------------------------------------
+
+    def run_due(self, wall: Optional[datetime] = None) -> float:
+        """
+        Start every refresh that is due and drop idle keys.
+
+        Returns the seconds until something next needs doing.
+        """
+        wall = wall or self.clock()
+        phase = market_phase(wall)
+        until_change = max(0.0, (next_phase_change(wall) - wall).total_seconds())
+        now = self.monotonic()
+        due: List[_Watch] = []
+        batches: Dict[Tuple[str, Hashable], List[_Watch]] = {}
+        wait = until_change
+        with self._lock:
+            for slot, watch in list(self._watches.items()):
+                if now - watch.last_read > self.idle:
+                    self._forget(slot)
+                    continue
+                if watch.running:
+                    continue
+                interval = self.policies[watch.kind].interval(phase)
+                if interval is None:
+                    # Nothing to do until the phase changes; reschedule from the next one
+                    if watch.due <= now:
+                        watch.due = now + until_change
+                    continue
+                if watch.due <= now:
+                    watch.due = now + interval
+                    watch.running = True
+                    if watch.group is None:
+                        due.append(watch)
+                    else:
+                        batches.setdefault((watch.kind, watch.group), []).append(watch)
+                wait = min(wait, max(0.0, watch.due - now))
+            # Bring the rest of a due group along, so symbols added later fall into step with it
+            for watch in self._watches.values():
+                batch = (watch.kind, watch.group)
+                if watch.group is None or watch.running or batch not in batches:
+                    continue
+                interval = self.policies[watch.kind].interval(phase)
+                if interval is not None:
+                    watch.due = now + interval
+                    watch.running = True
+                    batches[batch].append(watch)
+            jobs: List[Tuple[Callable[..., None], tuple]] = [(self._refresh, (watch,)) for watch in due]
+            for batch, members in batches.items():
+                fetch = self._batches[batch]
+                for offset in range(0, len(members), self.batch_size):
+                    jobs.append((self._refresh_batch, (fetch, members[offset:offset + self.batch_size])))
+        for job, args in jobs:
+            if self._pool is not None:
+                self._pool.submit(job, *args)
+            else:
+                job(*args)
+        return wait
+
+    def _refresh(self, watch: _Watch) -> None:
+        self._run_fetch(watch.kind, repr(watch.key), [watch], watch.fetch)
+
+    def _refresh_batch(self, fetch: Callable[[List[Any]], Any], watches: List[_Watch]) -> None:
+        members = [watch.member for watch in watches]
+        self._run_fetch(watches[0].kind, f"{watches[0].group!r} {members!r}", watches, lambda: fetch(members))
+
+    def _run_fetch(self, kind: str, label: str, watches: List[_Watch], fetch: Callable[[], Any]) -> None:
+        try:
+            fetch()
+        except Exception as exc:
+            level = logging.DEBUG if watches[0].last_error == str(exc) else logging.WARNING
+            for watch in watches:
+                watch.last_error = str(exc)
+            self.stats.errors[kind] = self.stats.errors.get(kind, 0) + 1
+            SCHEDULED_REFRESHES.inc(kind=kind, outcome="error")
+            logger.log(level, "Scheduled %s refresh of %s failed: %s", kind, label, exc)
+        else:
+            refreshed_at = time.time()
+            for watch in watches:
+                watch.last_error = None
+                watch.refreshes += 1
+                watch.refreshed_at = refreshed_at
+            self.stats.refreshes[kind] = self.stats.refreshes.get(kind, 0) + 1
+            SCHEDULED_REFRESHES.inc(kind=kind, outcome="ok")
+        finally:
+            for watch in watches:
+                watch.running = False
+
+    # -- lifecycle -----------------------------------------------------------
+
+    def start(self) -> None:
+        if self._thread is not None and self._thread.is_alive():
+            return
+        self._stop.clear()
+        self._pool = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="refresh")
+        self._thread = threading.Thread(target=self._run, name="refresh-scheduler", daemon=True)
+        self._thread.start()
+
+    def stop(self, timeout: float = 5.0) -> None:
+        self._stop.set()
+        self._wake.set()
+        if self._thread is not None:
+            self._thread.join(timeout)
+            self._thread = None
+        if self._pool is not None:
+            self._pool.shutdown(wait=False, cancel_futures=True)
+            self._pool = None
+
+    def _run(self) -> None:
+        while not self._stop.is_set():
+            try:
+                wait = self.run_due()
+            except Exception:
+                logger.exception("Refresh scheduler iteration failed")
+                wait = 5.0
+            # Never sleep long: idle keys must expire and a clock jump must be noticed
+            self._wake.wait(min(max(wait, 0.05), 60.0))
+            self._wake.clear()
+
+    def status(self) -> Dict[str, Any]:
+        wall = self.clock()
+        phase = market_phase(wall)
+        with self._lock:
+            watched: Dict[str, int] = {}
+            for kind, _ in self._watches:
+                watched[kind] = watched.get(kind, 0) + 1
+        return {
+            "running": self._thread is not None and self._thread.is_alive(),
+            "phase": phase,
+            "next_phase_change": next_phase_change(wall).isoformat(),
+            "intervals": {kind: policy.interval(phase) for kind, policy in self.policies.items()},
+            "watched": watched,
+            "max_watches": self.max_watches,
+            "evicted": self.stats.evicted,
+            "refreshes": dict(self.stats.refreshes),
+            "errors": dict(self.stats.errors),
+        }
+
+
+refresh_scheduler = RefreshScheduler()
@@ -0,0 +1,287 @@
+"""
+Deterministic replay of recorded trading days through the live tick path.
+
+A day recorded by the tick store (compressed per-minute blocks, see
+``APP.services.tick_store``) is exported once with :func:`export_day` into
+a flat replay file: a ``.npy`` array of fixed-size records (timestamp,
+price, volume, oi, symbol index) in replay order, plus a ``.json`` sidecar
+listing the symbols. Replay order is fixed at export: by timestamp, ties by
+symbol name, then in recorded order within a symbol. Every run therefore
+delivers the same ticks in the same order, whatever the speed, and
+:attr:`ReplayFile.digest` identifies the sequence.
+
+:func:`open_replay` memory-maps the array, so a day of several million
+ticks opens instantly and is paged in as it is read.
+
+:func:`replay` publishes the ticks as :class:`~APP.services.market_data.Tick`
+on a :class:`ReplayBus`, a ``TickBus`` that times every subscriber. It can
+mirror the handlers of the live ``tick_bus`` (candles, alerts, paper
+trading, ...) or use any handlers given. Speed is a multiple of real time:
+1 replays the session as it happened, 10 replays it ten times faster, and
+0 goes as fast as the handlers allow. The report gives throughput, how far
+publishing fell behind schedule and, per stage, the time spent in that
+handler and the tick-to-stage latency (from publish to the end of that
+handler); the stage with the largest total time is named the bottleneck.
+
+Replay files live in ``TICK_REPLAY_DIR`` (default ``tick_replay``).
+"""
+
+from __future__ import annotations
+
+import json
+import logging
+import os
+import time
+import zlib
+from array import array
+from dataclasses import dataclass
+from datetime import date
+from pathlib import Path
+from typing import Any, Callable, Dict, Iterable, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from APP.services.market_data import Tick, TickBus, TickHandler
+from APP.services.metrics import time_db_query
+from APP.services.tick_store import day_table, decode_block, merge_blocks
+
+logger = logging.getLogger(__name__)
+
+FORMAT_VERSION = 1
+REPLAY_DTYPE = np.dtype(
+    [("timestamp", "<f8"), ("price", "<f8"), ("volume", "<f8"), ("oi", "<f8"), ("symbol", "<u4")]
+)
+# Ticks converted to Python objects per slice of the memory map
+_CHUNK = 8192
+
+
+def replay_dir() -> Path:
+    return Path(os.getenv("TICK_REPLAY_DIR", "tick_replay"))
+
+
+def replay_path(day: date, directory: Optional[Path] = None) -> Path:
+    return (directory or replay_dir()) / f"ticks-{day:%Y%m%d}.npy"
+
+
+# -- replay files ---------------------------------------------------------------
+
+
+def write_replay_file(path: Path, columns: Dict[str, Dict[str, np.ndarray]], label: str = "") -> Path:
+    """
+    Write per-symbol tick columns (``timestamp``, ``price``, ``volume``,
+    optional ``oi``) as one replay file in replay order.
+    """
+    symbols = sorted(columns)
+    parts = []
+    for index, symbol in enumerate(symbols):
+        ticks = columns[symbol]
+        count = len(ticks["timestamp"])
+        part = np.empty(count, dtype=REPLAY_DTYPE)
+        part["timestamp"] = ticks["timestamp"]
+        part["price"] = ticks["price"]
+        part["volume"] = ticks["volume"]
+        part["oi"] = ticks["oi"] if ticks.get("oi") is not None else np.nan
+        part["symbol"] = index
+        parts.append(part)
+    records = np.concatenate(parts) if parts else np.empty(0, dtype=REPLAY_DTYPE)
+    # Symbols are concatenated in name order, so a stable sort settles ties by name, then arrival
+    records = records[np.argsort(records["timestamp"], kind="stable")]
+
+    path.parent.mkdir(parents=True, exist_ok=True)
+    temporary = path.with_name(f".{path.name}.partial")
+    with temporary.open("wb") as fh:
+        np.save(fh, records, allow_pickle=False)
+    meta = {
+        "format": FORMAT_VERSION,
+        "label": label,
+        "symbols": symbols,
+        "count": int(len(records)),
+        "digest": zlib.crc32(records.tobytes()),
+    }
+    path.with_suffix(".json").write_text(json.dumps(meta, indent=2), encoding="utf-8")
+    os.replace(temporary, path)
+    return path
+
+
+def export_day(
+    day: date, engine: Any = None, directory: Optional[Path] = None, symbols: Optional[Sequence[str]] = None
+) -> Path:
+    """Decode every stored block of ``day`` (optionally only ``symbols``) into a replay file."""
+    from sqlalchemy import select
+
+    if engine is None:
+        from APP.fyersApp.db.connection import get_engine
+
+        engine = get_engine()
+    table = day_table(day, engine)
+    query = select(table.c.symbol, table.c.payload).order_by(table.c.symbol, table.c.minute)
+    if symbols:
+        query = query.where(table.c.symbol.in_(list(symbols)))
+    blocks: Dict[str, List[Dict[str, np.ndarray]]] = {}
+    with time_db_query("export_tick_blocks"):
+        with engine.connect() as connection:
+            for symbol, payload in connection.execute(query):
+                blocks.setdefault(symbol, []).append(decode_block(payload))
+    columns = {symbol: merge_blocks(symbol_blocks) for symbol, symbol_blocks in blocks.items()}
+    return write_replay_file(replay_path(day, directory), columns, label=day.isoformat())
+
+
+@dataclass
+class ReplayFile:
+    path: Path
+    symbols: List[str]
+    records: np.ndarray
+    label: str
+    digest: int
+
+    def __len__(self) -> int:
+        return len(self.records)
+
+    def window(self, start: Optional[float] = None, end: Optional[float] = None) -> np.ndarray:
+        """Records with ``start <= timestamp < end``; a view into the map, nothing is copied."""
+        stamps = self.records["timestamp"]
+        first = 0 if start is None else int(np.searchsorted(stamps, start, side="left"))
+        last = len(stamps) if end is None else int(np.searchsorted(stamps, end, side="left"))
+        return self.records[first:last]
+
+
+def open_replay(path: Path) -> ReplayFile:
+    meta = json.loads(path.with_suffix(".json").read_text(encoding="utf-8"))
+    if meta.get("format") != FORMAT_VERSION:
+        raise ValueError(f"Unsupported replay file format {meta.get('format')!r} in {path}")
+    records = np.load(path, mmap_mode="r", allow_pickle=False)
+    if records.dtype != REPLAY_DTYPE or len(records) != meta["count"]:
+        raise ValueError(f"Replay file {path} does not match its sidecar")
+    return ReplayFile(path, list(meta["symbols"]), records, meta.get("label", ""), int(meta["digest"]))
+
+
+# -- instrumented bus -----------------------------------------------------------
+
+
+def _stage_name(handler: TickHandler) -> str:
+    owner = getattr(handler, "__self__", None)
+    name = getattr(handler, "__name__", type(handler).__name__)
+    return f"{type(owner).__name__}.{name}" if owner is not None else name
+
+
+class ReplayBus(TickBus):
+    """``TickBus`` that records, per handler, its own time and the time since publish at its end."""
+
+    def __init__(self, handlers: Iterable[TickHandler] = ()) -> None:
+        super().__init__()
+        # Per stage: its own time and the time from publish to its end, in ns
+        self._samples: Dict[str, Tuple[array, array]] = {}
+        self._stages: Dict[TickHandler, Tuple[array, array]] = {}
+        for handler in handlers:
+            self.subscribe(handler)
+
+    @classmethod
+    def mirroring(cls, bus: TickBus) -> "ReplayBus":
+        """A bus with the same subscribers as ``bus`` (normally the live ``tick_bus``)."""
+        return cls(bus._handlers)
+
+    def subscribe(self, handler: TickHandler) -> None:
+        super().subscribe(handler)
+        self._stages[handler] = self._samples.setdefault(_stage_name(handler), (array("q"), array("q")))
+
+    def publish(self, tick: Tick) -> None:
+        self.published += 1
+        clock = time.perf_counter_ns
+        stages = self._stages
+        started = previous = clock()
+        for handler in self._handlers:
+            try:
+                handler(tick)
+            except Exception:
+                logger.exception("Tick handler %r failed for %s", handler, tick.symbol)
+            now = clock()
+            own, since_publish = stages[handler]
+            own.append(now - previous)
+            since_publish.append(now - started)
+            previous = now
+
+    def stage_stats(self) -> Dict[str, Dict[str, float]]:
+        stats = {}
+        for name, (own, since_publish) in self._samples.items():
+            if not own:
+                continue
+            own_us = np.frombuffer(own, dtype=np.int64) / 1000.0
+            since_us = np.frombuffer(since_publish, dtype=np.int64) / 1000.0
+            stats[name] = {
+                "ticks": int(len(own_us)),
+                "total_seconds": float(own_us.sum() / 1e6),
+                "mean_us": float(own_us.mean()),
+                "p50_us": float(np.percentile(own_us, 50)),
+                "p99_us": float(np.percentile(own_us, 99)),
+                "max_us": float(own_us.max()),
+                "tick_to_stage_p50_us": float(np.percentile(since_us, 50)),
+                "tick_to_stage_p99_us": float(np.percentile(since_us, 99)),
+            }
+        return stats
+
+
+# -- replay ---------------------------------------------------------------------
+
+
+def replay(
+    replay_file: ReplayFile,
+    bus: ReplayBus,
+    speed: float = 0.0,
+    start: Optional[float] = None,
+    end: Optional[float] = None,
+    clock: Callable[[], float] = time.perf_counter,
+    sleep: Callable[[float], None] = time.sleep,
+) -> Dict[str, Any]:
+    """
+    Publish the ticks of ``replay_file`` (within [start, end)) on ``bus``.
+
+    With ``speed > 0`` tick ``i`` is published ``(t_i - t_0) / speed``
+    seconds after the first; ``speed=0`` publishes back to back.
+    """
+    if speed < 0:
+        raise ValueError("speed must be >= 0 (0 replays as fast as possible)")
+    records = replay_file.window(start, end)
+    symbols = replay_file.symbols
+    lag = array("d")
+    count = 0
+    first_stamp = float(records["timestamp"][0]) if len(records) else 0.0
+    began = clock()
+    for offset in range(0, len(records), _CHUNK):
+        chunk = records[offset:offset + _CHUNK]
+        columns = zip(
+            chunk["timestamp"].tolist(),
+            chunk["price"].tolist(),
+            chunk["volume"].tolist(),
+            chunk["oi"].tolist(),
+            chunk["symbol"].tolist(),
+        )
+        for stamp, price, volume, oi, symbol in columns:
+            if speed > 0:
+                due = began + (stamp - first_stamp) / speed
+                wait = due - clock()
+                if wait > 0:
+                    sleep(wait)
+                lag.append(max(0.0, clock() - due))
+            bus.publish(Tick(symbols[symbol], price, volume, stamp, None if oi != oi else oi))
+            count += 1
+    elapsed = clock() - began
+
+    stages = bus.stage_stats()
+    session = float(records["timestamp"][-1]) - first_stamp if count else 0.0
+    report: Dict[str, Any] = {
+        "label": replay_file.label,
+        "digest": replay_file.digest if len(records) == len(replay_file) else zlib.crc32(records.tobytes()),
+        "ticks": count,
+        "speed": speed or "max",
+        "wall_seconds": elapsed,
+        "session_seconds": session,
+        "ticks_per_second": count / elapsed if elapsed > 0 else 0.0,
+        "achieved_speed": session / elapsed if elapsed > 0 else 0.0,
+        "stages": stages,
+        "bottleneck": max(stages, key=lambda name: stages[name]["total_seconds"]) if stages else None,
+    }
+    if lag:
+        lag_ms = np.frombuffer(lag, dtype=np.float64) * 1000
+        report["schedule_lag_p99_ms"] = float(np.percentile(lag_ms, 99))
+        report["schedule_lag_max_ms"] = float(lag_ms.max())
+    return report
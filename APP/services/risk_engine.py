@@ -0,0 +1,455 @@
+"""
+Pre-trade risk checks.
+
+Every order is checked against in-memory limit state before it reaches a
+broker, so the order path never waits on the database:
+
+* max quantity and max notional value per order
+* max absolute notional exposure per symbol (after the order)
+* max daily loss (realised + mark-to-market); once hit only orders that
+  reduce an existing position are accepted
+* order rate, as a token bucket; orders that reduce a position (square-offs,
+  basket rollbacks) neither need nor take a token
+
+Positions and P&L are kept per symbol and updated incrementally from fills
+and price marks, so each check is a handful of dict lookups and float ops.
+Positions are seeded from the brokers' positions calls (at startup and at
+the pre-market warm-up), open positions are marked from the tick bus, and
+the token scheduler starts a new day's P&L on each new trading day.
+Each session user (``APP.services.sessions``) gets an engine of their own
+from :func:`risk_for`, so positions, daily loss and the order rate are never
+shared between users; the legacy single-user session uses ``risk_engine``.
+Breaches are queued to the ``system_logs`` write-behind buffer
+(``APP.services.write_behind``); a missing or failing database never
+blocks an order.
+
+Limits come from ``RISK_*`` environment variables; 0 disables a limit.
+"""
+
+from __future__ import annotations
+
+import logging
+import os
+import threading
+import time
+from dataclasses import dataclass, field
+from datetime import datetime, timezone
+from typing import Any, Callable, Dict, List, Optional
+
+from APP.services.market_data import Tick, TickBus, tick_bus
+from APP.services.metrics import registry
+from APP.services.sessions import current_user
+
+logger = logging.getLogger(__name__)
+
+RISK_BREACHES = registry.counter(
+    "algonova_risk_breaches_total",
+    "Orders rejected by the pre-trade risk engine",
+    ("rule",),
+)
+RISK_BREACHES_DROPPED = registry.counter(
+    "algonova_risk_breaches_dropped_total",
+    "Risk breaches that could not be queued for system_logs",
+)
+
+BUY = "BUY"
+SELL = "SELL"
+
+
+def _env_float(name: str) -> float:
+    return float(os.getenv(name, "0") or 0)
+
+
+@dataclass
+class RiskLimits:
+    max_order_quantity: int = 0
+    max_order_value: float = 0.0
+    max_symbol_exposure: float = 0.0
+    max_daily_loss: float = 0.0
+    max_orders_per_second: float = 0.0
+    order_burst: int = 0
+
+    @classmethod
+    def from_env(cls) -> "RiskLimits":
+        return cls(
+            max_order_quantity=int(_env_float("RISK_MAX_ORDER_QUANTITY")),
+            max_order_value=_env_float("RISK_MAX_ORDER_VALUE"),
+            max_symbol_exposure=_env_float("RISK_MAX_SYMBOL_EXPOSURE"),
+            max_daily_loss=_env_float("RISK_MAX_DAILY_LOSS"),
+            max_orders_per_second=_env_float("RISK_MAX_ORDERS_PER_SECOND"),
+            order_burst=int(_env_float("RISK_ORDER_BURST")),
+        )
+
+
+@dataclass
+class RiskBreach:
+    rule: str
+    message: str
+    symbol: str
+    side: str
+    quantity: int
+    price: float
+    user_id: Optional[int] = None
+    at: datetime = field(default_factory=lambda: datetime.now(timezone.utc))
+
+
+class RiskLimitExceeded(ValueError):
+    """Raised by :meth:`RiskEngine.enforce`; ``breach`` has the details."""
+
+    def __init__(self, breach: RiskBreach) -> None:
+        super().__init__(breach.message)
+        self.breach = breach
+
+
+class _Position:
+    __slots__ = ("quantity", "average_price", "last_price", "realized")
+
+    def __init__(self) -> None:
+        self.quantity = 0
+        self.average_price = 0.0
+        self.last_price = 0.0
+        self.realized = 0.0
+
+    @property
+    def unrealized(self) -> float:
+        return (self.last_price - self.average_price) * self.quantity
+
+
+def _breach_row(breach: RiskBreach) -> Dict[str, Any]:
+    return {
+        "user_id": breach.user_id,
+        "level": "WARNING",
+        "message": f"Risk breach [{breach.rule}] {breach.side} {breach.quantity} "
+        f"{breach.symbol} @ {breach.price}: {breach.message}",
+        "created_at": breach.at,
+    }
+
+
+def _submit_system_logs(breaches: List[RiskBreach]) -> None:
+    from APP.services import write_behind
+
+    for breach in breaches:
+        write_behind.submit("system_logs", _breach_row(breach))
+
+
+class BreachRecorder:
+    """Hands breaches to the ``system_logs`` write-behind buffer without blocking the check."""
+
+    def __init__(self, sink: Optional[Callable[[List[RiskBreach]], None]] = None) -> None:
+        self.sink = sink or _submit_system_logs
+
+    def record(self, breach: RiskBreach) -> None:
+        try:
+            self.sink([breach])
+        except Exception as exc:
+            RISK_BREACHES_DROPPED.inc()
+            logger.warning("Could not queue risk breach for system_logs: %s", exc)
+
+    def flush(self) -> bool:
+        """Force the pending ``system_logs`` rows out; True once written."""
+        if self.sink is not _submit_system_logs:
+            return True
+        from APP.services import write_behind
+
+        buffer = write_behind.get_buffer("system_logs")
+        buffer.flush()
+        return len(buffer) == 0
+
+
+class RiskEngine:
+    """In-memory pre-trade checks; all state updates are O(1) per order or fill."""
+
+    def __init__(
+        self,
+        limits: Optional[RiskLimits] = None,
+        recorder: Optional[BreachRecorder] = None,
+        clock: Callable[[], float] = time.monotonic,
+    ) -> None:
+        self.recorder = recorder or BreachRecorder()
+        self.clock = clock
+        self._positions: Dict[str, _Position] = {}
+        self._realized = 0.0
+        self._unrealized = 0.0
+        self._lock = threading.Lock()
+        self._bus: Optional[TickBus] = None
+        self.configure(limits or RiskLimits.from_env())
+
+    def configure(self, limits: RiskLimits) -> None:
+        with self._lock:
+            self.limits = limits
+            rate = limits.max_orders_per_second
+            self._bucket_capacity = float(limits.order_burst or max(1.0, rate))
+            self._tokens = self._bucket_capacity
+            self._refilled_at = self.clock()
+
+    # -- checks --------------------------------------------------------------
+
+    def check(
+        self,
+        symbol: str,
+        side: str,
+        quantity: int,
+        price: float,
+        user_id: Optional[int] = None,
+        consume_rate: bool = True,
+    ) -> Optional[RiskBreach]:
+        """
+        Return the first breached rule for the order, or ``None`` if it may go out.
+
+        ``consume_rate=False`` evaluates without taking an order-rate token
+        (pre-validation of orders that are placed, and enforced, later).
+        """
+        limits = self.limits
+        signed = quantity if side == BUY else -quantity
+        value = quantity * price
+        rule = message = None
+
+        with self._lock:
+            position = self._positions.get(symbol)
+            current = position.quantity if position is not None else 0
+            after = current + signed
+            reduces = abs(after) < abs(current)
+
+            if quantity <= 0:
+                rule, message = "quantity", "Order quantity must be positive"
+            elif limits.max_order_quantity and quantity > limits.max_order_quantity:
+                rule, message = "max_quantity", (
+                    f"Quantity {quantity} exceeds limit {limits.max_order_quantity}"
+                )
+            elif limits.max_order_value and value > limits.max_order_value:
+                rule, message = "max_order_value", (
+                    f"Order value {value:.2f} exceeds limit {limits.max_order_value:.2f}"
+                )
+            elif (
+                limits.max_symbol_exposure
+                and not reduces
+                and abs(after) * price > limits.max_symbol_exposure
+            ):
+                rule, message = "symbol_exposure", (
+                    f"Exposure {abs(after) * price:.2f} in {symbol} would exceed "
+                    f"limit {limits.max_symbol_exposure:.2f}"
+                )
+            elif (
+                limits.max_daily_loss
+                and not reduces
+                and self._realized + self._unrealized <= -limits.max_daily_loss
+            ):
+                rule, message = "daily_loss", (
+                    f"Daily loss {-(self._realized + self._unrealized):.2f} reached limit "
+                    f"{limits.max_daily_loss:.2f}; only position-reducing orders allowed"
+                )
+            elif limits.max_orders_per_second and consume_rate and not reduces:
+                now = self.clock()
+                tokens = self._tokens + (now - self._refilled_at) * limits.max_orders_per_second
+                self._tokens = min(self._bucket_capacity, tokens)
+                self._refilled_at = now
+                if self._tokens < 1.0:
+                    rule, message = "order_rate", (
+                        f"Order rate above {limits.max_orders_per_second:g}/s"
+                    )
+                else:
+                    self._tokens -= 1.0
+
+        if rule is None:
+            return None
+        breach = RiskBreach(rule, message, symbol, side, quantity, price, user_id)
+        RISK_BREACHES.inc(rule=rule)
+        self.recorder.record(breach)
+        return breach
+
+    def enforce(
+        self, symbol: str, side: str, quantity: int, price: float, user_id: Optional[int] = None
+    ) -> None:
+        breach = self.check(symbol, side, quantity, price, user_id)
+        if breach is not None:
+            raise RiskLimitExceeded(breach)
+
+    # -- state updates -------------------------------------------------------
+
+    def on_fill(self, symbol: str, side: str, quantity: int, price: float) -> None:
+        """Apply an executed fill to the position and P&L totals."""
+        signed = quantity if side == BUY else -quantity
+        with self._lock:
+            position = self._positions.get(symbol)
+            if position is None:
+                position = self._positions[symbol] = _Position()
+            self._unrealized -= position.unrealized
+            current = position.quantity
+
+            if current == 0 or (current > 0) == (signed > 0):
+                total = abs(current) + quantity
+                position.average_price = (
+                    position.average_price * abs(current) + price * quantity
+                ) / total
+            else:
+                closed = min(quantity, abs(current))
+                pnl = closed * (price - position.average_price) * (1 if current > 0 else -1)
+                position.realized += pnl
+                self._realized += pnl
+                if quantity > abs(current):
+                    position.average_price = price
+                elif quantity == abs(current):
+                    position.average_price = 0.0
+
+            position.quantity = current + signed
+            position.last_price = price
+            self._unrealized += position.unrealized
+
+    def on_price(self, symbol: str, price: float) -> None:
+        """Mark an open position to ``price``."""
+        if symbol not in self._positions:
+            return
+        with self._lock:
+            position = self._positions.get(symbol)
+            if position is None:
+                return
+            self._unrealized += (price - position.last_price) * position.quantity
+            position.last_price = price
+
+    def on_tick(self, tick: Tick) -> None:
+        self.on_price(tick.symbol, tick.price)
+
+    def set_position(
+        self,
+        symbol: str,
+        quantity: int,
+        average_price: float,
+        last_price: Optional[float] = None,
+        realized: Optional[float] = None,
+    ) -> None:
+        """Seed or overwrite a position, e.g. from the broker's positions API at startup."""
+        with self._lock:
+            position = self._positions.get(symbol)
+            if position is None:
+                position = self._positions[symbol] = _Position()
+            self._unrealized -= position.unrealized
+            position.quantity = quantity
+            position.average_price = average_price
+            position.last_price = average_price if last_price is None else last_price
+            self._unrealized += position.unrealized
+            if realized is not None:
+                self._realized += realized - position.realized
+                position.realized = realized
+
+    def load_positions(self, rows: List[Dict[str, Any]]) -> int:
+        """
+        Seed positions from broker rows (``symbol``, ``quantity``, ``average_price``,
+        ``last_price``, ``realized``) as returned by the services' ``get_positions``.
+        """
+        for row in rows:
+            self.set_position(
+                row["symbol"],
+                int(row["quantity"]),
+                float(row["average_price"]),
+                float(row["last_price"]) if row.get("last_price") else None,
+                float(row.get("realized") or 0.0),
+            )
+        return len(rows)
+
+    def reset_day(self) -> None:
+        """Start a new trading day: realised P&L and the rate bucket are reset."""
+        with self._lock:
+            self._realized = 0.0
+            for position in self._positions.values():
+                position.realized = 0.0
+            self._tokens = self._bucket_capacity
+            self._refilled_at = self.clock()
+
+    def start(self, bus: TickBus = tick_bus) -> None:
+        if self._bus is None:
+            bus.subscribe(self.on_tick)
+            self._bus = bus
+
+    def stop(self) -> None:
+        if self._bus is not None:
+            self._bus.unsubscribe(self.on_tick)
+            self._bus = None
+
+    @property
+    def daily_pnl(self) -> float:
+        return self._realized + self._unrealized
+
+    def snapshot(self) -> Dict[str, Any]:
+        with self._lock:
+            positions = {
+                symbol: {
+                    "quantity": position.quantity,
+                    "average_price": position.average_price,
+                    "last_price": position.last_price,
+                    "realized": position.realized,
+                    "unrealized": position.unrealized,
+                }
+                for symbol, position in self._positions.items()
+                if position.quantity or position.realized
+            }
+            return {
+                "limits": self.limits.__dict__.copy(),
+                "daily_pnl": self._realized + self._unrealized,
+                "realized": self._realized,
+                "unrealized": self._unrealized,
+                "positions": positions,
+            }
+
+
+risk_engine = RiskEngine()
+
+
+class UserRiskEngines:
+    """One :class:`RiskEngine` per session user, built on first use with the ``RISK_*`` limits."""
+
+    def __init__(self, legacy: RiskEngine, factory: Callable[[], RiskEngine] = RiskEngine) -> None:
+        self.legacy = legacy
+        self.factory = factory
+        self._engines: Dict[str, RiskEngine] = {}
+        self._lock = threading.Lock()
+        self._bus: Optional[TickBus] = None
+
+    def for_user(self, user: Optional[str]) -> RiskEngine:
+        if user is None:
+            return self.legacy
+        engine = self._engines.get(user)
+        if engine is None:
+            with self._lock:
+                engine = self._engines.get(user)
+                if engine is None:
+                    engine = self.factory()
+                    if self._bus is not None:
+                        engine.start(self._bus)
+                    self._engines[user] = engine
+        return engine
+
+    def users(self) -> List[str]:
+        return sorted(self._engines)
+
+    def reset_day(self) -> None:
+        """New trading day for every user's engine (the legacy one included)."""
+        self.legacy.reset_day()
+        for engine in list(self._engines.values()):
+            engine.reset_day()
+
+    def start(self, bus: TickBus = tick_bus) -> None:
+        with self._lock:
+            self._bus = bus
+            engines = [self.legacy, *self._engines.values()]
+        for engine in engines:
+            engine.start(bus)
+
+    def stop(self) -> None:
+        with self._lock:
+            self._bus = None
+            engines = [self.legacy, *self._engines.values()]
+        for engine in engines:
+            engine.stop()
+
+
+risk_engines = UserRiskEngines(risk_engine)
+
+
+def risk_for(user: Optional[str]) -> RiskEngine:
+    """Risk engine of session user ``user``; ``risk_engine`` for None, the legacy session."""
+    return risk_engines.for_user(user)
+
+
+def current_risk() -> RiskEngine:
+    """Risk engine of the user the current request (or ``use_user`` block) acts for."""
+    return risk_engines.for_user(current_user())
@@ -0,0 +1,172 @@
+"""
+Per-user broker sessions.
+
+Each request runs on behalf of a user ID taken from the ``X-User-ID`` header
+(name set by ``SESSION_USER_HEADER``) or a ``user`` query parameter, which
+broker login redirects and browser WebSockets can carry. The ID is only an
+identifier: it must be set by whatever authenticates users in front of this
+service (gateway, reverse proxy), never trusted straight from the internet.
+Requests without one use the legacy single-user token files
+(``kite_token.json`` / ``FYERS_TOKEN_PATH``), so a one-trader deployment
+works as before.
+
+Token files for identified users live under ``SESSION_DIR`` (default
+``sessions``) as ``<broker>/<user_id>.json``. Parsed files are kept in a
+bounded LRU and re-read only when their mtime or size changes, and the
+authenticated SDK clients built from them sit in LRU caches with an idle TTL
+(``SESSION_CLIENT_CACHE_SIZE``, default 1024; ``SESSION_CLIENT_IDLE_TTL``
+seconds, default 6h) that slides on every use. Memory is bounded by the
+cache sizes however many users are registered, and a user who keeps trading
+keeps a warm client.
+"""
+
+from __future__ import annotations
+
+import json
+import os
+import re
+import tempfile
+from contextlib import contextmanager
+from contextvars import ContextVar
+from pathlib import Path
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+from urllib.parse import parse_qs
+
+from APP.services.cache import TTLCache
+
+_USER_ID = re.compile(r"^[A-Za-z0-9][A-Za-z0-9_.@-]{0,63}$")
+
+_current_user: ContextVar[Optional[str]] = ContextVar("session_user", default=None)
+
+
+def client_cache_size() -> int:
+    return int(os.getenv("SESSION_CLIENT_CACHE_SIZE", "1024"))
+
+
+def client_idle_ttl() -> float:
+    return float(os.getenv("SESSION_CLIENT_IDLE_TTL", str(6 * 3600)))
+
+
+def validate_user_id(user_id: str) -> str:
+    """Return ``user_id`` if it is usable as a file name; raises ValueError otherwise."""
+    if not _USER_ID.match(user_id):
+        raise ValueError("user id must be 1-64 characters of letters, digits, '_', '.', '@' or '-'")
+    return user_id
+
+
+def current_user() -> Optional[str]:
+    """User the current request acts for; None for the legacy single-user session."""
+    return _current_user.get()
+
+
+@contextmanager
+def use_user(user_id: Optional[str]) -> Iterator[None]:
+    """Run a block (e.g. a background job) on behalf of ``user_id``."""
+    token = _current_user.set(validate_user_id(user_id) if user_id is not None else None)
+    try:
+        yield
+    finally:
+        _current_user.reset(token)
+
+
+class SessionStore:
+    """Token files of one broker, one per user, with a stat-validated read cache."""
+
+    def __init__(self, broker: str, root: Optional[str] = None, cache_size: Optional[int] = None) -> None:
+        self.broker = broker
+        self._root = root
+        self._files: TTLCache[Tuple[Tuple[int, int], Dict[str, Any]]] = TTLCache(
+            f"{broker}_sessions", ttl=float("inf"), maxsize=cache_size or client_cache_size()
+        )
+
+    @property
+    def root(self) -> Path:
+        return Path(self._root or os.getenv("SESSION_DIR", "sessions")) / self.broker
+
+    def path_for(self, user_id: str) -> Path:
+        return self.root / f"{validate_user_id(user_id)}.json"
+
+    def load(self, path: Path) -> Optional[Dict[str, Any]]:
+        """Parsed contents of ``path`` (a copy), or None when it does not exist."""
+        try:
+            stat = path.stat()
+        except FileNotFoundError:
+            self._files.invalidate(str(path))
+            return None
+        version = (stat.st_mtime_ns, stat.st_size)
+        cached = self._files.get(str(path))
+        if cached is None or cached[0] != version:
+            with path.open("r", encoding="utf-8") as fh:
+                cached = (version, json.load(fh))
+            self._files.set(str(path), cached)
+        return dict(cached[1])
+
+    def save(self, path: Path, payload: Dict[str, Any]) -> None:
+        """Write ``payload`` atomically, so concurrent readers never see half a file."""
+        path.parent.mkdir(parents=True, exist_ok=True)
+        fd, temporary = tempfile.mkstemp(prefix=f".{path.name}.", dir=path.parent)
+        try:
+            with os.fdopen(fd, "w", encoding="utf-8") as fh:
+                json.dump(payload, fh, indent=2)
+            os.replace(temporary, path)
+        except BaseException:
+            Path(temporary).unlink(missing_ok=True)
+            raise
+
+    def delete(self, path: Path) -> None:
+        path.unlink(missing_ok=True)
+        self._files.invalidate(str(path))
+
+    def users(self) -> List[str]:
+        """User IDs with a stored session."""
+        if not self.root.is_dir():
+            return []
+        return sorted(path.stem for path in self.root.glob("*.json"))
+
+
+kite_sessions = SessionStore("kite")
+fyers_sessions = SessionStore("fyers")
+
+
+class UserContextMiddleware:
+    """ASGI middleware binding the request's user ID (header or ``user`` query parameter)."""
+
+    def __init__(self, app: Any, header_name: Optional[str] = None) -> None:
+        self.app = app
+        self.header = (header_name or os.getenv("SESSION_USER_HEADER", "X-User-ID")).lower().encode("latin-1")
+
+    async def __call__(self, scope: Dict[str, Any], receive: Any, send: Any) -> None:
+        if scope["type"] not in ("http", "websocket"):
+            await self.app(scope, receive, send)
+            return
+        user_id = None
+        for key, value in scope.get("headers", []):
+            if key == self.header:
+                user_id = value.decode("latin-1").strip()
+                break
+        if not user_id and scope.get("query_string"):
+            values = parse_qs(scope["query_string"].decode("latin-1")).get("user")
+            user_id = values[0].strip() if values else None
+        if user_id and not _USER_ID.match(user_id):
+            await _reject(scope, send, "Invalid user id")
+            return
+        token = _current_user.set(user_id or None)
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            _current_user.reset(token)
+
+
+async def _reject(scope: Dict[str, Any], send: Any, message: str) -> None:
+    if scope["type"] == "websocket":
+        await send({"type": "websocket.close", "code": 1008})
+        return
+    body = json.dumps({"detail": message}).encode("utf-8")
+    await send(
+        {
+            "type": "http.response.start",
+            "status": 400,
+            "headers": [(b"content-type", b"application/json"), (b"content-length", str(len(body)).encode())],
+        }
+    )
+    await send({"type": "http.response.body", "body": body})
@@ -0,0 +1,482 @@
+"""
+Last tick per instrument in shared memory, for every uvicorn worker.
+
+One process (the feed handler) runs the broker tick socket and writes the
+latest price, cumulative volume, OI and exchange timestamp of each
+instrument into a fixed-layout shared-memory segment; the other workers
+map the same segment and read it directly, with no socket, copy of the
+feed or IPC round-trip of their own.
+
+Layout (``SHARED_TICKS_CAPACITY`` slots, default 4096), struct of arrays::
+
+    header   int64[8]     magic, layout version, capacity, slots in use,
+                          writer pid, generation, ticks written, dropped
+    names    S48[cap]     canonical symbol per slot (``NSE:TCS-EQ``)
+    seq      uint64[cap]  per-slot sequence lock
+    price, volume, oi, timestamp, written   float64[cap]
+
+Slots are handed out in arrival order and never reused while the segment
+lives; a symbol's name is written before ``slots in use`` is raised, so a
+reader that finds a slot number sees its name. Each slot is guarded by a
+sequence lock: the writer makes ``seq`` odd, writes the fields, and makes
+it even again; a reader takes ``seq``, reads, and retries unless ``seq``
+was even and unchanged. Readers never block the writer and take no lock.
+This relies on stores becoming visible in program order, which holds on
+x86-64; there is a single writer.
+
+``SHARED_TICKS_MODE`` selects the role: ``off`` (default), ``writer``,
+``reader`` or ``auto``, where the first worker to take an exclusive lock
+on ``<tmp>/<SHARED_TICKS_NAME>.lock`` becomes the writer (the lock goes
+with the process, so a restarted worker can take over) and the rest read.
+Only the writer streams ticks (and records them to the tick store). Each
+reader mirrors the table onto its own tick bus: every
+``SHARED_TICKS_POLL_INTERVAL`` seconds (default 0.02) it publishes the
+latest tick of each instrument written since the last poll, so candles,
+alerts, paper fills and position marks work in every worker. Ticks an
+instrument gets between two polls are coalesced into the latest one, so
+a reader's candles can miss a high or low that lasted less than a poll.
+"""
+
+from __future__ import annotations
+
+import logging
+import os
+import sys
+import tempfile
+import threading
+import time
+from dataclasses import dataclass
+from multiprocessing import resource_tracker, shared_memory
+from typing import Any, Dict, Iterable, List, Optional
+
+import numpy as np
+
+from APP.services.market_data import Tick, TickBus, tick_bus
+
+logger = logging.getLogger(__name__)
+
+WRITER = "writer"
+READER = "reader"
+MAGIC = 0x414C474F5449434B  # "ALGOTICK"
+LAYOUT_VERSION = 1
+NAME_BYTES = 48
+_FIELDS = ("price", "volume", "oi", "timestamp", "written")
+# Header words
+_MAGIC, _VERSION, _CAPACITY, _COUNT, _WRITER_PID, _GENERATION, _TICKS, _DROPPED = range(8)
+# Attempts at a consistent read before giving up on a slot being rewritten
+_READ_ATTEMPTS = 64
+
+
+def segment_size(capacity: int) -> int:
+    return 8 * 8 + capacity * (NAME_BYTES + 8 + 8 * len(_FIELDS))
+
+
+def _canonical(symbol: str) -> str:
+    from APP.services.quotes import normalize_symbol
+
+    try:
+        return normalize_symbol(symbol)
+    except ValueError:
+        return symbol.strip()
+
+
+def _attach_untracked(name: str) -> shared_memory.SharedMemory:
+    """Map an existing segment without registering it for unlinking when this process exits."""
+    if sys.version_info >= (3, 13):
+        return shared_memory.SharedMemory(name=name, track=False)
+    # Before 3.13 every mapping is tracked and unlinked at exit, which would pull the segment
+    # from under the writer; only the writer owns it, so skip registration while attaching
+    register = resource_tracker.register
+    resource_tracker.register = lambda name, rtype: None  # type: ignore[assignment]
+    try:
+        return shared_memory.SharedMemory(name=name)
+    finally:
+        resource_tracker.register = register  # type: ignore[assignment]
+
+
+@dataclass(slots=True)
+class LastTick:
+    symbol: str
+    price: float
+    volume: float
+    oi: Optional[float]
+    timestamp: float
+    # Wall-clock time the feed handler wrote it
+    written: float
+
+    def as_dict(self, now: float) -> Dict[str, Any]:
+        return {
+            "symbol": self.symbol,
+            "ltp": self.price,
+            "volume": self.volume,
+            "oi": self.oi,
+            "timestamp": self.timestamp,
+            "age": max(0.0, now - self.written),
+        }
+
+
+class SharedTickTable:
+    """NumPy views over the shared segment; :meth:`on_tick` writes, :meth:`read` / :meth:`read_many` read."""
+
+    def __init__(self, memory: shared_memory.SharedMemory, owner: bool) -> None:
+        self.memory = memory
+        self.owner = owner
+        buffer = memory.buf
+        self._header = np.ndarray(8, dtype=np.int64, buffer=buffer)
+        if self._header[_MAGIC] != MAGIC or self._header[_VERSION] != LAYOUT_VERSION:
+            raise ValueError(f"Shared memory {memory.name!r} does not hold a tick table")
+        capacity = self.capacity = int(self._header[_CAPACITY])
+        offset = 64
+        self._names = np.ndarray(capacity, dtype=f"S{NAME_BYTES}", buffer=buffer, offset=offset)
+        offset += capacity * NAME_BYTES
+        self._seq = np.ndarray(capacity, dtype=np.uint64, buffer=buffer, offset=offset)
+        offset += capacity * 8
+        columns = []
+        for _ in _FIELDS:
+            columns.append(np.ndarray(capacity, dtype=np.float64, buffer=buffer, offset=offset))
+            offset += capacity * 8
+        self._price, self._volume, self._oi, self._timestamp, self._written = columns
+        # Local symbol -> slot maps; rebuilt when the writer starts a new generation
+        self._generation = -1
+        self._slots: Dict[str, int] = {}
+        self._known = 0
+        self._raw: Dict[str, int] = {}
+        # Slot sequence numbers already mirrored by :meth:`changed`
+        self._seen = np.zeros(capacity, dtype=np.uint64)
+
+    @classmethod
+    def create(cls, name: str, capacity: int) -> "SharedTickTable":
+        """Create the segment (or take over a stale one of the same size) as its writer."""
+        size = segment_size(capacity)
+        try:
+            memory = shared_memory.SharedMemory(name=name, create=True, size=size)
+        except FileExistsError:
+            memory = shared_memory.SharedMemory(name=name)
+            if memory.size < size:
+                memory.close()
+                raise ValueError(f"Shared memory {name!r} exists with a smaller size; remove it first")
+        header = np.ndarray(8, dtype=np.int64, buffer=memory.buf)
+        generation = int(header[_GENERATION]) + 1 if header[_MAGIC] == MAGIC else 1
+        header[_COUNT] = 0
+        header[_CAPACITY] = capacity
+        header[_VERSION] = LAYOUT_VERSION
+        header[_WRITER_PID] = os.getpid()
+        header[_TICKS] = header[_DROPPED] = 0
+        header[_GENERATION] = generation
+        header[_MAGIC] = MAGIC
+        del header
+        return cls(memory, owner=True)
+
+    @classmethod
+    def attach(cls, name: str) -> "SharedTickTable":
+        memory = _attach_untracked(name)
+        try:
+            return cls(memory, owner=False)
+        except ValueError:
+            memory.close()
+            raise
+
+    # -- writer --------------------------------------------------------------
+
+    def _assign(self, raw: str) -> int:
+        symbol = _canonical(raw)
+        slot = self._slots.get(symbol)
+        if slot is None:
+            count = int(self._header[_COUNT])
+            if count >= self.capacity:
+                return -1
+            slot = count
+            self._names[slot] = symbol.encode()[:NAME_BYTES]
+            self._seq[slot] = 0
+            # Publish the slot only once its name is in place
+            self._header[_COUNT] = count + 1
+            self._slots[symbol] = slot
+        self._raw[raw] = slot
+        return slot
+
+    def on_tick(self, tick: Tick) -> None:
+        slot = self._raw.get(tick.symbol)
+        if slot is None:
+            slot = self._assign(tick.symbol)
+        header = self._header
+        if slot < 0:
+            header[_DROPPED] += 1
+            return
+        seq = self._seq
+        seq[slot] += 1
+        self._price[slot] = tick.price
+        self._volume[slot] = tick.volume
+        self._oi[slot] = np.nan if tick.oi is None else tick.oi
+        self._timestamp[slot] = tick.timestamp
+        self._written[slot] = time.time()
+        seq[slot] += 1
+        header[_TICKS] += 1
+
+    # -- readers -------------------------------------------------------------
+
+    def _sync(self) -> None:
+        generation = int(self._header[_GENERATION])
+        if generation != self._generation:
+            self._generation = generation
+            self._slots, self._raw, self._known = {}, {}, 0
+            self._seen[:] = 0
+        count = min(int(self._header[_COUNT]), self.capacity)
+        for slot in range(self._known, count):
+            self._slots[self._names[slot].decode()] = slot
+        self._known = count
+
+    def slot(self, symbol: str) -> Optional[int]:
+        """Slot of ``symbol`` (either broker's notation), None if the feed has not sent it."""
+        if not self.owner:
+            self._sync()
+        found = self._raw.get(symbol)
+        if found is None:
+            found = self._slots.get(_canonical(symbol))
+            if found is None:
+                return None
+            self._raw[symbol] = found
+        return found
+
+    def read(self, symbol: str) -> Optional[LastTick]:
+        slot = self.slot(symbol)
+        if slot is None:
+            return None
+        seq = self._seq
+        for _ in range(_READ_ATTEMPTS):
+            before = int(seq[slot])
+            if before & 1:
+                # Mid-write; in the writer's own process it needs the GIL back to finish
+                time.sleep(0)
+                continue
+            values = (
+                float(self._price[slot]),
+                float(self._volume[slot]),
+                float(self._oi[slot]),
+                float(self._timestamp[slot]),
+                float(self._written[slot]),
+            )
+            if int(seq[slot]) == before:
+                if before == 0:
+                    return None
+                price, volume, oi, stamp, written = values
+                return LastTick(
+                    self._names[slot].decode(), price, volume, None if oi != oi else oi, stamp, written
+                )
+            time.sleep(0)
+        return None
+
+    def read_many(self, symbols: Iterable[str]) -> Dict[str, LastTick]:
+        """Latest ticks for ``symbols`` (keyed as given); one vectorised pass, retrying only torn slots."""
+        wanted = [(symbol, self.slot(symbol)) for symbol in symbols]
+        wanted = [(symbol, slot) for symbol, slot in wanted if slot is not None]
+        if not wanted:
+            return {}
+        slots = np.fromiter((slot for _, slot in wanted), dtype=np.int64, count=len(wanted))
+        before = self._seq[slots]
+        fields = (self._price, self._volume, self._oi, self._timestamp, self._written)
+        columns = [column[slots] for column in fields]
+        after = self._seq[slots]
+        clean = (before == after) & (before % 2 == 0) & (before > 0)
+        found: Dict[str, LastTick] = {}
+        rows = zip(clean.tolist(), *(column.tolist() for column in columns))
+        for (symbol, slot), (ok, price, volume, oi, stamp, written) in zip(wanted, rows):
+            if ok:
+                name = self._names[slot].decode()
+                found[symbol] = LastTick(name, price, volume, None if oi != oi else oi, stamp, written)
+            else:
+                tick = self.read(symbol)
+                if tick is not None:
+                    found[symbol] = tick
+        return found
+
+    def changed(self) -> List[LastTick]:
+        """
+        Latest tick of every slot rewritten since the previous call, in one vectorised pass.
+
+        Slots caught mid-write are left for the next call.
+        """
+        self._sync()
+        count = self._known
+        seq = self._seq[:count].copy()
+        moved = np.flatnonzero((seq != self._seen[:count]) & (seq % 2 == 0) & (seq > 0))
+        if not len(moved):
+            return []
+        fields = (self._price, self._volume, self._oi, self._timestamp, self._written)
+        columns = [column[moved] for column in fields]
+        clean = self._seq[moved] == seq[moved]
+        self._seen[moved[clean]] = seq[moved[clean]]
+        ticks: List[LastTick] = []
+        rows = zip(moved.tolist(), clean.tolist(), *(column.tolist() for column in columns))
+        for slot, ok, price, volume, oi, stamp, written in rows:
+            if ok:
+                name = self._names[slot].decode()
+                ticks.append(LastTick(name, price, volume, None if oi != oi else oi, stamp, written))
+        return ticks
+
+    def writer_alive(self) -> bool:
+        """Whether the process that last took the table over still runs (always True off POSIX)."""
+        if os.name != "posix":
+            return True
+        try:
+            os.kill(int(self._header[_WRITER_PID]), 0)
+        except ProcessLookupError:
+            return False
+        except PermissionError:
+            pass
+        return True
+
+    def status(self) -> Dict[str, Any]:
+        header = self._header
+        return {
+            "name": self.memory.name,
+            "role": WRITER if self.owner else READER,
+            "capacity": self.capacity,
+            "symbols": int(header[_COUNT]),
+            "ticks": int(header[_TICKS]),
+            "dropped": int(header[_DROPPED]),
+            "writer_pid": int(header[_WRITER_PID]),
+            "generation": int(header[_GENERATION]),
+        }
+
+    def close(self) -> None:
+        # Views must go before the mapping can be released
+        self._header = self._names = self._seq = None  # type: ignore[assignment]
+        self._price = self._volume = self._oi = self._timestamp = self._written = None  # type: ignore
+        self.memory.close()
+        if self.owner:
+            try:
+                self.memory.unlink()
+            except FileNotFoundError:
+                pass
+
+
+# -- process role -------------------------------------------------------------
+
+table: Optional[SharedTickTable] = None
+role: Optional[str] = None
+_lock_file: Any = None
+_bus: Optional[TickBus] = None
+_checked_at = 0.0
+# Tables of writers that went away; request threads may still be reading them, so they close at stop()
+_retired: List[SharedTickTable] = []
+_attach_lock = threading.Lock()
+_mirror: Optional[threading.Thread] = None
+_mirror_stop = threading.Event()
+
+
+def _name() -> str:
+    return os.getenv("SHARED_TICKS_NAME", "algonova_ticks")
+
+
+def _elect(name: str) -> bool:
+    """Take the writer lock for ``name`` if no other live process holds it."""
+    global _lock_file
+    try:
+        import fcntl
+    except ImportError:  # pragma: no cover - Windows: the first creator writes
+        try:
+            shared_memory.SharedMemory(name=name).close()
+            return False
+        except FileNotFoundError:
+            return True
+    handle = open(os.path.join(tempfile.gettempdir(), f"{name}.lock"), "a+")
+    try:
+        fcntl.flock(handle, fcntl.LOCK_EX | fcntl.LOCK_NB)
+    except OSError:
+        handle.close()
+        return False
+    _lock_file = handle
+    return True
+
+
+def start(bus: TickBus = tick_bus, mode: Optional[str] = None) -> Optional[str]:
+    """Take this process's role per ``SHARED_TICKS_MODE``; the writer mirrors ``bus`` into the table."""
+    global table, role, _bus
+    mode = (mode or os.getenv("SHARED_TICKS_MODE", "off")).lower()
+    if mode in ("", "off", "false", "0") or role is not None:
+        return role
+    if mode not in (WRITER, READER, "auto"):
+        raise ValueError("SHARED_TICKS_MODE must be off, writer, reader or auto")
+    name = _name()
+    if mode == WRITER or (mode == "auto" and _elect(name)):
+        table = SharedTickTable.create(name, int(os.getenv("SHARED_TICKS_CAPACITY", "4096")))
+        bus.subscribe(table.on_tick)
+        _bus = bus
+        role = WRITER
+    else:
+        # Attached on first read: the writer may not have created the segment yet
+        role = READER
+        _start_mirror(bus, float(os.getenv("SHARED_TICKS_POLL_INTERVAL", "0.02")))
+    logger.info("Shared tick table %s: %s (pid %d)", name, role, os.getpid())
+    return role
+
+
+def get_table() -> Optional[SharedTickTable]:
+    """
+    The table to read from, attaching a reader on first use; None when off or not yet written.
+
+    A writer that exits unlinks its segment, so readers check (at most once a second) that it is
+    alive and re-attach to its successor's segment when it is not.
+    """
+    global table, _checked_at
+    if role != READER:
+        return table
+    with _attach_lock:
+        if table is not None and time.monotonic() - _checked_at > 1.0:
+            _checked_at = time.monotonic()
+            if not table.writer_alive():
+                _retired.append(table)
+                table = None
+        if table is None:
+            try:
+                table = SharedTickTable.attach(_name())
+            except (FileNotFoundError, ValueError) as exc:
+                logger.debug("Shared tick table not available yet: %s", exc)
+        return table
+
+
+def _start_mirror(bus: TickBus, interval: float) -> None:
+    global _mirror
+    _mirror_stop.clear()
+    _mirror = threading.Thread(target=_mirror_ticks, args=(bus, interval), name="shared-ticks", daemon=True)
+    _mirror.start()
+
+
+def _mirror_ticks(bus: TickBus, interval: float) -> None:
+    """Reader side: publish the writer's new ticks on this process's ``bus``."""
+    while not _mirror_stop.wait(interval):
+        current = get_table()
+        if current is None:
+            continue
+        try:
+            for tick in current.changed():
+                bus.publish(Tick(tick.symbol, tick.price, tick.volume, tick.timestamp, tick.oi))
+        except Exception:
+            logger.exception("Could not mirror shared ticks")
+
+
+def stop() -> None:
+    global table, role, _bus, _lock_file, _mirror
+    if _mirror is not None:
+        _mirror_stop.set()
+        _mirror.join(5.0)
+        _mirror = None
+    if _bus is not None and table is not None:
+        _bus.unsubscribe(table.on_tick)
+    _bus = None
+    if table is not None:
+        table.close()
+        table = None
+    while _retired:
+        _retired.pop().close()
+    if _lock_file is not None:
+        _lock_file.close()
+        _lock_file = None
+    role = None
+
+
+def status() -> Optional[Dict[str, Any]]:
+    current = get_table()
+    if current is not None:
+        return current.status()
+    return {"role": role, "attached": False} if role is not None else None
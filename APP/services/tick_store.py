@@ -0,0 +1,582 @@
+"""
+Tick persistence: compact buffers, per-minute compressed blocks, bulk loads.
+
+Ticks from :data:`APP.services.market_data.tick_bus` are appended to typed
+``array`` columns (timestamp ms, price, cumulative volume, OI) per symbol -
+32 bytes a tick instead of a Python object. When a minute is over (plus
+``TICK_STORE_CLOSE_GRACE`` seconds) the flush thread seals it into one
+:class:`TickBlock`: OHLC/volume summary columns plus a payload holding every
+tick, delta-encoded as int64 (prices in 1/``TICK_PRICE_SCALE`` units),
+byte-shuffled and zlib-compressed. A liquid symbol's minute of ticks becomes
+one row of a few hundred bytes.
+
+Blocks are inserted with one ``executemany`` per ``TICK_STORE_BATCH_SIZE``
+rows (``fast_executemany`` on pyodbc, see ``connection.get_engine``), all in
+one transaction, into a table per IST trading day
+(``<TICK_TABLE_PREFIX>_YYYYMMDD``, created on first use) so a day can be
+queried, archived or dropped on its own.
+
+When an insert fails the blocks are spilled to ``TICK_STORE_SPILL_DIR``
+(default ``tick_spill``) as columnar ``.npz`` files - one array per column,
+payloads concatenated - and loaded from there, oldest first, once the
+database takes writes again; new blocks queue behind them on disk so rows
+land in order. With the spill directory set to empty, up to
+``TICK_STORE_MAX_PENDING`` blocks wait in memory and the oldest are dropped. A minute can produce more
+than one block (ticks arriving after it was sealed); readers merge them.
+"""
+
+from __future__ import annotations
+
+import logging
+import os
+import struct
+import threading
+import time
+import zipfile
+import zlib
+from array import array
+from dataclasses import dataclass
+from datetime import date, datetime, timezone
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+import numpy as np
+
+from APP.services.market_calendar import IST
+from APP.services.market_data import Tick, TickBus, tick_bus
+from APP.services.metrics import registry, time_db_query
+
+logger = logging.getLogger(__name__)
+
+ENCODING_VERSION = 1
+# version, tick count, price scale, has OI
+_HEADER = struct.Struct("<BIdB")
+
+TICKS_RECORDED = registry.counter(
+    "algonova_ticks_recorded_total",
+    "Ticks buffered by the tick store",
+)
+TICK_BLOCKS = registry.counter(
+    "algonova_tick_blocks_total",
+    "Per-minute tick blocks handled by the tick store",
+    ("outcome",),
+)
+TICK_STORE_PENDING = registry.gauge(
+    "algonova_tick_store_pending_blocks",
+    "Sealed tick blocks waiting in memory for the database",
+)
+
+
+# -- block encoding -----------------------------------------------------------
+
+
+def _shuffle(values: np.ndarray) -> bytes:
+    # Byte-plane transpose: small deltas leave most high-order planes zero, which zlib crushes
+    return values.astype("<i8").view(np.uint8).reshape(-1, 8).T.tobytes()
+
+
+def _unshuffle(raw: bytes, count: int) -> np.ndarray:
+    planes = np.frombuffer(raw, dtype=np.uint8).reshape(8, count)
+    return planes.T.copy().view("<i8").reshape(-1)
+
+
+def encode_block(
+    timestamps_ms: np.ndarray,
+    prices: np.ndarray,
+    volumes: np.ndarray,
+    oi: Optional[np.ndarray] = None,
+    price_scale: float = 100.0,
+    level: int = 1,
+) -> bytes:
+    """Pack one block's ticks; :func:`decode_block` reverses it exactly (prices to the scale)."""
+    columns = [
+        np.asarray(timestamps_ms, dtype=np.int64),
+        np.rint(np.asarray(prices, dtype=np.float64) * price_scale).astype(np.int64),
+        np.rint(np.asarray(volumes, dtype=np.float64)).astype(np.int64),
+    ]
+    if oi is not None:
+        columns.append(np.rint(np.asarray(oi, dtype=np.float64)).astype(np.int64))
+    deltas = np.concatenate([np.diff(column, prepend=np.int64(0)) for column in columns])
+    header = _HEADER.pack(ENCODING_VERSION, len(columns[0]), price_scale, oi is not None)
+    return header + zlib.compress(_shuffle(deltas), level)
+
+
+def decode_block(payload: bytes) -> Dict[str, np.ndarray]:
+    """``{"timestamp": epoch seconds, "price", "volume", "oi"}`` (OI absent if never sent)."""
+    version, count, price_scale, has_oi = _HEADER.unpack_from(payload)
+    if version != ENCODING_VERSION:
+        raise ValueError(f"Unsupported tick block encoding {version}")
+    columns = 4 if has_oi else 3
+    deltas = _unshuffle(zlib.decompress(payload[_HEADER.size:]), count * columns)
+    values = np.cumsum(deltas.reshape(columns, count), axis=1)
+    decoded = {
+        "timestamp": values[0] / 1000.0,
+        "price": values[1] / price_scale,
+        "volume": values[2].astype(np.float64),
+    }
+    if has_oi:
+        decoded["oi"] = values[3].astype(np.float64)
+    return decoded
+
+
+@dataclass
+class TickBlock:
+    symbol: str
+    # Epoch minute (UTC seconds // 60) the ticks fall in
+    minute: int
+    count: int
+    open: float
+    high: float
+    low: float
+    close: float
+    # Traded in the block: change of the cumulative day volume
+    volume: float
+    payload: bytes
+
+    @property
+    def trading_day(self) -> date:
+        return datetime.fromtimestamp(self.minute * 60, IST).date()
+
+    def as_row(self) -> Dict[str, Any]:
+        return {
+            "symbol": self.symbol,
+            "minute": _utc_naive(self.minute * 60),
+            "tick_count": self.count,
+            "open": self.open,
+            "high": self.high,
+            "low": self.low,
+            "close": self.close,
+            "volume": self.volume,
+            "encoding": ENCODING_VERSION,
+            "payload": self.payload,
+        }
+
+
+class _OpenMinute:
+    """Typed column buffers for one symbol's ticks within one minute."""
+
+    __slots__ = ("minute", "base_volume", "timestamps", "prices", "volumes", "oi", "has_oi")
+
+    def __init__(self, minute: int, base_volume: Optional[float] = None) -> None:
+        self.minute = minute
+        # Cumulative volume at the symbol's previous tick; the minute's volume counts from there
+        self.base_volume = base_volume
+        self.timestamps = array("q")
+        self.prices = array("d")
+        self.volumes = array("d")
+        self.oi = array("d")
+        self.has_oi = False
+
+    def append(self, timestamp_ms: int, price: float, volume: float, oi: Optional[float]) -> None:
+        self.timestamps.append(timestamp_ms)
+        self.prices.append(price)
+        self.volumes.append(volume)
+        if oi is None:
+            # Carry the last OI forward so the column stays aligned
+            self.oi.append(self.oi[-1] if self.oi else 0.0)
+        else:
+            self.oi.append(oi)
+            self.has_oi = True
+
+
+def _seal(symbol: str, buffer: _OpenMinute, price_scale: float, level: int) -> TickBlock:
+    timestamps = np.frombuffer(buffer.timestamps, dtype=np.int64)
+    prices = np.frombuffer(buffer.prices, dtype=np.float64)
+    volumes = np.frombuffer(buffer.volumes, dtype=np.float64)
+    oi = np.frombuffer(buffer.oi, dtype=np.float64) if buffer.has_oi else None
+    base = buffer.base_volume
+    if base is None or base > volumes[0]:
+        # A symbol's first block, a late block, or the cumulative count was reset
+        base = float(volumes[0])
+    return TickBlock(
+        symbol=symbol,
+        minute=buffer.minute,
+        count=len(prices),
+        open=float(prices[0]),
+        high=float(prices.max()),
+        low=float(prices.min()),
+        close=float(prices[-1]),
+        volume=max(0.0, float(volumes[-1] - base)),
+        payload=encode_block(timestamps, prices, volumes, oi, price_scale, level),
+    )
+
+
+# -- database -----------------------------------------------------------------
+
+_tables: Dict[str, Any] = {}
+_tables_lock = threading.Lock()
+
+
+def table_name(day: date) -> str:
+    return f"{os.getenv('TICK_TABLE_PREFIX', 'tick_blocks')}_{day:%Y%m%d}"
+
+
+def day_table(day: date, engine: Any = None) -> Any:
+    """The ``Table`` for ``day``; created in the database the first time it is asked for."""
+    name = table_name(day)
+    table = _tables.get(name)
+    if table is None:
+        from sqlalchemy import (
+            Column, DateTime, Float, Index, Integer, LargeBinary, MetaData, SmallInteger, String, Table,
+        )
+
+        with _tables_lock:
+            table = _tables.get(name)
+            if table is None:
+                table = Table(
+                    name,
+                    MetaData(),
+                    Column("symbol", String(64), nullable=False),
+                    Column("minute", DateTime, nullable=False),
+                    Column("tick_count", Integer, nullable=False),
+                    Column("open", Float, nullable=False),
+                    Column("high", Float, nullable=False),
+                    Column("low", Float, nullable=False),
+                    Column("close", Float, nullable=False),
+                    Column("volume", Float, nullable=False),
+                    Column("encoding", SmallInteger, nullable=False),
+                    Column("payload", LargeBinary, nullable=False),
+                    # Not unique: a minute can gain a second block from late ticks
+                    Index(f"ix_{name}_symbol_minute", "symbol", "minute"),
+                )
+                if engine is not None:
+                    table.create(engine, checkfirst=True)
+                _tables[name] = table
+    return table
+
+
+def sql_sink(
+    engine_factory: Optional[Callable[[], Any]] = None, batch_size: int = 1000
+) -> Callable[[List[TickBlock]], None]:
+    """Sink inserting blocks into their day tables, one transaction per call."""
+
+    def engine() -> Any:
+        if engine_factory is not None:
+            return engine_factory()
+        from APP.fyersApp.db.connection import get_engine
+
+        return get_engine()
+
+    def insert(blocks: List[TickBlock]) -> None:
+        by_day: Dict[date, List[Dict[str, Any]]] = {}
+        for block in blocks:
+            by_day.setdefault(block.trading_day, []).append(block.as_row())
+        current = engine()
+        with time_db_query("bulk_insert_tick_blocks"):
+            with current.begin() as connection:
+                for day, rows in by_day.items():
+                    statement = day_table(day, current).insert()
+                    for start in range(0, len(rows), batch_size):
+                        connection.execute(statement, rows[start:start + batch_size])
+
+    return insert
+
+
+def read_ticks(
+    symbol: str, day: date, engine: Any = None, start: Optional[float] = None, end: Optional[float] = None
+) -> Dict[str, np.ndarray]:
+    """Stored ticks of ``symbol`` on ``day`` in time order, optionally within [start, end) epoch seconds."""
+    from sqlalchemy import select
+
+    if engine is None:
+        from APP.fyersApp.db.connection import get_engine
+
+        engine = get_engine()
+    table = day_table(day, engine)
+    query = select(table.c.payload).where(table.c.symbol == symbol).order_by(table.c.minute)
+    if start is not None:
+        query = query.where(table.c.minute >= _utc_naive(start // 60 * 60))
+    if end is not None:
+        query = query.where(table.c.minute < _utc_naive(end))
+    with time_db_query("read_tick_blocks"):
+        with engine.connect() as connection:
+            payloads = [row[0] for row in connection.execute(query)]
+    return merge_blocks([decode_block(payload) for payload in payloads], start, end)
+
+
+def _utc_naive(epoch: float) -> datetime:
+    return datetime.fromtimestamp(epoch, timezone.utc).replace(tzinfo=None)
+
+
+def merge_blocks(
+    blocks: List[Dict[str, np.ndarray]], start: Optional[float] = None, end: Optional[float] = None
+) -> Dict[str, np.ndarray]:
+    names = ("timestamp", "price", "volume", "oi")
+    if not blocks:
+        return {name: np.empty(0) for name in names}
+    merged = {
+        name: np.concatenate([block.get(name, np.full(len(block["price"]), np.nan)) for block in blocks])
+        for name in names
+    }
+    # Late blocks of a minute sort back into place; stable keeps arrival order on ties
+    order = np.argsort(merged["timestamp"], kind="stable")
+    keep = order
+    if start is not None or end is not None:
+        stamps = merged["timestamp"][order]
+        mask = np.ones(len(order), dtype=bool)
+        if start is not None:
+            mask &= stamps >= start
+        if end is not None:
+            mask &= stamps < end
+        keep = order[mask]
+    return {name: values[keep] for name, values in merged.items()}
+
+
+# -- spill files --------------------------------------------------------------
+
+
+def write_spill(path: Path, blocks: List[TickBlock]) -> None:
+    """Write ``blocks`` column by column; the rename makes the file appear complete or not at all."""
+    payloads = [block.payload for block in blocks]
+    offsets = np.cumsum([0] + [len(payload) for payload in payloads], dtype=np.int64)
+    temporary = path.with_name(f".{path.name}.partial")
+    with temporary.open("wb") as fh:
+        np.savez(
+            fh,
+            symbol=np.array([block.symbol for block in blocks]),
+            minute=np.array([block.minute for block in blocks], dtype=np.int64),
+            count=np.array([block.count for block in blocks], dtype=np.int64),
+            ohlcv=np.array(
+                [(block.open, block.high, block.low, block.close, block.volume) for block in blocks],
+                dtype=np.float64,
+            ),
+            offsets=offsets,
+            payload=np.frombuffer(b"".join(payloads), dtype=np.uint8),
+        )
+    os.replace(temporary, path)
+
+
+def read_spill(path: Path) -> List[TickBlock]:
+    with np.load(path, allow_pickle=False) as data:
+        symbols, minutes, counts = data["symbol"], data["minute"], data["count"]
+        ohlcv, offsets, payload = data["ohlcv"], data["offsets"], data["payload"]
+        return [
+            TickBlock(
+                str(symbols[index]), int(minutes[index]), int(counts[index]),
+                *(float(value) for value in ohlcv[index]),
+                payload=payload[offsets[index]:offsets[index + 1]].tobytes(),
+            )
+            for index in range(len(symbols))
+        ]
+
+
+# -- recorder -----------------------------------------------------------------
+
+
+class TickRecorder:
+    """Buffers ticks per symbol-minute and writes sealed minutes in bulk, spilling when behind."""
+
+    def __init__(
+        self,
+        sink: Optional[Callable[[List[TickBlock]], None]] = None,
+        spill_dir: Optional[Path] = None,
+        flush_interval: Optional[float] = None,
+        close_grace: Optional[float] = None,
+        max_pending: Optional[int] = None,
+        price_scale: Optional[float] = None,
+        compression: int = 1,
+        clock: Callable[[], float] = time.time,
+    ) -> None:
+        self.sink = sink or sql_sink(batch_size=int(os.getenv("TICK_STORE_BATCH_SIZE", "1000")))
+        if spill_dir is None:
+            configured = os.getenv("TICK_STORE_SPILL_DIR", "tick_spill")
+            spill_dir = Path(configured) if configured else None
+        self.spill_dir = spill_dir
+        if flush_interval is None:
+            flush_interval = float(os.getenv("TICK_STORE_FLUSH_INTERVAL", "1.0"))
+        if close_grace is None:
+            close_grace = float(os.getenv("TICK_STORE_CLOSE_GRACE", "2.0"))
+        self.flush_interval = flush_interval
+        self.close_grace = close_grace
+        self.max_pending = max_pending or int(os.getenv("TICK_STORE_MAX_PENDING", "20000"))
+        self.price_scale = price_scale or float(os.getenv("TICK_PRICE_SCALE", "100"))
+        self.compression = compression
+        self.clock = clock
+
+        self._open: Dict[str, _OpenMinute] = {}
+        # Ticks for minutes a symbol has already moved past
+        self._late: Dict[Tuple[str, int], _OpenMinute] = {}
+        # Cumulative volume of each symbol's latest in-order tick
+        self._last_volume: Dict[str, float] = {}
+        self._pending: List[TickBlock] = []
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._spill_seq = 0
+        self._spills: List[Path] = []
+        if spill_dir is not None:
+            spill_dir.mkdir(parents=True, exist_ok=True)
+            self._spills = sorted(spill_dir.glob("ticks-*.npz"))
+            if self._spills:
+                self._spill_seq = int(self._spills[-1].stem.split("-", 1)[1])
+        self._last_error: Optional[str] = None
+        self.recorded = 0
+        self.raw_bytes = 0
+        self.stored_bytes = 0
+
+        self._bus: Optional[TickBus] = None
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        TICK_STORE_PENDING.set_function(lambda: {(): float(len(self._pending))})
+
+    # -- ingest --------------------------------------------------------------
+
+    def on_tick(self, tick: Tick) -> None:
+        stamp = tick.timestamp or self.clock()
+        stamp_ms = int(stamp * 1000)
+        minute = stamp_ms // 60_000
+        with self._lock:
+            buffer = self._open.get(tick.symbol)
+            if buffer is not None and minute < buffer.minute:
+                key = (tick.symbol, minute)
+                buffer = self._late.get(key)
+                if buffer is None:
+                    buffer = self._late[key] = _OpenMinute(minute)
+            else:
+                if buffer is None or buffer.minute != minute:
+                    if buffer is not None:
+                        self._late[(tick.symbol, buffer.minute)] = buffer
+                    buffer = self._open[tick.symbol] = _OpenMinute(minute, self._last_volume.get(tick.symbol))
+                self._last_volume[tick.symbol] = tick.volume
+            buffer.append(stamp_ms, tick.price, tick.volume, tick.oi)
+            self.recorded += 1
+
+    # -- flushing ------------------------------------------------------------
+
+    def _take_closed(self, now: float, force: bool) -> List[Tuple[str, _OpenMinute]]:
+        """Detach every buffer whose minute is over (all of them when ``force``)."""
+        cutoff = int((now - self.close_grace) // 60)
+        with self._lock:
+            closed = [(symbol, buffer) for (symbol, _), buffer in self._late.items()]
+            self._late = {}
+            for symbol, buffer in list(self._open.items()):
+                if force or buffer.minute < cutoff:
+                    closed.append((symbol, buffer))
+                    del self._open[symbol]
+        return closed
+
+    def flush(self, now: Optional[float] = None, force: bool = False) -> int:
+        """Seal finished minutes and write what the database will take; returns blocks written."""
+        with self._flush_lock:
+            closed = self._take_closed(self.clock() if now is None else now, force)
+            blocks = [_seal(symbol, buffer, self.price_scale, self.compression) for symbol, buffer in closed]
+            TICKS_RECORDED.inc(sum(block.count for block in blocks))
+            self.raw_bytes += sum(block.count for block in blocks) * 32
+            self.stored_bytes += sum(len(block.payload) for block in blocks)
+            self._pending.extend(blocks)
+
+            written = self._replay_spills()
+            if self._spills:
+                # Still behind: keep new blocks in arrival order behind the spilled ones
+                self._spill(self._pending)
+                self._pending = []
+                return written
+            if self._pending:
+                batch, self._pending = self._pending, []
+                if self._write(batch):
+                    written += len(batch)
+                else:
+                    self._spill(batch)
+            return written
+
+    def _write(self, blocks: List[TickBlock]) -> bool:
+        try:
+            self.sink(blocks)
+        except Exception as exc:
+            TICK_BLOCKS.inc(len(blocks), outcome="failed")
+            level = logging.DEBUG if self._last_error == str(exc) else logging.WARNING
+            self._last_error = str(exc)
+            logger.log(level, "Tick block insert failed (%d blocks): %s", len(blocks), exc)
+            return False
+        self._last_error = None
+        TICK_BLOCKS.inc(len(blocks), outcome="written")
+        return True
+
+    def _spill(self, blocks: List[TickBlock]) -> None:
+        if not blocks:
+            return
+        if self.spill_dir is None:
+            # Nowhere to spill: hold what fits in memory, drop the oldest beyond that
+            self._pending = (blocks + self._pending)[-self.max_pending:]
+            dropped = len(blocks) - min(len(blocks), self.max_pending)
+            if dropped:
+                TICK_BLOCKS.inc(dropped, outcome="dropped")
+            return
+        self._spill_seq += 1
+        path = self.spill_dir / f"ticks-{self._spill_seq:08d}.npz"
+        write_spill(path, blocks)
+        self._spills.append(path)
+        TICK_BLOCKS.inc(len(blocks), outcome="spilled")
+
+    def _replay_spills(self) -> int:
+        """Load spill files oldest first, stopping at the first one the database refuses."""
+        written = 0
+        while self._spills:
+            path = self._spills[0]
+            try:
+                blocks = read_spill(path) if path.exists() else []
+            except (OSError, ValueError, zipfile.BadZipFile) as exc:
+                logger.error("Unreadable tick spill file %s moved aside: %s", path, exc)
+                path.replace(path.with_suffix(".bad"))
+                blocks = []
+            if blocks and not self._write(blocks):
+                break
+            written += len(blocks)
+            path.unlink(missing_ok=True)
+            self._spills.pop(0)
+        return written
+
+    # -- lifecycle -----------------------------------------------------------
+
+    def start(self, bus: TickBus = tick_bus) -> None:
+        if self._bus is None:
+            bus.subscribe(self.on_tick)
+            self._bus = bus
+        if self._thread is None:
+            self._stop.clear()
+            self._thread = threading.Thread(target=self._run, name="tick-store", daemon=True)
+            self._thread.start()
+
+    def stop(self) -> None:
+        """Unsubscribe, then seal and write (or spill) everything still buffered."""
+        if self._bus is not None:
+            self._bus.unsubscribe(self.on_tick)
+            self._bus = None
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout=10)
+            self._thread = None
+        self.flush(force=True)
+
+    def _run(self) -> None:
+        while not self._stop.wait(self.flush_interval):
+            try:
+                self.flush()
+            except Exception:
+                logger.exception("Tick store flush failed")
+
+    def status(self) -> Dict[str, Any]:
+        with self._lock:
+            open_ticks = sum(len(buffer.prices) for buffer in self._open.values())
+            late = len(self._late)
+        return {
+            "recorded": self.recorded,
+            "open_symbols": len(self._open),
+            "open_ticks": open_ticks,
+            "late_buffers": late,
+            "pending_blocks": len(self._pending),
+            "spill_files": len(self._spills),
+            "compression_ratio": round(self.raw_bytes / self.stored_bytes, 1) if self.stored_bytes else None,
+            "running": self._thread is not None,
+            "last_error": self._last_error,
+        }
+
+
+tick_recorder: Optional[TickRecorder] = None
+
+
+def get_recorder() -> TickRecorder:
+    """Shared recorder, built on first use so the DB and spill directory are only touched when enabled."""
+    global tick_recorder
+    if tick_recorder is None:
+        tick_recorder = TickRecorder()
+    return tick_recorder
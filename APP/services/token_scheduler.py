@@ -0,0 +1,319 @@
+"""
+Background token renewal and pre-market warm-up.
+
+A daemon thread wakes every ``TOKEN_SCHEDULER_INTERVAL`` seconds and:
+
+* refreshes the Fyers access token from its refresh token once it is within
+  ``TOKEN_REFRESH_MARGIN_MINUTES`` of expiry (Kite tokens are renewed too when
+  the app was issued a refresh token, otherwise expiry is only reported), for
+  the legacy session and every user with a stored session;
+* once per trading day after ``PREWARM_AT`` (IST, default 09:05) builds the
+  authenticated clients and fills the profile, instrument and option-chain
+  caches so the 09:15 open is served warm; per-user sessions get their
+  client and profile warmed and their positions loaded;
+* starts a new day in every user's risk engine when the date changes, and
+  seeds the positions from the brokers on the first run and at each pre-warm.
+"""
+
+from __future__ import annotations
+
+import logging
+import os
+import threading
+from dataclasses import dataclass, field
+from datetime import date, datetime, time, timedelta
+from typing import Any, Callable, Dict, List, Optional
+
+from APP.services.market_calendar import is_trading_day, now_ist, to_ist
+from APP.services.risk_engine import RiskEngine, UserRiskEngines, risk_engine, risk_engines
+from APP.services.sessions import fyers_sessions, kite_sessions, use_user
+
+logger = logging.getLogger(__name__)
+
+
+def _fyers_service() -> Any:
+    from APP.fyersApp.services import FyersService
+
+    return FyersService()
+
+
+def _kite_service() -> Any:
+    from APP.services.kite_service import KiteService
+
+    return KiteService()
+
+
+def _session_users(broker: str) -> List[str]:
+    return {"fyers": fyers_sessions, "kite": kite_sessions}[broker].users()
+
+
+def _env_list(name: str, default: str) -> List[str]:
+    return [item.strip() for item in os.getenv(name, default).split(",") if item.strip()]
+
+
+@dataclass
+class BrokerTokenState:
+    broker: str
+    user: Optional[str] = None
+    expires_at: Optional[datetime] = None
+    refreshed_at: Optional[datetime] = None
+    last_error: Optional[str] = None
+
+    def as_dict(self) -> Dict[str, Any]:
+        return {
+            "broker": self.broker,
+            "user": self.user,
+            "expires_at": self.expires_at.isoformat() if self.expires_at else None,
+            "refreshed_at": self.refreshed_at.isoformat() if self.refreshed_at else None,
+            "last_error": self.last_error,
+        }
+
+
+@dataclass
+class PrewarmState:
+    last_run: Optional[datetime] = None
+    warmed: List[str] = field(default_factory=list)
+    errors: Dict[str, str] = field(default_factory=dict)
+
+
+class TokenRenewalScheduler:
+    """Tracks broker token expiry, renews ahead of time and pre-warms caches."""
+
+    def __init__(
+        self,
+        fyers_factory: Callable[[], Any] = _fyers_service,
+        kite_factory: Callable[[], Any] = _kite_service,
+        clock: Callable[[], datetime] = now_ist,
+        risk: RiskEngine = risk_engine,
+        users: Callable[[str], List[str]] = _session_users,
+        user_risk: UserRiskEngines = risk_engines,
+    ) -> None:
+        self.fyers_factory = fyers_factory
+        self.kite_factory = kite_factory
+        self.users = users
+        self.clock = clock
+        self.risk = risk
+        self.user_risk = user_risk
+        self.interval = float(os.getenv("TOKEN_SCHEDULER_INTERVAL", "60"))
+        self.refresh_margin = timedelta(minutes=float(os.getenv("TOKEN_REFRESH_MARGIN_MINUTES", "30")))
+        self.prewarm_at = time.fromisoformat(os.getenv("PREWARM_AT", "09:05"))
+        self.option_chain_symbols = _env_list(
+            "PREWARM_OPTION_CHAINS", "NSE:NIFTY50-INDEX,NSE:NIFTYBANK-INDEX"
+        )
+        self.option_chain_strikes = int(os.getenv("PREWARM_OPTION_CHAIN_STRIKES", "10"))
+        self.kite_exchanges = _env_list("PREWARM_KITE_EXCHANGES", "NSE,NFO")
+
+        self.tokens: Dict[str, BrokerTokenState] = {
+            "fyers": BrokerTokenState("fyers"),
+            "kite": BrokerTokenState("kite"),
+        }
+        self.prewarm = PrewarmState()
+        self._prewarmed_on: Optional[date] = None
+        self._risk_day: Optional[date] = None
+        self.position_errors: Dict[str, str] = {}
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    # -- lifecycle -----------------------------------------------------------
+
+    def start(self) -> None:
+        if self._thread is not None and self._thread.is_alive():
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name="token-scheduler", daemon=True)
+        self._thread.start()
+
+    def stop(self, timeout: float = 5.0) -> None:
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout)
+            self._thread = None
+
+    def _run(self) -> None:
+        while not self._stop.is_set():
+            try:
+                self.run_once()
+            except Exception:
+                logger.exception("Token scheduler iteration failed")
+            self._stop.wait(self.interval)
+
+    # -- work ----------------------------------------------------------------
+
+    def run_once(self) -> None:
+        now = self.clock()
+        checked = set()
+        for name, factory, renew_method in (
+            ("fyers", self.fyers_factory, "refresh_access_token"),
+            ("kite", self.kite_factory, "renew_access_token"),
+        ):
+            for user in self._session_users(name):
+                checked.add(self._check_broker(name, factory, renew_method, now, user))
+        # Users whose session files were removed
+        for label in set(self.tokens) - checked:
+            del self.tokens[label]
+        self._roll_risk_day(now)
+        if self._prewarm_due(now):
+            self.run_prewarm(now)
+
+    def _roll_risk_day(self, now: datetime) -> None:
+        today = to_ist(now).date()
+        if self._risk_day is None:
+            # First run: positions (and today's realised P&L) come from the brokers
+            self._risk_day = today
+            self.sync_positions()
+        elif today != self._risk_day:
+            self._risk_day = today
+            self.risk.reset_day()
+            for user in self.user_risk.users():
+                self.user_risk.for_user(user).reset_day()
+            logger.info("Risk engine reset for %s", today.isoformat())
+
+    def sync_positions(self) -> Dict[str, str]:
+        """Seed the risk engine from each broker's positions; returns the errors per broker."""
+        errors: Dict[str, str] = {}
+        for name, factory in (("fyers", self.fyers_factory), ("kite", self.kite_factory)):
+            try:
+                self.risk.load_positions(factory().get_positions())
+            except Exception as exc:
+                errors[name] = str(exc)
+                logger.debug("Could not load %s positions: %s", name, exc)
+        self.position_errors = errors
+        return errors
+
+    def _session_users(self, broker: str) -> List[Optional[str]]:
+        """None (the legacy single-user session) followed by every user with a stored session."""
+        try:
+            return [None, *self.users(broker)]
+        except OSError as exc:
+            logger.warning("Could not list %s sessions: %s", broker, exc)
+            return [None]
+
+    def _check_broker(
+        self,
+        name: str,
+        factory: Callable[[], Any],
+        renew_method: str,
+        now: datetime,
+        user: Optional[str] = None,
+    ) -> str:
+        label = name if user is None else f"{name}:{user}"
+        state = self.tokens.setdefault(label, BrokerTokenState(name, user))
+        try:
+            with use_user(user):
+                service = factory()
+                expires_at = service.token_expiry()
+                state.expires_at = to_ist(expires_at) if expires_at else None
+                if state.expires_at is not None and state.expires_at - now <= self.refresh_margin:
+                    getattr(service, renew_method)()
+                    renewed = service.token_expiry()
+                    state.expires_at = to_ist(renewed) if renewed else None
+                    state.refreshed_at = now
+                    logger.info("Renewed %s access token ahead of expiry", label)
+            state.last_error = None
+        except Exception as exc:
+            # Repeats of the same failure (e.g. no credentials) are only logged once
+            level = logging.DEBUG if state.last_error == str(exc) else logging.WARNING
+            state.last_error = str(exc)
+            logger.log(level, "Could not renew %s token: %s", label, exc)
+        return label
+
+    def _prewarm_due(self, now: datetime) -> bool:
+        now = to_ist(now)
+        if not is_trading_day(now.date()) or self._prewarmed_on == now.date():
+            return False
+        return now.time() >= self.prewarm_at
+
+    def run_prewarm(self, now: Optional[datetime] = None) -> PrewarmState:
+        """Build authenticated clients and fill broker caches; failures are recorded per step."""
+        now = now or self.clock()
+        state = PrewarmState(last_run=now)
+
+        def step(label: str, action: Callable[[], Any]) -> None:
+            try:
+                action()
+                state.warmed.append(label)
+            except Exception as exc:
+                state.errors[label] = str(exc)
+
+        fyers: Any = None
+        kite: Any = None
+
+        def build_fyers() -> None:
+            nonlocal fyers
+            fyers = self.fyers_factory()
+
+        def build_kite() -> None:
+            nonlocal kite
+            kite = self.kite_factory()
+
+        step("fyers:client", build_fyers)
+        if fyers is not None:
+            step("fyers:profile", fyers.refresh_profile)
+            from APP.fyersApp.models import OptionChainRequest
+
+            step("fyers:positions", lambda: self.risk.load_positions(fyers.get_positions()))
+            for symbol in self.option_chain_symbols:
+                step(
+                    f"fyers:option_chain:{symbol}",
+                    lambda symbol=symbol: fyers.fetch_option_chain(
+                        OptionChainRequest(symbol=symbol, strikecount=self.option_chain_strikes)
+                    ),
+                )
+        step("kite:client", build_kite)
+        if kite is not None:
+            step("kite:profile", lambda: kite.get_profile(use_stored_token=True))
+            step("kite:positions", lambda: self.risk.load_positions(kite.get_positions()))
+            for exchange in self.kite_exchanges:
+                step(f"kite:instruments:{exchange}", lambda exchange=exchange: kite.get_instruments(exchange))
+            from APP.services.derivatives import derivatives_index
+
+            step("derivatives:index", lambda: derivatives_index.refresh(kite))
+
+        def as_user(user: str, action: Callable[[], Any]) -> Callable[[], Any]:
+            def run() -> Any:
+                with use_user(user):
+                    return action()
+
+            return run
+
+        def load_positions(user: str, factory: Callable[[], Any]) -> None:
+            self.user_risk.for_user(user).load_positions(factory().get_positions())
+
+        # Each user's positions go to their own risk engine
+        for user in self._session_users("fyers")[1:]:
+            step(f"fyers:{user}:profile", as_user(user, lambda: self.fyers_factory().refresh_profile()))
+            step(
+                f"fyers:{user}:positions",
+                as_user(user, lambda user=user: load_positions(user, self.fyers_factory)),
+            )
+        for user in self._session_users("kite")[1:]:
+            step(
+                f"kite:{user}:profile",
+                as_user(user, lambda: self.kite_factory().get_profile(use_stored_token=True)),
+            )
+            step(
+                f"kite:{user}:positions",
+                as_user(user, lambda user=user: load_positions(user, self.kite_factory)),
+            )
+
+        self.prewarm = state
+        self._prewarmed_on = to_ist(now).date()
+        logger.info("Pre-warm finished: %d ok, %d failed", len(state.warmed), len(state.errors))
+        return state
+
+    def status(self) -> Dict[str, Any]:
+        return {
+            "running": self._thread is not None and self._thread.is_alive(),
+            "tokens": {name: state.as_dict() for name, state in self.tokens.items()},
+            "risk_day": self._risk_day.isoformat() if self._risk_day else None,
+            "position_errors": self.position_errors,
+            "prewarm": {
+                "at": self.prewarm_at.isoformat(),
+                "last_run": self.prewarm.last_run.isoformat() if self.prewarm.last_run else None,
+                "warmed": self.prewarm.warmed,
+                "errors": self.prewarm.errors,
+            },
+        }
+
+
+scheduler = TokenRenewalScheduler()
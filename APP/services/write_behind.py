@@ -0,0 +1,475 @@
+"""
+Write-behind persistence for high-volume tables.
+
+``orders``, ``strategy_signals`` and ``system_logs`` rows are appended to an
+in-memory buffer from the request path and inserted in batches by one
+background thread per table, using a single ``executemany`` per chunk
+(``fast_executemany`` on pyodbc, see ``connection.get_engine``). All chunks
+of one flush or journal segment go in one transaction.
+
+Crash safety: every record is first appended to a local JSON-lines journal
+segment. A flush rotates the segment, drains the buffer and deletes the
+segment only after the insert committed. Segments left behind by a crash or
+a failed insert are replayed on the next flush / start-up, so rows can be
+retried but are not lost. Segment names carry a per-process owner token,
+and each owner holds an ``flock`` on its ``<table>-<owner>.lock`` file, so
+several workers can share a journal directory: at start-up a buffer only
+claims (renames to its own token, then replays) the segments of owners whose
+lock is free, i.e. of processes that are gone. Rows evicted by ``drop_oldest`` are journaled as
+tombstones and not replayed; ``orders`` rows whose ``order_id`` is already
+stored are skipped, so replaying a segment that did commit is harmless.
+Records marked with :func:`as_update` (order status and fill changes) update
+the stored row with the same ``order_id`` instead, after the batch's inserts.
+``WRITE_BEHIND_FSYNC=true`` fsyncs each record (survives OS crashes, at a
+per-record cost); by default records are only flushed to the OS, which
+survives process crashes.
+
+Settings (env):
+
+* ``WRITE_BEHIND_FLUSH_INTERVAL`` seconds between flushes (default 1.0)
+* ``WRITE_BEHIND_BATCH_SIZE`` rows per insert; reaching it triggers an early
+  flush (default 500)
+* ``WRITE_BEHIND_MAX_QUEUE`` buffered rows per table (default 50000)
+* ``WRITE_BEHIND_OVERFLOW[_<TABLE>]`` ``block`` | ``drop_oldest`` |
+  ``drop_newest`` (default ``block``; ``drop_oldest`` for system_logs)
+* ``WRITE_BEHIND_JOURNAL_DIR`` journal directory, empty disables
+  (default ``write_behind_journal``)
+"""
+
+from __future__ import annotations
+
+import json
+import logging
+import os
+import threading
+import uuid
+from collections import deque
+from datetime import date, datetime
+from decimal import Decimal
+from pathlib import Path
+from typing import Any, Callable, Deque, Dict, List, Optional, TextIO
+
+from APP.services.metrics import registry, time_db_query
+
+logger = logging.getLogger(__name__)
+
+Record = Dict[str, Any]
+Sink = Callable[[str, List[Record]], None]
+
+_TOMBSTONE = "$dropped"
+_UPDATE = "$update"
+
+OVERFLOW_POLICIES = ("block", "drop_oldest", "drop_newest")
+TABLES = ("orders", "strategy_signals", "system_logs")
+_DEFAULT_OVERFLOW = {"system_logs": "drop_oldest"}
+# Columns that identify a row already written, so a replay does not insert it twice
+_UNIQUE_KEYS = {"orders": "order_id"}
+
+WRITE_BEHIND_ROWS = registry.counter(
+    "algonova_write_behind_rows_total",
+    "Rows handled by the write-behind buffers",
+    ("table", "outcome"),
+)
+WRITE_BEHIND_DEPTH = registry.gauge(
+    "algonova_write_behind_queue_depth",
+    "Rows buffered in memory waiting for the next flush",
+    ("table",),
+)
+
+
+class BufferFull(RuntimeError):
+    """Raised by ``submit`` when a ``block`` buffer stays full past the timeout."""
+
+
+def _encode(value: Any) -> Any:
+    if isinstance(value, datetime):
+        return {"$dt": value.isoformat()}
+    if isinstance(value, date):
+        return {"$date": value.isoformat()}
+    if isinstance(value, Decimal):
+        return float(value)
+    raise TypeError(f"Cannot journal {type(value).__name__}")
+
+
+def _decode(obj: Dict[str, Any]) -> Any:
+    if "$dt" in obj:
+        return datetime.fromisoformat(obj["$dt"])
+    if "$date" in obj:
+        return date.fromisoformat(obj["$date"])
+    return obj
+
+
+def _model_table(table: str) -> Any:
+    from APP.fyersApp.models.order import Order
+    from APP.fyersApp.models.strategy_signal import StrategySignal
+    from APP.fyersApp.models.system_log import SystemLog
+
+    models = {"orders": Order, "strategy_signals": StrategySignal, "system_logs": SystemLog}
+    return models[table].__table__
+
+
+def as_update(record: Record) -> Record:
+    """Mark ``record`` as new values for the stored row with its unique key (``orders``: ``order_id``)."""
+    return {_UPDATE: 1, **record}
+
+
+def insert_rows(table: str, rows: List[Record], chunk_size: Optional[int] = None) -> None:
+    """Default sink: one transaction, one executemany per ``chunk_size`` rows."""
+    from APP.fyersApp.db.connection import get_engine
+
+    chunk_size = chunk_size or int(os.getenv("WRITE_BEHIND_BATCH_SIZE", "500"))
+    model = _model_table(table)
+    updates: List[Record] = []
+    with time_db_query(f"bulk_insert_{table}"):
+        with get_engine().begin() as connection:
+            unique = _UNIQUE_KEYS.get(table)
+            if unique is not None:
+                updates = [row for row in rows if _UPDATE in row]
+                rows = _unwritten(connection, model.c[unique], [row for row in rows if _UPDATE not in row])
+            for start in range(0, len(rows), chunk_size):
+                connection.execute(model.insert(), rows[start:start + chunk_size])
+            if updates:
+                # After the inserts, so an order placed and filled within one batch ends up filled
+                _update_rows(connection, model, model.c[unique], updates, chunk_size)
+
+
+def _update_rows(connection: Any, model: Any, key: Any, rows: List[Record], chunk_size: int) -> None:
+    """Apply update records in order; rows whose key is not stored are left alone."""
+    from sqlalchemy import bindparam
+
+    columns = sorted({name for row in rows for name in row} - {_UPDATE, key.name})
+    # Bind names may not repeat the SET columns' own names
+    statement = (
+        model.update()
+        .where(key == bindparam("where_key"))
+        .values({name: bindparam(f"set_{name}") for name in columns})
+    )
+    params = [
+        {"where_key": row[key.name], **{f"set_{name}": row.get(name) for name in columns}} for row in rows
+    ]
+    for start in range(0, len(params), chunk_size):
+        connection.execute(statement, params[start:start + chunk_size])
+
+
+def _unwritten(connection: Any, column: Any, rows: List[Record]) -> List[Record]:
+    """``rows`` without those whose ``column`` value is stored already or repeats an earlier row."""
+    from sqlalchemy import select
+
+    keys = sorted({row[column.name] for row in rows if row.get(column.name) is not None})
+    seen = set()
+    for start in range(0, len(keys), 500):
+        chunk = keys[start:start + 500]
+        seen.update(connection.execute(select(column).where(column.in_(chunk))).scalars())
+    fresh = []
+    for row in rows:
+        key = row.get(column.name)
+        if key is not None:
+            if key in seen:
+                continue
+            seen.add(key)
+        fresh.append(row)
+    return fresh
+
+
+class WriteBehindBuffer:
+    """Bounded in-memory buffer for one table, flushed in batches by a daemon thread."""
+
+    def __init__(
+        self,
+        table: str,
+        sink: Sink = insert_rows,
+        flush_interval: float = 1.0,
+        batch_size: int = 500,
+        max_queue: int = 50_000,
+        overflow: str = "block",
+        journal_dir: Optional[Path] = None,
+        fsync: bool = False,
+        block_timeout: float = 1.0,
+    ) -> None:
+        if overflow not in OVERFLOW_POLICIES:
+            raise ValueError(f"overflow must be one of {', '.join(OVERFLOW_POLICIES)}")
+        self.table = table
+        self.sink = sink
+        self.flush_interval = flush_interval
+        self.batch_size = max(1, batch_size)
+        self.max_queue = max(1, max_queue)
+        self.overflow = overflow
+        self.journal_dir = journal_dir
+        self.fsync = fsync
+        self.block_timeout = block_timeout
+
+        self._records: Deque[Record] = deque()
+        self._lock = threading.Lock()
+        self._not_full = threading.Condition(self._lock)
+        self._wake = threading.Event()
+        self._flush_lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+        # Records that failed to insert while journaling is disabled
+        self._retry: List[Record] = []
+        self._last_error: Optional[str] = None
+        self._journal: Optional[TextIO] = None
+        self._segment = 0
+        self._pending_segments: List[Path] = []
+        # Unique per buffer, so workers sharing the journal directory never write the same segment
+        self._owner = f"{os.getpid()}_{uuid.uuid4().hex[:8]}"
+        self._owner_lock: Optional[TextIO] = None
+        if journal_dir is not None:
+            journal_dir.mkdir(parents=True, exist_ok=True)
+            self._owner_lock = self._lock_path(self._owner).open("a")
+            _flock(self._owner_lock)
+            self._pending_segments = self._claim_orphans()
+
+    def __len__(self) -> int:
+        return len(self._records)
+
+    # -- producer side -------------------------------------------------------
+
+    def submit(self, record: Record) -> bool:
+        """Buffer ``record``; returns False if the overflow policy dropped it."""
+        with self._lock:
+            if len(self._records) >= self.max_queue:
+                if self.overflow == "drop_newest":
+                    WRITE_BEHIND_ROWS.inc(table=self.table, outcome="dropped")
+                    return False
+                if self.overflow == "drop_oldest":
+                    self._records.popleft()
+                    if self.journal_dir is not None:
+                        # The oldest buffered record is the oldest live one in the open segment
+                        self._journal_write({_TOMBSTONE: 1})
+                    WRITE_BEHIND_ROWS.inc(table=self.table, outcome="dropped")
+                else:
+                    self._wake.set()
+                    if not self._not_full.wait_for(
+                        lambda: len(self._records) < self.max_queue, self.block_timeout
+                    ):
+                        raise BufferFull(f"{self.table} write-behind buffer is full")
+            if self.journal_dir is not None:
+                self._journal_write(record)
+            self._records.append(record)
+            depth = len(self._records)
+        if depth >= self.batch_size:
+            self._wake.set()
+        return True
+
+    def _journal_write(self, record: Record) -> None:
+        if self._journal is None:
+            self._segment += 1
+            self._journal = self._segment_path(self._segment).open("a", encoding="utf-8")
+        self._journal.write(json.dumps(record, default=_encode, separators=(",", ":")) + "\n")
+        self._journal.flush()
+        if self.fsync:
+            os.fsync(self._journal.fileno())
+
+    def _segment_path(self, segment: int) -> Path:
+        return self.journal_dir / f"{self.table}-{self._owner}-{segment:08d}.jsonl"
+
+    def _lock_path(self, owner: str) -> Path:
+        return self.journal_dir / f"{self.table}-{owner}.lock"
+
+    def _claim_orphans(self) -> List[Path]:
+        """Rename the segments of owners that are gone to this buffer's own, oldest first."""
+        claimed: List[Path] = []
+        with (self.journal_dir / ".claim.lock").open("a") as guard:
+            # One claimer at a time, so a dead owner's segments are taken over once
+            _flock(guard)
+            owners: Dict[Optional[str], List[Path]] = {}
+            for lock in self.journal_dir.glob(f"{self.table}-*.lock"):
+                owners.setdefault(lock.stem[len(self.table) + 1:], [])
+            for segment in self.journal_dir.glob(f"{self.table}-*.jsonl"):
+                parts = segment.stem.split("-")
+                # Segments named before owner tokens (<table>-<seq>) have no owner left
+                owners.setdefault(parts[1] if len(parts) == 3 else None, []).append(segment)
+            orphans: List[Path] = []
+            for owner, segments in owners.items():
+                if owner == self._owner:
+                    continue
+                if owner is None or not self._lock_path(owner).exists():
+                    orphans.extend(segments)
+                    continue
+                with self._lock_path(owner).open("a") as lock:
+                    if not _flock(lock, blocking=False):
+                        # A live worker's journal
+                        continue
+                    orphans.extend(segments)
+                    self._lock_path(owner).unlink(missing_ok=True)
+            for segment in sorted(orphans, key=lambda path: (path.stat().st_mtime, path.name)):
+                self._segment += 1
+                target = self._segment_path(self._segment)
+                os.replace(segment, target)
+                claimed.append(target)
+        return claimed
+
+    # -- consumer side -------------------------------------------------------
+
+    def start(self) -> None:
+        if self._thread is not None and self._thread.is_alive():
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(
+            target=self._run, name=f"write-behind-{self.table}", daemon=True
+        )
+        self._thread.start()
+
+    def stop(self, timeout: float = 10.0) -> None:
+        """Stop the thread after a final flush."""
+        self._stop.set()
+        self._wake.set()
+        if self._thread is not None:
+            self._thread.join(timeout)
+            self._thread = None
+        self.flush()
+
+    def _run(self) -> None:
+        while not self._stop.is_set():
+            self._wake.wait(self.flush_interval)
+            self._wake.clear()
+            try:
+                self.flush()
+            except Exception:
+                logger.exception("Write-behind flush for %s failed", self.table)
+
+    def flush(self) -> int:
+        """Write everything buffered (and any leftover journal segments); returns rows written."""
+        with self._flush_lock:
+            written = self._replay_segments()
+            with self._lock:
+                segment: Optional[Path] = None
+                if self._journal is not None:
+                    self._journal.close()
+                    self._journal = None
+                    segment = self._segment_path(self._segment)
+                batch = self._retry + list(self._records)
+                self._records.clear()
+                self._retry = []
+                self._not_full.notify_all()
+            if not batch:
+                if segment is not None:
+                    segment.unlink(missing_ok=True)
+                return written
+            if self._write(batch):
+                if segment is not None:
+                    segment.unlink(missing_ok=True)
+                return written + len(batch)
+            if segment is not None:
+                # Retried from the journal on the next flush
+                self._pending_segments.append(segment)
+            else:
+                self._retry = batch[-self.max_queue:]
+            return written
+
+    def _replay_segments(self) -> int:
+        written = 0
+        while self._pending_segments:
+            segment = self._pending_segments[0]
+            if segment.exists():
+                rows = self._read_segment(segment)
+                if rows and not self._write(rows):
+                    break
+                written += len(rows)
+                segment.unlink(missing_ok=True)
+            self._pending_segments.pop(0)
+        return written
+
+    @staticmethod
+    def _read_segment(segment: Path) -> List[Record]:
+        rows: Deque[Record] = deque()
+        with segment.open("r", encoding="utf-8") as fh:
+            for line in fh:
+                if not line.strip():
+                    continue
+                record = json.loads(line, object_hook=_decode)
+                if _TOMBSTONE in record:
+                    # drop_oldest evicted the oldest record still live in this segment
+                    if rows:
+                        rows.popleft()
+                else:
+                    rows.append(record)
+        return list(rows)
+
+    def _write(self, rows: List[Record]) -> bool:
+        try:
+            self.sink(self.table, rows)
+        except Exception as exc:
+            WRITE_BEHIND_ROWS.inc(len(rows), table=self.table, outcome="failed")
+            # Retried every interval; only a new kind of failure is worth a warning
+            level = logging.DEBUG if self._last_error == str(exc) else logging.WARNING
+            self._last_error = str(exc)
+            logger.log(level, "Write-behind insert into %s failed (%d rows): %s", self.table, len(rows), exc)
+            return False
+        self._last_error = None
+        WRITE_BEHIND_ROWS.inc(len(rows), table=self.table, outcome="written")
+        return True
+
+
+def _flock(handle: TextIO, blocking: bool = True) -> bool:
+    """Exclusive ``flock`` on ``handle``, held until it is closed; False if another process holds it."""
+    try:
+        import fcntl
+    except ImportError:  # pragma: no cover - Windows: no flock, give each worker its own journal dir
+        return True
+    try:
+        fcntl.flock(handle, fcntl.LOCK_EX | (0 if blocking else fcntl.LOCK_NB))
+    except OSError:
+        return False
+    return True
+
+
+_buffers: Dict[str, WriteBehindBuffer] = {}
+_buffers_lock = threading.Lock()
+
+
+def _from_env(table: str) -> WriteBehindBuffer:
+    journal_dir = os.getenv("WRITE_BEHIND_JOURNAL_DIR", "write_behind_journal")
+    overflow = os.getenv(
+        f"WRITE_BEHIND_OVERFLOW_{table.upper()}",
+        os.getenv("WRITE_BEHIND_OVERFLOW", _DEFAULT_OVERFLOW.get(table, "block")),
+    )
+    return WriteBehindBuffer(
+        table,
+        flush_interval=float(os.getenv("WRITE_BEHIND_FLUSH_INTERVAL", "1.0")),
+        batch_size=int(os.getenv("WRITE_BEHIND_BATCH_SIZE", "500")),
+        max_queue=int(os.getenv("WRITE_BEHIND_MAX_QUEUE", "50000")),
+        overflow=overflow,
+        journal_dir=Path(journal_dir) if journal_dir else None,
+        fsync=os.getenv("WRITE_BEHIND_FSYNC", "false").lower() in ("1", "true", "yes"),
+    )
+
+
+def get_buffer(table: str) -> WriteBehindBuffer:
+    """Return the shared buffer for ``table``, creating and starting it on first use."""
+    buffer = _buffers.get(table)
+    if buffer is None:
+        if table not in TABLES:
+            raise ValueError(f"No write-behind buffer for table {table!r}")
+        with _buffers_lock:
+            buffer = _buffers.get(table)
+            if buffer is None:
+                buffer = _from_env(table)
+                buffer.start()
+                _buffers[table] = buffer
+    return buffer
+
+
+def submit(table: str, record: Record) -> bool:
+    return get_buffer(table).submit(record)
+
+
+def start_all() -> None:
+    """Create every buffer so journal segments from a previous run get replayed."""
+    for table in TABLES:
+        get_buffer(table)
+
+
+def stop_all() -> None:
+    with _buffers_lock:
+        buffers = list(_buffers.values())
+        _buffers.clear()
+    for buffer in buffers:
+        buffer.stop()
+
+
+WRITE_BEHIND_DEPTH.set_function(
+    lambda: {(table,): float(len(buffer)) for table, buffer in list(_buffers.items())}
+)
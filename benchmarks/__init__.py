@@ -0,0 +1,3 @@
+"""
+Reproducible performance benchmarks run against stubbed brokers.
+"""
@@ -0,0 +1,109 @@
+"""
+Per-tick alert evaluation: sorted threshold index vs. scanning every rule.
+
+``--alerts`` price alerts are spread over ``--symbols`` symbols at levels
+around each symbol's price, then ``--ticks`` random-walk ticks are fed
+through :class:`APP.services.alerts.AlertEngine` and through a naive loop
+that checks every rule of the ticked symbol. Reports the mean per-tick cost
+of each and whether both fired the same alerts.
+
+Usage::
+
+    python -m benchmarks.alerts --alerts 10000 --symbols 50 --ticks 100000 --output alerts.json
+"""
+
+from __future__ import annotations
+
+import argparse
+import json
+import platform
+import sys
+import time
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+
+def _rules(alerts: int, symbols: int, rng: np.random.Generator) -> List[Tuple[str, str, float]]:
+    rules = []
+    for index in range(alerts):
+        symbol = f"NSE:SYM{index % symbols}-EQ"
+        # Levels within ±5% of the 1000 start, most of them never reached
+        level = float(1000 * (1 + rng.uniform(-0.05, 0.05)))
+        rules.append((symbol, "above" if level > 1000 else "below", level))
+    return rules
+
+
+def _ticks(ticks: int, symbols: int, rng: np.random.Generator) -> List[Tuple[str, float]]:
+    names = rng.integers(0, symbols, ticks)
+    prices = np.full(symbols, 1000.0)
+    stream = []
+    for name in names.tolist():
+        prices[name] *= 1 + rng.normal(0, 0.0005)
+        stream.append((f"NSE:SYM{name}-EQ", float(prices[name])))
+    return stream
+
+
+def bench(alerts: int, symbols: int, ticks: int, seed: int) -> Dict[str, Any]:
+    from APP.services.alerts import PRICE, AlertEngine
+
+    rng = np.random.default_rng(seed)
+    rules = _rules(alerts, symbols, rng)
+    stream = _ticks(ticks, symbols, rng)
+
+    engine = AlertEngine(max_alerts=alerts, chain_poll=0)
+    for symbol, condition, level in rules:
+        engine.add(symbol, condition=condition, threshold=level)
+    start = time.perf_counter()
+    indexed_fired = sum(len(engine.evaluate(symbol, PRICE, price)) for symbol, price in stream)
+    indexed = time.perf_counter() - start
+
+    pending: Dict[str, List[Tuple[str, float]]] = {}
+    for symbol, condition, level in rules:
+        pending.setdefault(symbol, []).append((condition, level))
+    start = time.perf_counter()
+    naive_fired = 0
+    for symbol, price in stream:
+        remaining = []
+        for condition, level in pending.get(symbol, ()):
+            if (price >= level) if condition == "above" else (price <= level):
+                naive_fired += 1
+            else:
+                remaining.append((condition, level))
+        pending[symbol] = remaining
+    naive = time.perf_counter() - start
+
+    return {
+        "indexed_us_per_tick": indexed / ticks * 1e6,
+        "naive_us_per_tick": naive / ticks * 1e6,
+        "fired": indexed_fired,
+        "fired_matches": indexed_fired == naive_fired,
+    }
+
+
+def main(argv: Optional[Sequence[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Compare indexed alert evaluation with a full scan")
+    parser.add_argument("--alerts", type=int, default=10_000)
+    parser.add_argument("--symbols", type=int, default=50)
+    parser.add_argument("--ticks", type=int, default=100_000)
+    parser.add_argument("--seed", type=int, default=7)
+    parser.add_argument("--output", help="Write the JSON report here (default: stdout)")
+    args = parser.parse_args(argv)
+
+    result = bench(args.alerts, args.symbols, args.ticks, args.seed)
+    report = {
+        "environment": {"python": platform.python_version(), "platform": platform.platform()},
+        "config": {"alerts": args.alerts, "symbols": args.symbols, "ticks": args.ticks, "seed": args.seed},
+        "results": result,
+    }
+    rendered = json.dumps(report, indent=2, sort_keys=True)
+    if args.output:
+        Path(args.output).write_text(rendered + "\n", encoding="utf-8")
+    else:
+        print(rendered)
+    return 0 if result["fired_matches"] else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,296 @@
+"""
+Throughput and latency benchmark for the API hot paths.
+
+Runs the real FastAPI app in-process (via ``httpx.ASGITransport``) with the
+broker SDKs replaced by the stubs in ``benchmarks.stubs`` and the master DB
+pointed at SQLite, so results only reflect our own code plus the simulated
+upstream latency.
+
+Usage::
+
+    python -m benchmarks.api_hot_paths --output bench.json
+    python -m benchmarks.api_hot_paths --compare bench.json --tolerance 0.15
+"""
+
+from __future__ import annotations
+
+import argparse
+import asyncio
+import json
+import math
+import os
+import platform
+import sys
+import tempfile
+import time
+from datetime import datetime
+from pathlib import Path
+from typing import Any, Callable, Dict, Iterator, List, Optional, Sequence
+
+from benchmarks import stubs
+
+SCENARIOS: Dict[str, str] = {
+    "fyers_option_chain": "/api/fyers/option-chain?symbol=NSE:NIFTY50-INDEX&strikecount=5",
+    "fyers_profile": "/api/fyers/profile",
+    "fyers_profile_refresh": "/api/fyers/profile?refresh=true",
+    "broker_status": "/api/broker/status",
+    "master_dropdown": "/api/master/dropdown?type=Exchange",
+}
+
+DEFAULT_CONCURRENCY = (1, 4, 16, 64)
+REPORT_VERSION = 1
+
+
+def _prepare_environment(workdir: Path) -> None:
+    """Point every service at throwaway credentials and token files."""
+    os.environ.update(
+        {
+            "FYERS_APP_ID": "BENCH-100",
+            "FYERS_SECRET_KEY": "bench-secret",
+            "FYERS_LOG_PATH": str(workdir / "logs"),
+            "FYERS_TOKEN_PATH": str(workdir / "fyers_token.json"),
+            "KITE_API_KEY": "bench-key",
+            "KITE_API_SECRET": "bench-secret",
+        }
+    )
+    os.environ.setdefault("LOG_LEVEL", "WARNING")
+
+    stamp = datetime.now().isoformat()
+    (workdir / "fyers_token.json").write_text(
+        json.dumps(
+            {
+                "access_token": "bench-fyers-token",
+                "profile": {"s": "ok", "data": {"name": "AlgoNova Trader"}},
+                "stored_at": stamp,
+            }
+        )
+    )
+    (workdir / "kite_token.json").write_text(
+        json.dumps(
+            {
+                "access_token": "bench-kite-token",
+                "profile": {"user_id": "AB1234"},
+                "stored_at": stamp,
+            }
+        )
+    )
+
+
+def _sqlite_session_factory(rows: int) -> Callable[[], Iterator[Any]]:
+    from sqlalchemy import create_engine
+    from sqlalchemy.orm import sessionmaker
+    from sqlalchemy.pool import StaticPool
+
+    from APP.fyersApp.models.dropdown import Base, DropdownMaster
+
+    engine = create_engine(
+        "sqlite://",
+        connect_args={"check_same_thread": False},
+        poolclass=StaticPool,
+    )
+    Base.metadata.create_all(engine)
+    session_factory = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+
+    types = ("Exchange", "Segment", "OrderType", "ProductType")
+    with session_factory() as db:
+        db.add_all(
+            DropdownMaster(
+                DropdownName=f"Option {index}",
+                DropdownType=types[index % len(types)],
+                IsActive=index % 10 != 0,
+                Description=f"Benchmark row {index}",
+                CreatedBy="benchmark",
+                CreatedDate=datetime(2024, 1, 1),
+                Value=f"VAL{index}",
+            )
+            for index in range(rows)
+        )
+        db.commit()
+
+    def get_sqlite_db() -> Iterator[Any]:
+        db = session_factory()
+        try:
+            yield db
+        finally:
+            db.close()
+
+    return get_sqlite_db
+
+
+def build_app(workdir: Path, dropdown_rows: int = 200) -> Any:
+    """Import the real app and swap broker SDKs / DB for local stand-ins."""
+    _prepare_environment(workdir)
+
+    import main
+    from APP.fyersApp.db.connection import get_db
+    from APP.fyersApp.services import fyers_service
+    from APP.services import kite_service
+
+    fyers_service.SessionModel = stubs.DummySession
+    fyers_service.FyersModel = stubs.DummyFyers
+    kite_service.KiteConnect = stubs.DummyKite
+    kite_service.TOKEN_STORAGE_FILE = workdir / "kite_token.json"
+
+    main.app.dependency_overrides[get_db] = _sqlite_session_factory(dropdown_rows)
+    return main.app
+
+
+def percentile(sorted_values: Sequence[float], fraction: float) -> float:
+    """Nearest-rank percentile of an already sorted sequence."""
+    if not sorted_values:
+        return 0.0
+    rank = max(1, math.ceil(fraction * len(sorted_values)))
+    return sorted_values[min(rank, len(sorted_values)) - 1]
+
+
+async def _run_level(client: Any, path: str, concurrency: int, total: int) -> Dict[str, Any]:
+    latencies: List[float] = []
+    errors = 0
+    remaining = total
+
+    async def worker() -> None:
+        nonlocal remaining, errors
+        while remaining > 0:
+            remaining -= 1
+            start = time.perf_counter()
+            response = await client.get(path)
+            latencies.append(time.perf_counter() - start)
+            if response.status_code >= 400:
+                errors += 1
+
+    started = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    wall = time.perf_counter() - started
+
+    latencies.sort()
+    return {
+        "concurrency": concurrency,
+        "requests": len(latencies),
+        "errors": errors,
+        "throughput_rps": round(len(latencies) / wall, 2) if wall else 0.0,
+        "mean_ms": round(sum(latencies) / len(latencies) * 1000, 3) if latencies else 0.0,
+        "p50_ms": round(percentile(latencies, 0.50) * 1000, 3),
+        "p99_ms": round(percentile(latencies, 0.99) * 1000, 3),
+    }
+
+
+async def run_benchmarks(
+    app: Any,
+    scenarios: Sequence[str],
+    concurrency_levels: Sequence[int],
+    requests_per_level: int,
+    warmup: int = 5,
+) -> List[Dict[str, Any]]:
+    import httpx
+
+    results: List[Dict[str, Any]] = []
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+        for name in scenarios:
+            path = SCENARIOS[name]
+            for _ in range(warmup):
+                await client.get(path)
+            for concurrency in concurrency_levels:
+                result = await _run_level(client, path, concurrency, requests_per_level)
+                result["scenario"] = name
+                results.append(result)
+                print(
+                    f"{name:<24} c={concurrency:<4} {result['throughput_rps']:>10.1f} rps "
+                    f"p50={result['p50_ms']:.2f}ms p99={result['p99_ms']:.2f}ms "
+                    f"errors={result['errors']}",
+                    file=sys.stderr,
+                )
+    return results
+
+
+def compare_reports(
+    baseline: Dict[str, Any], current: Dict[str, Any], tolerance: float
+) -> List[str]:
+    """Return human-readable regressions of ``current`` against ``baseline``."""
+    previous = {(r["scenario"], r["concurrency"]): r for r in baseline.get("results", [])}
+    regressions: List[str] = []
+    for result in current.get("results", []):
+        before = previous.get((result["scenario"], result["concurrency"]))
+        if before is None:
+            continue
+        label = f"{result['scenario']} c={result['concurrency']}"
+        if before["p99_ms"] and result["p99_ms"] > before["p99_ms"] * (1 + tolerance):
+            regressions.append(f"{label}: p99 {before['p99_ms']}ms -> {result['p99_ms']}ms")
+        if result["throughput_rps"] < before["throughput_rps"] * (1 - tolerance):
+            regressions.append(
+                f"{label}: throughput {before['throughput_rps']} -> {result['throughput_rps']} rps"
+            )
+        if result["errors"] > before["errors"]:
+            regressions.append(f"{label}: errors {before['errors']} -> {result['errors']}")
+    return regressions
+
+
+def _parse_args(argv: Optional[Sequence[str]]) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--fyers-latency-ms", type=float, default=5.0)
+    parser.add_argument("--kite-latency-ms", type=float, default=5.0)
+    parser.add_argument(
+        "--concurrency",
+        default=",".join(str(level) for level in DEFAULT_CONCURRENCY),
+        help="Comma separated concurrency levels",
+    )
+    parser.add_argument("--requests", type=int, default=200, help="Requests per level")
+    parser.add_argument(
+        "--scenarios",
+        default=",".join(SCENARIOS),
+        help=f"Comma separated subset of: {', '.join(SCENARIOS)}",
+    )
+    parser.add_argument("--dropdown-rows", type=int, default=200)
+    parser.add_argument("--output", help="Write the JSON report here (default: stdout)")
+    parser.add_argument("--compare", help="Baseline JSON report to check for regressions")
+    parser.add_argument("--tolerance", type=float, default=0.15)
+    return parser.parse_args(argv)
+
+
+def main(argv: Optional[Sequence[str]] = None) -> int:
+    args = _parse_args(argv)
+    scenarios = [name.strip() for name in args.scenarios.split(",") if name.strip()]
+    unknown = [name for name in scenarios if name not in SCENARIOS]
+    if unknown:
+        raise SystemExit(f"Unknown scenarios: {', '.join(unknown)}")
+    levels = [int(level) for level in args.concurrency.split(",") if level.strip()]
+
+    stubs.LATENCY.fyers = args.fyers_latency_ms / 1000.0
+    stubs.LATENCY.kite = args.kite_latency_ms / 1000.0
+
+    with tempfile.TemporaryDirectory(prefix="algonova-bench-") as tmp:
+        app = build_app(Path(tmp), dropdown_rows=args.dropdown_rows)
+        results = asyncio.run(run_benchmarks(app, scenarios, levels, args.requests))
+
+    report = {
+        "version": REPORT_VERSION,
+        "config": {
+            "fyers_latency_ms": args.fyers_latency_ms,
+            "kite_latency_ms": args.kite_latency_ms,
+            "requests_per_level": args.requests,
+            "dropdown_rows": args.dropdown_rows,
+        },
+        "environment": {
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "cpu_count": os.cpu_count(),
+        },
+        "results": results,
+    }
+    rendered = json.dumps(report, indent=2, sort_keys=True)
+    if args.output:
+        Path(args.output).write_text(rendered + "\n", encoding="utf-8")
+    else:
+        print(rendered)
+
+    if args.compare:
+        baseline = json.loads(Path(args.compare).read_text(encoding="utf-8"))
+        regressions = compare_reports(baseline, report, args.tolerance)
+        for line in regressions:
+            print(f"REGRESSION {line}", file=sys.stderr)
+        return 1 if regressions else 0
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
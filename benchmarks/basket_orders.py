@@ -0,0 +1,140 @@
+"""
+Basket placement latency against stubbed brokers.
+
+Places a straddle (2 legs) and an iron condor (4 legs, and an 8-leg double
+condor) through ``BasketExecutor`` and, for comparison, leg by leg through
+the broker service. The stub sleeps ``--latency-ms`` per broker call, so the
+sequential time grows with legs while the basket stays near one round-trip.
+
+Usage::
+
+    python -m benchmarks.basket_orders --runs 20 --latency-ms 25 --output basket.json
+"""
+
+from __future__ import annotations
+
+import argparse
+import json
+import platform
+import statistics
+import sys
+import tempfile
+import time
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Sequence
+
+from benchmarks import stubs
+from benchmarks.api_hot_paths import _prepare_environment
+from benchmarks.risk_engine import _discard_order_rows
+
+UNDERLYING = "NFO:NIFTY24JUN"
+
+
+def _legs(count: int, broker: str) -> List[Any]:
+    from APP.services.basket import BasketLeg
+
+    legs = []
+    for index in range(count):
+        kind = "CE" if index % 2 == 0 else "PE"
+        strike = 22000 + 100 * (index // 2)
+        side = "SELL" if index < 2 else "BUY"
+        legs.append(
+            BasketLeg(broker, f"{UNDERLYING}{strike}{kind}", side, 50, order_type="LIMIT", price=100.0)
+        )
+    return legs
+
+
+def _executor(broker_rate: float) -> Any:
+    from APP.services.basket import BasketExecutor, RateLimiter
+    from APP.services.kite_service import KiteService
+    from APP.services.order_book import OrderBook
+    from APP.services.risk_engine import BreachRecorder, RiskEngine, RiskLimits
+
+    risk = RiskEngine(RiskLimits(), recorder=BreachRecorder(sink=lambda batch: None))
+
+    def kite() -> Any:
+        service = KiteService(risk=risk)
+        service.kite = stubs.DummyKite(api_key="bench-key")
+        return service
+
+    executor = BasketExecutor(services={"kite": kite}, book=OrderBook(), risk=risk)
+    executor.limiters = {"kite": RateLimiter(broker_rate)}
+    return executor
+
+
+def _summary(samples: Sequence[float]) -> Dict[str, float]:
+    ordered = sorted(samples)
+    return {
+        "median_ms": round(statistics.median(ordered), 3),
+        "p90_ms": round(ordered[int(0.9 * (len(ordered) - 1))], 3),
+        "max_ms": round(ordered[-1], 3),
+    }
+
+
+def bench(leg_count: int, runs: int, broker_rate: float) -> Dict[str, Any]:
+    from APP.services.basket import RateLimiter
+
+    executor = _executor(broker_rate)
+    service = executor.services["kite"]()
+    sequential: List[float] = []
+    parallel: List[float] = []
+    for _ in range(runs):
+        legs = _legs(leg_count, "kite")
+        start = time.perf_counter()
+        for leg in legs:
+            service.place_order(
+                symbol=leg.symbol,
+                transaction_type=leg.transaction_type,
+                quantity=leg.quantity,
+                order_type=leg.order_type,
+                price=leg.price,
+            )
+        sequential.append((time.perf_counter() - start) * 1000)
+
+        # Each basket starts with a full bucket, as it would after an idle second
+        executor.limiters = {"kite": RateLimiter(broker_rate)}
+        start = time.perf_counter()
+        execution = executor.execute(legs, rollback=False)
+        parallel.append((time.perf_counter() - start) * 1000)
+        if execution.failed_legs:
+            raise RuntimeError(f"basket failed: {execution.as_dict()}")
+    return {
+        "legs": leg_count,
+        "sequential": _summary(sequential),
+        "basket": _summary(parallel),
+        "speedup": round(statistics.median(sequential) / statistics.median(parallel), 2),
+    }
+
+
+def main(argv: Optional[Sequence[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Measure time to place all legs of a basket")
+    parser.add_argument("--runs", type=int, default=20)
+    parser.add_argument("--latency-ms", type=float, default=25.0)
+    parser.add_argument("--broker-rate", type=float, default=10.0, help="Orders/sec per broker")
+    parser.add_argument("--legs", default="2,4,8")
+    parser.add_argument("--output", help="Write the JSON report here (default: stdout)")
+    args = parser.parse_args(argv)
+
+    stubs.LATENCY.kite = args.latency_ms / 1000.0
+    with tempfile.TemporaryDirectory(prefix="algonova-bench-") as tmp:
+        _prepare_environment(Path(tmp))
+        _discard_order_rows()
+        results = [
+            bench(int(count), args.runs, args.broker_rate) for count in args.legs.split(",") if count.strip()
+        ]
+
+    report = {
+        "environment": {"python": platform.python_version(), "platform": platform.platform()},
+        "config": {"runs": args.runs, "latency_ms": args.latency_ms, "broker_rate": args.broker_rate},
+        "results": results,
+    }
+    rendered = json.dumps(report, indent=2, sort_keys=True)
+    if args.output:
+        Path(args.output).write_text(rendered + "\n", encoding="utf-8")
+    else:
+        print(rendered)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,113 @@
+"""
+Incremental indicators vs. full recomputation.
+
+A strategy that recomputes its indicators over the whole history on every
+new bar does O(N) work per bar; the incremental indicators do O(1). For each
+indicator this measures, over ``--bars`` synthetic minute bars:
+
+* ``naive_us``        - per-bar cost of recomputing over the full history
+  (vectorised ``batch`` on the last ``--history`` bars, i.e. the best case
+  for recomputation)
+* ``incremental_us``  - per-bar cost of ``update``
+* ``batch_ms`` / ``loop_ms`` - a whole backtest series via ``batch`` vs.
+  feeding every bar through ``update``
+
+Usage::
+
+    python -m benchmarks.indicators --bars 100000 --history 5000 --output indicators.json
+"""
+
+from __future__ import annotations
+
+import argparse
+import json
+import platform
+import statistics
+import sys
+import time
+from pathlib import Path
+from typing import Any, Dict, Optional, Sequence
+
+import numpy as np
+
+SPECS = ("sma:20", "ema:50", "rsi:14", "atr:14", "vwap", "supertrend:10:3")
+
+
+def _series(count: int) -> Dict[str, np.ndarray]:
+    rng = np.random.default_rng(42)
+    close = 1000 + np.cumsum(rng.normal(0, 1, count))
+    return {
+        "close": close,
+        "high": close + rng.random(count) * 2,
+        "low": close - rng.random(count) * 2,
+        "volume": rng.integers(1, 1000, count).astype(float),
+        "timestamp": 1_700_000_000 + 60 * np.arange(count),
+    }
+
+
+def bench(spec: str, data: Dict[str, np.ndarray], history: int, samples: int) -> Dict[str, Any]:
+    from APP.services.indicators import create
+
+    close, high, low = data["close"], data["high"], data["low"]
+    volume, stamps = data["volume"], data["timestamp"]
+    rows = list(zip(close.tolist(), high.tolist(), low.tolist(), volume.tolist(), stamps.tolist()))
+
+    # Naive: each new bar recomputes over the trailing window
+    naive = []
+    for end in range(history, history + samples):
+        start = time.perf_counter()
+        create(spec).batch(
+            close[end - history:end], high[end - history:end], low[end - history:end],
+            volume[end - history:end], stamps[end - history:end],
+        )
+        naive.append((time.perf_counter() - start) * 1e6)
+
+    indicator = create(spec)
+    start = time.perf_counter()
+    for c, h, lo, v, t in rows:
+        indicator.update(c, h, lo, v, t)
+    loop_seconds = time.perf_counter() - start
+
+    start = time.perf_counter()
+    batch = create(spec).batch(close, high, low, volume, stamps)
+    batch_seconds = time.perf_counter() - start
+
+    matches = bool(np.allclose(batch[-1], indicator.value, rtol=1e-8, equal_nan=True))
+    incremental_us = loop_seconds / len(rows) * 1e6
+    naive_us = statistics.median(naive)
+    return {
+        "indicator": spec,
+        "naive_us": round(naive_us, 3),
+        "incremental_us": round(incremental_us, 3),
+        "speedup": round(naive_us / incremental_us, 1),
+        "loop_ms": round(loop_seconds * 1000, 3),
+        "batch_ms": round(batch_seconds * 1000, 3),
+        "batch_matches_incremental": matches,
+    }
+
+
+def main(argv: Optional[Sequence[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Compare incremental indicators with full recomputation")
+    parser.add_argument("--bars", type=int, default=100_000)
+    parser.add_argument("--history", type=int, default=5_000, help="Bars recomputed per new bar (naive)")
+    parser.add_argument("--samples", type=int, default=500)
+    parser.add_argument("--output", help="Write the JSON report here (default: stdout)")
+    args = parser.parse_args(argv)
+
+    data = _series(max(args.bars, args.history + args.samples))
+    results = [bench(spec, data, args.history, args.samples) for spec in SPECS]
+    report = {
+        "environment": {"python": platform.python_version(), "platform": platform.platform()},
+        "config": {"bars": args.bars, "history": args.history, "samples": args.samples},
+        "results": results,
+    }
+    rendered = json.dumps(report, indent=2, sort_keys=True)
+    if args.output:
+        Path(args.output).write_text(rendered + "\n", encoding="utf-8")
+    else:
+        print(rendered)
+    return 0 if all(result["batch_matches_incremental"] for result in results) else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,126 @@
+"""
+Parameter-search throughput and scaling across worker processes.
+
+Runs the same ``ema_crossover`` grid over ``--bars`` synthetic bars with 1,
+2, 4, ... up to ``--max-workers`` processes through
+:class:`APP.services.optimizer.Optimizer` (bars memory-mapped by every
+worker), and once with the bars pickled into every task instead, which is
+what a plain ``ProcessPoolExecutor.submit(run_backtest, ...)`` would do.
+
+Reports wall time, evaluations/sec and parallel efficiency
+(speedup / workers) per worker count.
+
+Usage::
+
+    python -m benchmarks.optimizer --bars 200000 --max-workers 8 --output optimizer.json
+"""
+
+from __future__ import annotations
+
+import argparse
+import json
+import multiprocessing
+import os
+import platform
+import sys
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+from typing import Any, Dict, Optional, Sequence
+
+import numpy as np
+
+SPACE = {"fast": [5, 8, 10, 12, 15, 20, 25, 30], "slow": [40, 50, 60, 80, 100, 120, 150, 200]}
+
+
+def _bars(count: int) -> Any:
+    rng = np.random.default_rng(11)
+    close = 1000 + np.cumsum(rng.normal(0, 1, count))
+    ohlcv = np.column_stack(
+        [close, close + rng.random(count), close - rng.random(count), close, rng.integers(1, 100, count)]
+    ).astype(np.float64)
+    return 1_700_000_000 + 60 * np.arange(count), ohlcv
+
+
+def bench_memmap(timestamps: np.ndarray, ohlcv: np.ndarray, workers: int, data_dir: Path) -> float:
+    from APP.services.optimizer import COMPLETED, Optimizer
+
+    optimizer = Optimizer(max_workers=workers, data_dir=data_dir)
+    run = optimizer.start("ema_crossover", timestamps, ohlcv, space=SPACE)
+    while run.status == "RUNNING":
+        time.sleep(0.01)
+    if run.status != COMPLETED:
+        raise RuntimeError(f"run failed: {run.error}")
+    return run.elapsed
+
+
+def bench_pickled(timestamps: np.ndarray, ohlcv: np.ndarray, workers: int) -> float:
+    from APP.services.backtest import run_backtest
+    from APP.services.optimizer import grid_candidates
+
+    started = time.perf_counter()
+    context = multiprocessing.get_context("spawn")
+    with ProcessPoolExecutor(max_workers=workers, mp_context=context) as pool:
+        futures = [
+            pool.submit(run_backtest, "ema_crossover", timestamps, ohlcv, params)
+            for params in grid_candidates(SPACE)
+        ]
+        for future in futures:
+            future.result()
+    return time.perf_counter() - started
+
+
+def main(argv: Optional[Sequence[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Measure optimiser scaling across processes")
+    parser.add_argument("--bars", type=int, default=200_000)
+    parser.add_argument("--max-workers", type=int, default=os.cpu_count() or 1)
+    parser.add_argument("--output", help="Write the JSON report here (default: stdout)")
+    args = parser.parse_args(argv)
+
+    timestamps, ohlcv = _bars(args.bars)
+    evaluations = len(SPACE["fast"]) * len(SPACE["slow"])
+    counts = []
+    workers = 1
+    while workers <= args.max_workers:
+        counts.append(workers)
+        workers *= 2
+    if counts[-1] != args.max_workers:
+        counts.append(args.max_workers)
+
+    results = []
+    with tempfile.TemporaryDirectory(prefix="algonova-bench-") as tmp:
+        baseline: Optional[float] = None
+        for count in counts:
+            elapsed = bench_memmap(timestamps, ohlcv, count, Path(tmp))
+            baseline = baseline or elapsed
+            results.append(
+                {
+                    "workers": count,
+                    "seconds": round(elapsed, 3),
+                    "evaluations_per_second": round(evaluations / elapsed, 1),
+                    "efficiency": round(baseline / elapsed / count, 3),
+                }
+            )
+        pickled = bench_pickled(timestamps, ohlcv, args.max_workers)
+
+    report = {
+        "environment": {
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "cpus": os.cpu_count(),
+        },
+        "config": {"bars": args.bars, "evaluations": evaluations},
+        "memmap": results,
+        "pickled_per_task_seconds": round(pickled, 3),
+    }
+    rendered = json.dumps(report, indent=2, sort_keys=True)
+    if args.output:
+        Path(args.output).write_text(rendered + "\n", encoding="utf-8")
+    else:
+        print(rendered)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,150 @@
+"""
+Paper-trading matching engine throughput.
+
+Generates a seeded order flow over ``--symbols`` symbols: limit orders
+priced around the current tick (about half of them cross), ``--market-share``
+market orders, a few SL-M stops and ``--cancel-share`` cancels of resting
+orders, with a synthetic tick every ``--orders-per-tick`` orders. The flow is
+pre-generated, then pushed through :class:`APP.services.paper.MatchingEngine`
+twice:
+
+* ``engine``: the matching engine alone (what a strategy runtime sees);
+* ``with_order_book``: every order state change also applied to an
+  :class:`~APP.services.order_book.OrderBook`, one batch per submit or tick,
+  as :data:`APP.services.paper.paper_engine` does.
+
+Reports orders/s, fills and ticks for each. The 100k+ orders/s target is
+the ``engine`` figure; ``with_order_book`` runs at roughly a third of it.
+
+Usage::
+
+    python -m benchmarks.paper_trading --orders 500000 --output paper.json
+"""
+
+from __future__ import annotations
+
+import argparse
+import json
+import platform
+import sys
+import time
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+
+def _flow(
+    orders: int, symbols: int, orders_per_tick: int, market_share: float, cancel_share: float, seed: int
+) -> Tuple[List[str], List[Tuple[Any, ...]]]:
+    """Pre-built events: ("tick", symbol, price) or ("order", ...) or ("cancel", back_reference)."""
+    from APP.services.paper import synthetic_ticks
+
+    names = [f"NSE:SYM{index}-EQ" for index in range(symbols)]
+    rng = np.random.default_rng(seed)
+    ticks = iter(synthetic_ticks(names, orders // orders_per_tick + 2, seed=seed))
+    last = {name: 100.0 for name in names}
+    kinds = rng.random(orders)
+    sides = np.where(rng.random(orders) < 0.5, "BUY", "SELL")
+    picks = rng.integers(0, symbols, orders)
+    offsets = np.round(rng.normal(0.0, 0.2, orders) / 0.05) * 0.05
+    sizes = rng.integers(1, 20, orders) * 25
+    events: List[Tuple[Any, ...]] = []
+    for index in range(orders):
+        if index % orders_per_tick == 0:
+            tick = next(ticks)
+            last[tick.symbol] = tick.price
+            events.append(("tick", tick))
+        symbol = names[picks[index]]
+        side = str(sides[index])
+        kind = kinds[index]
+        if kind < cancel_share:
+            events.append(("cancel", int(rng.integers(1, 64))))
+        elif kind < cancel_share + market_share:
+            events.append(("order", symbol, side, int(sizes[index]), "MARKET", None, None))
+        elif kind < cancel_share + market_share + 0.02:
+            below = round(last[symbol] - 0.5, 2) if side == "SELL" else round(last[symbol] + 0.5, 2)
+            events.append(("order", symbol, side, int(sizes[index]), "SL-M", None, below))
+        else:
+            price = round(last[symbol] + float(offsets[index]), 2)
+            events.append(("order", symbol, side, int(sizes[index]), "LIMIT", price, None))
+    return names, events
+
+
+def _run(events: List[Tuple[Any, ...]], with_book: bool) -> Dict[str, Any]:
+    from APP.services.order_book import OrderBook
+    from APP.services.paper import MatchingEngine, apply_all_to_book
+
+    book = OrderBook()
+    report = (lambda orders: apply_all_to_book(orders, book)) if with_book else None
+    engine = MatchingEngine(on_updates=report)
+    submit, cancel, on_tick = engine.submit, engine.cancel, engine.on_tick
+    placed: List[str] = []
+    orders = rejected = cancels = 0
+    start = time.perf_counter()
+    for event in events:
+        kind = event[0]
+        if kind == "order":
+            order = submit(*event[1:])
+            orders += 1
+            placed.append(order.order_id)
+        elif kind == "tick":
+            on_tick(event[1])
+        elif placed:
+            try:
+                cancel(placed[-event[1] % len(placed)])
+                cancels += 1
+            except ValueError:
+                rejected += 1
+    elapsed = time.perf_counter() - start
+    status = engine.status()
+    return {
+        "seconds": elapsed,
+        "orders_per_second": orders / elapsed,
+        "events_per_second": len(events) / elapsed,
+        "orders": orders,
+        "fills": status["fills"],
+        "ticks": status["ticks"],
+        "cancels": cancels,
+        "cancels_of_finished_orders": rejected,
+        "resting_at_end": status["live_orders"],
+        "order_book_entries": len(book),
+    }
+
+
+def main(argv: Optional[Sequence[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Measure paper matching engine throughput")
+    parser.add_argument("--orders", type=int, default=300_000)
+    parser.add_argument("--symbols", type=int, default=50)
+    parser.add_argument("--orders-per-tick", type=int, default=10)
+    parser.add_argument("--market-share", type=float, default=0.1)
+    parser.add_argument("--cancel-share", type=float, default=0.05)
+    parser.add_argument("--seed", type=int, default=11)
+    parser.add_argument("--output", help="Write the JSON report here (default: stdout)")
+    args = parser.parse_args(argv)
+
+    _, events = _flow(
+        args.orders, args.symbols, args.orders_per_tick, args.market_share, args.cancel_share, args.seed
+    )
+    report = {
+        "environment": {"python": platform.python_version(), "platform": platform.platform()},
+        "config": {
+            "orders": args.orders,
+            "symbols": args.symbols,
+            "orders_per_tick": args.orders_per_tick,
+            "market_share": args.market_share,
+            "cancel_share": args.cancel_share,
+            "seed": args.seed,
+        },
+        "results": {"engine": _run(events, False), "with_order_book": _run(events, True)},
+    }
+    rendered = json.dumps(report, indent=2, sort_keys=True)
+    if args.output:
+        Path(args.output).write_text(rendered + "\n", encoding="utf-8")
+    else:
+        print(rendered)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
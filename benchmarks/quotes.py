@@ -0,0 +1,119 @@
+"""
+Quote tail latency: one broker vs. hedged requests across two.
+
+Two simulated brokers answer with log-normal latency (median
+``--median-ms``) plus an occasional stall (``--stall-rate`` of requests
+take ``--stall-ms``), independently of each other. ``--requests``
+sequential lookups go through :class:`APP.services.quotes.QuoteFacade`
+with each broker alone and with both and hedging (``--hedge-ms``, or
+``auto`` for the primary's p95). Reports p50/p95/p99 per setup and, for
+the hedged one, the extra broker requests it cost.
+
+Usage::
+
+    python -m benchmarks.quotes --requests 1000 --output quotes.json
+"""
+
+from __future__ import annotations
+
+import argparse
+import json
+import platform
+import sys
+import threading
+import time
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Optional, Sequence
+
+import numpy as np
+
+
+def _broker(
+    name: str, median: float, stall_rate: float, stall: float, seed: int, sent: List[str]
+) -> Callable[[List[str]], Dict[str, Dict[str, Any]]]:
+    rng = np.random.default_rng(seed)
+    lock = threading.Lock()
+
+    def fetch(symbols: List[str]) -> Dict[str, Dict[str, Any]]:
+        with lock:
+            delay = stall if rng.random() < stall_rate else median * float(rng.lognormal(0, 0.35))
+            sent.append(name)
+        time.sleep(delay)
+        return {symbol: {"symbol": symbol, "ltp": 100.0, "broker": name} for symbol in symbols}
+
+    return fetch
+
+
+def _run(brokers: Dict[str, Callable], hedge: str, requests: int) -> Dict[str, Any]:
+    from APP.services.quotes import QuoteFacade
+
+    facade = QuoteFacade(brokers, hedge_delay=hedge, cache_ttl=0.0001, workers=8)
+    latencies = []
+    for index in range(requests):
+        start = time.perf_counter()
+        facade.get_quotes([f"NSE:SYM{index}-EQ"])
+        latencies.append(time.perf_counter() - start)
+    # Let losing requests finish before the pool goes
+    time.sleep(0.5)
+    facade.shutdown()
+    ms = np.asarray(latencies) * 1000
+    return {
+        "p50_ms": float(np.percentile(ms, 50)),
+        "p95_ms": float(np.percentile(ms, 95)),
+        "p99_ms": float(np.percentile(ms, 99)),
+        "primary": facade.ranking()[0],
+    }
+
+
+def bench(
+    requests: int, median_ms: float, stall_rate: float, stall_ms: float, hedge: str, seed: int
+) -> Dict[str, Any]:
+    median, stall = median_ms / 1000, stall_ms / 1000
+    results: Dict[str, Any] = {}
+    for label, names in (("fyers_only", ["fyers"]), ("kite_only", ["kite"]), ("hedged", ["fyers", "kite"])):
+        sent: List[str] = []
+        # Kite a little slower at the median, so Fyers starts as primary
+        brokers = {
+            name: _broker(name, median * (1.0, 1.2)[offset], stall_rate, stall, seed + offset, sent)
+            for offset, name in enumerate(names)
+        }
+        results[label] = _run(brokers, hedge, requests)
+        results[label]["broker_requests_per_lookup"] = len(sent) / requests
+    results["p99_improvement"] = results["fyers_only"]["p99_ms"] / results["hedged"]["p99_ms"]
+    return results
+
+
+def main(argv: Optional[Sequence[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Compare single-broker and hedged quote latency")
+    parser.add_argument("--requests", type=int, default=600)
+    parser.add_argument("--median-ms", type=float, default=20.0)
+    parser.add_argument("--stall-rate", type=float, default=0.04)
+    parser.add_argument("--stall-ms", type=float, default=250.0)
+    parser.add_argument("--hedge-ms", default="auto")
+    parser.add_argument("--seed", type=int, default=3)
+    parser.add_argument("--output", help="Write the JSON report here (default: stdout)")
+    args = parser.parse_args(argv)
+
+    result = bench(args.requests, args.median_ms, args.stall_rate, args.stall_ms, args.hedge_ms, args.seed)
+    report = {
+        "environment": {"python": platform.python_version(), "platform": platform.platform()},
+        "config": {
+            "requests": args.requests,
+            "median_ms": args.median_ms,
+            "stall_rate": args.stall_rate,
+            "stall_ms": args.stall_ms,
+            "hedge_ms": args.hedge_ms,
+            "seed": args.seed,
+        },
+        "results": result,
+    }
+    rendered = json.dumps(report, indent=2, sort_keys=True)
+    if args.output:
+        Path(args.output).write_text(rendered + "\n", encoding="utf-8")
+    else:
+        print(rendered)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,114 @@
+"""
+Replay throughput and per-stage cost of the live tick path.
+
+Synthesises a session of ``--ticks`` random-walk ticks per symbol over
+``--symbols`` symbols (one tick every ``--interval`` seconds per symbol),
+writes it as a replay file and replays it through
+:func:`APP.services.replay.replay` on a :class:`~APP.services.replay.ReplayBus`
+carrying the real consumers: the candle aggregator, the alert engine with
+``--alerts`` price alerts and the paper matching engine with resting
+orders. ``--speed 0`` (the default) replays as fast as the handlers allow.
+
+Reports ticks/s, the achieved speed-up over the session clock, the time
+spent in each stage and the bottleneck.
+
+Usage::
+
+    python -m benchmarks.replay --symbols 50 --ticks 20000 --output replay.json
+"""
+
+from __future__ import annotations
+
+import argparse
+import json
+import platform
+import sys
+import tempfile
+from datetime import datetime
+from pathlib import Path
+from typing import Any, Dict, Optional, Sequence
+
+import numpy as np
+
+
+def _session(symbols: int, ticks: int, interval: float, seed: int) -> Dict[str, Dict[str, np.ndarray]]:
+    from APP.services.market_calendar import IST
+
+    rng = np.random.default_rng(seed)
+    opening = datetime(2024, 6, 3, 9, 15, tzinfo=IST).timestamp()
+    columns = {}
+    for index in range(symbols):
+        walk = 1000.0 * np.exp(np.cumsum(rng.normal(0.0, 0.0005, ticks)))
+        stamps = opening + np.arange(ticks) * interval + rng.uniform(0.0, interval, ticks)
+        columns[f"NSE:SYM{index}-EQ"] = {
+            "timestamp": np.sort(stamps),
+            "price": np.round(walk / 0.05) * 0.05,
+            "volume": np.cumsum(rng.integers(1, 500, ticks)).astype(float),
+        }
+    return columns
+
+
+def _stages(symbols: int, alerts: int, seed: int) -> list:
+    from APP.services.alerts import AlertEngine
+    from APP.services.candles import CandleAggregator
+    from APP.services.paper import MatchingEngine
+
+    rng = np.random.default_rng(seed)
+    candles = CandleAggregator(close_grace=0)
+    alert_engine = AlertEngine(max_alerts=max(alerts, 1), chain_poll=0)
+    for index in range(alerts):
+        level = float(1000 * (1 + rng.uniform(-0.05, 0.05)))
+        alert_engine.add(f"NSE:SYM{index % symbols}-EQ", condition="cross", threshold=level)
+    matching = MatchingEngine()
+    for index in range(symbols):
+        symbol = f"NSE:SYM{index}-EQ"
+        for level in range(1, 21):
+            matching.submit(symbol, "BUY", 25, "LIMIT", price=round(1000 - level * 2.5, 2))
+            matching.submit(symbol, "SELL", 25, "LIMIT", price=round(1000 + level * 2.5, 2))
+    return [candles.on_tick, alert_engine.on_tick, matching.on_tick]
+
+
+def main(argv: Optional[Sequence[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Replay a synthetic session through the live tick consumers")
+    parser.add_argument("--symbols", type=int, default=50)
+    parser.add_argument("--ticks", type=int, default=10_000, help="Ticks per symbol")
+    parser.add_argument("--interval", type=float, default=0.5, help="Seconds between ticks of a symbol")
+    parser.add_argument("--alerts", type=int, default=5_000)
+    parser.add_argument("--speed", type=float, default=0.0, help="Multiple of real time; 0 for max")
+    parser.add_argument("--seed", type=int, default=5)
+    parser.add_argument("--output", help="Write the JSON report here (default: stdout)")
+    args = parser.parse_args(argv)
+
+    from APP.services.replay import ReplayBus, open_replay, replay, write_replay_file
+
+    with tempfile.TemporaryDirectory() as directory:
+        path = write_replay_file(
+            Path(directory) / "session.npy",
+            _session(args.symbols, args.ticks, args.interval, args.seed),
+            label="synthetic",
+        )
+        results: Dict[str, Any] = replay(
+            open_replay(path), ReplayBus(_stages(args.symbols, args.alerts, args.seed)), speed=args.speed
+        )
+    report = {
+        "environment": {"python": platform.python_version(), "platform": platform.platform()},
+        "config": {
+            "symbols": args.symbols,
+            "ticks_per_symbol": args.ticks,
+            "interval": args.interval,
+            "alerts": args.alerts,
+            "speed": args.speed,
+            "seed": args.seed,
+        },
+        "results": results,
+    }
+    rendered = json.dumps(report, indent=2, sort_keys=True)
+    if args.output:
+        Path(args.output).write_text(rendered + "\n", encoding="utf-8")
+    else:
+        print(rendered)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,148 @@
+"""
+Pre-trade risk check overhead.
+
+Measures, with every limit enabled and a book of open positions:
+
+* ``check``        - a bare ``RiskEngine.check`` call (accepted orders)
+* ``place_order``  - ``KiteService.place_order`` against a zero-latency stub
+  (orders rows discarded in memory), with the risk engine enabled vs.
+  with all limits disabled; the difference is what the checks add to the
+  order path
+
+Exits non-zero when the p99 added latency exceeds ``--budget-us`` (100µs).
+
+Usage::
+
+    python -m benchmarks.risk_engine --orders 100000 --output risk.json
+"""
+
+from __future__ import annotations
+
+import argparse
+import json
+import platform
+import sys
+import tempfile
+import time
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Optional, Sequence
+
+from benchmarks import stubs
+from benchmarks.api_hot_paths import _prepare_environment, percentile
+
+SYMBOLS = [f"NSE:STOCK{index}" for index in range(500)]
+
+
+def _engine(enabled: bool) -> Any:
+    from APP.services.risk_engine import BreachRecorder, RiskEngine, RiskLimits
+
+    limits = (
+        RiskLimits(
+            max_order_quantity=10_000,
+            max_order_value=5_000_000,
+            max_symbol_exposure=50_000_000,
+            max_daily_loss=1_000_000,
+            max_orders_per_second=1e9,
+        )
+        if enabled
+        else RiskLimits()
+    )
+    engine = RiskEngine(limits, recorder=BreachRecorder(sink=lambda batch: None))
+    for index, symbol in enumerate(SYMBOLS):
+        engine.set_position(symbol, 10 * (index % 7 - 3), 100.0, 101.0)
+    return engine
+
+
+def _discard_order_rows() -> None:
+    """Keep the orders write-behind buffer in memory with a no-op sink."""
+    from APP.services import write_behind
+
+    write_behind._buffers["orders"] = write_behind.WriteBehindBuffer(
+        "orders", sink=lambda table, rows: None, max_queue=10_000_000
+    )
+
+
+def _timings(call: Callable[[int], Any], orders: int) -> List[float]:
+    samples: List[float] = []
+    clock = time.perf_counter_ns
+    for index in range(orders):
+        start = clock()
+        call(index)
+        samples.append((clock() - start) / 1000.0)
+    samples.sort()
+    return samples
+
+
+def _summary(samples: Sequence[float]) -> Dict[str, float]:
+    return {
+        "mean_us": round(sum(samples) / len(samples), 3),
+        "p50_us": round(percentile(samples, 0.50), 3),
+        "p99_us": round(percentile(samples, 0.99), 3),
+        "max_us": round(samples[-1], 3),
+    }
+
+
+def bench_check(orders: int) -> Dict[str, float]:
+    engine = _engine(enabled=True)
+    symbols = len(SYMBOLS)
+    return _summary(
+        _timings(lambda i: engine.check(SYMBOLS[i % symbols], "BUY" if i & 1 else "SELL", 10, 100.0), orders)
+    )
+
+
+def bench_place_order(orders: int, enabled: bool) -> Dict[str, float]:
+    from APP.services import kite_service
+
+    service = kite_service.KiteService(risk=_engine(enabled))
+    service.kite = stubs.DummyKite(api_key="bench-key")
+    symbols = len(SYMBOLS)
+    return _summary(
+        _timings(
+            lambda i: service.place_order(
+                SYMBOLS[i % symbols], "BUY" if i & 1 else "SELL", 10, order_type="LIMIT", price=100.0
+            ),
+            orders,
+        )
+    )
+
+
+def main(argv: Optional[Sequence[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Measure pre-trade risk check overhead")
+    parser.add_argument("--orders", type=int, default=100_000)
+    parser.add_argument("--budget-us", type=float, default=100.0)
+    parser.add_argument("--output", help="Write the JSON report here (default: stdout)")
+    args = parser.parse_args(argv)
+
+    stubs.LATENCY.kite = 0.0
+    with tempfile.TemporaryDirectory(prefix="algonova-bench-") as tmp:
+        _prepare_environment(Path(tmp))
+        _discard_order_rows()
+        check = bench_check(args.orders)
+        without = bench_place_order(args.orders, enabled=False)
+        with_risk = bench_place_order(args.orders, enabled=True)
+
+    added = {key: round(with_risk[key] - without[key], 3) for key in with_risk}
+    report = {
+        "environment": {"python": platform.python_version(), "platform": platform.platform()},
+        "orders": args.orders,
+        "budget_us": args.budget_us,
+        "check": check,
+        "place_order_without_limits": without,
+        "place_order_with_limits": with_risk,
+        "added_by_checks": added,
+    }
+    rendered = json.dumps(report, indent=2, sort_keys=True)
+    if args.output:
+        Path(args.output).write_text(rendered + "\n", encoding="utf-8")
+    else:
+        print(rendered)
+
+    worst = max(check["p99_us"], added["p99_us"])
+    if worst > args.budget_us:
+        print(f"Risk checks add {worst}µs at p99, over the {args.budget_us}µs budget", file=sys.stderr)
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
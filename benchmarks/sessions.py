@@ -0,0 +1,207 @@
+"""
+Multi-user session load test.
+
+Registers ``--users`` simulated traders (a stored Fyers and Kite session
+each, under a throwaway ``SESSION_DIR``) and replays ``--requests`` requests
+from ``--threads`` threads. Who sends each request follows a Zipf law
+(``--skew``), so a few hundred active traders make most of the traffic and
+a long tail shows up occasionally. Each request does what a route does
+before calling the broker: build ``FyersService``/``KiteService`` for the
+user, load its session and get the authenticated client.
+
+Reported per phase (first half / second half of the run):
+
+* ``p50_us`` / ``p99_us``  - per-request latency
+* ``clients_built``        - SDK client constructions (cache misses)
+* ``hot_user_builds``      - constructions for the 1% most active users
+  after warm-up; 0 means active traders never paid construction cost
+* ``rss_kib``              - resident memory at the end of the phase; flat
+  between phases means memory is bounded by the caches, not the users
+
+Usage::
+
+    python -m benchmarks.sessions --users 5000 --requests 200000 --cache-size 1024 --output sessions.json
+"""
+
+from __future__ import annotations
+
+import argparse
+import json
+import os
+import platform
+import sys
+import tempfile
+import threading
+import time
+from collections import Counter
+from datetime import datetime
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Sequence
+
+import numpy as np
+
+from benchmarks import stubs
+
+_built: "Counter[str]" = Counter()
+_built_lock = threading.Lock()
+
+
+class CountingFyers(stubs.DummyFyers):
+    def __init__(self, *args: Any, **kwargs: Any) -> None:
+        super().__init__(*args, **kwargs)
+        with _built_lock:
+            _built[self.token] += 1
+
+
+class CountingKite(stubs.DummyKite):
+    def set_access_token(self, access_token: str) -> None:
+        super().set_access_token(access_token)
+        with _built_lock:
+            _built[access_token] += 1
+
+
+def _prepare(workdir: Path, users: int, cache_size: int) -> None:
+    os.environ.update(
+        {
+            "FYERS_APP_ID": "BENCH-100",
+            "FYERS_SECRET_KEY": "bench-secret",
+            "FYERS_LOG_PATH": str(workdir / "logs"),
+            "KITE_API_KEY": "bench-key",
+            "KITE_API_SECRET": "bench-secret",
+            "SESSION_DIR": str(workdir / "sessions"),
+            "SESSION_CLIENT_CACHE_SIZE": str(cache_size),
+            # Keep profile lookups off the upstream path; only client reuse is measured
+            "KITE_PROFILE_TTL": "3600",
+        }
+    )
+    from APP.services.sessions import fyers_sessions, kite_sessions
+
+    stamp = datetime.now().isoformat()
+    for index in range(users):
+        user = f"u{index}"
+        profile = {"user_id": user}
+        fyers_sessions.save(
+            fyers_sessions.path_for(user),
+            {"access_token": f"fy-{user}", "profile": profile, "stored_at": stamp},
+        )
+        kite_sessions.save(
+            kite_sessions.path_for(user),
+            {"access_token": f"kt-{user}", "profile": profile, "stored_at": stamp},
+        )
+
+
+def _request(user: str) -> None:
+    from APP.fyersApp.services import FyersService
+    from APP.services.kite_service import KiteService
+
+    fyers = FyersService(session_factory=stubs.DummySession, fyers_factory=CountingFyers, user_id=user)
+    fyers._create_fyers_client(fyers._load_session()["access_token"])
+    kite = KiteService(user_id=user)
+    if not kite._initialize_with_stored_token():
+        raise RuntimeError(f"no Kite session for {user}")
+
+
+def _rss_kib() -> int:
+    try:
+        with open("/proc/self/statm") as fh:
+            return int(fh.read().split()[1]) * os.sysconf("SC_PAGE_SIZE") // 1024
+    except OSError:
+        import resource
+
+        # Peak rather than current outside Linux
+        return int(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss)
+
+
+def _phase(schedule: np.ndarray, threads: int, hot: set) -> Dict[str, Any]:
+    latencies: List[List[float]] = [[] for _ in range(threads)]
+    before = Counter(_built)
+
+    def worker(slot: int) -> None:
+        record = latencies[slot].append
+        for user_index in schedule[slot::threads].tolist():
+            start = time.perf_counter()
+            _request(f"u{user_index}")
+            record(time.perf_counter() - start)
+
+    pool = [threading.Thread(target=worker, args=(slot,)) for slot in range(threads)]
+    for thread in pool:
+        thread.start()
+    for thread in pool:
+        thread.join()
+
+    built = _built - before
+    merged = np.sort(np.concatenate([np.asarray(values) for values in latencies]))
+    return {
+        "requests": int(len(merged)),
+        "p50_us": float(merged[len(merged) // 2] * 1e6),
+        "p99_us": float(merged[int(len(merged) * 0.99)] * 1e6),
+        "clients_built": int(sum(built.values())),
+        "hot_user_builds": int(sum(count for token, count in built.items() if token[3:] in hot)),
+        "rss_kib": _rss_kib(),
+    }
+
+
+def run(users: int, requests: int, threads: int, cache_size: int, skew: float, seed: int) -> Dict[str, Any]:
+    with tempfile.TemporaryDirectory() as tmp:
+        _prepare(Path(tmp), users, cache_size)
+        from APP.services import kite_service
+        from APP.fyersApp.services import fyers_service
+
+        kite_service.KiteConnect = CountingKite
+        fyers_service.FyersModel = CountingFyers
+
+        rng = np.random.default_rng(seed)
+        # Zipf ranks folded onto the user population; rank 1 is the busiest trader
+        ranks = rng.zipf(skew, requests) - 1
+        schedule = ranks % users
+        active = np.bincount(schedule, minlength=users)
+        hot = {f"u{index}" for index in np.argsort(active)[::-1][: max(1, users // 100)].tolist()}
+
+        half = requests // 2
+        warm = _phase(schedule[:half], threads, hot)
+        steady = _phase(schedule[half:], threads, hot)
+        return {
+            "distinct_users_seen": int(np.count_nonzero(active)),
+            "warm_up": warm,
+            "steady": steady,
+        }
+
+
+def main(argv: Optional[Sequence[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Load-test per-user sessions and the client caches")
+    parser.add_argument("--users", type=int, default=5_000)
+    parser.add_argument("--requests", type=int, default=100_000)
+    parser.add_argument("--threads", type=int, default=8)
+    parser.add_argument("--cache-size", type=int, default=1_024)
+    parser.add_argument("--skew", type=float, default=1.2, help="Zipf exponent of user activity (> 1)")
+    parser.add_argument("--seed", type=int, default=11)
+    parser.add_argument("--output", help="Write the JSON report here (default: stdout)")
+    args = parser.parse_args(argv)
+
+    results = run(args.users, args.requests, args.threads, args.cache_size, args.skew, args.seed)
+    report = {
+        "environment": {
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "cpus": os.cpu_count(),
+        },
+        "config": {
+            "users": args.users,
+            "requests": args.requests,
+            "threads": args.threads,
+            "cache_size": args.cache_size,
+            "skew": args.skew,
+            "seed": args.seed,
+        },
+        "results": results,
+    }
+    rendered = json.dumps(report, indent=2, sort_keys=True)
+    if args.output:
+        Path(args.output).write_text(rendered + "\n", encoding="utf-8")
+    else:
+        print(rendered)
+    return 0 if results["steady"]["hot_user_builds"] == 0 else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,128 @@
+"""
+Shared-memory last-tick table: cross-process read cost and consistency.
+
+A separate writer process streams ticks for ``--symbols`` instruments into
+a :class:`APP.services.shared_ticks.SharedTickTable` as fast as it can,
+each tick carrying ``volume = 2 * price`` and ``timestamp = 3 * price``.
+Meanwhile this process reads it for ``--seconds``: single-symbol
+:meth:`read` calls and :meth:`read_many` batches of ``--batch`` symbols.
+Reports writer ticks/s, reads/s and mean latency per read, and how many
+reads came back torn (fields from different ticks): that must be 0.
+
+Usage::
+
+    python -m benchmarks.shared_ticks --symbols 2000 --seconds 3 --output shared_ticks.json
+"""
+
+from __future__ import annotations
+
+import argparse
+import json
+import multiprocessing
+import platform
+import sys
+import time
+import uuid
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Sequence
+
+
+def _write(name: str, symbols: List[str], stop: Any, written: Any) -> None:
+    from APP.services.market_data import Tick
+    from APP.services.shared_ticks import SharedTickTable
+
+    table = SharedTickTable.attach(name)
+    table.owner = True
+    on_tick = table.on_tick
+    count = len(symbols)
+    n = 0
+    while not stop.is_set():
+        n += 1
+        price = float(n)
+        on_tick(Tick(symbols[n % count], price, 2 * price, 3 * price))
+    written.value = n
+    table.owner = False
+    table.close()
+
+
+def _torn(ticks: Any) -> int:
+    return sum(1 for tick in ticks if tick.volume != 2 * tick.price or tick.timestamp != 3 * tick.price)
+
+
+def main(argv: Optional[Sequence[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Measure cross-process reads of the shared tick table")
+    parser.add_argument("--symbols", type=int, default=2000)
+    parser.add_argument("--batch", type=int, default=50)
+    parser.add_argument("--seconds", type=float, default=3.0)
+    parser.add_argument("--output", help="Write the JSON report here (default: stdout)")
+    args = parser.parse_args(argv)
+
+    from APP.services.shared_ticks import SharedTickTable
+
+    name = f"algonova_bench_{uuid.uuid4().hex[:8]}"
+    symbols = [f"NSE:SYM{index}-EQ" for index in range(args.symbols)]
+    table = SharedTickTable.create(name, capacity=args.symbols)
+    context = multiprocessing.get_context("spawn")
+    stop, written = context.Event(), context.Value("q", 0)
+    writer = context.Process(target=_write, args=(name, symbols, stop, written))
+    writer.start()
+    try:
+        # Wait until every symbol has a slot
+        while table.status()["symbols"] < args.symbols:
+            time.sleep(0.01)
+        half = args.seconds / 2
+
+        reads = torn = 0
+        deadline = time.perf_counter() + half
+        started = time.perf_counter()
+        while time.perf_counter() < deadline:
+            for symbol in symbols[:1000]:
+                tick = table.read(symbol)
+                reads += 1
+                if tick is not None:
+                    torn += _torn([tick])
+        single_seconds = time.perf_counter() - started
+
+        batches = batch_torn = 0
+        deadline = time.perf_counter() + half
+        started = time.perf_counter()
+        while time.perf_counter() < deadline:
+            for offset in range(0, len(symbols), args.batch):
+                ticks = table.read_many(symbols[offset:offset + args.batch])
+                batches += 1
+                batch_torn += _torn(ticks.values())
+        batch_seconds = time.perf_counter() - started
+    finally:
+        stop.set()
+        writer.join()
+        status = table.status()
+        table.close()
+
+    report: Dict[str, Any] = {
+        "environment": {"python": platform.python_version(), "platform": platform.platform()},
+        "config": {"symbols": args.symbols, "batch": args.batch, "seconds": args.seconds},
+        "results": {
+            "writer_ticks": status["ticks"],
+            "writer_ticks_per_second": written.value / args.seconds,
+            "read": {
+                "reads_per_second": reads / single_seconds,
+                "mean_us": single_seconds / reads * 1e6,
+                "torn": torn,
+            },
+            "read_many": {
+                "symbols_per_second": batches * args.batch / batch_seconds,
+                "mean_batch_us": batch_seconds / batches * 1e6,
+                "torn": batch_torn,
+            },
+        },
+    }
+    rendered = json.dumps(report, indent=2, sort_keys=True)
+    if args.output:
+        Path(args.output).write_text(rendered + "\n", encoding="utf-8")
+    else:
+        print(rendered)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
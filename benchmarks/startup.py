@@ -0,0 +1,143 @@
+"""
+Startup-time benchmark.
+
+Measures, in fresh interpreters:
+
+* ``import_ms``  - wall time of ``import main``
+* ``health_ms``  - process spawn until uvicorn answers ``/health``
+* ``ready_ms``   - process spawn until ``/ready`` reports every subsystem warm
+  (or errored, e.g. when no database is configured)
+
+Usage::
+
+    python -m benchmarks.startup --runs 5 --output startup.json
+"""
+
+from __future__ import annotations
+
+import argparse
+import json
+import os
+import platform
+import socket
+import statistics
+import subprocess
+import sys
+import time
+import urllib.error
+import urllib.request
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Sequence
+
+ROOT = Path(__file__).resolve().parent.parent
+
+_IMPORT_SNIPPET = (
+    "import time; start = time.perf_counter(); import main; "
+    "print((time.perf_counter() - start) * 1000)"
+)
+
+
+def _free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def _get_json(url: str) -> Optional[Dict[str, Any]]:
+    try:
+        with urllib.request.urlopen(url, timeout=0.5) as response:
+            return json.loads(response.read())
+    except urllib.error.HTTPError as exc:
+        return json.loads(exc.read() or b"{}")
+    except (urllib.error.URLError, ConnectionError, socket.timeout):
+        return None
+
+
+def measure_import() -> float:
+    output = subprocess.check_output([sys.executable, "-c", _IMPORT_SNIPPET], cwd=ROOT)
+    return float(output.decode().strip().splitlines()[-1])
+
+
+def measure_server(timeout: float = 30.0) -> Dict[str, Any]:
+    port = _free_port()
+    env = dict(os.environ, LOG_LEVEL=os.getenv("LOG_LEVEL", "WARNING"))
+    start = time.perf_counter()
+    process = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "main:app", "--port", str(port), "--log-level", "warning"],
+        cwd=ROOT,
+        env=env,
+        stdout=subprocess.DEVNULL,
+        stderr=subprocess.DEVNULL,
+    )
+    base = f"http://127.0.0.1:{port}"
+    health_ms: Optional[float] = None
+    ready_ms: Optional[float] = None
+    subsystems: Dict[str, Any] = {}
+    try:
+        while time.perf_counter() - start < timeout:
+            if health_ms is None and _get_json(f"{base}/health") is not None:
+                health_ms = (time.perf_counter() - start) * 1000
+            if health_ms is not None:
+                report = _get_json(f"{base}/ready") or {}
+                subsystems = report.get("subsystems", {})
+                if subsystems and all(
+                    detail["warm"] or detail["error"] for detail in subsystems.values()
+                ):
+                    ready_ms = (time.perf_counter() - start) * 1000
+                    break
+            time.sleep(0.005)
+    finally:
+        process.terminate()
+        process.wait(timeout=10)
+    return {"health_ms": health_ms, "ready_ms": ready_ms, "subsystems": subsystems}
+
+
+def _summary(values: Sequence[Optional[float]]) -> Dict[str, Optional[float]]:
+    measured = [value for value in values if value is not None]
+    if not measured:
+        return {"min": None, "median": None, "max": None}
+    return {
+        "min": round(min(measured), 2),
+        "median": round(statistics.median(measured), 2),
+        "max": round(max(measured), 2),
+    }
+
+
+def main(argv: Optional[Sequence[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Measure AlgoNova API cold-start time")
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--output", help="Write the JSON report here (default: stdout)")
+    args = parser.parse_args(argv)
+
+    imports: List[float] = []
+    health: List[Optional[float]] = []
+    ready: List[Optional[float]] = []
+    subsystems: Dict[str, Any] = {}
+    for _ in range(args.runs):
+        imports.append(measure_import())
+        server = measure_server()
+        health.append(server["health_ms"])
+        ready.append(server["ready_ms"])
+        subsystems = server["subsystems"]
+
+    report = {
+        "environment": {
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+        },
+        "runs": args.runs,
+        "import_ms": _summary(imports),
+        "health_ms": _summary(health),
+        "ready_ms": _summary(ready),
+        "last_subsystems": subsystems,
+    }
+    rendered = json.dumps(report, indent=2, sort_keys=True)
+    if args.output:
+        Path(args.output).write_text(rendered + "\n", encoding="utf-8")
+    else:
+        print(rendered)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,123 @@
+"""
+Broker SDK stand-ins with configurable simulated latency.
+
+They mirror the ``_DummySession`` / ``_DummyFyers`` stubs used in
+``tests/unit`` and add a Kite client so every hot path can run offline.
+"""
+
+from __future__ import annotations
+
+import itertools
+import time
+from dataclasses import dataclass
+from typing import Any, Dict, List
+
+
+@dataclass
+class SimulatedLatency:
+    """Seconds each stubbed upstream call sleeps before returning."""
+
+    fyers: float = 0.0
+    kite: float = 0.0
+
+    @classmethod
+    def from_ms(cls, fyers_ms: float, kite_ms: float) -> "SimulatedLatency":
+        return cls(fyers=fyers_ms / 1000.0, kite=kite_ms / 1000.0)
+
+
+LATENCY = SimulatedLatency()
+
+
+def _wait(seconds: float) -> None:
+    if seconds > 0:
+        time.sleep(seconds)
+
+
+class DummySession:
+    """Stub emulating fyers_apiv3 SessionModel."""
+
+    def __init__(self, **kwargs: Any) -> None:
+        self.kwargs = kwargs
+        self.token = None
+
+    def generate_authcode(self) -> Dict[str, str]:
+        return {"Url": "https://api-t1.fyers.in/api/v3/generate-authcode?dummy=true"}
+
+    def set_token(self, token: str) -> None:
+        self.token = token
+
+    def generate_token(self) -> Dict[str, str]:
+        _wait(LATENCY.fyers)
+        return {"access_token": f"token-for-{self.token}"}
+
+
+class DummyFyers:
+    """Stub for fyers_apiv3.fyersModel.FyersModel."""
+
+    def __init__(self, client_id: str = "", token: str = "", log_path: str = "", **kwargs: Any) -> None:
+        self.client_id = client_id
+        self.token = token
+        self.log_path = log_path
+
+    def get_profile(self) -> Dict[str, Any]:
+        _wait(LATENCY.fyers)
+        return {"s": "ok", "data": {"name": "AlgoNova Trader", "fy_id": "FY1234"}}
+
+    def optionchain(self, data: Dict[str, Any]) -> Dict[str, Any]:
+        _wait(LATENCY.fyers)
+        strikes = [
+            {"symbol": f"{data['symbol']}-{strike}-{side}", "strike_price": strike, "option_type": side}
+            for strike in range(100, 100 + 10 * data["strikecount"], 10)
+            for side in ("CE", "PE")
+        ]
+        return {"s": "ok", "code": 200, "data": {"optionsChain": strikes}}
+
+    def quotes(self, data: Dict[str, Any]) -> Dict[str, Any]:
+        _wait(LATENCY.fyers)
+        return {"s": "ok", "d": [{"n": data["symbols"], "v": {"lp": 100.0}}]}
+
+    _order_ids = itertools.count(1)
+
+    def place_order(self, data: Dict[str, Any]) -> Dict[str, Any]:
+        _wait(LATENCY.fyers)
+        return {"s": "ok", "code": 1101, "id": f"FY{next(self._order_ids):012d}"}
+
+    def cancel_order(self, data: Dict[str, Any]) -> Dict[str, Any]:
+        _wait(LATENCY.fyers)
+        return {"s": "ok", "id": data["id"]}
+
+
+class DummyKite:
+    """Stub for kiteconnect.KiteConnect."""
+
+    def __init__(self, api_key: str = "", **kwargs: Any) -> None:
+        self.api_key = api_key
+        self.access_token = None
+
+    def set_access_token(self, access_token: str) -> None:
+        self.access_token = access_token
+
+    def login_url(self) -> str:
+        return f"https://kite.zerodha.com/connect/login?v=3&api_key={self.api_key}"
+
+    def generate_session(self, request_token: str, api_secret: str) -> Dict[str, Any]:
+        _wait(LATENCY.kite)
+        return {"access_token": f"kite-token-for-{request_token}"}
+
+    def profile(self) -> Dict[str, Any]:
+        _wait(LATENCY.kite)
+        return {"user_id": "AB1234", "user_name": "AlgoNova Trader"}
+
+    def ltp(self, instruments: List[str]) -> Dict[str, Any]:
+        _wait(LATENCY.kite)
+        return {symbol: {"last_price": 100.0} for symbol in instruments}
+
+    _order_ids = itertools.count(1)
+
+    def place_order(self, **params: Any) -> str:
+        _wait(LATENCY.kite)
+        return f"ORD{next(self._order_ids):012d}"
+
+    def cancel_order(self, variety: str, order_id: str, **params: Any) -> str:
+        _wait(LATENCY.kite)
+        return order_id
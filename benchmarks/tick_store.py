@@ -0,0 +1,141 @@
+"""
+Tick persistence throughput.
+
+Feeds ``--ticks`` random-walk ticks for ``--symbols`` symbols at
+``--rate`` ticks per second of simulated market time through
+:class:`APP.services.tick_store.TickRecorder`, flushing every simulated
+second into a SQLite database (or nowhere with ``--sink null``). With
+``--outage`` seconds the sink fails for that long mid-run, so blocks go to
+the spill directory and are loaded back once it recovers.
+
+Reported:
+
+* ``ingest_ticks_per_s``  - ``on_tick`` calls per wall-clock second
+* ``end_to_end_ticks_per_s`` - ticks per second including sealing,
+  encoding and inserting (the number to hold above the feed rate)
+* ``compression_ratio``   - 32 raw bytes a tick over stored payload bytes
+* ``rows`` / ``stored_ticks`` - rows inserted and ticks they decode to
+
+Usage::
+
+    python -m benchmarks.tick_store --ticks 3000000 --rate 20000 --outage 60 --output tick_store.json
+"""
+
+from __future__ import annotations
+
+import argparse
+import json
+import platform
+import sys
+import tempfile
+import time
+from datetime import datetime
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Sequence
+
+import numpy as np
+
+
+def bench(ticks: int, symbols: int, rate: int, sink_kind: str, outage: float, seed: int) -> Dict[str, Any]:
+    from sqlalchemy import create_engine, func, select
+
+    from APP.services.market_calendar import IST
+    from APP.services.market_data import Tick
+    from APP.services.tick_store import TickBlock, TickRecorder, day_table, decode_block, sql_sink
+
+    rng = np.random.default_rng(seed)
+    names = [f"NSE:SYM{index}-EQ" for index in range(symbols)]
+    which = rng.integers(0, symbols, ticks)
+    start_price = rng.uniform(100, 3000, symbols)
+    steps = rng.normal(0, 0.0003, ticks)
+    # Paise-rounded random walk per symbol
+    prices = np.empty(ticks)
+    for index in range(symbols):
+        mask = which == index
+        prices[mask] = np.round(start_price[index] * np.exp(np.cumsum(steps[mask])), 2)
+    volumes = np.cumsum(rng.integers(1, 200, ticks)).astype(float)
+    # 2024-06-03 09:15 IST
+    stamps = 1717386300.0 + np.arange(ticks) / rate
+    columns = zip(which.tolist(), prices.tolist(), volumes.tolist(), stamps.tolist())
+    stream = [Tick(names[symbol], price, volume, stamp) for symbol, price, volume, stamp in columns]
+
+    with tempfile.TemporaryDirectory() as tmp:
+        engine = create_engine(f"sqlite:///{tmp}/ticks.db")
+        outage_window = (stamps[len(stamps) // 3], stamps[len(stamps) // 3] + outage)
+        now = [0.0]
+        inner = sql_sink(lambda: engine) if sink_kind == "sqlite" else (lambda blocks: None)
+
+        def sink(blocks: List[TickBlock]) -> None:
+            if outage_window[0] <= now[0] < outage_window[1]:
+                raise ConnectionError("simulated outage")
+            inner(blocks)
+
+        recorder = TickRecorder(sink=sink, spill_dir=Path(tmp) / "spill", close_grace=1)
+        ingest = 0.0
+        started = time.perf_counter()
+        for offset in range(0, ticks, rate):
+            chunk = stream[offset:offset + rate]
+            begin = time.perf_counter()
+            for tick in chunk:
+                recorder.on_tick(tick)
+            ingest += time.perf_counter() - begin
+            now[0] = chunk[-1].timestamp
+            recorder.flush(now=now[0])
+        now[0] = float("inf")
+        recorder.flush(now=float(stamps[-1]) + 120, force=True)
+        elapsed = time.perf_counter() - started
+        status = recorder.status()
+
+        rows = stored = 0
+        if sink_kind == "sqlite":
+            table = day_table(datetime.fromtimestamp(stamps[0], IST).date(), engine)
+            with engine.connect() as connection:
+                rows = connection.execute(select(func.count()).select_from(table)).scalar_one()
+                payloads = connection.execute(select(table.c.payload))
+                stored = sum(len(decode_block(payload)["price"]) for (payload,) in payloads)
+
+    return {
+        "ingest_ticks_per_s": ticks / ingest,
+        "end_to_end_ticks_per_s": ticks / elapsed,
+        "compression_ratio": status["compression_ratio"],
+        "spill_files_left": status["spill_files"],
+        "rows": rows,
+        "stored_ticks": stored,
+    }
+
+
+def main(argv: Optional[Sequence[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Measure tick recording and bulk insert throughput")
+    parser.add_argument("--ticks", type=int, default=500_000)
+    parser.add_argument("--symbols", type=int, default=200)
+    parser.add_argument("--rate", type=int, default=50_000, help="Simulated feed rate, ticks per second")
+    parser.add_argument("--sink", choices=("sqlite", "null"), default="sqlite")
+    parser.add_argument("--outage", type=float, default=0.0, help="Seconds of simulated DB outage mid-run")
+    parser.add_argument("--seed", type=int, default=5)
+    parser.add_argument("--output", help="Write the JSON report here (default: stdout)")
+    args = parser.parse_args(argv)
+
+    result = bench(args.ticks, args.symbols, args.rate, args.sink, args.outage, args.seed)
+    report = {
+        "environment": {"python": platform.python_version(), "platform": platform.platform()},
+        "config": {
+            "ticks": args.ticks,
+            "symbols": args.symbols,
+            "rate": args.rate,
+            "sink": args.sink,
+            "outage": args.outage,
+            "seed": args.seed,
+        },
+        "results": result,
+    }
+    rendered = json.dumps(report, indent=2, sort_keys=True)
+    if args.output:
+        Path(args.output).write_text(rendered + "\n", encoding="utf-8")
+    else:
+        print(rendered)
+    complete = args.sink == "null" or result["stored_ticks"] == args.ticks
+    return 0 if complete and result["spill_files_left"] == 0 else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
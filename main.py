@@ -1,13 +1,113 @@
-from fastapi import FastAPI
+from contextlib import asynccontextmanager
+from fastapi import FastAPI, Request
+from fastapi.concurrency import run_in_threadpool
 from fastapi.middleware.cors import CORSMiddleware
-from dotenv import load_dotenv
+from fastapi.responses import JSONResponse, PlainTextResponse
+import asyncio
 import os
-from typing import List
+from typing import AsyncIterator, List
+
+from APP.config import load_environment
 
 # Load environment variables
-load_dotenv()
+load_environment()
+
+from APP.services import (
+    market_data,
+    order_stream,
+    paper,
+    portfolio,
+    quotes,
+    readiness,
+    shared_ticks,
+    tick_store,
+    write_behind,
+)
+from APP.services.alerts import alert_engine
+from APP.services.candles import candle_aggregator
+from APP.services.circuit import CircuitOpenError
+from APP.services.portfolio import portfolio_analytics
+from APP.services.refresh import refresh_scheduler
+from APP.services.risk_engine import risk_engines
+from APP.services.token_scheduler import scheduler as token_scheduler
+from APP.services.sessions import UserContextMiddleware
+from APP.services.logging_config import (
+    RequestContextMiddleware,
+    configure_logging,
+    shutdown_logging,
+)
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI) -> AsyncIterator[None]:
+    """
+    Keep startup cheap: broker SDKs and the DB engine load lazily, and are
+    warmed in a background thread so /health answers immediately.
+    """
+    configure_logging()
+    if os.getenv("STARTUP_PREWARM", "true").lower() in ("1", "true", "yes"):
+        asyncio.get_running_loop().run_in_executor(None, readiness.warm_all)
+    if os.getenv("TOKEN_SCHEDULER_ENABLED", "true").lower() in ("1", "true", "yes"):
+        token_scheduler.start()
+    if os.getenv("REFRESH_SCHEDULER_ENABLED", "true").lower() in ("1", "true", "yes"):
+        refresh_scheduler.start()
+    # Replays journal segments left by a previous run
+    write_behind.start_all()
+    if os.getenv("ORDER_STREAMS_ENABLED", "true").lower() in ("1", "true", "yes"):
+        # Socket handshakes block for a few seconds; keep them off the event loop
+        asyncio.get_running_loop().run_in_executor(None, order_stream.start_streams)
+    # Marks open positions for the daily-loss limit
+    risk_engines.start()
+    portfolio_analytics.start()
+    alert_engine.start()
+    if os.getenv("PAPER_TRADING_ENABLED", "false").lower() in ("1", "true", "yes"):
+        # Paper orders fill against the live tick feed
+        paper.start()
+    # With several workers only the shared tick table's writer streams; the others mirror its
+    # table onto their own tick bus
+    shared_role = shared_ticks.start()
+    if os.getenv("MARKET_DATA_SYMBOLS"):
+        candle_aggregator.start()
+        if shared_role != shared_ticks.READER:
+            if os.getenv("TICK_STORE_ENABLED", "false").lower() in ("1", "true", "yes"):
+                # Subscribed before the stream starts so the first ticks are kept
+                tick_store.get_recorder().start()
+            asyncio.get_running_loop().run_in_executor(None, market_data.start_tick_stream)
+    readiness.mark_started()
+    try:
+        yield
+    finally:
+        readiness.mark_started(False)
+        token_scheduler.stop()
+        refresh_scheduler.stop()
+        if quotes.quote_facade is not None:
+            quotes.quote_facade.shutdown()
+        order_stream.stop_streams()
+        market_data.stop_tick_stream()
+        shared_ticks.stop()
+        candle_aggregator.stop()
+        paper.stop()
+        if tick_store.tick_recorder is not None:
+            # Seals open minutes and writes (or spills) them before the engine goes away
+            tick_store.tick_recorder.stop()
+        portfolio.stop_all()
+        risk_engines.stop()
+        alert_engine.stop()
+        write_behind.stop_all()
+        shutdown_logging()
+
 
-app = FastAPI(title="AlgoNova API", version="1.0.0")
+app = FastAPI(title="AlgoNova API", version="1.0.0", lifespan=lifespan)
+
+
+@app.exception_handler(CircuitOpenError)
+async def circuit_open_handler(request: Request, exc: CircuitOpenError) -> JSONResponse:
+    """A dependency is failing fast and nothing cached could stand in: tell clients when to retry."""
+    return JSONResponse(
+        {"detail": str(exc)},
+        status_code=503,
+        headers={"Retry-After": str(max(1, round(exc.retry_after)))},
+    )
 
 
 def _build_cors_origins() -> List[str]:
@@ -43,16 +143,34 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["Server-Timing", "X-Request-ID"],
 )
 
+# Request timing histograms + Server-Timing header
+from APP.services import metrics
+from APP.services.profiling import ProfilingMiddleware
+
+# Innermost: profiles cover the route and response encoding; inert until armed via /api/admin
+app.add_middleware(ProfilingMiddleware)
+app.add_middleware(metrics.MetricsMiddleware)
+# Binds X-User-ID (or ?user=) so broker services load that user's session
+app.add_middleware(UserContextMiddleware)
+# Added last so it wraps everything: request IDs are visible to all inner log records
+app.add_middleware(RequestContextMiddleware)
+
 # Import routers
-from APP.routers import broker, fyers
+from APP.routers import admin, alerts, broker, fyers, market, optimizer, orders
 from APP.fyersApp.routers import master
 
 # Include routers
 app.include_router(broker.router, prefix="/api/broker", tags=["broker"])
 app.include_router(fyers.router, prefix="/api/fyers", tags=["fyers"])
+app.include_router(orders.router, prefix="/api/orders", tags=["orders"])
+app.include_router(market.router, prefix="/api/market", tags=["market"])
+app.include_router(optimizer.router, prefix="/api/optimizer", tags=["optimizer"])
+app.include_router(alerts.router, prefix="/api/alerts", tags=["alerts"])
 app.include_router(master.router, prefix="/api/master", tags=["master"])
+app.include_router(admin.router, prefix="/api/admin", tags=["admin"])
 
 @app.get("/")
 async def root():
@@ -62,6 +180,17 @@ async def root():
 async def health():
     return {"status": "healthy"}
 
+@app.get("/ready")
+async def ready() -> JSONResponse:
+    """Report which lazily initialised subsystems are warm; 503 until required ones are."""
+    # Subsystem checks may touch files or sockets; keep them off the event loop
+    report = await run_in_threadpool(readiness.report)
+    return JSONResponse(report, status_code=200 if report["ready"] else 503)
+
+@app.get("/metrics", include_in_schema=False)
+async def prometheus_metrics() -> PlainTextResponse:
+    return PlainTextResponse(metrics.registry.render(), media_type=metrics.CONTENT_TYPE)
+
 if __name__ == "__main__":
     import uvicorn
     uvicorn.run(app, host="0.0.0.0", port=8000)
@@ -0,0 +1,80 @@
+import time
+
+import pytest
+from fastapi import FastAPI
+from fastapi.concurrency import run_in_threadpool
+from starlette.testclient import TestClient
+
+from APP.routers import admin as admin_router
+from APP.services.logging_config import RequestContextMiddleware
+from APP.services.profiling import Profiler, ProfilingMiddleware
+
+HEADERS = {"X-Admin-Token": "s3cret"}
+
+
+@pytest.fixture
+def profiler(monkeypatch: pytest.MonkeyPatch) -> Profiler:
+    profiler = Profiler()
+    monkeypatch.setattr(admin_router, "profiler", profiler)
+    monkeypatch.setenv("ADMIN_TOKEN", "s3cret")
+    return profiler
+
+
+def load_session_file() -> dict:
+    time.sleep(0.05)
+    return {"token": "abc"}
+
+
+def _client(profiler: Profiler) -> TestClient:
+    app = FastAPI()
+
+    @app.get("/api/chain/{symbol}")
+    async def chain(symbol: str) -> dict:
+        return await run_in_threadpool(load_session_file)
+
+    @app.get("/api/other")
+    async def other() -> dict:
+        return {}
+
+    app.include_router(admin_router.router, prefix="/api/admin")
+    app.add_middleware(ProfilingMiddleware, profiler=profiler)
+    app.add_middleware(RequestContextMiddleware)
+    return TestClient(app)
+
+
+def test_admin_endpoints_need_the_admin_token(profiler: Profiler, monkeypatch: pytest.MonkeyPatch) -> None:
+    """Given the admin API When called with no, a wrong or the right token Then only the right one passes."""
+    client = _client(profiler)
+
+    assert client.get("/api/admin/profiling").status_code == 401
+    assert client.get("/api/admin/profiling", headers={"X-Admin-Token": "guess"}).status_code == 401
+    assert client.get("/api/admin/profiling", headers=HEADERS).json()["data"]["armed"] is False
+    assert client.post("/api/admin/profiling?sample_rate=2", headers=HEADERS).status_code == 400
+    monkeypatch.delenv("ADMIN_TOKEN")
+    assert client.get("/api/admin/profiling", headers=HEADERS).status_code == 403
+
+
+def test_armed_route_is_profiled_into_collapsed_stacks_until_the_limit(profiler: Profiler) -> None:
+    """Given profiling armed for a route When it is called Then thread-pool work is sampled and it disarms."""
+    client = _client(profiler)
+    query = "route=/api/chain/{symbol}&max_requests=2&interval_ms=1"
+    armed = client.post(f"/api/admin/profiling?{query}", headers=HEADERS)
+    assert armed.json()["data"]["armed"] is True
+
+    client.get("/api/other")
+    first = client.get("/api/chain/NIFTY", headers={"X-Request-ID": "req-1"})
+    client.get("/api/chain/BANKNIFTY")
+    client.get("/api/chain/FINNIFTY")
+
+    status = client.get("/api/admin/profiling", headers=HEADERS).json()["data"]
+    assert (status["armed"], status["remaining"]) == (False, 0)
+    assert [profile["path"] for profile in status["profiles"]] == ["/api/chain/NIFTY", "/api/chain/BANKNIFTY"]
+    assert first.headers["X-Request-ID"] == "req-1" and status["profiles"][0]["request_id"] == "req-1"
+    assert status["profiles"][0]["status"] == 200 and status["profiles"][0]["samples"] > 5
+
+    folded = client.get("/api/admin/profiling/collapsed?request_id=req-1", headers=HEADERS).text
+    lines = folded.splitlines()
+    assert lines and all(line.rsplit(" ", 1)[1].isdigit() for line in lines)
+    # Stacks start at the request's own work, on the loop or in the pool, never the server's idle loop
+    assert any(line.startswith("load_session_file (") for line in lines)
+    assert not any("run_forever" in line or "_run_once" in line for line in lines)
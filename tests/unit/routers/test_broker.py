@@ -0,0 +1,34 @@
+from typing import Any
+
+import pytest
+from fastapi import FastAPI
+from fastapi.responses import JSONResponse
+from starlette.testclient import TestClient
+
+from APP.routers import broker as broker_router
+from APP.services.circuit import CircuitOpenError
+
+
+def test_place_order_with_open_circuit_propagates_for_a_503(monkeypatch: pytest.MonkeyPatch) -> None:
+    """Given the Kite circuit is open When an order is placed Then the error reaches the app handler."""
+
+    class _OpenCircuitKite:
+        def place_order(self, **params: Any) -> None:
+            raise CircuitOpenError("kite", 12.0)
+
+    monkeypatch.setattr(broker_router, "KiteService", _OpenCircuitKite)
+    app = FastAPI()
+    app.include_router(broker_router.router, prefix="/api/broker")
+    handled = []
+
+    @app.exception_handler(CircuitOpenError)
+    async def _circuit_open(request: Any, exc: CircuitOpenError) -> JSONResponse:
+        handled.append(exc.name)
+        return JSONResponse({"detail": str(exc)}, status_code=503)
+
+    response = TestClient(app).post(
+        "/api/broker/orders", json={"symbol": "NSE:TCS", "transaction_type": "BUY", "quantity": 1}
+    )
+
+    assert response.status_code == 503
+    assert handled == ["kite"]
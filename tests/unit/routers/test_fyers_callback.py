@@ -44,6 +44,63 @@ def test_callback_success_posts_payload(monkeypatch: pytest.MonkeyPatch):
     assert "token123" in response.text
 
 
+def test_callback_binds_the_signed_user_only(monkeypatch: pytest.MonkeyPatch):
+    """Given a signed per-user state When another user calls back with it Then the code is not exchanged."""
+    from APP.fyersApp.services import fyers_service
+    from APP.services.sessions import UserContextMiddleware, current_user
+
+    app = FastAPI()
+    app.add_middleware(UserContextMiddleware)
+    app.include_router(fyers_router.router, prefix="/api/fyers")
+    exchanged = []
+
+    class DummyService:
+        def exchange_auth_code(self, auth_code: str):
+            exchanged.append(current_user())
+            return {"access_token": "token123"}
+
+    monkeypatch.setenv("FYERS_STATE", "algonova-fyers")
+    monkeypatch.setenv("FYERS_SECRET_KEY", "secret-xyz")
+    monkeypatch.setattr(fyers_router, "FyersService", lambda: DummyService())
+    state = fyers_service.sign_state("alice")
+    client = TestClient(app)
+
+    forged = client.get(
+        "/api/fyers/callback", params={"auth_code": "abc", "state": state.replace(":alice:", ":mallory:")}
+    )
+    assert "State validation failed" in forged.text
+    other = client.get("/api/fyers/callback", params={"auth_code": "abc", "state": state, "user": "mallory"})
+    assert "State validation failed" in other.text
+    unsigned = client.get("/api/fyers/callback", params={"auth_code": "abc", "user": "alice"})
+    assert "State validation failed" in unsigned.text
+    legacy = client.get(
+        "/api/fyers/callback",
+        params={"auth_code": "abc", "state": "algonova-fyers"},
+        headers={"X-User-ID": "alice"},
+    )
+    assert "State validation failed" in legacy.text
+    assert exchanged == []
+
+    client.get("/api/fyers/callback", params={"auth_code": "abc", "state": state})
+    assert exchanged == ["alice"]
+
+
+def test_state_is_signed_with_any_configured_app_secret(monkeypatch: pytest.MonkeyPatch):
+    """Given only the Secret_Key alias When a state is signed Then it verifies; a state secret takes over."""
+    from APP.fyersApp.services import fyers_service
+
+    for name in ("FYERS_STATE_SECRET", "FYERS_SECRET_KEY", "FYERS_SECRET_ID"):
+        monkeypatch.delenv(name, raising=False)
+    monkeypatch.setenv("FYERS_STATE", "algonova-fyers")
+    monkeypatch.setenv("Secret_Key", "alias-secret")
+    state = fyers_service.sign_state("alice")
+    assert fyers_service.user_from_state(state) == "alice"
+
+    monkeypatch.setenv("FYERS_STATE_SECRET", "state-secret")
+    with pytest.raises(ValueError, match="State validation failed"):
+        fyers_service.user_from_state(state)
+
+
 def test_get_profile_returns_cached_data(monkeypatch: pytest.MonkeyPatch, tmp_path):
     """Given stored fyers_token.json When /profile called Then cached data is returned."""
     token_path = tmp_path / "fyers_token.json"
@@ -109,3 +166,35 @@ def test_option_chain_endpoint_handles_validation_error(monkeypatch: pytest.Monk
     assert response.status_code == 400
     assert "symbol is required" in response.json()["detail"]
 
+
+
+def test_profile_returns_304_for_matching_etag(monkeypatch: pytest.MonkeyPatch):
+    """Given a profile ETag When the same ETag is sent back Then 304 without a body is returned."""
+    app = FastAPI()
+    app.include_router(fyers_router.router, prefix="/api/fyers")
+
+    session = {
+        "access_token": "token123",
+        "profile": {"data": {"client_id": "FY123"}},
+        "stored_at": "2026-01-05T03:00:00+00:00",
+    }
+
+    class DummyService:
+        def get_cached_profile(self):
+            return dict(session)
+
+    monkeypatch.setattr(fyers_router, "FyersService", lambda: DummyService())
+
+    client = TestClient(app)
+    first = client.get("/api/fyers/profile")
+    etag = first.headers["etag"]
+    second = client.get("/api/fyers/profile", headers={"If-None-Match": etag})
+    session["stored_at"] = "2026-01-06T03:00:00+00:00"
+    third = client.get("/api/fyers/profile", headers={"If-None-Match": etag})
+
+    assert first.status_code == 200
+    assert first.json()["data"]["data"]["client_id"] == "FY123"
+    assert second.status_code == 304
+    assert second.content == b""
+    assert third.status_code == 200
+    assert third.headers["etag"] != etag
@@ -0,0 +1,68 @@
+from datetime import datetime
+
+import pytest
+from fastapi import FastAPI
+from starlette.testclient import TestClient
+
+from APP.fyersApp.db import connection
+from APP.fyersApp.routers import master
+
+
+def _app() -> FastAPI:
+    app = FastAPI()
+    app.include_router(master.router, prefix="/api/master")
+    return app
+
+
+def test_dropdown_returns_503_when_db_not_configured(monkeypatch: pytest.MonkeyPatch):
+    """Given no DB settings When /dropdown called Then only this route fails, with 503."""
+    for key in ("MSSQL_CONNECTION_STRING", "DB_SERVER", "DB_DATABASE"):
+        monkeypatch.delenv(key, raising=False)
+    monkeypatch.setattr(connection, "_engine", None)
+
+    client = TestClient(_app())
+    response = client.get("/api/master/dropdown")
+
+    assert response.status_code == 503
+    assert "Database configuration missing" in response.json()["detail"]
+
+
+def test_dropdown_filters_active_rows():
+    """Given a SQLite session When /dropdown?type= called Then active rows of that type return."""
+    from sqlalchemy import create_engine
+    from sqlalchemy.orm import sessionmaker
+    from sqlalchemy.pool import StaticPool
+
+    from APP.fyersApp.models.dropdown import Base, DropdownMaster
+
+    engine = create_engine("sqlite://", connect_args={"check_same_thread": False}, poolclass=StaticPool)
+    Base.metadata.create_all(engine)
+    session_factory = sessionmaker(bind=engine)
+    with session_factory() as db:
+        for name, active in (("NSE", True), ("BSE", False)):
+            db.add(
+                DropdownMaster(
+                    DropdownName=name,
+                    DropdownType="Exchange",
+                    IsActive=active,
+                    CreatedBy="test",
+                    CreatedDate=datetime(2024, 1, 1),
+                    Value=name,
+                )
+            )
+        db.commit()
+
+    def override_db():
+        db = session_factory()
+        try:
+            yield db
+        finally:
+            db.close()
+
+    app = _app()
+    app.dependency_overrides[connection.get_db] = override_db
+    client = TestClient(app)
+    response = client.get("/api/master/dropdown", params={"type": "Exchange"})
+
+    assert response.status_code == 200
+    assert [item["value"] for item in response.json()["data"]] == ["NSE"]
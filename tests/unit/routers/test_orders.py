@@ -0,0 +1,83 @@
+import hashlib
+
+import pytest
+from fastapi import FastAPI
+from starlette.testclient import TestClient
+
+from APP.routers import orders as orders_router
+from APP.services.order_book import COMPLETE, PENDING, OrderBook, OrderUpdate
+from APP.services.order_stream import FakeOrderStream
+from APP.services.sessions import UserContextMiddleware
+
+
+@pytest.fixture
+def book(monkeypatch: pytest.MonkeyPatch) -> OrderBook:
+    book = OrderBook()
+    monkeypatch.setattr(orders_router, "order_book", book)
+    return book
+
+
+def _client() -> TestClient:
+    app = FastAPI()
+    app.include_router(orders_router.router, prefix="/api/orders")
+    app.add_middleware(UserContextMiddleware)
+    return TestClient(app)
+
+
+def test_kite_postback_requires_valid_checksum(monkeypatch: pytest.MonkeyPatch, book: OrderBook) -> None:
+    """Given a postback When the checksum matches Then the order is applied, otherwise rejected."""
+    monkeypatch.setenv("KITE_API_SECRET", "secret")
+    payload = {
+        "order_id": "3001",
+        "order_timestamp": "2024-06-03 09:15:02",
+        "status": "OPEN",
+        "exchange": "NSE",
+        "tradingsymbol": "TCS",
+        "transaction_type": "SELL",
+        "quantity": 1,
+    }
+    client = _client()
+
+    rejected = client.post("/api/orders/kite-postback", json={**payload, "checksum": "bad"})
+    checksum = hashlib.sha256(b"30012024-06-03 09:15:02secret").hexdigest()
+    accepted = client.post("/api/orders/kite-postback", json={**payload, "checksum": checksum})
+
+    assert rejected.status_code == 401
+    assert accepted.json()["applied"] is True
+    assert client.get("/api/orders/3001").json()["data"]["symbol"] == "NSE:TCS"
+
+
+def test_websocket_pushes_order_updates(book: OrderBook) -> None:
+    """Given a connected client When the stream applies an update Then it is pushed over the socket."""
+    stream = FakeOrderStream("kite", book=book)
+    client = _client()
+
+    with client.websocket_connect("/api/orders/ws") as websocket:
+        assert websocket.receive_json() == {"type": "snapshot", "data": []}
+        stream.emit({"order_id": "4001", "status": "COMPLETE", "filled_quantity": 2, "quantity": 2})
+        event = websocket.receive_json()
+
+    assert event["type"] == "order"
+    assert event["data"]["order_id"] == "4001"
+    assert event["data"]["status"] == "COMPLETE"
+
+
+def test_orders_are_listed_only_to_their_owner(book: OrderBook) -> None:
+    """Given orders of two users When one lists, fetches or streams Then the other's orders stay hidden."""
+    book.apply(OrderUpdate("kite", "6001", PENDING, symbol="NSE:INFY", user="alice"))
+    book.apply(OrderUpdate("kite", "6002", PENDING, symbol="NSE:TCS", user="bob"))
+    client = _client()
+
+    listed = client.get("/api/orders", headers={"X-User-ID": "alice"}).json()["data"]
+    foreign = client.get("/api/orders/6002", headers={"X-User-ID": "alice"})
+    with client.websocket_connect("/api/orders/ws?user=alice") as websocket:
+        snapshot = websocket.receive_json()["data"]
+        book.apply(OrderUpdate("kite", "6002", COMPLETE, filled_quantity=1, average_price=1.0))
+        book.apply(OrderUpdate("kite", "6001", COMPLETE, filled_quantity=1, average_price=1.0))
+        event = websocket.receive_json()
+
+    assert [order["order_id"] for order in listed] == ["6001"]
+    assert foreign.status_code == 404
+    assert [order["order_id"] for order in snapshot] == ["6001"]
+    assert event["data"]["order_id"] == "6001"
+    assert client.get("/api/orders").json()["data"] == []
@@ -0,0 +1,94 @@
+import pytest
+
+from APP.services.alerts import CANCELLED, FIRED, OI, PRICE, AlertEngine
+from APP.services.market_data import Tick
+
+
+def _engine() -> AlertEngine:
+    return AlertEngine(chain_poll=0, clock=lambda: 1_700_000_000.0)
+
+
+def test_price_alerts_fire_only_when_their_level_is_crossed():
+    """Given above/below/cross alerts When prices move Then each fires once at its level."""
+    engine = _engine()
+    engine.evaluate("NSE:NIFTY50-INDEX", PRICE, 24000.0)
+    above = engine.add("NSE:NIFTY50-INDEX", condition="above", threshold=24100)
+    higher = engine.add("NSE:NIFTY50-INDEX", condition="above", threshold=24500)
+    below = engine.add("NSE:NIFTY50-INDEX", condition="below", threshold=23900)
+    cross_up = engine.add("NSE:NIFTY50-INDEX", condition="cross", threshold=24300)
+
+    assert engine.evaluate("NSE:NIFTY50-INDEX", PRICE, 24080.0) == []
+    fired = engine.evaluate("NSE:NIFTY50-INDEX", PRICE, 24150.0)
+    assert [alert.id for alert in fired] == [above.id]
+    assert above.status == FIRED and above.fired_value == 24150.0
+
+    # Price was below 24300 when set, so the cross alert waits for an upward move
+    assert cross_up.rising is True
+    engine.on_tick(Tick(symbol="NSE:NIFTY50-INDEX", price=23850.0))
+    assert below.status == FIRED
+    assert engine.evaluate("NSE:NIFTY50-INDEX", PRICE, 24600.0) == [cross_up, higher]
+    assert engine.active_count() == 0
+    assert [alert.id for alert in engine.fired()] == [higher.id, cross_up.id, below.id, above.id]
+
+
+def test_oi_alert_uses_first_value_as_baseline_and_reads_option_chains():
+    """Given an OI alert without baseline When chains report OI Then it fires on a 20% rise."""
+    engine = _engine()
+    symbol = "NSE:NIFTY2610624000CE"
+    alert = engine.add(symbol, field=OI, change_pct=20)
+    drop = engine.add(symbol, field=OI, change_pct=-50, baseline=1000)
+
+    def chain(oi: float) -> dict:
+        return {"data": {"optionsChain": [{"symbol": symbol, "ltp": 120.5, "oi": oi}]}}
+
+    engine.ingest_option_chain(chain(100_000))
+    assert alert.baseline == 100_000 and alert.level == pytest.approx(120_000)
+    engine.ingest_option_chain(chain(119_000))
+    assert alert.status != FIRED
+    engine.ingest_option_chain(chain(125_000))
+    assert alert.status == FIRED and alert.fired_value == 125_000
+    assert drop.status != FIRED
+    engine.evaluate(symbol, OI, 400)
+    assert drop.status == FIRED
+
+
+def test_cancel_removes_alert_from_index_and_validates_rules():
+    """Given active alerts When one is cancelled Then it never fires and bad rules are rejected."""
+    engine = _engine()
+    keep = engine.add("NSE:SBIN-EQ", condition="above", threshold=800)
+    dropped = engine.add("NSE:SBIN-EQ", condition="above", threshold=800)
+
+    assert engine.cancel(dropped.id).status == CANCELLED
+    fired = engine.evaluate("NSE:SBIN-EQ", PRICE, 801)
+
+    assert fired == [keep]
+    assert engine.status()["indexed_series"] == 0
+    with pytest.raises(ValueError):
+        engine.add("NSE:SBIN-EQ", condition="sideways", threshold=800)
+    with pytest.raises(ValueError):
+        engine.add("NSE:SBIN-EQ", field=OI, change_pct=0)
+    full = AlertEngine(max_alerts=1, chain_poll=0)
+    full.add("NSE:SBIN-EQ", threshold=800)
+    with pytest.raises(ValueError, match="limit"):
+        full.add("NSE:SBIN-EQ", threshold=810)
+
+
+def test_alert_added_while_a_value_is_evaluated_keeps_its_book():
+    """Given a book replaced before evaluate takes the lock When the value arrives Then the new alert fires."""
+    engine = _engine()
+    old = engine.add("NSE:SBIN-EQ", condition="above", threshold=900)
+    replaced = []
+
+    class Books(dict):
+        def __contains__(self, key):
+            # Another thread cancels the only alert and adds a new one in the unlocked window
+            if not replaced:
+                replaced.append(engine.cancel(old.id))
+                replaced.append(engine.add("NSE:SBIN-EQ", condition="above", threshold=800))
+            return super().__contains__(key)
+
+    engine._books = Books(engine._books)
+    assert engine.evaluate("NSE:SBIN-EQ", PRICE, 810) == [replaced[1]]
+
+    later = engine.add("NSE:SBIN-EQ", condition="above", threshold=820)
+    assert engine.evaluate("NSE:SBIN-EQ", PRICE, 825) == [later]
@@ -0,0 +1,212 @@
+import itertools
+import threading
+import time
+from typing import Any, Dict, List, Optional
+
+import pytest
+
+from APP.services.basket import FAILED, ROLLED_BACK, BasketExecutor, BasketLeg, RateLimiter
+from APP.services.order_book import PENDING, OrderBook, OrderUpdate
+from APP.services.risk_engine import BreachRecorder, RiskEngine, RiskLimits
+
+
+class _FakeBroker:
+    """Broker service stub: slow placement, optional rejection, fills applied on demand."""
+
+    def __init__(self, book: OrderBook, delay: float = 0.0, reject: Optional[str] = None) -> None:
+        self.book = book
+        self.delay = delay
+        self.reject = reject
+        self.placed: List[Dict[str, Any]] = []
+        self.cancelled: List[str] = []
+        self._ids = itertools.count(1)
+        self._lock = threading.Lock()
+
+    def place_order(self, **params: Any) -> Dict[str, Any]:
+        time.sleep(self.delay)
+        if params["symbol"] == self.reject:
+            raise ValueError("RMS: insufficient margin")
+        with self._lock:
+            order_id = f"O{next(self._ids)}"
+            self.placed.append({"order_id": order_id, **params})
+        self.book.apply(
+            OrderUpdate("kite", order_id, PENDING, params["symbol"], params["transaction_type"],
+                        params["quantity"], strategy=params["tag"])
+        )
+        return {"order_id": order_id}
+
+    def cancel_order(self, order_id: str) -> Dict[str, Any]:
+        self.cancelled.append(order_id)
+        self.book.apply(OrderUpdate("kite", order_id, "CANCELLED"))
+        return {"order_id": order_id}
+
+
+def _executor(broker: _FakeBroker, book: OrderBook, limits: Optional[RiskLimits] = None) -> BasketExecutor:
+    risk = RiskEngine(limits or RiskLimits(), recorder=BreachRecorder(sink=lambda batch: None))
+    return BasketExecutor(
+        services={"kite": lambda: broker},
+        book=book,
+        risk=risk,
+        limiters={"kite": RateLimiter(100)},
+    )
+
+
+def _condor() -> List[BasketLeg]:
+    return [
+        BasketLeg("kite", "NFO:NIFTY22000CE", "SELL", 50, "LIMIT", price=120.0),
+        BasketLeg("kite", "NFO:NIFTY21800PE", "SELL", 50, "LIMIT", price=110.0),
+        BasketLeg("kite", "NFO:NIFTY22200CE", "BUY", 50, "LIMIT", price=60.0),
+        BasketLeg("kite", "NFO:NIFTY21600PE", "BUY", 50, "LIMIT", price=55.0),
+    ]
+
+
+def test_invalid_basket_places_nothing() -> None:
+    """Given a leg breaching a limit and a malformed leg When executed Then nothing is placed."""
+    book = OrderBook()
+    broker = _FakeBroker(book)
+    executor = _executor(broker, book, RiskLimits(max_order_quantity=25))
+    legs = _condor() + [BasketLeg("kite", "NIFTY", "HOLD", 0)]
+
+    with pytest.raises(ValueError) as excinfo:
+        executor.execute(legs)
+
+    assert "leg 5" in str(excinfo.value)
+    assert broker.placed == []
+
+
+def test_stop_legs_without_a_trigger_are_rejected() -> None:
+    """Given SL and SL-M legs without trigger_price When executed Then both are reported, nothing placed."""
+    book = OrderBook()
+    broker = _FakeBroker(book)
+    legs = [
+        BasketLeg("kite", "NFO:NIFTY22000CE", "SELL", 50, "SL", price=120.0),
+        BasketLeg("kite", "NFO:NIFTY21800PE", "SELL", 50, "SL-M"),
+        BasketLeg("kite", "NFO:NIFTY22200CE", "BUY", 50, "SL", price=61.0, trigger_price=60.0),
+    ]
+
+    with pytest.raises(ValueError) as excinfo:
+        _executor(broker, book).execute(legs)
+
+    message = str(excinfo.value)
+    assert "leg 1: SL orders need a trigger_price" in message
+    assert "leg 2: SL-M orders need a trigger_price" in message
+    assert "leg 3" not in message
+    assert broker.placed == []
+
+
+def test_legs_are_placed_concurrently_and_tracked() -> None:
+    """Given four legs and a 50ms broker When executed Then all go out in about one round-trip."""
+    book = OrderBook()
+    broker = _FakeBroker(book, delay=0.05)
+    executor = _executor(broker, book)
+
+    started = time.perf_counter()
+    execution = executor.execute(_condor(), tag="condor1")
+    elapsed = time.perf_counter() - started
+
+    assert elapsed < 0.15
+    assert [leg.status for leg in execution.legs] == [PENDING] * 4
+    assert len(book.orders("condor1")) == 4
+    assert executor.get(execution.basket_id) is execution
+
+
+def test_rejected_leg_rolls_back_filled_and_open_legs() -> None:
+    """Given one rejected leg When rollback is on Then open legs are cancelled and fills squared off."""
+    book = OrderBook()
+    broker = _FakeBroker(book, reject="NFO:NIFTY21600PE")
+    executor = _executor(broker, book)
+    original_place = broker.place_order
+
+    def place_and_fill_first(**params: Any) -> Dict[str, Any]:
+        placed = original_place(**params)
+        if params["symbol"] == "NFO:NIFTY22000CE" and params["transaction_type"] == "SELL":
+            book.apply(OrderUpdate("kite", placed["order_id"], "COMPLETE", filled_quantity=50, average_price=120.0))
+        return placed
+
+    broker.place_order = place_and_fill_first
+    execution = executor.execute(_condor())
+
+    assert execution.status == ROLLED_BACK
+    filled_leg = execution.legs[0]
+    assert "squared off 50" in filled_leg.rollback
+    square_off = broker.placed[-1]
+    assert (square_off["symbol"], square_off["transaction_type"]) == ("NFO:NIFTY22000CE", "BUY")
+    assert len(broker.cancelled) == 2
+    assert execution.legs[3].error == "RMS: insufficient margin"
+
+
+def test_failed_basket_without_rollback_is_left_alone() -> None:
+    """Given rollback disabled When a leg is rejected Then the basket is FAILED and nothing is unwound."""
+    book = OrderBook()
+    broker = _FakeBroker(book, reject="NFO:NIFTY22000CE")
+    executor = _executor(broker, book)
+
+    execution = executor.execute(_condor(), rollback=False)
+
+    assert execution.status == FAILED
+    assert broker.cancelled == []
+
+
+def test_rollback_squares_off_once_and_is_not_rate_limited() -> None:
+    """Given filled legs and a spent order-rate bucket When rolled back twice Then fills are unwound once."""
+    risk = RiskEngine(RiskLimits(max_orders_per_second=0.001, order_burst=2),
+                      recorder=BreachRecorder(sink=lambda batch: None))
+    book = OrderBook(on_fill=risk.on_fill)
+    broker = _FakeBroker(book)
+    executor = BasketExecutor(services={"kite": lambda: broker}, book=book, risk=risk,
+                              limiters={"kite": RateLimiter(100)})
+    original_place = broker.place_order
+
+    def enforce_and_fill(**params: Any) -> Dict[str, Any]:
+        price = params.get("price") or 100.0
+        risk.enforce(params["symbol"], params["transaction_type"], params["quantity"], price)
+        placed = original_place(**params)
+        book.apply(OrderUpdate("kite", placed["order_id"], "COMPLETE", filled_quantity=params["quantity"],
+                               average_price=price))
+        return placed
+
+    broker.place_order = enforce_and_fill
+    # Two legs take the whole bucket, the third is refused by the rate limit
+    execution = executor.execute(_condor()[:3])
+
+    assert execution.status == ROLLED_BACK, execution.error
+    assert execution.legs[2].error.startswith("Order rate")
+    assert [leg.unwound_quantity for leg in execution.legs] == [50, 50, 0]
+    placed = len(broker.placed)
+
+    assert executor.rollback(execution) is execution
+    assert len(broker.placed) == placed
+    assert [position["quantity"] for position in risk.snapshot()["positions"].values()] == [0, 0]
+
+
+def test_failed_square_off_is_a_basket_error_and_can_be_retried() -> None:
+    """Given a square-off the broker refuses When rolled back Then the basket errors and a retry ends it."""
+    book = OrderBook()
+    broker = _FakeBroker(book, reject="NFO:NIFTY21600PE")
+    executor = _executor(broker, book)
+    original_place = broker.place_order
+    refuse = [True]
+
+    def place(**params: Any) -> Dict[str, Any]:
+        if refuse[0] and (params["symbol"], params["transaction_type"]) == ("NFO:NIFTY22000CE", "BUY"):
+            raise ValueError("broker down")
+        placed = original_place(**params)
+        if params["symbol"] == "NFO:NIFTY22000CE":
+            book.apply(
+                OrderUpdate("kite", placed["order_id"], "COMPLETE", filled_quantity=50, average_price=120.0)
+            )
+        return placed
+
+    broker.place_order = place
+    execution = executor.execute(_condor())
+
+    assert execution.status == FAILED
+    assert "square-off of 50 failed: broker down" in execution.error
+    assert execution.legs[0].unwound_quantity == 0
+
+    refuse[0] = False
+    executor.rollback(execution)
+
+    assert execution.status == ROLLED_BACK and execution.error is None
+    assert execution.legs[0].unwound_quantity == 50
+    assert len(broker.cancelled) == 2
@@ -0,0 +1,60 @@
+from typing import List
+
+from APP.services.candles import Bar, CandleAggregator
+from APP.services.market_data import Tick, TickBus
+
+
+def _aggregator(**kwargs) -> CandleAggregator:
+    return CandleAggregator(timeframes=["1s", "1m"], close_grace=0.0, **kwargs)
+
+
+def test_ticks_build_ohlcv_bars_and_emit_closes() -> None:
+    """Given ticks across two minutes When aggregated Then bars hold OHLC and traded volume deltas."""
+    aggregator = _aggregator()
+    closed: List[Bar] = []
+    aggregator.add_listener(closed.append)
+    bus = TickBus()
+    bus.subscribe(aggregator.on_tick)
+
+    trades = [(0, 100.0, 1000), (10, 102.0, 1010), (20, 99.0, 1030), (59, 101.0, 1040), (61, 103.0, 1045)]
+    for second, price, volume in trades:
+        bus.publish(Tick("NSE:SBIN-EQ", price, volume, 1_700_000_040 + second))
+
+    minute = [bar for bar in closed if bar.timeframe == "1m"]
+    assert len(minute) == 1
+    assert (minute[0].open, minute[0].high, minute[0].low, minute[0].close) == (100.0, 102.0, 99.0, 101.0)
+    # The first tick only sets the volume baseline
+    assert minute[0].volume == 40.0
+    assert [bar.timestamp for bar in closed if bar.timeframe == "1s"] == [
+        1_700_000_040, 1_700_000_050, 1_700_000_060, 1_700_000_099,
+    ]
+    rows = aggregator.candles("NSE:SBIN-EQ", "1m", include_partial=True)
+    assert rows[-1] == {
+        "timestamp": 1_700_000_100, "open": 103.0, "high": 103.0, "low": 103.0,
+        "close": 103.0, "volume": 5.0, "partial": True,
+    }
+
+
+def test_flush_closes_idle_bars_and_late_ticks_are_dropped() -> None:
+    """Given an open bar When its period passes without ticks Then flush closes it and later ticks for it are late."""
+    aggregator = _aggregator()
+    aggregator.on_tick(Tick("NSE:INFY-EQ", 1500.0, 10, 1_700_000_001.5))
+
+    closed = aggregator.flush(now=1_700_000_002.0)
+    aggregator.on_tick(Tick("NSE:INFY-EQ", 1499.0, 11, 1_700_000_001.9))
+
+    assert [bar.timeframe for bar in closed] == ["1s"]
+    assert aggregator.late_ticks == 1
+    assert aggregator.candles("NSE:INFY-EQ", "1s")[0]["close"] == 1500.0
+
+
+def test_ring_keeps_only_the_latest_bars() -> None:
+    """Given more bars than the ring holds When read Then the newest ones come back oldest first."""
+    aggregator = CandleAggregator(timeframes=["1s"], capacities={"1s": 4}, close_grace=0.0)
+    for second in range(10):
+        aggregator.on_tick(Tick("NSE:TCS-EQ", 3000.0 + second, 0, 1_700_000_000 + second))
+    aggregator.flush(now=1_800_000_000)
+
+    rows = aggregator.candles("NSE:TCS-EQ", "1s", limit=10)
+
+    assert [row["close"] for row in rows] == [3006.0, 3007.0, 3008.0, 3009.0]
@@ -0,0 +1,122 @@
+import pytest
+
+from APP.fyersApp.models import OptionChainRequest
+from APP.fyersApp.services import FyersService, fyers_service
+from APP.services import circuit
+from APP.services.circuit import CircuitBreaker, CircuitOpenError, breaker, guarded
+
+
+@pytest.fixture(autouse=True)
+def _fresh_breakers(monkeypatch: pytest.MonkeyPatch):
+    monkeypatch.setenv("CIRCUIT_RETRY_BASE_SECONDS", "0")
+    circuit.reset_breakers()
+    yield
+    circuit.reset_breakers()
+
+
+def test_breaker_opens_on_errors_fails_fast_and_recovers_through_probes():
+    """Given mostly failing calls When the window fills Then calls fail fast until probes succeed."""
+    now = [0.0]
+    trips = CircuitBreaker(
+        "test", window=4, min_calls=4, failure_rate=0.5, open_seconds=10, half_open_probes=2,
+        clock=lambda: now[0],
+    )
+    calls = []
+
+    def flaky(ok: bool) -> str:
+        calls.append(ok)
+        if not ok:
+            raise ConnectionError("reset by peer")
+        return "ok"
+
+    def refused() -> None:
+        raise ValueError("bad symbol")
+
+    trips.call(flaky, True)
+    with pytest.raises(ConnectionError):
+        trips.call(flaky, False)
+    trips.call(flaky, True)
+    # Upstream refusals are answers, not outages
+    with pytest.raises(ValueError):
+        trips.call(refused)
+    assert trips.state == "closed"
+    with pytest.raises(ConnectionError):
+        trips.call(flaky, False)
+    assert trips.state == "open"
+    assert trips.status()["last_error"] == "ConnectionError: reset by peer"
+
+    with pytest.raises(CircuitOpenError) as rejected:
+        trips.call(flaky, True)
+    assert 8 <= rejected.value.retry_after <= 12
+    assert len(calls) == 4
+
+    now[0] = 13.0
+    assert trips.call(flaky, True) == "ok"
+    assert trips.state == "half_open"
+    assert trips.call(flaky, True) == "ok"
+    assert trips.state == "closed"
+
+
+def test_guarded_retries_transient_errors_only_and_slow_calls_trip():
+    """Given transient and permanent failures When guarded Then only transient ones are retried."""
+    attempts = []
+
+    def twice_down() -> str:
+        attempts.append(1)
+        if len(attempts) < 3:
+            raise TimeoutError("read timed out")
+        return "ok"
+
+    assert guarded("fyers", twice_down) == "ok"
+    assert len(attempts) == 3
+
+    attempts.clear()
+    with pytest.raises(ValueError):
+        guarded("fyers", lambda: attempts.append(1) or int("x"))
+    assert len(attempts) == 1
+
+    slow = CircuitBreaker("slow", window=3, min_calls=3, slow_call_seconds=0.0, slow_call_rate=1.0)
+    for _ in range(3):
+        slow.call(lambda: None)
+    assert slow.state == "open"
+
+
+def test_option_chain_is_served_stale_while_fyers_is_down(monkeypatch: pytest.MonkeyPatch, tmp_path):
+    """Given a cached chain and a failing Fyers When fetching Then the stale chain returns without waiting."""
+    down = [False]
+    sent = []
+
+    class FlakyFyers:
+        def __init__(self, client_id: str, token: str, log_path: str) -> None:
+            pass
+
+        def optionchain(self, data):
+            sent.append(data["symbol"])
+            if down[0]:
+                raise ConnectionError("fyers unreachable")
+            return {"s": "ok", "data": {"optionsChain": []}, "call": len(sent)}
+
+    monkeypatch.setenv("FYERS_APP_ID", "APP-5678")
+    monkeypatch.setenv("FYERS_SECRET_KEY", "secret-xyz")
+    monkeypatch.setenv("FYERS_LOG_PATH", str(tmp_path / "logs"))
+    monkeypatch.setenv("FYERS_TOKEN_PATH", str(tmp_path / "fyers_token.json"))
+    monkeypatch.setenv("CIRCUIT_FYERS_MIN_CALLS", "3")
+    monkeypatch.setenv("CIRCUIT_FYERS_RETRIES", "1")
+    fyers_service._option_chain_cache.clear()
+    service = FyersService(fyers_factory=FlakyFyers)
+    service._store_session("token-1", {"data": {}})
+    request = OptionChainRequest(symbol="NSE:NIFTY50-INDEX")
+
+    assert service.fetch_option_chain(request)["call"] == 1
+    down[0] = True
+    # Refreshing skips the fresh cache, hits the outage (retried once) and falls back
+    assert service.fetch_option_chain(request, refresh=True)["call"] == 1
+    assert len(sent) == 3
+    assert breaker("fyers").state == "open"
+    assert service.fetch_option_chain(request, refresh=True)["call"] == 1
+    assert len(sent) == 3
+
+    with pytest.raises(CircuitOpenError):
+        service.fetch_option_chain(OptionChainRequest(symbol="NSE:SBIN-EQ"))
+    assert len(sent) == 3
+
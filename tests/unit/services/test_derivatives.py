@@ -0,0 +1,112 @@
+from datetime import date, datetime
+from typing import Any, Dict, List
+
+import pytest
+
+from APP.services.derivatives import DerivativesIndex
+from APP.services.market_calendar import IST
+
+EXPIRIES = [date(2024, 6, 6), date(2024, 6, 13), date(2024, 6, 20), date(2024, 6, 27), date(2024, 7, 25)]
+
+
+def _rows() -> List[Dict[str, Any]]:
+    rows: List[Dict[str, Any]] = [{"instrument_type": "EQ", "name": "NIFTY", "expiry": None}]
+    for expiry in EXPIRIES:
+        code = f"{expiry:%y}{expiry.month}{expiry:%d}"
+        for strike in range(21800, 22450, 50):
+            for kind in ("CE", "PE"):
+                rows.append({
+                    "exchange": "NFO",
+                    "tradingsymbol": f"NIFTY{code}{strike}{kind}",
+                    "name": "NIFTY",
+                    "expiry": expiry,
+                    "strike": float(strike),
+                    "lot_size": 25,
+                    "tick_size": 0.05,
+                    "instrument_type": kind,
+                })
+    rows.append({
+        "exchange": "NFO",
+        "tradingsymbol": "NIFTY24JUNFUT",
+        "name": "NIFTY",
+        "expiry": "2024-06-27",
+        "strike": 0.0,
+        "lot_size": 25,
+        "tick_size": 0.1,
+        "instrument_type": "FUT",
+    })
+    return rows
+
+
+def _clock(day: int, hour: int = 10) -> float:
+    return datetime(2024, 6, day, hour, tzinfo=IST).timestamp()
+
+
+def test_expiry_selectors_and_strike_lookups_resolve_from_the_index():
+    """Given a loaded instrument dump When selecting expiries and strikes Then no broker call is needed."""
+    now = [_clock(7)]
+    index = DerivativesIndex(loader=_rows, clock=lambda: now[0])
+
+    # The 6 June weekly has expired; spot and option symbols share the underlying key
+    assert [series.expiry for series in index.expiries("NSE:NIFTY50-INDEX")] == EXPIRIES[1:]
+    assert index.series("NIFTY").expiry == date(2024, 6, 13)
+    assert index.series("NIFTY", "next").expiry == date(2024, 6, 20)
+    assert index.series("NSE:NIFTY2462022000CE", "2").expiry == date(2024, 6, 27)
+    monthly = index.series("NIFTY", "monthly")
+    assert (monthly.expiry, monthly.future) == (date(2024, 6, 27), "NSE:NIFTY24JUNFUT")
+    assert monthly.monthly and monthly.tick_size == 0.1
+    assert index.series("NIFTY", "next-monthly").expiry == date(2024, 7, 25)
+    assert index.lot_size("NIFTY") == 25
+
+    weekly = index.series("NIFTY", "2024-06-20")
+    # Nearest strike, the lower one on a tie, clamped to the ladder
+    assert [weekly.atm(price) for price in (22024.0, 22025.0, 22026.0)] == [22000.0, 22000.0, 22050.0]
+    assert weekly.atm(10.0) == 21800.0 and weekly.atm(99999.0) == 22400.0
+    assert weekly.window(22010.0, 2).tolist() == [21900.0, 21950.0, 22000.0, 22050.0, 22100.0]
+    assert weekly.window(22010.0, 1, offset=-3).tolist() == [21800.0, 21850.0, 21900.0]
+    assert weekly.window(22390.0, 2).tolist() == [22300.0, 22350.0, 22400.0]
+    assert weekly.option(22000, "ce") == "NSE:NIFTY2462022000CE"
+
+    for selector in ("weekly", "5", "2024-06-06"):
+        with pytest.raises(ValueError):
+            index.series("NIFTY", selector)
+    with pytest.raises(ValueError, match="No derivatives"):
+        index.series("NSE:TCS-EQ")
+    assert index.status()["options"] == 130 and index.status()["loaded_on"] == "2024-06-07"
+
+
+def test_index_reloads_on_a_new_day_and_keeps_the_last_good_copy_on_failure():
+    """Given a loaded index When the day changes Then it reloads, and a failed reload keeps the old data."""
+    now = [_clock(7)]
+    calls = []
+    broken = [False]
+
+    def loader() -> List[Dict[str, Any]]:
+        calls.append(now[0])
+        if broken[0]:
+            raise ConnectionError("kite unreachable")
+        return _rows()
+
+    index = DerivativesIndex(loader=loader, clock=lambda: now[0])
+    index.series("NIFTY")
+    index.series("NIFTY", "next")
+    assert len(calls) == 1
+
+    now[0] = _clock(14)
+    broken[0] = True
+    # Reload fails: yesterday's copy still answers, with the 13 June weekly rolled off
+    assert index.series("NIFTY").expiry == date(2024, 6, 20)
+    assert index.series("NIFTY").expiry == date(2024, 6, 20)
+    assert len(calls) == 2 and index.status()["error"] == "kite unreachable"
+
+    now[0] += 61
+    broken[0] = False
+    index.series("NIFTY")
+    assert len(calls) == 3 and index.status()["loaded_on"] == "2024-06-14"
+
+    def unreachable() -> List[Dict[str, Any]]:
+        raise ConnectionError("down")
+
+    empty = DerivativesIndex(loader=unreachable, clock=lambda: now[0])
+    with pytest.raises(ValueError, match="not loaded"):
+        empty.series("NIFTY")
@@ -1,12 +1,21 @@
 from typing import Any, Dict
 
 import json
+import threading
+import time
 from typing import Any, Dict
 
 import pytest
 
-from APP.fyersApp.services import FyersService
+from APP.fyersApp.services import FyersService, fyers_service
 from APP.fyersApp.models import OptionChainRequest
+from APP.services.cache import COALESCED_CALLS
+
+
+@pytest.fixture(autouse=True)
+def _clear_caches():
+    fyers_service._client_cache.clear()
+    fyers_service._option_chain_cache.clear()
 
 
 class _DummySession:
@@ -148,3 +157,151 @@ def test_fetch_option_chain_handles_fyers_error(monkeypatch: pytest.MonkeyPatch,
     with pytest.raises(ValueError, match="token expired"):
         error_service.fetch_option_chain(OptionChainRequest(symbol="NSE:TCS-EQ"))
 
+
+def test_refresh_access_token_uses_stored_refresh_token(monkeypatch: pytest.MonkeyPatch, tmp_path) -> None:
+    """Given stored refresh token and PIN When refresh_access_token called Then new token persisted."""
+    _reset_env(monkeypatch)
+    service = _service(monkeypatch, tmp_path)
+    service.exchange_auth_code("abc123")
+    session = json.loads((tmp_path / "fyers_token.json").read_text())
+    session["refresh_token"] = "refresh-1"
+    (tmp_path / "fyers_token.json").write_text(json.dumps(session))
+
+    calls = []
+
+    def fake_post(url: str, payload: Dict[str, Any]) -> Dict[str, Any]:
+        calls.append(payload)
+        return {"s": "ok", "access_token": "renewed-token"}
+
+    service.http_post = fake_post
+    service.pin = "1234"
+
+    result = service.refresh_access_token()
+
+    assert result["access_token"] == "renewed-token"
+    assert calls[0]["refresh_token"] == "refresh-1"
+    assert calls[0]["grant_type"] == "refresh_token"
+    stored = json.loads((tmp_path / "fyers_token.json").read_text())
+    assert stored["access_token"] == "renewed-token"
+    assert stored["refresh_token"] == "refresh-1"
+
+
+def test_refresh_access_token_requires_refresh_token(monkeypatch: pytest.MonkeyPatch, tmp_path) -> None:
+    """Given session without refresh token When refresh_access_token called Then ValueError raised."""
+    _reset_env(monkeypatch)
+    service = _service(monkeypatch, tmp_path)
+    service.exchange_auth_code("abc123")
+    service.pin = "1234"
+
+    with pytest.raises(ValueError, match="refresh token"):
+        service.refresh_access_token()
+
+
+def test_refresh_profile_coalesces_concurrent_calls(monkeypatch: pytest.MonkeyPatch, tmp_path) -> None:
+    """Given several concurrent refreshes When profile is in flight Then Fyers is called once."""
+    _reset_env(monkeypatch)
+    service = _service(monkeypatch, tmp_path)
+    service.exchange_auth_code("abc123")
+    release = threading.Event()
+    calls = []
+
+    class SlowFyers(_DummyFyers):
+        def get_profile(self) -> Dict[str, str]:
+            calls.append(self.token)
+            release.wait(5)
+            return {"data": {"name": "AlgoNova Trader"}}
+
+    service.fyers_factory = SlowFyers
+    fyers_service._client_cache.clear()
+    waited = COALESCED_CALLS.value(flight="fyers_profile")
+    results = []
+    threads = [threading.Thread(target=lambda: results.append(service.refresh_profile())) for _ in range(4)]
+    for thread in threads:
+        thread.start()
+    deadline = time.monotonic() + 5
+    while COALESCED_CALLS.value(flight="fyers_profile") < waited + 3 and time.monotonic() < deadline:
+        time.sleep(0.005)
+    release.set()
+    for thread in threads:
+        thread.join()
+
+    assert calls == ["token-for-abc123"]
+    assert len(results) == 4
+    assert all(result["profile"]["data"]["name"] == "AlgoNova Trader" for result in results)
+
+
+def test_refresh_profile_skips_rewrite_when_unchanged(monkeypatch: pytest.MonkeyPatch, tmp_path) -> None:
+    """Given an unchanged profile When refresh_profile called Then the token file is not rewritten."""
+    _reset_env(monkeypatch)
+    service = _service(monkeypatch, tmp_path)
+    service.exchange_auth_code("abc123")
+    token_file = tmp_path / "fyers_token.json"
+    before = token_file.stat().st_mtime_ns
+    stored_at = json.loads(token_file.read_text())["stored_at"]
+
+    result = service.refresh_profile()
+
+    assert token_file.stat().st_mtime_ns == before
+    assert result["stored_at"] == stored_at
+
+    class RenamedFyers(_DummyFyers):
+        def get_profile(self) -> Dict[str, str]:
+            return {"data": {"name": "Renamed Trader"}}
+
+    service.fyers_factory = RenamedFyers
+    fyers_service._client_cache.clear()
+    result = service.refresh_profile()
+
+    assert result["profile"]["data"]["name"] == "Renamed Trader"
+    assert json.loads(token_file.read_text())["profile"]["data"]["name"] == "Renamed Trader"
+
+
+def test_relative_option_chain_is_resolved_locally(monkeypatch: pytest.MonkeyPatch, tmp_path) -> None:
+    """Given an expiry selector and strike offset When fetching a chain Then one plain call is made."""
+    from datetime import date, datetime
+
+    from APP.services import derivatives
+    from APP.services.market_calendar import IST
+
+    rows = [
+        {
+            "exchange": "NFO",
+            "tradingsymbol": f"NIFTY24JUN{strike}{kind}",
+            "name": "NIFTY",
+            "expiry": date(2024, 6, 27),
+            "strike": float(strike),
+            "lot_size": 25,
+            "tick_size": 0.05,
+            "instrument_type": kind,
+        }
+        for strike in range(21500, 22550, 50)
+        for kind in ("CE", "PE")
+    ]
+    index = derivatives.DerivativesIndex(
+        loader=lambda: rows, clock=lambda: datetime(2024, 6, 20, 10, tzinfo=IST).timestamp()
+    )
+    monkeypatch.setattr(derivatives, "derivatives_index", index)
+    sent = []
+
+    class ChainFyers(_DummyFyers):
+        def optionchain(self, data: Dict[str, Any]) -> Dict[str, Any]:
+            sent.append(data)
+            strikes = range(22000 - 50 * data["strikecount"], 22000 + 50 * data["strikecount"] + 1, 50)
+            chain = [{"symbol": "NSE:NIFTY50-INDEX", "strike_price": -1, "ltp": 22012.5}]
+            chain += [{"symbol": f"NSE:NIFTY24JUN{s}CE", "strike_price": s, "ltp": 10.0} for s in strikes]
+            return {"s": "ok", "data": {"optionsChain": chain}}
+
+    _reset_env(monkeypatch)
+    _service(monkeypatch, tmp_path).exchange_auth_code("abc123")
+    service = FyersService(session_factory=_DummySession, fyers_factory=ChainFyers)
+
+    request = OptionChainRequest(symbol="NSE:NIFTY50-INDEX", strikecount=1, expiry="monthly", strike_offset=3)
+    result = service.fetch_option_chain(request)
+
+    assert sent == [{"symbol": "NSE:NIFTY50-INDEX", "strikecount": 4, "timestamp": "1719482400"}]
+    assert [row["strike_price"] for row in result["data"]["optionsChain"]] == [-1, 22100, 22150, 22200]
+    selection = result["selection"]
+    assert (selection["expiry"], selection["lot_size"], selection["atm"]) == ("2024-06-27", 25, 22000.0)
+    assert selection["strikes"] == [22100.0, 22150.0, 22200.0]
+    with pytest.raises(ValueError, match="expiry"):
+        request.to_payload()
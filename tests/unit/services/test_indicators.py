@@ -0,0 +1,69 @@
+import math
+
+import numpy as np
+import pytest
+
+from APP.services.candles import CandleAggregator
+from APP.services.indicators import IndicatorSet, create
+from APP.services.market_data import Tick
+
+
+def _bars(count: int = 3000) -> dict:
+    rng = np.random.default_rng(7)
+    close = 1000 + np.cumsum(rng.normal(0, 1, count))
+    return {
+        "close": close,
+        "high": close + rng.random(count) * 2,
+        "low": close - rng.random(count) * 2,
+        "volume": rng.integers(1, 1000, count).astype(float),
+        # Minute bars spanning several IST sessions
+        "timestamp": 1_700_000_000 + 60 * np.arange(count),
+    }
+
+
+@pytest.mark.parametrize("spec", ["sma:20", "ema:2", "ema:50", "rsi:14", "atr:14", "vwap", "supertrend:10:3"])
+def test_incremental_updates_match_batch_mode(spec: str) -> None:
+    """Given the same bars When fed one by one and as arrays Then both modes agree."""
+    bars = _bars()
+    incremental = create(spec)
+    streamed = np.array(
+        [
+            incremental.update(c, h, lo, v, t)
+            for c, h, lo, v, t in zip(
+                *(bars[key].tolist() for key in ("close", "high", "low", "volume", "timestamp"))
+            )
+        ]
+    )
+
+    batch = create(spec).batch(bars["close"], bars["high"], bars["low"], bars["volume"], bars["timestamp"])
+
+    np.testing.assert_array_equal(np.isnan(streamed), np.isnan(batch))
+    np.testing.assert_allclose(streamed, batch, rtol=1e-8, equal_nan=True)
+
+
+def test_preview_does_not_advance_state() -> None:
+    """Given a warm EMA When a forming bar is previewed Then the committed value is unchanged."""
+    ema = create("ema:3")
+    for price in (10.0, 11.0, 12.0):
+        ema.update(price)
+
+    preview = ema.update(20.0, final=False)
+
+    assert ema.value == 11.0
+    assert preview == 11.0 + 0.5 * (20.0 - 11.0)
+    assert math.isnan(create("rsi:14").update(1.0, final=False))
+
+
+def test_indicator_set_follows_bar_closes() -> None:
+    """Given bars already aggregated When a set attaches Then it replays them and tracks new closes."""
+    aggregator = CandleAggregator(timeframes=["1m"], close_grace=0.0)
+    for minute, price in enumerate([100.0, 101.0, 102.0, 103.0]):
+        aggregator.on_tick(Tick("NSE:SBIN-EQ", price, 0, 1_700_000_040 + 60 * minute))
+    indicators = IndicatorSet(["sma:3"])
+
+    indicators.attach(aggregator, "NSE:SBIN-EQ", "1m")
+    replayed = indicators.values()["sma:3"]
+    aggregator.flush(now=1_800_000_000)
+
+    assert replayed == 101.0
+    assert indicators.values()["sma:3"] == 102.0
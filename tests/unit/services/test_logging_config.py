@@ -0,0 +1,60 @@
+import json
+import logging
+
+from fastapi import FastAPI
+from starlette.testclient import TestClient
+
+from APP.services import logging_config
+
+
+def _record(level: int = logging.INFO, **extra) -> logging.LogRecord:
+    record = logging.LogRecord("APP.test", level, __file__, 1, "hello %s", ("world",), None)
+    for key, value in extra.items():
+        setattr(record, key, value)
+    return record
+
+
+def test_json_formatter_includes_request_id_and_extras() -> None:
+    """Given a record with extras When formatted Then one JSON object carries them."""
+    record = _record(request_id="req-1", latency_ms=12.5)
+
+    payload = json.loads(logging_config.JsonFormatter().format(record))
+
+    assert payload["message"] == "hello world"
+    assert payload["request_id"] == "req-1"
+    assert payload["latency_ms"] == 12.5
+    assert payload["level"] == "INFO"
+
+
+def test_sampling_filter_keeps_one_in_n_but_all_warnings() -> None:
+    """Given a 10% sample rate When 100 records pass Then 10 infos and every warning survive."""
+    sampler = logging_config.SamplingFilter(0.1)
+
+    kept_info = sum(sampler.filter(_record()) for _ in range(100))
+    kept_warning = sum(sampler.filter(_record(logging.WARNING)) for _ in range(5))
+
+    assert kept_info == 10
+    assert kept_warning == 5
+
+
+def test_parse_mapping_ignores_malformed_items() -> None:
+    """Given a LOG_LEVELS style value When parsed Then only name=value pairs remain."""
+    parsed = logging_config._parse_mapping("APP.services=DEBUG, bogus ,FyersAPI=INFO,=x")
+
+    assert parsed == {"APP.services": "DEBUG", "FyersAPI": "INFO"}
+
+
+def test_request_context_middleware_sets_request_id() -> None:
+    """Given an incoming X-Request-ID When handled Then it is visible to the route and echoed."""
+    app = FastAPI()
+    app.add_middleware(logging_config.RequestContextMiddleware)
+
+    @app.get("/ping")
+    async def ping():
+        return {"request_id": logging_config.get_request_id()}
+
+    client = TestClient(app)
+    response = client.get("/ping", headers={"X-Request-ID": "abc123"})
+
+    assert response.json()["request_id"] == "abc123"
+    assert response.headers["x-request-id"] == "abc123"
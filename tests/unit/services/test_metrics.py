@@ -0,0 +1,88 @@
+import pytest
+from fastapi import FastAPI
+from starlette.testclient import TestClient
+
+from APP.services import metrics
+
+
+def test_histogram_renders_cumulative_buckets() -> None:
+    """Given observations When rendered Then buckets are cumulative with sum/count."""
+    registry = metrics.MetricsRegistry()
+    histogram = registry.histogram("demo_seconds", "Demo.", ("op",), buckets=(0.1, 1.0))
+
+    histogram.observe(0.05, op="a")
+    histogram.observe(0.5, op="a")
+    histogram.observe(5.0, op="a")
+
+    text = registry.render()
+
+    assert 'demo_seconds_bucket{op="a",le="0.1"} 1' in text
+    assert 'demo_seconds_bucket{op="a",le="1.0"} 2' in text
+    assert 'demo_seconds_bucket{op="a",le="+Inf"} 3' in text
+    assert 'demo_seconds_count{op="a"} 3' in text
+
+
+def test_time_upstream_records_error_outcome() -> None:
+    """Given a failing broker call When timed Then outcome=error is recorded."""
+    before = metrics.UPSTREAM_CALL_SECONDS.count(
+        service="test", operation="boom", outcome="error"
+    )
+
+    with pytest.raises(RuntimeError):
+        with metrics.time_upstream("test", "boom"):
+            raise RuntimeError("down")
+
+    after = metrics.UPSTREAM_CALL_SECONDS.count(service="test", operation="boom", outcome="error")
+    assert after == before + 1
+
+
+def test_cache_hit_ratio_gauge() -> None:
+    """Given hits and misses When rendered Then hit ratio is exposed per cache."""
+    metrics.record_cache_lookup("ratio-test", hit=True)
+    metrics.record_cache_lookup("ratio-test", hit=True)
+    metrics.record_cache_lookup("ratio-test", hit=False)
+    metrics.record_cache_lookup("ratio-test", hit=False)
+
+    text = metrics.registry.render()
+
+    assert 'algonova_cache_hit_ratio{cache="ratio-test"} 0.5' in text
+
+
+def test_middleware_adds_server_timing_and_route_histogram() -> None:
+    """Given an instrumented route When called Then Server-Timing and route metrics are set."""
+    app = FastAPI()
+    app.add_middleware(metrics.MetricsMiddleware)
+
+    @app.get("/items/{item_id}")
+    async def read_item(item_id: str):
+        with metrics.time_upstream("fyers", "optionchain"):
+            pass
+        return {"item_id": item_id}
+
+    client = TestClient(app)
+    response = client.get("/items/42")
+
+    assert response.status_code == 200
+    server_timing = response.headers["server-timing"]
+    assert "fyers-optionchain;dur=" in server_timing
+    assert "app;dur=" in server_timing
+    assert metrics.HTTP_REQUEST_SECONDS.count(method="GET", route="/items/{item_id}", status="200") >= 1
+
+
+def test_route_label_is_the_prefixed_template_of_an_included_router() -> None:
+    """Given a prefixed router with a path converter When called Then the label is the full template."""
+    from fastapi import APIRouter
+
+    router = APIRouter()
+
+    @router.get("/files/{name:path}")
+    async def read_file(name: str):
+        return {"name": name}
+
+    app = FastAPI()
+    app.add_middleware(metrics.MetricsMiddleware)
+    app.include_router(router, prefix="/api/store")
+
+    assert TestClient(app).get("/api/store/files/a/b/c.txt").status_code == 200
+    count = metrics.HTTP_REQUEST_SECONDS.count(method="GET", route="/api/store/files/{name}", status="200")
+    assert count == 1
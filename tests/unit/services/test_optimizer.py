@@ -0,0 +1,68 @@
+import time
+from pathlib import Path
+
+import numpy as np
+import pytest
+
+from APP.services.optimizer import COMPLETED, Optimizer, random_candidates
+
+
+def _bars(count: int = 4000):
+    rng = np.random.default_rng(3)
+    close = 1000 + np.cumsum(rng.normal(0, 1, count))
+    ohlcv = np.column_stack(
+        [close, close + rng.random(count), close - rng.random(count), close, rng.integers(1, 100, count)]
+    ).astype(np.float64)
+    return 1_700_000_000 + 300 * np.arange(count), ohlcv
+
+
+def _wait(run, timeout: float = 60.0):
+    deadline = time.monotonic() + timeout
+    while run.status == "RUNNING" and time.monotonic() < deadline:
+        time.sleep(0.05)
+    return run
+
+
+@pytest.fixture
+def optimizer(tmp_path: Path) -> Optimizer:
+    return Optimizer(max_workers=2, data_dir=tmp_path)
+
+
+def test_grid_search_evaluates_every_combination(optimizer: Optimizer, tmp_path: Path) -> None:
+    """Given a 2x2 grid When run on the pool Then all four sets are scored and the data file is removed."""
+    timestamps, ohlcv = _bars()
+
+    run = _wait(optimizer.start("ema_crossover", timestamps, ohlcv, space={"fast": [5, 10], "slow": [30, 60]}))
+
+    assert run.status == COMPLETED
+    assert run.completed == 4
+    assert {tuple(r["params"].values()) for r in run.results} == {(5, 30), (5, 60), (10, 30), (10, 60)}
+    assert run.best["metrics"]["sharpe"] == max(r["metrics"]["sharpe"] for r in run.results)
+    assert list(tmp_path.iterdir()) == []
+
+
+def test_halving_scores_finalists_on_full_history(optimizer: Optimizer) -> None:
+    """Given nine candidates When halving with eta 3 Then three rounds narrow them to one full-data result."""
+    timestamps, ohlcv = _bars(4500)
+    space = {"period": [7, 10, 14], "multiplier": [2.0, 3.0, 4.0]}
+
+    run = _wait(
+        optimizer.start(
+            "supertrend", timestamps, ohlcv, search="halving", space=space, samples=9, min_bars=500, seed=1
+        )
+    )
+
+    assert run.status == COMPLETED
+    assert [r["bars"] for r in run.results].count(500) == 9
+    assert [r["bars"] for r in run.results].count(1500) == 3
+    assert run.best["bars"] == 4500
+
+
+def test_random_candidates_respect_ranges_and_rejects_bad_spaces() -> None:
+    """Given list and range domains When sampled Then values stay in bounds; malformed domains are rejected."""
+    candidates = random_candidates({"period": {"min": 5, "max": 9}, "multiplier": [2.0, 3.0]}, 6, seed=4)
+
+    assert len(candidates) == 6
+    assert all(5 <= c["period"] <= 9 and c["multiplier"] in (2.0, 3.0) for c in candidates)
+    with pytest.raises(ValueError):
+        random_candidates({"period": "7"}, 1)
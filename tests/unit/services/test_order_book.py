@@ -0,0 +1,172 @@
+from typing import List, Optional, Tuple
+
+import pytest
+
+from APP.services.order_book import (
+    CANCELLED,
+    COMPLETE,
+    OPEN,
+    ORDER_UPDATES,
+    PENDING,
+    OrderBook,
+    OrderUpdate,
+    track_new_order,
+)
+from APP.services.order_stream import FakeOrderStream
+from APP.services.sessions import current_user
+
+
+def _kite(order_id: str, status: str, filled: int, average: float, tag: str = "momentum") -> dict:
+    return {
+        "order_id": order_id,
+        "status": status,
+        "exchange": "NSE",
+        "tradingsymbol": "INFY",
+        "transaction_type": "BUY",
+        "quantity": 10,
+        "filled_quantity": filled,
+        "average_price": average,
+        "tag": tag,
+    }
+
+
+def test_fake_stream_updates_book_and_reports_fills() -> None:
+    """Given partial then full fills When streamed Then the book tracks them and each fill is priced."""
+    fills: List[Tuple[str, str, int, float]] = []
+    book = OrderBook(on_fill=lambda *fill: fills.append(fill))
+    stream = FakeOrderStream("kite", book=book)
+
+    stream.play(
+        [
+            _kite("1001", "OPEN", 0, 0.0),
+            _kite("1001", "OPEN", 4, 100.0),
+            _kite("1001", "COMPLETE", 10, 101.2),
+            _kite("1002", "CANCELLED", 0, 0.0, tag="meanrev"),
+        ]
+    ).join(1)
+
+    order = book.get("1001")
+    assert order.status == COMPLETE
+    assert order.filled_quantity == 10
+    assert fills[0] == ("NSE:INFY", "BUY", 4, 100.0)
+    assert fills[1][2] == 6 and abs(fills[1][3] - 102.0) < 1e-9
+    assert [state.order_id for state in book.orders("momentum")] == ["1001"]
+    assert book.get("1002").status == CANCELLED
+
+
+def test_stale_and_duplicate_updates_are_ignored() -> None:
+    """Given a replayed or reordered update When applied Then the book state does not regress."""
+    book = OrderBook()
+    stream = FakeOrderStream("kite", book=book)
+    stream.emit(_kite("2001", "COMPLETE", 10, 50.0))
+
+    stream.emit(_kite("2001", "OPEN", 4, 50.0))
+    stream.emit(_kite("2001", "COMPLETE", 10, 50.0))
+
+    assert book.get("2001").status == COMPLETE
+    assert book.get("2001").version == 1
+
+
+def test_fyers_order_message_normalised() -> None:
+    """Given a Fyers order socket message When applied Then status and side are mapped."""
+    book = OrderBook()
+    stream = FakeOrderStream("fyers", book=book)
+
+    stream.emit(
+        {
+            "s": "ok",
+            "orders": {
+                "id": "23080400089344",
+                "symbol": "NSE:SBIN-EQ",
+                "side": -1,
+                "qty": 5,
+                "filledQty": 0,
+                "status": 6,
+                "orderTag": "hedge",
+            },
+        }
+    )
+
+    order = book.get("23080400089344")
+    assert (order.status, order.side, order.strategy) == (OPEN, "SELL", "hedge")
+
+
+def test_orders_and_fills_belong_to_the_placing_user() -> None:
+    """Given orders placed by two users When filled Then each fill and listing stays with its owner."""
+    fills: List[Tuple[Optional[str], int]] = []
+    book = OrderBook(on_fill=lambda *fill: fills.append((current_user(), fill[2])))
+    book.apply(OrderUpdate("kite", "5001", PENDING, symbol="NSE:INFY", side="BUY", quantity=3, user="alice"))
+    book.apply(OrderUpdate("kite", "5002", PENDING, symbol="NSE:INFY", side="BUY", quantity=4))
+
+    # Stream updates carry no user; the order keeps the one it was placed with
+    book.apply(OrderUpdate("kite", "5001", COMPLETE, filled_quantity=3, average_price=10.0))
+    book.apply(OrderUpdate("kite", "5002", COMPLETE, filled_quantity=4, average_price=10.0))
+
+    assert fills == [("alice", 3), (None, 4)]
+    assert [state.order_id for state in book.orders(user="alice")] == ["5001"]
+    assert [state.order_id for state in book.orders(user=None)] == ["5002"]
+    assert len(book.orders()) == 2
+
+
+def test_new_order_row_carries_the_session_user(monkeypatch: pytest.MonkeyPatch) -> None:
+    """Given a per-user placement When tracked Then the book entry and the orders row name that user."""
+    from APP.services import order_book as order_book_module, write_behind
+
+    rows: List[Tuple[str, dict]] = []
+    monkeypatch.setattr(order_book_module, "order_book", OrderBook())
+    monkeypatch.setattr(write_behind, "submit", lambda table, record: rows.append((table, record)) or True)
+
+    track_new_order(
+        "kite", "7001", symbol="NSE:INFY", side="BUY", quantity=1, order_type="MARKET", product="CNC",
+        validity="DAY", price=None, tag="t1", user_id=1, session_user="alice",
+    )
+
+    assert order_book_module.order_book.get("7001").user == "alice"
+    assert rows[0][0] == "orders" and rows[0][1]["session_user"] == "alice"
+
+
+def test_status_and_fill_changes_are_written_to_the_order_row(monkeypatch: pytest.MonkeyPatch) -> None:
+    """Given a tracked order When it fills Then an update of its row is queued, once per real change."""
+    from APP.services import order_book as order_book_module, write_behind
+
+    rows: List[dict] = []
+    book = OrderBook(on_change=order_book_module._record_change)
+    monkeypatch.setattr(order_book_module, "order_book", book)
+    monkeypatch.setattr(write_behind, "submit", lambda table, record: rows.append(record) or True)
+    track_new_order(
+        "kite", "8001", symbol="NSE:INFY", side="BUY", quantity=10, order_type="MARKET", product="CNC",
+        validity="DAY", price=None, tag=None, user_id=1,
+    )
+
+    book.apply(OrderUpdate("kite", "8001", OPEN))
+    book.apply(OrderUpdate("kite", "8001", OPEN, filled_quantity=4, average_price=100.0))
+    book.apply(OrderUpdate("kite", "8001", OPEN, filled_quantity=4, average_price=100.0))
+    book.apply(OrderUpdate("kite", "8001", COMPLETE, filled_quantity=10, average_price=101.0))
+
+    updates = [(row["status"], row["filled_quantity"], row["average_price"]) for row in rows[1:]]
+    assert rows[0]["status"] == PENDING and "$update" not in rows[0]
+    assert all("$update" in row for row in rows[1:])
+    assert updates == [(OPEN, 0, 0.0), (OPEN, 4, 100.0), (COMPLETE, 10, 101.0)]
+
+
+def test_a_batch_applies_in_order_and_counts_every_outcome() -> None:
+    """Given a new order, its fill and a replay in one batch When applied Then only real changes come back."""
+    fills: List[Tuple[str, int]] = []
+    book = OrderBook(on_fill=lambda *fill: fills.append((fill[0], fill[2])))
+    before = {
+        outcome: ORDER_UPDATES.value(broker="paper", outcome=outcome) for outcome in ("applied", "stale")
+    }
+
+    applied = book.apply_many(
+        [
+            OrderUpdate("paper", "P1", OPEN, symbol="NSE:TCS", side="BUY", quantity=5),
+            OrderUpdate("paper", "P1", COMPLETE, filled_quantity=5, average_price=10.0),
+            OrderUpdate("paper", "P1", OPEN, filled_quantity=2, average_price=10.0),
+        ]
+    )
+
+    assert [state.order_id for state in applied] == ["P1", "P1"]
+    assert book.get("P1").status == COMPLETE and book.get("P1").version == 2
+    assert fills == [("NSE:TCS", 5)]
+    assert ORDER_UPDATES.value(broker="paper", outcome="applied") - before["applied"] == 2
+    assert ORDER_UPDATES.value(broker="paper", outcome="stale") - before["stale"] == 1
@@ -0,0 +1,122 @@
+import pytest
+
+from APP.services.basket import FILLED, BasketExecutor, BasketLeg, RateLimiter
+from APP.services.market_data import Tick
+from APP.services.order_book import CANCELLED, COMPLETE, OPEN, REJECTED, OrderBook
+from APP.services.paper import MatchingEngine, PaperBroker, apply_all_to_book, apply_to_book, synthetic_ticks
+from APP.services.risk_engine import BreachRecorder, RiskEngine, RiskLimits
+
+
+def test_orders_match_by_price_then_time_and_rest_until_a_tick_trades_through():
+    """Given resting sells When a buy crosses them Then best price, then oldest, fills first."""
+    engine = MatchingEngine()
+    first = engine.submit("NSE:TCS", "SELL", 10, "LIMIT", price=101.0)
+    second = engine.submit("NSE:TCS", "SELL", 10, "LIMIT", price=101.0)
+    better = engine.submit("NSE:TCS", "SELL", 5, "LIMIT", price=100.5)
+
+    buy = engine.submit("NSE:TCS", "BUY", 20, "LIMIT", price=101.0)
+    assert (better.status, first.status, second.filled, second.status) == (COMPLETE, COMPLETE, 5, OPEN)
+    assert buy.status == COMPLETE and buy.average_price == pytest.approx((5 * 100.5 + 15 * 101.0) / 20)
+    assert engine.depth("NSE:TCS") == {"bids": [], "asks": [(101.0, 5)]}
+
+    bid = engine.submit("NSE:TCS", "BUY", 7, "LIMIT", price=99.0)
+    engine.on_tick(Tick("NSE:TCS", 99.5))
+    assert bid.status == OPEN
+    engine.on_tick(Tick("NSE:TCS", 98.9))
+    # A resting limit fills at its own price when the market trades through it
+    assert (bid.status, bid.average_price) == (COMPLETE, 99.0)
+    # Market orders take the book first, then the last tick for the rest
+    market = engine.submit("NSE:TCS", "BUY", 8, "MARKET")
+    assert market.average_price == pytest.approx((5 * 101.0 + 3 * 98.9) / 8)
+    assert engine.status()["live_orders"] == 0
+
+
+def test_stops_fire_on_the_trigger_and_bad_orders_are_refused():
+    """Given stop orders When the price crosses their trigger Then they enter as market / limit orders."""
+    engine = MatchingEngine()
+    assert engine.submit("NSE:SBIN", "SELL", 5, "MARKET").status == REJECTED
+    engine.on_tick(Tick("NSE:SBIN", 800.0))
+    stop = engine.submit("NSE:SBIN", "SELL", 5, "SL-M", trigger_price=795.0)
+    stop_limit = engine.submit("NSE:SBIN", "BUY", 5, "SL", price=812.0, trigger_price=810.0)
+    assert engine.submit("NSE:SBIN", "SELL", 5, "SL-M", trigger_price=801.0).status == REJECTED
+    cancelled = engine.submit("NSE:SBIN", "SELL", 5, "SL-M", trigger_price=790.0)
+    assert engine.cancel(cancelled.order_id).status == CANCELLED
+    with pytest.raises(ValueError, match="not open"):
+        engine.cancel(cancelled.order_id)
+
+    engine.on_tick(Tick("NSE:SBIN", 796.0))
+    assert stop.status == "TRIGGER_PENDING"
+    engine.on_tick(Tick("NSE:SBIN", 794.5))
+    assert (stop.status, stop.average_price) == (COMPLETE, 794.5)
+    engine.on_tick(Tick("NSE:SBIN", 790.0))
+    assert cancelled.filled == 0
+    engine.on_tick(Tick("NSE:SBIN", 815.0))
+    # Triggered above its limit: rests as a buy limit at 812 until the market comes back
+    assert (stop_limit.status, stop_limit.filled) == (OPEN, 0)
+    engine.on_tick(Tick("NSE:SBIN", 811.0))
+    assert (stop_limit.status, stop_limit.average_price) == (COMPLETE, 812.0)
+    with pytest.raises(ValueError, match="need a price"):
+        engine.submit("NSE:SBIN", "BUY", 1, "LIMIT")
+
+
+def test_each_submit_reports_the_orders_it_touched_in_one_batch():
+    """Given resting sells When a buy sweeps them Then the book gets one batch with the buy and both sells."""
+    book = OrderBook()
+    batches = []
+
+    def report(orders):
+        batches.append([order.order_id for order in orders])
+        apply_all_to_book(orders, book)
+
+    engine = MatchingEngine(on_updates=report)
+    first = engine.submit("NSE:TCS", "SELL", 10, "LIMIT", price=101.0)
+    second = engine.submit("NSE:TCS", "SELL", 5, "LIMIT", price=100.5)
+    buy = engine.submit("NSE:TCS", "BUY", 15, "LIMIT", price=101.0)
+
+    # Makers in the order they traded, then the taker
+    assert batches == [[first.order_id], [second.order_id], [second.order_id, first.order_id, buy.order_id]]
+    assert [book.get(order.order_id).status for order in (first, second, buy)] == [COMPLETE] * 3
+    assert book.get(buy.order_id).average_price == pytest.approx(buy.average_price)
+
+
+def test_baskets_run_end_to_end_on_the_paper_broker():
+    """Given the paper broker and synthetic ticks When a basket is placed Then it fills into positions."""
+    book = OrderBook()
+    risk = RiskEngine(RiskLimits(), recorder=BreachRecorder(sink=lambda batch: None))
+    book.on_fill = risk.on_fill
+    engine = MatchingEngine(on_update=lambda order: apply_to_book(order, book))
+    executor = BasketExecutor(
+        services={"paper": lambda: PaperBroker(engine, risk)},
+        paper_book=book,
+        paper_risk=risk,
+        limiters={"paper": RateLimiter(0)},
+    )
+    engine.feed(synthetic_ticks(["NFO:NIFTY22000CE", "NFO:NIFTY22000PE"], 50, start_price=120.0, seed=7))
+    last_call = engine.last_price("NFO:NIFTY22000CE")
+
+    execution = executor.execute(
+        [
+            BasketLeg("paper", "NFO:NIFTY22000CE", "SELL", 50),
+            BasketLeg("paper", "NFO:NIFTY22000PE", "SELL", 50),
+        ],
+        wait_for_fills=1.0,
+    )
+    assert execution.status == FILLED
+    assert execution.legs[0].average_price == last_call
+    assert risk.snapshot()["positions"]["NFO:NIFTY22000CE"]["quantity"] == -50
+
+
+def test_default_paper_broker_keeps_fills_out_of_live_risk():
+    """Given the default paper broker When an order fills Then only the paper book and risk engine see it."""
+    from APP.services import paper
+    from APP.services.order_book import order_book
+    from APP.services.risk_engine import risk_engine
+
+    live_positions = risk_engine.snapshot()["positions"]
+    paper.paper_engine.on_tick(Tick("NSE:PAPERTEST-EQ", 250.0, 1.0, 0.0))
+    placed = PaperBroker().place_order("NSE:PAPERTEST-EQ", "BUY", 4)
+
+    assert paper.paper_book.get(placed["order_id"]).status == COMPLETE
+    assert order_book.get(placed["order_id"]) is None
+    assert paper.paper_risk.snapshot()["positions"]["NSE:PAPERTEST-EQ"]["quantity"] == 4
+    assert risk_engine.snapshot()["positions"] == live_positions
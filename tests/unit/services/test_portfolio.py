@@ -0,0 +1,106 @@
+import threading
+import time
+
+import numpy as np
+import pytest
+
+from APP.services.market_data import Tick
+from APP.services.portfolio import PortfolioAnalytics, black_scholes, implied_volatility, parse_option
+from APP.services.risk_engine import BreachRecorder, RiskEngine, RiskLimits
+
+# 2026-06-09 15:43 IST; the weekly contracts below expire 2026-06-16
+NOW = 1781000000.0
+
+
+@pytest.fixture
+def risk() -> RiskEngine:
+    engine = RiskEngine(RiskLimits(), recorder=BreachRecorder(sink=lambda batch: None))
+    engine.set_position("NSE:NIFTY2661624000CE", -75, 150.0)
+    engine.set_position("NSE:NIFTY2661624000PE", -75, 160.0)
+    engine.set_position("NSE:SBIN-EQ", 100, 800.0)
+    return engine
+
+
+def test_black_scholes_parity_and_implied_vol_round_trip() -> None:
+    """Given a call and put When priced Then put-call parity holds and IV recovers the input vol."""
+    spot, strike, years, vol, rate = 24000.0, 24500.0, 30 / 365, 0.15, 0.065
+    call, *_ = black_scholes(spot, strike, years, vol, rate, True)
+    put, *_ = black_scholes(spot, strike, years, vol, rate, False)
+
+    recovered = implied_volatility(np.array([call, put]), spot, strike, years, rate, np.array([True, False]))
+
+    assert call - put == pytest.approx(spot - strike * np.exp(-rate * years), rel=1e-6)
+    np.testing.assert_allclose(recovered, [vol, vol], rtol=1e-6)
+    assert parse_option("NSE:NIFTY2661624000CE").strike == 24000.0
+
+
+def test_report_aggregates_greeks_scenarios_and_var(risk: RiskEngine) -> None:
+    """Given a short straddle and stock When analysed Then Greeks, grid and VaR are consistent."""
+    analytics = PortfolioAnalytics(risk=risk, clock=lambda: NOW, simulations=2000)
+    analytics.set_price("NSE:NIFTY50-INDEX", 24000.0)
+
+    report = analytics.report(spot_range=10, spot_steps=5, iv_range=5, iv_steps=3)
+
+    nifty = report["greeks"]["by_underlying"]["NIFTY"]
+    assert nifty["gamma"] < 0 and nifty["vega"] < 0 and nifty["theta"] > 0
+    assert report["greeks"]["by_underlying"]["SBIN"]["delta_value"] == 80000.0
+    grid = np.array(report["scenarios"]["pnl"])
+    assert grid.shape == (5, 3)
+    assert grid[2, 1] == pytest.approx(0.0, abs=1e-6)
+    # A short straddle loses on large moves either way
+    assert grid[0, 1] < 0 and grid[4, 1] < 0
+    assert 0 < report["var"]["var_95"] <= report["var"]["var_99"]
+    assert report["margin"]["total"] > 0
+    assert report["missing_marks"] == []
+
+
+def test_price_change_recomputes_only_its_underlying(risk: RiskEngine, monkeypatch: pytest.MonkeyPatch) -> None:
+    """Given a computed report When one stock ticks Then only its rows reprice and unchanged state is cached."""
+    analytics = PortfolioAnalytics(risk=risk, clock=lambda: NOW, simulations=500)
+    analytics.set_price("NSE:NIFTY50-INDEX", 24000.0)
+    first = analytics.report()
+    recomputed = []
+    original = analytics._recompute
+    monkeypatch.setattr(
+        analytics, "_recompute", lambda rows, *args: (recomputed.append(list(rows)), original(rows, *args))
+    )
+
+    assert analytics.report() is first
+    analytics.set_price("NSE:SBIN-EQ", 810.0)
+    second = analytics.report()
+
+    assert recomputed == [[analytics._symbols.index("NSE:SBIN-EQ")]]
+    assert second["greeks"]["by_underlying"]["SBIN"]["delta_value"] == 81000.0
+    assert second["greeks"]["by_underlying"]["NIFTY"] == first["greeks"]["by_underlying"]["NIFTY"]
+
+
+def test_ticks_are_not_held_up_by_a_report_in_progress(
+    risk: RiskEngine, monkeypatch: pytest.MonkeyPatch
+) -> None:
+    """Given a report mid-computation When ticks arrive Then they are recorded without waiting for it."""
+    analytics = PortfolioAnalytics(risk=risk, clock=lambda: NOW, simulations=500)
+    analytics.set_price("NSE:NIFTY50-INDEX", 24000.0)
+    computing, release = threading.Event(), threading.Event()
+    original = analytics._recompute
+
+    def slow_recompute(*args):
+        computing.set()
+        release.wait(5)
+        return original(*args)
+
+    monkeypatch.setattr(analytics, "_recompute", slow_recompute)
+    reports = []
+    worker = threading.Thread(target=lambda: reports.append(analytics.report()))
+    worker.start()
+    assert computing.wait(5)
+
+    started = time.perf_counter()
+    analytics.on_tick(Tick("NSE:SBIN-EQ", 820.0))
+    elapsed = time.perf_counter() - started
+    release.set()
+    worker.join()
+
+    assert elapsed < 0.5
+    # The report used the marks it copied; the new tick reprices SBIN in the next one
+    assert reports[0]["greeks"]["by_underlying"]["SBIN"]["delta_value"] == 80000.0
+    assert analytics.report()["greeks"]["by_underlying"]["SBIN"]["delta_value"] == 82000.0
@@ -0,0 +1,30 @@
+import random
+
+import pytest
+
+from APP.services.profiling import Profiler
+
+
+def test_claims_follow_route_and_sample_rate_and_stop_at_the_limit():
+    """Given an armed profiler When requests arrive Then only sampled matches are claimed, up to the limit."""
+    profiler = Profiler(history=2)
+    assert profiler.claim("GET", "/api/fyers/option-chain") is None
+
+    profiler.arm(route="/api/orders/{order_id}", sample_rate=0.5, max_requests=3)
+    profiler._random = random.Random(3)
+    assert profiler.claim("GET", "/api/orders") is None
+    assert profiler.claim("GET", "/api/orders/7/cancel") is None
+    claimed = [profiler.claim("GET", f"/api/orders/{n}") for n in range(40)]
+    picked = [profile.path for profile in claimed if profile is not None]
+    assert len(picked) == 3 and len(set(picked)) == 3
+    assert claimed.index(None) < 3
+    for profile in claimed:
+        if profile is not None:
+            profiler.finish(profile, 200)
+
+    status = profiler.status()
+    assert (status["armed"], status["remaining"], status["active"]) == (False, 0, 0)
+    assert [profile["path"] for profile in status["profiles"]] == picked[1:]
+    for bad in ({"sample_rate": 0}, {"max_requests": 0}, {"interval": 5}, {"route": "api/orders"}):
+        with pytest.raises(ValueError):
+            profiler.arm(**bad)
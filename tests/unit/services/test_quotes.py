@@ -0,0 +1,84 @@
+import time
+
+import pytest
+
+from APP.services.quotes import QuoteFacade, QuoteUnavailable, normalize_symbol, to_kite
+
+
+def _broker(name: str, delay: list, calls: list, fail: list = None):
+    def fetch(symbols):
+        calls.append(name)
+        time.sleep(delay[0])
+        if fail and fail[0]:
+            raise ConnectionError(f"{name} down")
+        return {symbol: {"symbol": symbol, "ltp": 100.0, "broker": name} for symbol in symbols}
+
+    return fetch
+
+
+def test_symbols_map_between_broker_conventions():
+    """Given Fyers and Kite style symbols When normalised Then both map to one form and back to Kite's."""
+    pairs = {
+        "NSE:TCS-EQ": "NSE:TCS",
+        "NSE:BAJAJ-AUTO-EQ": "NSE:BAJAJ-AUTO",
+        "NSE:NIFTY50-INDEX": "NSE:NIFTY 50",
+        "NSE:NIFTY24JUN24000CE": "NFO:NIFTY24JUN24000CE",
+        "BSE:SENSEX-INDEX": "BSE:SENSEX",
+        "MCX:CRUDEOIL24JUNFUT": "MCX:CRUDEOIL24JUNFUT",
+    }
+    for fyers, kite in pairs.items():
+        assert to_kite(fyers) == kite
+        assert normalize_symbol(kite) == fyers
+    with pytest.raises(ValueError):
+        normalize_symbol("TCS")
+
+
+def test_slow_primary_is_hedged_and_loses_its_role():
+    """Given a primary slower than the hedge delay When quoting Then the other broker wins and takes over."""
+    calls = []
+    fyers_delay, kite_delay = [0.3], [0.01]
+    facade = QuoteFacade(
+        {"fyers": _broker("fyers", fyers_delay, calls), "kite": _broker("kite", kite_delay, calls)},
+        hedge_delay="30",
+        cache_ttl=0.001,
+    )
+
+    started = time.perf_counter()
+    quotes = facade.get_quotes(["NSE:TCS-EQ", "NSE:INFY"])
+    assert time.perf_counter() - started < 0.2
+    assert {quote["broker"] for quote in quotes.values()} == {"kite"}
+    assert list(quotes) == ["NSE:TCS-EQ", "NSE:INFY"]
+    assert calls == ["fyers", "kite"]
+
+    # Once the slow request completes its latency counts, and Kite becomes primary
+    time.sleep(0.35)
+    assert facade.ranking() == ["kite", "fyers"]
+    calls.clear()
+    facade.get_quotes(["NSE:SBIN-EQ"])
+    assert calls == ["kite"]
+    facade.shutdown()
+
+
+def test_failed_primary_fails_over_at_once_and_all_failing_raises():
+    """Given a primary that errors When quoting Then the backup serves without waiting out the delay."""
+    calls = []
+    down = [True]
+    facade = QuoteFacade(
+        {"fyers": _broker("fyers", [0.0], calls, down), "kite": _broker("kite", [0.0], calls, down)},
+        hedge_delay="500",
+        cache_ttl=60,
+    )
+    with pytest.raises(QuoteUnavailable, match="fyers down; kite: kite down"):
+        facade.get_quotes(["NSE:TCS-EQ"])
+
+    facade.fetchers["fyers"] = _broker("fyers", [0.0], calls, [True])
+    facade.fetchers["kite"] = _broker("kite", [0.0], calls)
+    calls.clear()
+    started = time.perf_counter()
+    assert facade.get_quotes(["NSE:TCS-EQ"])["NSE:TCS-EQ"]["broker"] == "kite"
+    assert time.perf_counter() - started < 0.25
+    # Cached: a Kite-style spelling of the same instrument needs no broker call
+    assert facade.get_quotes(["NSE:TCS"])["NSE:TCS"]["broker"] == "kite"
+    assert len(calls) == 2
+    assert facade.status()["brokers"]["fyers"]["errors"] == 2
+    facade.shutdown()
@@ -0,0 +1,89 @@
+import pytest
+
+from APP.services import readiness
+
+
+@pytest.fixture(autouse=True)
+def _isolated_registry(monkeypatch: pytest.MonkeyPatch):
+    monkeypatch.setattr(readiness, "_subsystems", {})
+    monkeypatch.setattr(readiness, "_started", False)
+
+
+def test_warm_all_records_success_and_failure() -> None:
+    """Given one good and one broken subsystem When warmed Then both states are reported."""
+    state = {"warm": False}
+
+    def warm_ok() -> None:
+        state["warm"] = True
+
+    def warm_broken() -> None:
+        raise ValueError("Database configuration missing")
+
+    readiness.register("sdk", lambda: state["warm"], warm_ok)
+    readiness.register("database", lambda: False, warm_broken)
+    readiness.mark_started()
+
+    readiness.warm_all()
+    report = readiness.report()
+
+    assert report["subsystems"]["sdk"]["warm"] is True
+    assert report["subsystems"]["database"]["error"] == "Database configuration missing"
+    assert report["ready"] is True
+
+
+def test_required_subsystem_blocks_readiness(monkeypatch: pytest.MonkeyPatch) -> None:
+    """Given READINESS_REQUIRED lists a cold subsystem When reported Then not ready."""
+    monkeypatch.setenv("READINESS_REQUIRED", "database")
+    readiness.register("database", lambda: False, lambda: None)
+    readiness.mark_started()
+
+    assert readiness.report()["ready"] is False
+
+
+def test_database_is_ready_only_when_it_answers(monkeypatch: pytest.MonkeyPatch) -> None:
+    """Given a built engine When the database does not answer Then it is not reported ready."""
+    from sqlalchemy import create_engine
+    from sqlalchemy.pool import StaticPool
+
+    from APP.fyersApp.db import connection
+
+    monkeypatch.setattr(connection, "_engine", None)
+    monkeypatch.setattr(connection, "_probed_at", float("-inf"))
+    monkeypatch.setattr(connection, "_probe_ok", False)
+    assert connection.probe_database() is False
+
+    monkeypatch.setattr(connection, "_engine", create_engine("sqlite://", poolclass=StaticPool))
+    assert connection.probe_database() is True
+    monkeypatch.setattr(connection, "_engine", create_engine("sqlite:////nonexistent-dir/db.sqlite"))
+    assert connection.probe_database() is False
+
+
+def test_database_readiness_never_blocks_on_the_probe(monkeypatch: pytest.MonkeyPatch) -> None:
+    """Given a database that hangs When readiness is asked Then the last answer returns at once."""
+    import threading
+    import time
+
+    from APP.fyersApp.db import connection
+
+    release = threading.Event()
+
+    class HangingEngine:
+        def connect(self):
+            release.wait(5)
+            raise ConnectionError("login timeout")
+
+    monkeypatch.setenv("DB_READY_PROBE_INTERVAL", "0")
+    monkeypatch.setattr(connection, "_engine", HangingEngine())
+    monkeypatch.setattr(connection, "_probed_at", float("-inf"))
+    monkeypatch.setattr(connection, "_probe_ok", True)
+
+    started = time.perf_counter()
+    assert connection.engine_ready() is True
+    assert connection.engine_ready() is True
+    assert time.perf_counter() - started < 1.0
+
+    release.set()
+    deadline = time.monotonic() + 5
+    while connection._probe_lock.locked() and time.monotonic() < deadline:
+        time.sleep(0.01)
+    assert connection.engine_ready() is False
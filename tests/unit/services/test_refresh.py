@@ -0,0 +1,129 @@
+from datetime import datetime, timedelta
+
+import pytest
+
+from APP.fyersApp.services import FyersService, fyers_service
+from APP.services import refresh
+from APP.services.market_calendar import IST, market_phase, next_phase_change
+from APP.services.refresh import OPTION_CHAIN, QUOTES, RefreshPolicy, RefreshScheduler
+
+
+def _ist(text: str) -> datetime:
+    return datetime.fromisoformat(text).replace(tzinfo=IST)
+
+
+def test_market_phases_follow_holidays_and_special_sessions(monkeypatch: pytest.MonkeyPatch, tmp_path):
+    """Given a holiday file and a special session When asking for phases Then the calendar honours both."""
+    holidays = tmp_path / "holidays.txt"
+    holidays.write_text("# NSE 2024\n2024-06-17  Bakri Id\n")
+    monkeypatch.setenv("MARKET_HOLIDAYS_FILE", str(holidays))
+    monkeypatch.setenv("MARKET_HOLIDAYS", "2024-06-18")
+    monkeypatch.setenv("MARKET_SPECIAL_SESSIONS", "2024-06-22")
+
+    assert market_phase(_ist("2024-06-14T09:05")) == "pre_open"
+    assert market_phase(_ist("2024-06-14T11:00")) == "open"
+    assert market_phase(_ist("2024-06-14T15:45")) == "post_close"
+    assert market_phase(_ist("2024-06-14T20:00")) == "closed"
+    assert market_phase(_ist("2024-06-17T11:00")) == "closed"
+    assert market_phase(_ist("2024-06-22T11:00")) == "open"
+    # Friday evening: the weekend and two holidays later, Wednesday's pre-open
+    assert next_phase_change(_ist("2024-06-14T20:00")) == _ist("2024-06-19T09:00")
+
+
+def test_scheduler_refreshes_by_phase_and_drops_idle_keys():
+    """Given a watched key When phases pass Then it refreshes while open, stops at close, then expires."""
+    wall = [_ist("2024-06-14T11:00")]
+    mono = [0.0]
+    policy = RefreshPolicy.from_env("test", "pre_open=30,open=3,post_close=60,closed=off")
+    scheduler = RefreshScheduler(
+        {OPTION_CHAIN: policy}, idle=600, clock=lambda: wall[0], monotonic=lambda: mono[0]
+    )
+    calls = []
+    scheduler.watch(OPTION_CHAIN, "NIFTY", lambda: calls.append(wall[0]))
+
+    def advance(seconds: float) -> None:
+        wall[0] += timedelta(seconds=seconds)
+        mono[0] += seconds
+        scheduler.run_due()
+
+    for _ in range(10):
+        advance(1)
+    assert len(calls) == 3
+    # In the closing session, read once more; then nothing refreshes once the market shuts
+    wall[0], mono[0] = _ist("2024-06-14T15:59:00"), 500.0
+    scheduler.watch(OPTION_CHAIN, "NIFTY", lambda: calls.append(wall[0]))
+    before = len(calls)
+    scheduler.run_due()
+    for _ in range(11):
+        advance(60)
+    assert calls[before:] == [_ist("2024-06-14T15:59:00")]
+    assert scheduler.status()["phase"] == "closed"
+    assert scheduler.watched() == []
+
+
+def test_quotes_are_cached_per_symbol_until_the_next_session(monkeypatch: pytest.MonkeyPatch, tmp_path):
+    """Given a closed market When quotes are polled Then only new symbols hit Fyers, cached overnight."""
+    requested = []
+
+    class QuotingFyers:
+        def __init__(self, client_id: str, token: str, log_path: str) -> None:
+            pass
+
+        def quotes(self, data):
+            symbols = data["symbols"].split(",")
+            requested.append(symbols)
+            return {"s": "ok", "d": [{"n": symbol, "v": {"lp": 100.0 + len(symbol)}} for symbol in symbols]}
+
+    monkeypatch.setenv("FYERS_APP_ID", "APP-5678")
+    monkeypatch.setenv("FYERS_SECRET_KEY", "secret-xyz")
+    monkeypatch.setenv("FYERS_LOG_PATH", str(tmp_path / "logs"))
+    monkeypatch.setenv("FYERS_TOKEN_PATH", str(tmp_path / "fyers_token.json"))
+    monkeypatch.setattr(refresh, "now_ist", lambda: _ist("2024-06-14T20:00"))
+    fyers_service._quote_cache.clear()
+    service = FyersService(fyers_factory=QuotingFyers)
+    service._store_session("token-1", {"data": {}})
+
+    assert service.fetch_quotes(["NSE:SBIN-EQ"])["NSE:SBIN-EQ"]["lp"] == 111.0
+    quotes = service.fetch_quotes(["NSE:SBIN-EQ", "NSE:TCS-EQ", "NSE:SBIN-EQ"])
+    assert list(quotes) == ["NSE:SBIN-EQ", "NSE:TCS-EQ"]
+    assert requested == [["NSE:SBIN-EQ"], ["NSE:TCS-EQ"]]
+
+    entry = fyers_service._quote_cache.get_entry(("token-1", "NSE:TCS-EQ"))
+    # Fetched on Friday evening: fresh until Monday's pre-open
+    weekend = _ist("2024-06-17T09:00") - _ist("2024-06-14T20:00")
+    assert entry.expires_at - entry.stored_at == pytest.approx(weekend.total_seconds())
+    assert refresh.policies[QUOTES].ttl(_ist("2024-06-17T10:00")) == pytest.approx(1.5)
+
+
+def test_quote_watches_are_per_symbol_batched_and_capped():
+    """Given overlapping watchlists When quotes fall due Then each group is batched and keys are capped."""
+    wall = [_ist("2024-06-14T11:00")]
+    mono = [0.0]
+    policy = RefreshPolicy.from_env("test", "pre_open=5,open=1,post_close=30,closed=off")
+    scheduler = RefreshScheduler(
+        {QUOTES: policy},
+        idle=600,
+        max_watches=4,
+        batch_size=2,
+        clock=lambda: wall[0],
+        monotonic=lambda: mono[0],
+    )
+    calls = []
+    scheduler.watch_many(QUOTES, ("fyers", "alice"), ("NSE:SBIN-EQ", "NSE:TCS-EQ"), calls.append)
+    mono[0] = 0.5
+    scheduler.watch_many(QUOTES, ("fyers", "alice"), ("NSE:TCS-EQ", "NSE:INFY-EQ"), calls.append)
+    assert len(scheduler.watched(QUOTES)) == 3
+
+    mono[0] = 1.0
+    scheduler.run_due()
+    # One group, three symbols, batches of two: the late symbol is pulled into step
+    fetched = sorted(symbol for batch in calls for symbol in batch)
+    assert fetched == ["NSE:INFY-EQ", "NSE:SBIN-EQ", "NSE:TCS-EQ"]
+    assert len(calls) == 2
+
+    mono[0] = 1.5
+    scheduler.watch_many(QUOTES, ("fyers", "bob"), ("NSE:SBIN-EQ", "NSE:ITC-EQ"), calls.append)
+    keys = {watch["key"] for watch in scheduler.watched(QUOTES)}
+    assert len(keys) == 4
+    assert repr((("fyers", "bob"), "NSE:ITC-EQ")) in keys
+    assert scheduler.status()["evicted"] == 1
@@ -0,0 +1,98 @@
+import time
+from datetime import date, datetime
+
+import numpy as np
+import pytest
+from sqlalchemy import create_engine
+
+from APP.services import tick_store
+from APP.services.market_calendar import IST
+from APP.services.market_data import Tick, TickBus
+from APP.services.replay import ReplayBus, export_day, open_replay, replay, write_replay_file
+from APP.services.tick_store import TickRecorder, sql_sink
+
+OPEN = datetime(2024, 6, 3, 10, 0, tzinfo=IST).timestamp()
+
+
+@pytest.fixture(autouse=True)
+def _fresh_tables():
+    tick_store._tables.clear()
+    yield
+    tick_store._tables.clear()
+
+
+def _columns(stamps, prices):
+    return {
+        "timestamp": np.asarray(stamps, float),
+        "price": np.asarray(prices, float),
+        "volume": np.arange(len(stamps), dtype=float),
+    }
+
+
+def test_recorded_day_exports_to_a_mapped_file_in_a_fixed_order(tmp_path):
+    """Given ticks in the tick store When the day is exported Then the mapped file is time-ordered."""
+    engine = create_engine(f"sqlite:///{tmp_path / 'ticks.db'}")
+    recorder = TickRecorder(sink=sql_sink(lambda: engine), spill_dir=tmp_path / "spill", close_grace=0)
+    for second in (0.0, 1.0, 61.0):
+        recorder.on_tick(Tick("NSE:SBIN-EQ", 800 + second, second, OPEN + second))
+        recorder.on_tick(Tick("NSE:INFY-EQ", 1500 + second, second, OPEN + second, oi=7.0))
+    recorder.flush(now=OPEN + 200, force=True)
+
+    path = export_day(date(2024, 6, 3), engine, directory=tmp_path / "replay")
+    day = open_replay(path)
+
+    assert isinstance(day.records, np.memmap)
+    assert day.symbols == ["NSE:INFY-EQ", "NSE:SBIN-EQ"]
+    assert [day.symbols[index] for index in day.records["symbol"]] == day.symbols * 3
+    assert day.records["price"].tolist() == [1500.0, 800.0, 1501.0, 801.0, 1561.0, 861.0]
+    assert np.isnan(day.records["oi"][1]) and day.records["oi"][0] == 7.0
+    assert len(day.window(OPEN + 1, OPEN + 61)) == 2
+    again = export_day(date(2024, 6, 3), engine, directory=tmp_path / "again")
+    assert open_replay(again).digest == day.digest
+
+
+def test_replay_times_every_stage_and_names_the_bottleneck(tmp_path):
+    """Given a live bus with handlers When a day replays at max speed Then each stage is timed."""
+    path = write_replay_file(
+        tmp_path / "day.npy",
+        {"NSE:A": _columns([0, 2, 4], [10, 11, 12]), "NSE:B": _columns([0, 3], [20, 21])},
+    )
+    seen = []
+
+    def record(tick: Tick) -> None:
+        seen.append((tick.symbol, tick.price, tick.oi))
+
+    def slow_signal(tick: Tick) -> None:
+        time.sleep(0.002)
+
+    live = TickBus()
+    live.subscribe(record)
+    live.subscribe(slow_signal)
+    report = replay(open_replay(path), ReplayBus.mirroring(live))
+
+    assert seen == [("NSE:A", 10.0, None), ("NSE:B", 20.0, None), ("NSE:A", 11.0, None),
+                    ("NSE:B", 21.0, None), ("NSE:A", 12.0, None)]
+    assert report["ticks"] == 5 and report["session_seconds"] == 4.0
+    assert list(report["stages"]) == ["record", "slow_signal"]
+    assert report["bottleneck"] == "slow_signal"
+    slow = report["stages"]["slow_signal"]
+    assert slow["tick_to_stage_p50_us"] >= slow["p50_us"] >= 2000
+    assert live.published == 0
+
+
+def test_paced_replay_follows_the_session_clock_at_the_requested_speed(tmp_path):
+    """Given ticks seconds apart When replayed at 10x Then each waits a tenth of its recorded gap."""
+    path = write_replay_file(tmp_path / "day.npy", {"NSE:A": _columns([100, 101, 103, 103], [1, 2, 3, 4])})
+    now = [0.0]
+    waits = []
+
+    def sleep(seconds: float) -> None:
+        waits.append(round(seconds, 6))
+        now[0] += seconds
+
+    report = replay(open_replay(path), ReplayBus(), speed=10, clock=lambda: now[0], sleep=sleep)
+    assert waits == [0.1, 0.2]
+    assert report["achieved_speed"] == pytest.approx(10.0)
+    assert report["schedule_lag_max_ms"] == 0.0
+    with pytest.raises(ValueError):
+        replay(open_replay(path), ReplayBus(), speed=-1)
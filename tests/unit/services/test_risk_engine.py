@@ -0,0 +1,111 @@
+from typing import List
+
+import pytest
+
+from APP.services.risk_engine import (
+    BreachRecorder,
+    RiskBreach,
+    RiskEngine,
+    RiskLimitExceeded,
+    RiskLimits,
+    UserRiskEngines,
+)
+
+
+class _Clock:
+    def __init__(self) -> None:
+        self.now = 0.0
+
+    def __call__(self) -> float:
+        return self.now
+
+
+def _engine(limits: RiskLimits, persisted: List[RiskBreach], clock=None) -> RiskEngine:
+    recorder = BreachRecorder(sink=persisted.extend)
+    return RiskEngine(limits, recorder=recorder, clock=clock or _Clock())
+
+
+def test_order_limits_reject_and_persist_breach() -> None:
+    """Given quantity and value limits When an order exceeds them Then it is rejected and persisted."""
+    persisted: List[RiskBreach] = []
+    engine = _engine(RiskLimits(max_order_quantity=100, max_order_value=50_000), persisted)
+
+    assert engine.check("NSE:RELIANCE", "BUY", 50, 900.0) is None
+    assert engine.check("NSE:RELIANCE", "BUY", 150, 10.0).rule == "max_quantity"
+    with pytest.raises(RiskLimitExceeded, match="Order value"):
+        engine.enforce("NSE:RELIANCE", "BUY", 60, 1000.0)
+
+    assert engine.recorder.flush()
+    assert [breach.rule for breach in persisted] == ["max_quantity", "max_order_value"]
+
+
+def test_symbol_exposure_allows_reducing_orders() -> None:
+    """Given a position near the exposure limit When adding vs reducing Then only reducing passes."""
+    engine = _engine(RiskLimits(max_symbol_exposure=10_000), [])
+    engine.on_fill("NSE:INFY", "BUY", 90, 100.0)
+
+    assert engine.check("NSE:INFY", "BUY", 20, 100.0).rule == "symbol_exposure"
+    assert engine.check("NSE:INFY", "SELL", 50, 100.0) is None
+
+
+def test_daily_loss_tracks_fills_and_marks() -> None:
+    """Given losses from fills and price marks When the loss limit is hit Then new risk is blocked."""
+    engine = _engine(RiskLimits(max_daily_loss=1_000), [])
+    engine.on_fill("NSE:SBIN", "BUY", 100, 600.0)
+    engine.on_fill("NSE:SBIN", "SELL", 50, 590.0)
+    engine.on_price("NSE:SBIN", 585.0)
+
+    assert engine.daily_pnl == pytest.approx(-500.0 - 750.0)
+    assert engine.check("NSE:TCS", "BUY", 1, 3500.0).rule == "daily_loss"
+    assert engine.check("NSE:SBIN", "SELL", 50, 585.0) is None
+
+    engine.reset_day()
+    assert engine.daily_pnl == pytest.approx(-750.0)
+
+
+def test_order_rate_token_bucket() -> None:
+    """Given 2 orders/sec When a third order arrives in the same instant Then it is throttled."""
+    clock = _Clock()
+    engine = _engine(RiskLimits(max_orders_per_second=2), [], clock=clock)
+
+    assert engine.check("NSE:ITC", "BUY", 1, 400.0) is None
+    assert engine.check("NSE:ITC", "BUY", 1, 400.0) is None
+    assert engine.check("NSE:ITC", "BUY", 1, 400.0).rule == "order_rate"
+
+    clock.now += 0.5
+    assert engine.check("NSE:ITC", "BUY", 1, 400.0) is None
+
+
+def test_ticks_mark_seeded_positions() -> None:
+    """Given a position seeded from the broker When ticks arrive Then unrealised P&L follows them."""
+    from APP.services.market_data import Tick, TickBus
+
+    engine = _engine(RiskLimits(), [])
+    bus = TickBus()
+    engine.start(bus)
+    engine.load_positions([{
+        "symbol": "NSE:SBIN-EQ", "quantity": -20,
+        "average_price": 800.0, "last_price": 810.0, "realized": 50.0,
+    }])
+    assert engine.daily_pnl == -150.0
+
+    bus.publish(Tick("NSE:SBIN-EQ", 790.0, 0.0))
+    bus.publish(Tick("NSE:ITC-EQ", 400.0, 0.0))
+    engine.stop()
+    bus.publish(Tick("NSE:SBIN-EQ", 900.0, 0.0))
+
+    assert engine.daily_pnl == 250.0
+    assert engine.snapshot()["positions"]["NSE:SBIN-EQ"]["last_price"] == 790.0
+
+
+def test_each_session_user_has_their_own_limits() -> None:
+    """Given two users When one fills their exposure Then the other and the legacy engine are unaffected."""
+    legacy = _engine(RiskLimits(max_symbol_exposure=10_000), [])
+    engines = UserRiskEngines(legacy, factory=lambda: _engine(RiskLimits(max_symbol_exposure=10_000), []))
+
+    engines.for_user("alice").on_fill("NSE:INFY", "BUY", 90, 100.0)
+
+    assert engines.for_user("alice").check("NSE:INFY", "BUY", 20, 100.0).rule == "symbol_exposure"
+    assert engines.for_user("bob").check("NSE:INFY", "BUY", 20, 100.0) is None
+    assert engines.for_user(None) is legacy and legacy.check("NSE:INFY", "BUY", 20, 100.0) is None
+    assert engines.users() == ["alice", "bob"]
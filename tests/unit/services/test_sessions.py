@@ -0,0 +1,160 @@
+import json
+from datetime import datetime
+
+import pytest
+from fastapi import FastAPI
+from starlette.testclient import TestClient
+
+from APP.fyersApp.services import FyersService, fyers_service
+from APP.services import kite_service
+from APP.services.cache import TTLCache
+from APP.services.sessions import SessionStore, UserContextMiddleware, current_user, use_user
+
+
+class _Fyers:
+    built = 0
+
+    def __init__(self, client_id: str, token: str, log_path: str) -> None:
+        type(self).built += 1
+        self.token = token
+
+    def get_profile(self):
+        return {"data": {"name": f"user of {self.token}"}}
+
+
+class _Session:
+    def __init__(self, **kwargs):
+        self.kwargs = kwargs
+
+    def generate_authcode(self):
+        return {"Url": f"https://api-t1.fyers.in/api/v3/generate-authcode?state={self.kwargs['state']}"}
+
+
+def _fyers_env(monkeypatch: pytest.MonkeyPatch, tmp_path) -> None:
+    monkeypatch.setenv("FYERS_APP_ID", "APP-5678")
+    monkeypatch.setenv("FYERS_SECRET_KEY", "secret-xyz")
+    monkeypatch.setenv("FYERS_LOG_PATH", str(tmp_path / "logs"))
+    monkeypatch.setenv("FYERS_TOKEN_PATH", str(tmp_path / "fyers_token.json"))
+    monkeypatch.setenv("SESSION_DIR", str(tmp_path / "sessions"))
+
+
+def test_session_store_rereads_only_changed_files(tmp_path):
+    """Given a stored session When it is loaded repeatedly Then the file is parsed again only after a change."""
+    store = SessionStore("kite", root=str(tmp_path), cache_size=2)
+    path = store.path_for("alice")
+
+    assert store.load(path) is None
+    store.save(path, {"access_token": "a1"})
+    first = store.load(path)
+    first["access_token"] = "mutated"
+    assert store.load(path) == {"access_token": "a1"}
+
+    store.save(path, {"access_token": "a2-longer"})
+    assert store.load(path)["access_token"] == "a2-longer"
+    store.save(store.path_for("bob"), {"access_token": "b1"})
+    assert store.users() == ["alice", "bob"]
+    store.delete(path)
+    assert store.load(path) is None
+    with pytest.raises(ValueError):
+        store.path_for("../etc/passwd")
+
+
+def test_services_keep_one_session_and_client_per_user(monkeypatch: pytest.MonkeyPatch, tmp_path):
+    """Given two users When each stores and reuses a session Then files and clients stay per user."""
+    _fyers_env(monkeypatch, tmp_path)
+    fyers_service._client_cache.clear()
+    _Fyers.built = 0
+    for user in ("alice", "bob"):
+        service = FyersService(session_factory=_Session, fyers_factory=_Fyers, user_id=user)
+        service._store_session(f"token-{user}", {"data": {"name": user}})
+
+    with use_user("alice"):
+        service = FyersService(session_factory=_Session, fyers_factory=_Fyers)
+        for _ in range(3):
+            service.refresh_profile()
+        login_url = service.get_login_url()
+
+    assert current_user() is None
+    assert _Fyers.built == 1
+    state = login_url.split("state=", 1)[1]
+    assert state.startswith("algonova-fyers:alice:")
+    assert fyers_service.user_from_state(state) == "alice"
+    stored = json.loads((tmp_path / "sessions" / "fyers" / "alice.json").read_text())
+    assert stored["profile"] == {"data": {"name": "user of token-alice"}}
+    assert json.loads((tmp_path / "sessions" / "fyers" / "bob.json").read_text())["access_token"] == "token-bob"
+    assert not (tmp_path / "fyers_token.json").exists()
+
+    monkeypatch.setattr(kite_service, "TOKEN_STORAGE_FILE", tmp_path / "kite_token.json")
+    kite = kite_service.KiteService(api_key="key", api_secret="secret", user_id="carol")
+    kite._store_token("kite-carol", {"user_id": "CR1"})
+    assert kite.token_file == tmp_path / "sessions" / "kite" / "carol.json"
+    assert kite._load_stored_token()["access_token"] == "kite-carol"
+    assert kite_service.KiteService(api_key="key")._load_stored_token() is None
+
+
+def test_client_cache_keeps_active_entries_and_stays_bounded(monkeypatch: pytest.MonkeyPatch):
+    """Given a sliding LRU cache When entries are used Then active ones outlive the idle TTL and size is capped."""
+    now = [0.0]
+    monkeypatch.setattr("APP.services.cache.time.monotonic", lambda: now[0])
+    cache: TTLCache[str] = TTLCache("test_clients", ttl=10, maxsize=2, sliding=True)
+    cache.set("active", "client-a")
+    cache.set("idle", "client-i")
+
+    for _ in range(5):
+        now[0] += 6
+        assert cache.get("active") == "client-a"
+
+    assert cache.get("idle") is None
+    cache.set("new", "client-n")
+    cache.set("newer", "client-x")
+    assert len(cache) == 2 and cache.get("active") is None
+
+    # A trader active every third request against a stream of one-off users
+    builds = {}
+    for second_chance in (False, True):
+        clients: TTLCache[str] = TTLCache("test_clients", ttl=10, maxsize=3, second_chance=second_chance)
+        built = []
+        clients.get_or_set("hot", lambda: built.append(1) or "client-h")
+        clients.get("hot")
+        for index in range(9):
+            clients.set(f"one-off-{index}", "client")
+            if index % 3 == 2:
+                clients.get_or_set("hot", lambda: built.append(1) or "client-h")
+        builds[second_chance] = len(built)
+        assert len(clients) == 3
+    assert builds == {False: 4, True: 1}
+
+
+def test_middleware_binds_user_from_header_or_query():
+    """Given X-User-ID or ?user= When a request runs Then the service layer sees that user."""
+    app = FastAPI()
+
+    @app.get("/whoami")
+    async def whoami():
+        return {"user": current_user()}
+
+    app.add_middleware(UserContextMiddleware)
+    client = TestClient(app)
+
+    assert client.get("/whoami").json() == {"user": None}
+    assert client.get("/whoami", headers={"X-User-ID": "alice"}).json() == {"user": "alice"}
+    assert client.get("/whoami", params={"user": "bob"}).json() == {"user": "bob"}
+    assert client.get("/whoami", headers={"X-User-ID": "../x"}).status_code == 400
+
+
+def test_fyers_state_is_signed_and_expires(monkeypatch: pytest.MonkeyPatch, tmp_path):
+    """Given a signed login state When it is altered or too old Then the user cannot be recovered from it."""
+    _fyers_env(monkeypatch, tmp_path)
+    state = fyers_service.sign_state("alice")
+
+    assert fyers_service.user_from_state(state) == "alice"
+    assert fyers_service.user_from_state("algonova-fyers") is None
+    forged = state.replace(":alice:", ":bob:")
+    with pytest.raises(ValueError, match="State validation failed"):
+        fyers_service.user_from_state(forged)
+    with pytest.raises(ValueError, match="State validation failed"):
+        fyers_service.user_from_state("algonova-fyers:bob")
+
+    monkeypatch.setenv("FYERS_STATE_TTL", "-1")
+    with pytest.raises(ValueError, match="expired"):
+        fyers_service.user_from_state(state)
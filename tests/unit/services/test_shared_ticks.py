@@ -0,0 +1,149 @@
+import threading
+import time
+import uuid
+
+import pytest
+from fastapi import FastAPI
+from starlette.testclient import TestClient
+
+from APP.routers import market as market_router
+from APP.services import shared_ticks
+from APP.services.market_data import Tick, TickBus
+from APP.services.shared_ticks import SharedTickTable
+
+
+@pytest.fixture
+def name(monkeypatch: pytest.MonkeyPatch):
+    name = f"algonova_test_{uuid.uuid4().hex[:8]}"
+    monkeypatch.setenv("SHARED_TICKS_NAME", name)
+    yield name
+    shared_ticks.stop()
+
+
+def test_writer_ticks_are_read_from_another_mapping_in_either_notation(name):
+    """Given a writer and an attached reader When ticks arrive Then they are read in either notation."""
+    writer = SharedTickTable.create(name, capacity=2)
+    reader = SharedTickTable.attach(name)
+    try:
+        writer.on_tick(Tick("NSE:TCS", 3900.5, 1200, 1717400000.0))
+        assert reader.read("NSE:TCS-EQ").price == 3900.5
+        writer.on_tick(Tick("NSE:NIFTY24JUN24000CE", 120.0, 50, 1717400001.0, oi=1500.0))
+        writer.on_tick(Tick("NSE:TCS", 3901.0, 1300, 1717400002.0))
+        # Full: a third instrument is counted as dropped, the others keep updating
+        writer.on_tick(Tick("NSE:SBIN-EQ", 830.0, 10, 1717400003.0))
+
+        ticks = reader.read_many(["NSE:TCS", "NFO:NIFTY24JUN24000CE", "NSE:SBIN-EQ"])
+        assert sorted(ticks) == ["NFO:NIFTY24JUN24000CE", "NSE:TCS"]
+        tcs = ticks["NSE:TCS"]
+        assert (tcs.symbol, tcs.price, tcs.volume) == ("NSE:TCS-EQ", 3901.0, 1300)
+        assert ticks["NSE:TCS"].oi is None and ticks["NFO:NIFTY24JUN24000CE"].oi == 1500.0
+        assert reader.status()["ticks"] == 3 and reader.status()["dropped"] == 1
+
+        # A new writer that finds the segment takes it over; readers drop slot maps of the old generation
+        successor = SharedTickTable.create(name, capacity=2)
+        assert reader.read("NSE:TCS") is None
+        successor.on_tick(Tick("NSE:SBIN-EQ", 831.0, 11, 1717400004.0))
+        assert reader.read("NSE:SBIN-EQ").price == 831.0
+        assert reader.writer_alive()
+        successor.close()
+    finally:
+        reader.close()
+        writer.close()
+
+
+def test_readers_never_see_a_half_written_tick(name):
+    """Given a writer rewriting one slot When a reader reads concurrently Then every tick read is whole."""
+    writer = SharedTickTable.create(name, capacity=4)
+    reader = SharedTickTable.attach(name)
+    writer.on_tick(Tick("NSE:TCS-EQ", 1.0, 2.0, 3.0, oi=4.0))
+    done = threading.Event()
+
+    def write() -> None:
+        n = 1
+        while not done.is_set():
+            n += 1
+            writer.on_tick(Tick("NSE:TCS-EQ", n, 2.0 * n, 3.0 * n, oi=4.0 * n))
+
+    thread = threading.Thread(target=write)
+    thread.start()
+    try:
+        seen = set()
+        for _ in range(20000):
+            tick = reader.read("NSE:TCS-EQ") or reader.read_many(["NSE:TCS-EQ"])["NSE:TCS-EQ"]
+            assert (tick.volume, tick.timestamp, tick.oi) == (2 * tick.price, 3 * tick.price, 4 * tick.price)
+            seen.add(tick.price)
+        assert len(seen) > 1
+    finally:
+        done.set()
+        thread.join()
+        reader.close()
+        writer.close()
+
+    # A slot held mid-write is reported as unavailable rather than torn
+    writer = SharedTickTable.create(name, capacity=4)
+    writer.on_tick(Tick("NSE:TCS-EQ", 1.0))
+    writer._seq[0] += 1
+    assert writer.read("NSE:TCS-EQ") is None
+    writer.close()
+
+
+def test_one_worker_is_elected_writer_and_the_rest_read(name):
+    """Given auto mode in two workers When both start Then one writes the table and the other reads it."""
+    bus = TickBus()
+    assert shared_ticks.start(bus, mode="auto") == shared_ticks.WRITER
+    # Another worker: the writer lock is taken
+    assert shared_ticks._elect(name) is False
+    bus.publish(Tick("NSE:INFY", 1500.0, 10, 1717400000.0))
+
+    reader = SharedTickTable.attach(name)
+    try:
+        assert reader.read("NSE:INFY-EQ").price == 1500.0
+    finally:
+        reader.close()
+    app = FastAPI()
+    app.include_router(market_router.router, prefix="/api/market")
+    body = TestClient(app).get("/api/market/ltp?symbols=NSE:INFY,NSE:TCS").json()
+    assert body["data"]["NSE:INFY"]["ltp"] == 1500.0 and body["missing"] == ["NSE:TCS"]
+
+    shared_ticks.stop()
+    assert bus._handlers == []
+    # A reader started before any writer exists attaches later, on first use
+    assert shared_ticks.start(bus, mode="reader") == shared_ticks.READER
+    assert shared_ticks.get_table() is None
+    shared_ticks.stop()
+    with pytest.raises(ValueError):
+        shared_ticks.start(bus, mode="both")
+
+
+def test_reader_workers_mirror_new_ticks_onto_their_own_bus(name, monkeypatch: pytest.MonkeyPatch):
+    """Given a reader worker When the writer records ticks Then the reader's local consumers receive them."""
+    monkeypatch.setenv("SHARED_TICKS_POLL_INTERVAL", "0.005")
+    writer = SharedTickTable.create(name, capacity=8)
+    bus = TickBus()
+    received = []
+    bus.subscribe(received.append)
+    try:
+        writer.on_tick(Tick("NSE:TCS-EQ", 3900.0, 100, 1717400000.0))
+        writer.on_tick(Tick("NSE:TCS-EQ", 3901.0, 150, 1717400001.0))
+        writer.on_tick(Tick("NSE:SBIN-EQ", 830.0, 10, 1717400001.0, oi=5.0))
+        assert shared_ticks.start(bus, mode="reader") == shared_ticks.READER
+        _wait_for(lambda: len(received) >= 2)
+        writer.on_tick(Tick("NSE:SBIN-EQ", 831.0, 12, 1717400002.0, oi=5.0))
+        _wait_for(lambda: len(received) >= 3)
+        time.sleep(0.02)
+
+        # Coalesced to the latest tick per instrument, and each published once
+        assert sorted((tick.symbol, tick.price, tick.volume, tick.oi) for tick in received[:2]) == [
+            ("NSE:SBIN-EQ", 830.0, 10.0, 5.0),
+            ("NSE:TCS-EQ", 3901.0, 150.0, None),
+        ]
+        assert [(tick.symbol, tick.price) for tick in received[2:]] == [("NSE:SBIN-EQ", 831.0)]
+    finally:
+        shared_ticks.stop()
+        writer.close()
+
+
+def _wait_for(condition, timeout: float = 2.0) -> None:
+    deadline = time.monotonic() + timeout
+    while not condition() and time.monotonic() < deadline:
+        time.sleep(0.005)
@@ -0,0 +1,107 @@
+from datetime import date, datetime
+
+import numpy as np
+import pytest
+from sqlalchemy import create_engine, inspect
+
+from APP.services.market_calendar import IST
+from APP.services.market_data import Tick
+from APP.services.tick_store import TickRecorder, decode_block, encode_block, read_ticks, sql_sink
+
+# 2024-06-03 10:00:00 IST
+OPEN = datetime(2024, 6, 3, 10, 0, tzinfo=IST).timestamp()
+
+
+def test_encode_block_round_trips_ticks():
+    """Given a minute of ticks When encoded and decoded Then every value comes back and the block is small."""
+    rng = np.random.default_rng(3)
+    stamps = (OPEN * 1000 + np.cumsum(rng.integers(1, 120, 2000))).astype(np.int64)
+    prices = np.round(24000 + np.cumsum(rng.normal(0, 0.5, 2000)), 2)
+    volumes = np.cumsum(rng.integers(0, 500, 2000)).astype(float)
+
+    payload = encode_block(stamps, prices, volumes)
+    decoded = decode_block(payload)
+
+    assert np.array_equal(decoded["timestamp"], stamps / 1000.0)
+    assert np.allclose(decoded["price"], prices, atol=1e-9)
+    assert np.array_equal(decoded["volume"], volumes)
+    assert "oi" not in decoded
+    assert len(payload) < 2000 * 32 / 4
+
+
+def test_recorder_seals_minutes_into_day_tables(tmp_path):
+    """Given ticks over two minutes When flushed Then closed minutes land in the day table and read back."""
+    engine = create_engine(f"sqlite:///{tmp_path / 'ticks.db'}")
+    sink = sql_sink(lambda: engine, batch_size=1)
+    recorder = TickRecorder(sink=sink, spill_dir=tmp_path / "spill", close_grace=2)
+    for second in range(0, 120, 2):
+        recorder.on_tick(Tick("NSE:SBIN-EQ", 800 + second / 100, 1000 + second, OPEN + second, oi=None))
+    recorder.on_tick(Tick("NSE:INFY-EQ", 1500.0, 10, OPEN + 5, oi=42))
+
+    # SBIN has moved past its first minute; INFY's minute waits out the grace period
+    assert recorder.flush(now=OPEN + 61) == 1
+    assert recorder.flush(now=OPEN + 62) == 1
+    # A straggler for the sealed minute becomes its own block
+    recorder.on_tick(Tick("NSE:SBIN-EQ", 799.5, 1001, OPEN + 59.5, oi=None))
+    assert recorder.flush(now=OPEN + 125) == 2
+
+    assert "tick_blocks_20240603" in inspect(engine).get_table_names()
+    ticks = read_ticks("NSE:SBIN-EQ", date(2024, 6, 3), engine)
+    assert len(ticks["price"]) == 61
+    assert np.all(np.diff(ticks["timestamp"]) >= 0)
+    assert ticks["price"][30] == 799.5
+    infy = read_ticks("NSE:INFY-EQ", date(2024, 6, 3), engine)
+    assert infy["oi"].tolist() == [42.0]
+    assert recorder.status()["open_symbols"] == 0
+
+
+def test_block_volume_counts_from_the_previous_minutes_last_tick():
+    """Given one tick a minute with cumulative volume When sealed Then blocks count from the last tick."""
+    blocks = []
+    recorder = TickRecorder(sink=blocks.extend, spill_dir=None, close_grace=0)
+    for index, volume in enumerate((100, 150, 200, 260)):
+        recorder.on_tick(Tick("NSE:SBIN-EQ", 800.0, volume, OPEN + 60 * index + 30))
+        recorder.flush(now=OPEN + 60 * index + 30)
+    recorder.flush(force=True)
+    # A new session restarts the cumulative count
+    recorder.on_tick(Tick("NSE:SBIN-EQ", 801.0, 5, OPEN + 86_400))
+    recorder.on_tick(Tick("NSE:SBIN-EQ", 801.0, 9, OPEN + 86_401))
+    recorder.flush(force=True)
+
+    assert [block.volume for block in blocks] == [0.0, 50.0, 50.0, 60.0, 4.0]
+
+
+def test_failed_inserts_spill_to_disk_and_replay_in_order(tmp_path):
+    """Given a database that is down When minutes close Then blocks spill to disk and load once it is back."""
+    written = []
+    down = [True]
+
+    def sink(blocks):
+        if down[0]:
+            raise ConnectionError("database unavailable")
+        written.extend(block.minute for block in blocks)
+
+    recorder = TickRecorder(sink=sink, spill_dir=tmp_path / "spill", close_grace=0)
+    for minute in range(3):
+        recorder.on_tick(Tick("NSE:SBIN-EQ", 800.0 + minute, 10 * minute, OPEN + 60 * minute))
+        recorder.flush(now=OPEN + 60 * (minute + 1))
+
+    assert written == []
+    assert len(list((tmp_path / "spill").glob("ticks-*.npz"))) == 3
+
+    # A restart picks the spill files up again
+    restarted = TickRecorder(sink=sink, spill_dir=tmp_path / "spill", close_grace=0)
+    down[0] = False
+    restarted.on_tick(Tick("NSE:SBIN-EQ", 810.0, 40, OPEN + 180))
+    assert restarted.flush(now=OPEN + 240) == 4
+    start_minute = int(OPEN // 60)
+    assert written == [start_minute, start_minute + 1, start_minute + 2, start_minute + 3]
+    assert list((tmp_path / "spill").iterdir()) == []
+
+
+@pytest.fixture(autouse=True)
+def _separate_tables(monkeypatch: pytest.MonkeyPatch):
+    # Table objects are cached per name; each test uses a fresh sqlite file
+    from APP.services import tick_store
+
+    monkeypatch.setattr(tick_store, "_tables", {})
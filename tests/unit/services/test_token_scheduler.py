@@ -0,0 +1,164 @@
+from datetime import datetime, timedelta
+from typing import Any, Dict, List, Optional
+
+import pytest
+
+from APP.services.market_calendar import IST
+from APP.services.sessions import current_user
+from APP.services.risk_engine import BreachRecorder, RiskEngine, RiskLimits, UserRiskEngines
+from APP.services.token_scheduler import TokenRenewalScheduler
+
+
+class _FakeBroker:
+    """Broker service stub exposing the methods the scheduler drives."""
+
+    def __init__(self, expires_at: Optional[datetime]) -> None:
+        self.expires_at = expires_at
+        self.renewed = 0
+        self.positions: List[Dict[str, Any]] = []
+
+    def token_expiry(self) -> Optional[datetime]:
+        return self.expires_at
+
+    def refresh_access_token(self) -> Dict[str, Any]:
+        self.renewed += 1
+        self.expires_at = self.expires_at + timedelta(days=1)
+        return {}
+
+    renew_access_token = refresh_access_token
+
+    def refresh_profile(self) -> Dict[str, Any]:
+        return {"data": {"name": "AlgoNova Trader"}}
+
+    def fetch_option_chain(self, request: Any) -> Dict[str, Any]:
+        raise ValueError("token expired")
+
+    def get_profile(self, use_stored_token: bool = True) -> Dict[str, Any]:
+        return {"user_id": "AB1234"}
+
+    def get_instruments(self, exchange: str) -> List[Dict[str, Any]]:
+        return []
+
+    def get_positions(self) -> List[Dict[str, Any]]:
+        return self.positions
+
+
+@pytest.fixture(autouse=True)
+def _scheduler_env(monkeypatch: pytest.MonkeyPatch, tmp_path) -> None:
+    monkeypatch.setenv("SESSION_DIR", str(tmp_path / "sessions"))
+    monkeypatch.setenv("TOKEN_REFRESH_MARGIN_MINUTES", "30")
+    monkeypatch.setenv("PREWARM_AT", "09:05")
+    monkeypatch.setenv("PREWARM_OPTION_CHAINS", "NSE:NIFTY50-INDEX")
+    monkeypatch.setenv("PREWARM_KITE_EXCHANGES", "NFO")
+
+
+def test_token_near_expiry_is_renewed() -> None:
+    """Given a token expiring inside the margin When run_once Then it is renewed early."""
+    now = datetime(2024, 6, 3, 5, 45, tzinfo=IST)
+    fyers = _FakeBroker(now + timedelta(minutes=15))
+    kite = _FakeBroker(now + timedelta(hours=5))
+    scheduler = TokenRenewalScheduler(lambda: fyers, lambda: kite, clock=lambda: now)
+
+    scheduler.run_once()
+
+    assert fyers.renewed == 1
+    assert kite.renewed == 0
+    status = scheduler.status()["tokens"]
+    assert status["fyers"]["refreshed_at"] == now.isoformat()
+    assert status["kite"]["last_error"] is None
+
+
+def test_prewarm_runs_once_per_trading_day() -> None:
+    """Given a weekday after PREWARM_AT When run_once twice Then pre-warm runs once and records failures."""
+    now = datetime(2024, 6, 3, 9, 6, tzinfo=IST)
+    broker = _FakeBroker(now + timedelta(hours=20))
+    scheduler = TokenRenewalScheduler(lambda: broker, lambda: broker, clock=lambda: now)
+
+    scheduler.run_once()
+    first_run = scheduler.prewarm
+    scheduler.run_once()
+
+    assert scheduler.prewarm is first_run
+    assert "fyers:profile" in first_run.warmed
+    assert "kite:instruments:NFO" in first_run.warmed
+    assert first_run.errors == {"fyers:option_chain:NSE:NIFTY50-INDEX": "token expired"}
+
+
+def test_prewarm_skipped_on_weekend() -> None:
+    """Given a Saturday When run_once Then no pre-warm happens."""
+    now = datetime(2024, 6, 8, 9, 30, tzinfo=IST)
+    broker = _FakeBroker(None)
+    scheduler = TokenRenewalScheduler(lambda: broker, lambda: broker, clock=lambda: now)
+
+    scheduler.run_once()
+
+    assert scheduler.prewarm.last_run is None
+
+
+def test_positions_are_seeded_and_the_risk_day_rolls_over() -> None:
+    """Given broker positions When started and the date changes Then risk is seeded, then reset."""
+    now = [datetime(2024, 6, 3, 15, 0, tzinfo=IST)]
+    kite = _FakeBroker(None)
+    kite.positions = [{
+        "symbol": "NSE:TCS", "quantity": 10,
+        "average_price": 3800.0, "last_price": 3700.0, "realized": -500.0,
+    }]
+    risk = RiskEngine(RiskLimits(max_daily_loss=1000), recorder=BreachRecorder(sink=lambda batch: None))
+    scheduler = TokenRenewalScheduler(
+        lambda: _FakeBroker(None), lambda: kite, clock=lambda: now[0], risk=risk
+    )
+
+    scheduler.run_once()
+
+    assert risk.daily_pnl == -1500.0
+    assert risk.check("NSE:TCS", "BUY", 1, 3700.0).rule == "daily_loss"
+
+    now[0] += timedelta(hours=18)
+    scheduler.run_once()
+
+    # Only the open position's mark-to-market remains
+    assert risk.daily_pnl == -1000.0
+    assert scheduler.status()["risk_day"] == "2024-06-04"
+
+
+def test_every_user_session_is_renewed_and_prewarmed() -> None:
+    """Given per-user sessions When run_once Then each user's token is checked and warmed as that user."""
+    now = datetime(2024, 6, 3, 9, 6, tzinfo=IST)
+    brokers: Dict[Any, _FakeBroker] = {
+        None: _FakeBroker(now + timedelta(hours=20)),
+        "alice": _FakeBroker(now + timedelta(minutes=10)),
+        "bob": _FakeBroker(now + timedelta(hours=20)),
+    }
+    brokers["alice"].positions = [{
+        "symbol": "NSE:TCS", "quantity": 10,
+        "average_price": 3800.0, "last_price": 3800.0, "realized": 0.0,
+    }]
+    sessions = {"fyers": ["alice", "bob"], "kite": []}
+    user_risk = UserRiskEngines(
+        RiskEngine(recorder=BreachRecorder(sink=lambda batch: None)),
+        factory=lambda: RiskEngine(recorder=BreachRecorder(sink=lambda batch: None)),
+    )
+    scheduler = TokenRenewalScheduler(
+        lambda: brokers[current_user()],
+        lambda: brokers[None],
+        clock=lambda: now,
+        risk=user_risk.legacy,
+        users=lambda broker: sessions[broker],
+        user_risk=user_risk,
+    )
+
+    scheduler.run_once()
+
+    assert [brokers[user].renewed for user in (None, "alice", "bob")] == [0, 1, 0]
+    tokens = scheduler.status()["tokens"]
+    assert tokens["fyers:alice"]["refreshed_at"] == now.isoformat()
+    assert tokens["fyers:bob"]["user"] == "bob"
+    assert {"fyers:alice:profile", "fyers:bob:profile"} <= set(scheduler.prewarm.warmed)
+    # Each user's positions land in their own risk engine, not the legacy one
+    assert "NSE:TCS" in user_risk.for_user("alice").snapshot()["positions"]
+    assert user_risk.for_user("bob").snapshot()["positions"] == {}
+    assert "NSE:TCS" not in user_risk.legacy.snapshot()["positions"]
+
+    sessions["fyers"] = ["alice"]
+    scheduler.run_once()
+    assert "fyers:bob" not in scheduler.status()["tokens"]
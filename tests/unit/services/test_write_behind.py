@@ -0,0 +1,232 @@
+from datetime import datetime, timezone
+from typing import Any, Dict, List
+
+import pytest
+
+from APP.services import write_behind
+from APP.services.write_behind import BufferFull, WriteBehindBuffer
+
+
+class _Sink:
+    def __init__(self) -> None:
+        self.batches: List[List[Dict[str, Any]]] = []
+        self.fail = False
+
+    def __call__(self, table: str, rows: List[Dict[str, Any]]) -> None:
+        if self.fail:
+            raise ConnectionError("database unavailable")
+        self.batches.append(rows)
+
+
+def _log(index: int) -> Dict[str, Any]:
+    return {
+        "level": "INFO",
+        "message": f"event {index}",
+        "created_at": datetime(2024, 6, 3, 9, 15, index, tzinfo=timezone.utc),
+    }
+
+
+def _crash(buffer: WriteBehindBuffer) -> None:
+    """What the process dying does: the journal is left as is and the owner lock is released."""
+    if buffer._journal is not None:
+        buffer._journal.close()
+    buffer._owner_lock.close()
+
+
+def test_flush_writes_in_one_sink_call_and_clears_journal(tmp_path) -> None:
+    """Given buffered rows When flushed Then they reach the sink in one call and the journal is removed."""
+    sink = _Sink()
+    buffer = WriteBehindBuffer("system_logs", sink=sink, batch_size=2, journal_dir=tmp_path)
+
+    for index in range(5):
+        buffer.submit(_log(index))
+    written = buffer.flush()
+
+    assert written == 5
+    assert [len(batch) for batch in sink.batches] == [5]
+    assert list(tmp_path.glob("*.jsonl")) == []
+
+
+def test_journal_replayed_after_crash(tmp_path) -> None:
+    """Given rows journaled but never flushed When a new buffer starts Then they are written with types intact."""
+    crashed = WriteBehindBuffer("system_logs", sink=_Sink(), journal_dir=tmp_path)
+    for index in range(3):
+        crashed.submit(_log(index))
+    _crash(crashed)
+
+    sink = _Sink()
+    recovered = WriteBehindBuffer("system_logs", sink=sink, journal_dir=tmp_path)
+    assert recovered.flush() == 3
+
+    rows = sink.batches[0]
+    assert [row["message"] for row in rows] == ["event 0", "event 1", "event 2"]
+    assert rows[0]["created_at"] == _log(0)["created_at"]
+
+
+def test_failed_insert_is_retried_from_journal(tmp_path) -> None:
+    """Given the database is down When flushing Then rows stay journaled and are written once it recovers."""
+    sink = _Sink()
+    sink.fail = True
+    buffer = WriteBehindBuffer("orders", sink=sink, journal_dir=tmp_path)
+    buffer.submit({"order_id": "1"})
+
+    assert buffer.flush() == 0
+    assert len(list(tmp_path.glob("orders-*.jsonl"))) == 1
+
+    sink.fail = False
+    buffer.submit({"order_id": "2"})
+    assert buffer.flush() == 2
+    assert [row["order_id"] for batch in sink.batches for row in batch] == ["1", "2"]
+
+
+def test_overflow_policies() -> None:
+    """Given a full buffer When submitting Then each policy drops or blocks as configured."""
+    newest = WriteBehindBuffer("system_logs", sink=_Sink(), max_queue=2, overflow="drop_newest")
+    oldest = WriteBehindBuffer("system_logs", sink=_Sink(), max_queue=2, overflow="drop_oldest")
+    blocking = WriteBehindBuffer("orders", sink=_Sink(), max_queue=1, block_timeout=0.01)
+
+    for index in range(3):
+        newest.submit(_log(index))
+        oldest.submit(_log(index))
+    blocking.submit(_log(0))
+
+    assert [row["message"] for row in newest._records] == ["event 0", "event 1"]
+    assert [row["message"] for row in oldest._records] == ["event 1", "event 2"]
+    with pytest.raises(BufferFull):
+        blocking.submit(_log(1))
+
+
+def test_insert_rows_uses_model_table(monkeypatch: pytest.MonkeyPatch) -> None:
+    """Given a SQLite engine When insert_rows called Then the rows land in system_logs."""
+    from sqlalchemy import create_engine, text
+    from sqlalchemy.pool import StaticPool
+
+    from APP.fyersApp.db import connection
+    from APP.fyersApp.models.dropdown import Base
+
+    engine = create_engine("sqlite://", poolclass=StaticPool)
+    write_behind._model_table("system_logs")
+    Base.metadata.create_all(engine)
+    monkeypatch.setattr(connection, "_engine", engine)
+
+    write_behind.insert_rows("system_logs", [_log(0), _log(1)])
+
+    with engine.connect() as conn:
+        count = conn.execute(text("SELECT COUNT(*) FROM system_logs")).scalar()
+    assert count == 2
+
+
+def test_rows_dropped_by_overflow_are_not_replayed(tmp_path) -> None:
+    """Given drop_oldest evicted journaled rows When the journal is replayed Then only kept rows go in."""
+    crashed = WriteBehindBuffer(
+        "system_logs", sink=_Sink(), max_queue=2, overflow="drop_oldest", journal_dir=tmp_path
+    )
+    for index in range(4):
+        crashed.submit(_log(index))
+    _crash(crashed)
+
+    sink = _Sink()
+    recovered = WriteBehindBuffer("system_logs", sink=sink, journal_dir=tmp_path)
+    assert recovered.flush() == 2
+    assert [row["message"] for row in sink.batches[0]] == ["event 2", "event 3"]
+
+
+def test_insert_rows_is_one_transaction_and_skips_stored_orders(monkeypatch: pytest.MonkeyPatch) -> None:
+    """Given orders stored before When replayed Then they are skipped, and a failed chunk rolls back all."""
+    from sqlalchemy import create_engine, text
+    from sqlalchemy.pool import StaticPool
+
+    from APP.fyersApp.db import connection
+    from APP.fyersApp.models.dropdown import Base
+
+    engine = create_engine("sqlite://", poolclass=StaticPool)
+    write_behind._model_table("orders")
+    Base.metadata.create_all(engine)
+    monkeypatch.setattr(connection, "_engine", engine)
+
+    def order(order_id: str, token: Any = "779521") -> Dict[str, Any]:
+        return {
+            "user_id": 1,
+            "order_id": order_id,
+            "instrument_token": token,
+            "transaction_type": "BUY",
+            "order_type": "MARKET",
+            "quantity": 1,
+        }
+
+    write_behind.insert_rows("orders", [order("1"), order("2")])
+    write_behind.insert_rows("orders", [order("1"), order("2"), order("3"), order("3")], chunk_size=1)
+    # The second chunk breaks a NOT NULL column: the first must not stay committed
+    with pytest.raises(Exception):
+        write_behind.insert_rows("orders", [order("4"), order("5", token=None)], chunk_size=1)
+
+    with engine.connect() as conn:
+        stored = conn.execute(text("SELECT order_id FROM orders ORDER BY order_id")).scalars().all()
+    assert stored == ["1", "2", "3"]
+
+
+def test_order_updates_are_applied_after_the_batch_inserts(monkeypatch: pytest.MonkeyPatch) -> None:
+    """Given an order row and its updates in one batch When written Then the row ends with the last update."""
+    from sqlalchemy import create_engine, text
+    from sqlalchemy.pool import StaticPool
+
+    from APP.fyersApp.db import connection
+    from APP.fyersApp.models.dropdown import Base
+
+    engine = create_engine("sqlite://", poolclass=StaticPool)
+    write_behind._model_table("orders")
+    Base.metadata.create_all(engine)
+    monkeypatch.setattr(connection, "_engine", engine)
+
+    def update(order_id: str, status: str, filled: int) -> Dict[str, Any]:
+        return write_behind.as_update(
+            {"order_id": order_id, "status": status, "filled_quantity": filled, "average_price": 101.5}
+        )
+
+    placed = {
+        "user_id": 1,
+        "order_id": "9001",
+        "instrument_token": "NSE:INFY",
+        "transaction_type": "BUY",
+        "order_type": "MARKET",
+        "quantity": 10,
+        "status": "PENDING",
+    }
+    write_behind.insert_rows("orders", [update("9001", "OPEN", 4), placed, update("9001", "COMPLETE", 10)])
+    # Orders placed elsewhere have no row to update
+    write_behind.insert_rows("orders", [update("9002", "COMPLETE", 1)])
+
+    with engine.connect() as conn:
+        stored = conn.execute(text("SELECT order_id, status, filled_quantity FROM orders")).all()
+    assert [tuple(row) for row in stored] == [("9001", "COMPLETE", 10)]
+
+
+def test_workers_sharing_a_journal_only_replay_dead_workers_segments(tmp_path) -> None:
+    """Given two live workers on one journal When a third starts Then it replays only the dead one's rows."""
+    first_sink, second_sink = _Sink(), _Sink()
+    first = WriteBehindBuffer("system_logs", sink=first_sink, journal_dir=tmp_path)
+    second = WriteBehindBuffer("system_logs", sink=second_sink, journal_dir=tmp_path)
+    first.submit(_log(0))
+    second.submit(_log(1))
+    assert len(list(tmp_path.glob("system_logs-*.jsonl"))) == 2
+
+    # A worker starting next to live ones leaves their journals alone
+    assert WriteBehindBuffer("system_logs", sink=_Sink(), journal_dir=tmp_path).flush() == 0
+    _crash(first)
+    sink = _Sink()
+    recovered = WriteBehindBuffer("system_logs", sink=sink, journal_dir=tmp_path)
+
+    assert recovered.flush() == 1
+    assert [row["message"] for row in sink.batches[0]] == ["event 0"]
+    assert second.flush() == 1
+    assert [row["message"] for row in second_sink.batches[0]] == ["event 1"]
+    assert first_sink.batches == [] and list(tmp_path.glob("*.jsonl")) == []
+
+
+def test_segments_from_before_owner_tokens_are_replayed(tmp_path) -> None:
+    """Given a segment named without an owner token When a buffer starts Then its rows are written."""
+    (tmp_path / "system_logs-00000007.jsonl").write_text('{"level":"INFO","message":"event 7"}\n')
+
+    sink = _Sink()
+    assert WriteBehindBuffer("system_logs", sink=sink, journal_dir=tmp_path).flush() == 1
+    assert sink.batches[0][0]["message"] == "event 7"